@@ -0,0 +1,28 @@
+# api/checks.py
+"""
+Проверки развёртывания (manage.py check --deploy).
+
+Кэш недельной сетки, штампы ETag и поколение индекса подсказок сбрасываются
+сигналами в том процессе, где изменили расписание; с кэшем в памяти процесса
+остальные воркеры этого не видят.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+_PER_PROCESS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    backend = settings.CACHES.get("default", {}).get("BACKEND", "")
+    if backend not in _PER_PROCESS:
+        return []
+    return [Warning(
+        "Кэш расписания и штампы ETag лежат в памяти процесса: при нескольких воркерах "
+        "сброс после правки занятий виден только одному из них.",
+        hint="Задайте REDIS_URL (общий Redis) или запускайте один процесс.",
+        id="api.W001",
+    )]
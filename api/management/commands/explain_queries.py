@@ -0,0 +1,179 @@
+# api/management/commands/explain_queries.py
+"""
+EXPLAIN QUERY PLAN для запросов горячих ручек API.
+
+Внутри транзакции (в конце — откат, база не меняется) размножает имеющиеся
+занятия на --weeks недель вперёд, прогоняет ручки тестовым клиентом и
+Lesson.clean, снимает все SELECT и показывает их планы. Если какой-то запрос
+читает большую таблицу (занятия, ДЗ) полным сканом — команда падает.
+
+    python manage.py explain_queries --weeks 52 [--analyze] [-v 2]
+"""
+import re
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from directory.models import Teacher
+from scheduleapp.models import Lesson
+from api.services import week_cache
+
+BIG_TABLES = {"scheduleapp_lesson", "scheduleapp_homeworkitem"}
+
+_ALIAS = re.compile(r'"(\w+)" (U\d+|T\d+)\b')
+
+
+def scale_lessons(weeks: int) -> int:
+    """Копирует первую неделю занятий на weeks недель после последней имеющейся. Возвращает число строк."""
+    first = Lesson.objects.order_by("date").values_list("date", flat=True).first()
+    last = Lesson.objects.order_by("-date").values_list("date", flat=True).first()
+    if first is None:
+        return 0
+    monday = first - timedelta(days=first.weekday())
+    offset = (last - monday).days // 7 + 1
+    fields = [f.attname for f in Lesson._meta.concrete_fields if f.attname != "id"]
+    week = list(Lesson.objects.filter(date__range=(monday, monday + timedelta(days=6))).values(*fields))
+    created = 0
+    for k in range(offset, offset + weeks):
+        shift = timedelta(weeks=k)
+        batch = [Lesson(**{**row, "date": row["date"] + shift}) for row in week]
+        Lesson.objects.bulk_create(batch, batch_size=2000)
+        created += len(batch)
+    return created
+
+
+def full_scans(sql: str, plan) -> list:
+    """
+    Строки плана вида «SCAN <большая таблица>» (в т.ч. по псевдониму подзапроса U0/T3).
+    Обход по индексу с LIMIT (первая страница в порядке индекса) сканом не считается —
+    SQLite останавливается, набрав нужное число строк.
+    """
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+    limited = " LIMIT " in sql
+    bad = []
+    for row in plan:
+        detail = row[-1]
+        if not detail.startswith("SCAN "):
+            continue
+        if limited and " USING " in detail and "INDEX" in detail:
+            continue
+        name = detail.split()[1]
+        if aliases.get(name, name) in BIG_TABLES:
+            bad.append(detail)
+    return bad
+
+
+class Command(BaseCommand):
+    help = "Планы запросов горячих ручек API на увеличенном наборе; ошибка, если есть полный скан занятий"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--weeks", type=int, default=52, help="на сколько недель размножить занятия")
+        parser.add_argument("--analyze", action="store_true", help="выполнить ANALYZE перед планами")
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("EXPLAIN QUERY PLAN есть только у SQLite")
+        with transaction.atomic():
+            t0 = time.perf_counter()
+            created = scale_lessons(opts["weeks"])
+            self.stdout.write(f"Занятий: {Lesson.objects.count()} (+{created} за {time.perf_counter() - t0:.1f} с)")
+            if opts["analyze"]:
+                connection.cursor().execute("ANALYZE")
+            failures = self.run_probes(opts["verbosity"])
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"Полный скан большой таблицы в {failures} запрос(ах)")
+        self.stdout.write(self.style.SUCCESS("Полных сканов больших таблиц нет"))
+
+    # ---------- ручки ----------
+    def probes(self):
+        lesson = Lesson.objects.select_related("group").exclude(room=None).order_by("date", "id").first()
+        if lesson is None:
+            raise CommandError("В базе нет занятий с аудиторией")
+        monday = lesson.date - timedelta(days=lesson.date.weekday())
+        week = f"start={monday}&end={monday + timedelta(days=6)}"
+        year = f"start={monday}&end={monday + timedelta(days=364)}"
+        g, t, r = lesson.group.code, lesson.teacher_id, lesson.room_id
+
+        admin = User.objects.create_superuser("explain_queries_admin", password=None)
+        teacher_user = User.objects.create_user("explain_queries_teacher", password=None)
+        teacher_user.groups.add(Group.objects.get_or_create(name="Teacher")[0])
+        Teacher.objects.filter(pk=t).update(user=teacher_user)
+
+        anon, staff, teach = Client(), Client(), Client()
+        staff.force_login(admin)
+        teach.force_login(teacher_user)
+        after = f"{lesson.date},{lesson.timeslot.order},{lesson.id}"
+        return [
+            ("schedule_today group", anon, f"/api/schedule/today/?group={g}"),
+            ("schedule_period group", anon, f"/api/schedule/period/?group={g}&{week}"),
+            ("schedule_period teacher", anon, f"/api/schedule/period/?teacher={t}&{week}"),
+            ("export_csv all", staff, f"/api/export/csv/?{week}"),
+            ("export_csv group", staff, f"/api/export/csv/?group={g}&{year}"),
+            ("export_csv teacher", staff, f"/api/export/csv/?teacher={t}&{year}"),
+            ("export_ics group", staff, f"/api/export/ics/?group={g}&{year}"),
+            ("export_ics_feed teacher", anon, f"/api/export/ics/feed/?teacher={t}"),
+            ("studio_lessons first", staff, "/api/studio/lessons/?limit=200"),
+            ("studio_lessons after", staff, f"/api/studio/lessons/?limit=200&after={after}"),
+            ("studio_lessons group", staff, f"/api/studio/lessons/?group={lesson.group_id}&{week}"),
+            ("studio_lessons teacher", staff, f"/api/studio/lessons/?teacher={t}&{week}"),
+            ("studio_lessons room", staff, f"/api/studio/lessons/?room={r}&{week}"),
+            ("admin_schedule_period_all", staff, f"/api/admin/schedule/period_all/?{week}"),
+            ("admin_teacher_schedule", staff, f"/api/admin/teacher/schedule/?teacher_id={t}&{week}"),
+            ("ranepa_conflicts", staff, f"/api/integrations/ranepa/conflicts/?{week}&format=summary"),
+            ("teacher_me_schedule", teach, f"/api/teacher/me/schedule/?{week}"),
+            ("teacher_me_stats", teach, f"/api/teacher/me/stats/?{year}"),
+            ("teacher_free_rooms", teach, f"/api/teacher/room/free/?lesson_id={lesson.id}"),
+            ("Lesson.clean", None, lambda: self.clean_quietly(lesson)),
+        ]
+
+    @staticmethod
+    def clean_quietly(lesson):
+        try:
+            lesson.full_clean()
+        except ValidationError:
+            pass  # нужны запросы проверки, а не её результат
+
+    def run_probes(self, verbosity) -> int:
+        failures = 0
+        week_cache.invalidate_all()  # иначе часть ручек ответит из кэша без запросов
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for name, client, target in self.probes():
+                with CaptureQueriesContext(connection) as ctx:
+                    t0 = time.perf_counter()
+                    if client is None:
+                        target()
+                        status = "-"
+                    else:
+                        resp = client.get(target)
+                        if getattr(resp, "streaming", False):
+                            for _ in resp.streaming_content:
+                                pass
+                        status = resp.status_code
+                    ms = (time.perf_counter() - t0) * 1000
+                selects = [q["sql"] for q in ctx.captured_queries if q["sql"].lstrip().upper().startswith("SELECT")]
+                bad = []
+                for sql in selects:
+                    with connection.cursor() as cur:
+                        cur.execute("EXPLAIN QUERY PLAN " + sql)
+                        plan = cur.fetchall()
+                    scans = full_scans(sql, plan)
+                    if scans:
+                        bad.append((sql, scans))
+                    if verbosity >= 2:
+                        self.stdout.write(f"    {sql[:160]}")
+                        for row in plan:
+                            self.stdout.write(f"      {row[-1]}")
+                mark = self.style.ERROR("SCAN") if bad else self.style.SUCCESS("ok")
+                self.stdout.write(f"{mark:>4} {name:<28} HTTP {status:<4} {len(selects):3d} SELECT {ms:8.1f} мс")
+                for sql, scans in bad:
+                    self.stdout.write(f"       {'; '.join(scans)}\n       {sql[:300]}")
+                failures += len(bad)
+        return failures
@@ -0,0 +1,53 @@
+# api/management/commands/export_ranepa_pages.py
+"""
+Выгрузка сохранённых страниц RANEPA (api.services.ranepa_pages) в каталог —
+корпус для tools/bench_ranepa_parse.py --pages DIR и офлайн-разборов.
+
+Текущая версия недели — <slug>.html, с --all ещё и прошлые: <slug>@<sha12>.html.
+Без каталога — только сводка по хранилищу.
+
+    python manage.py export_ranepa_pages [DIR] [--all]
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services import ranepa_pages
+
+
+class Command(BaseCommand):
+    help = "Выгрузить сохранённые страницы недель RANEPA в каталог"
+
+    def add_arguments(self, parser):
+        parser.add_argument("out", nargs="?", default="", help="куда писать *.html")
+        parser.add_argument("--all", action="store_true", help="все сохранённые версии, не только текущие")
+
+    def handle(self, *args, **opts):
+        store = ranepa_pages.default_store()
+        if store is None:
+            raise CommandError("хранилище страниц выключено (RANEPA_PAGE_STORE = False)")
+        out = Path(opts["out"]) if opts["out"] else None
+        if out:
+            out.mkdir(parents=True, exist_ok=True)
+
+        weeks = versions = written = missing = 0
+        for meta in store.weeks():
+            weeks += 1
+            history = meta.get("history") or [{"sha256": meta["sha256"]}]
+            versions += len(history)
+            if not out:
+                continue
+            shas = [h["sha256"] for h in history] if opts["all"] else [meta["sha256"]]
+            for sha in shas:
+                html = store.read(sha)
+                if html is None:
+                    missing += 1
+                    continue
+                name = f"{meta['slug']}.html" if sha == meta["sha256"] else f"{meta['slug']}@{sha[:12]}.html"
+                (out / name).write_text(html, encoding="utf-8")
+                written += 1
+
+        self.stdout.write(f"недель: {weeks}, версий: {versions}")
+        if out:
+            self.stdout.write(self.style.SUCCESS(f"→ {out}: {written} страниц")
+                              + (f", нет на диске: {missing}" if missing else ""))
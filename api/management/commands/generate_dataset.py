@@ -0,0 +1,291 @@
+# api/management/commands/generate_dataset.py
+"""
+Синтетический «большой колледж» для замеров производительности.
+
+Детерминированно по --seed заполняет справочники (корпуса, аудитории, группы,
+преподаватели, дисциплины, нагрузки, планы, назначения, приоритеты корпусов,
+праздники, исключения по дням) и занятия на --years лет. Занятия строятся по
+двум недельным шаблонам (чётная/нечётная неделя) без накладок групп,
+преподавателей и аудиторий, праздники пропускаются; пишутся bulk_create мимо
+save()/clean(), поэтому миллион строк — минуты, а не часы.
+
+Планы получают hours_assigned по фактически поставленным занятиям и запас
+--plan-slack сверх него, чтобы генератору было что расставлять.
+
+    python manage.py generate_dataset --groups 300 --teachers 450 --rooms 350 --years 3 --flush
+"""
+import random
+import time
+from collections import Counter
+from datetime import date, time as dtime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from directory.models import (
+    Building, RoomType, Room, LessonType, Discipline, Teacher, StudentGroup,
+    TeacherWorkload, TeacherDayOverride, GroupDisciplinePlan, TeachingAssignment,
+    Holiday, BuildingPriority,
+)
+from scheduleapp.models import Lesson, TimeSlot, HomeworkItem
+from api.services import week_cache
+
+BELL = [(8, 20, 9, 50), (10, 0, 11, 30), (11, 35, 13, 5), (13, 35, 15, 5), (15, 10, 16, 40), (16, 50, 18, 20)]
+
+SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Васильев", "Соколов",
+            "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов",
+            "Егоров", "Павлов", "Козлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров"]
+INITIALS = "АБВГДЕИКЛМНОПРСТ"
+SUBJECTS = ["Математика", "Физика", "Информатика", "История", "Иностранный язык", "Русский язык",
+            "Литература", "Химия", "Биология", "Экономика", "Право", "Философия", "Программирование",
+            "Базы данных", "Сети", "Бухгалтерский учёт", "Менеджмент", "Статистика", "Физическая культура",
+            "Обществознание", "География", "Психология", "Инженерная графика", "Электротехника"]
+SPECIALTIES = ["ИСП", "БД", "ЮР", "ЭК", "ПК", "СА", "ДО", "ТУР"]
+# фиксированные нерабочие дни (месяц, день)
+HOLIDAYS = [(1, d) for d in range(1, 9)] + [(2, 23), (3, 8), (5, 1), (5, 9), (6, 12), (11, 4)]
+
+FLUSH_MODELS = [HomeworkItem, Lesson, BuildingPriority, TeachingAssignment, GroupDisciplinePlan,
+                TeacherDayOverride, TeacherWorkload, Holiday, StudentGroup, Teacher, Discipline,
+                Room, RoomType, LessonType, Building]
+
+
+class Command(BaseCommand):
+    help = "Синтетический большой колледж (детерминированно по seed) для бенчмарков"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--buildings", type=int, default=4)
+        parser.add_argument("--rooms", type=int, default=150)
+        parser.add_argument("--groups", type=int, default=120)
+        parser.add_argument("--teachers", type=int, default=200)
+        parser.add_argument("--disciplines", type=int, default=60)
+        parser.add_argument("--plans-per-group", type=int, default=10)
+        parser.add_argument("--lessons-per-day", type=int, default=3, help="пар у группы в учебный день")
+        parser.add_argument("--years", type=float, default=1.0)
+        parser.add_argument("--start", type=date.fromisoformat, default=date(2025, 9, 1))
+        parser.add_argument("--overrides", type=int, default=300, help="исключений TeacherDayOverride")
+        parser.add_argument("--priorities", type=int, default=200, help="записей BuildingPriority")
+        parser.add_argument("--homework", type=float, default=0.05, help="доля занятий с ДЗ")
+        parser.add_argument("--plan-slack", type=float, default=0.1, help="запас часов плана сверх поставленных")
+        parser.add_argument("--flush", action="store_true", help="удалить имеющиеся справочники и занятия")
+
+    def handle(self, *args, **o):
+        if Lesson.objects.exists() or StudentGroup.objects.exists():
+            if not o["flush"]:
+                raise CommandError("База не пуста: --flush удалит справочники и занятия (пользователи и журналы останутся)")
+        if o["groups"] < 1 or o["teachers"] < 1 or o["rooms"] < 1 or o["buildings"] < 1:
+            raise CommandError("groups, teachers, rooms и buildings должны быть положительными")
+
+        t0 = time.perf_counter()
+        self.rnd = random.Random(o["seed"])
+        with transaction.atomic():
+            if o["flush"]:
+                for model in FLUSH_MODELS:
+                    model.objects.all().delete()
+            self.directory(o)
+            total = self.lessons(o)
+        week_cache.invalidate_all()  # bulk_create мимо сигналов
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово за {time.perf_counter() - t0:.1f} с: {len(self.groups)} групп, {len(self.teachers)} преподавателей, "
+            f"{len(self.rooms)} аудиторий, {len(self.disciplines)} дисциплин, {total} занятий"
+        ))
+
+    # ---------- справочники ----------
+    def directory(self, o):
+        rnd = self.rnd
+        self.slots = list(TimeSlot.objects.order_by("order"))
+        if not self.slots:
+            self.slots = TimeSlot.objects.bulk_create([
+                TimeSlot(order=i + 1, start_time=dtime(h1, m1), end_time=dtime(h2, m2))
+                for i, (h1, m1, h2, m2) in enumerate(BELL)
+            ])
+
+        lecture, practice, lab = LessonType.objects.bulk_create(
+            [LessonType(name="Лекция"), LessonType(name="Практика"), LessonType(name="Лабораторная")])
+        comp, gym = RoomType.objects.bulk_create([RoomType(name="компьютерный"), RoomType(name="спортзал")])
+
+        self.buildings = Building.objects.bulk_create(
+            [Building(name=f"Корпус {i + 1}") for i in range(o["buildings"])])
+        rooms = []
+        for i in range(o["rooms"]):
+            b = self.buildings[i % len(self.buildings)]
+            kind = rnd.random()
+            rtype = comp if kind < 0.15 else gym if kind < 0.2 else None
+            rooms.append(Room(
+                building=b, name=f"{100 * (1 + i // (len(self.buildings) * 30)) + i // len(self.buildings) % 30 + 1}",
+                capacity=rnd.choice([25, 30, 30, 35, 60, 90]) if rtype is not gym else 200,
+                computers=30 if rtype is comp else 0, room_type=rtype,
+            ))
+        self.rooms = Room.objects.bulk_create(rooms)
+
+        discs = []
+        for i in range(o["disciplines"]):
+            base = SUBJECTS[i % len(SUBJECTS)]
+            title = base if i < len(SUBJECTS) else f"{base} {i // len(SUBJECTS) + 1}"
+            sport = base == "Физическая культура"
+            computer = base in ("Информатика", "Программирование", "Базы данных", "Сети")
+            discs.append(Discipline(
+                title=title,
+                delivery_mode="in_person" if sport or computer else rnd.choice(["in_person"] * 6 + ["mixed", "remote"]),
+                default_lesson_type=rnd.choice([lecture, practice, lab]),
+                required_room_type=gym if sport else comp if computer else None,
+                requires_computers=computer,
+            ))
+        self.disciplines = Discipline.objects.bulk_create(discs)
+
+        names = set()
+        teachers = []
+        while len(teachers) < o["teachers"]:
+            name = f"{rnd.choice(SURNAMES)} {rnd.choice(INITIALS)}.{rnd.choice(INITIALS)}."
+            if name in names:
+                name = f"{name} ({len(teachers)})"
+            names.add(name)
+            teachers.append(Teacher(full_name=name))
+        self.teachers = Teacher.objects.bulk_create(teachers)
+        self.days_off = {t.id: ({5} if rnd.random() < 0.2 else set()) for t in self.teachers}
+        TeacherWorkload.objects.bulk_create([
+            TeacherWorkload(teacher=t, weekly_hours_limit=rnd.choice([18, 24, 30, 36]),
+                            days_off=",".join(str(d) for d in sorted(self.days_off[t.id] | {6})))
+            for t in self.teachers
+        ])
+
+        groups = []
+        for i in range(o["groups"]):
+            spec = SPECIALTIES[i % len(SPECIALTIES)]
+            course = 1 + (i // len(SPECIALTIES)) % 4
+            groups.append(StudentGroup(
+                code=f"{spec}-{course}{i // (len(SPECIALTIES) * 4) + 1}-{(o['start'].year - course + 1) % 100:02d}",
+                size=rnd.randint(15, 30), department=self.buildings[i % len(self.buildings)].name,
+            ))
+        self.groups = StudentGroup.objects.bulk_create(groups)
+
+        # преподаватели по дисциплинам: у каждой дисциплины свой круг, у каждой пары группа×дисциплина — один
+        per_disc = max(2, 3 * len(self.teachers) // max(1, len(self.disciplines)))
+        circle = {d.id: rnd.sample(self.teachers, min(per_disc, len(self.teachers))) for d in self.disciplines}
+        self.plan = {}  # group_id -> [(discipline, teacher)]
+        assignments = []
+        for g in self.groups:
+            chosen = rnd.sample(self.disciplines, min(o["plans_per_group"], len(self.disciplines)))
+            self.plan[g.id] = [(d, rnd.choice(circle[d.id])) for d in chosen]
+            assignments += [TeachingAssignment(group=g, discipline=d, teacher=t) for d, t in self.plan[g.id]]
+        TeachingAssignment.objects.bulk_create(assignments, batch_size=2000)
+
+        prefs = set()
+        for _ in range(o["priorities"]):
+            g = rnd.choice(self.groups)
+            d, _t = rnd.choice(self.plan[g.id])
+            prefs.add((g.id, d.id, rnd.choice(self.buildings).id))
+        BuildingPriority.objects.bulk_create([
+            BuildingPriority(group_id=g, discipline_id=d, building_id=b, priority=rnd.randint(0, 2))
+            for g, d, b in sorted(prefs)
+        ])
+
+        end = o["start"] + timedelta(days=int(o["years"] * 365.25) - 1)
+        self.end = end
+        holidays = {date(y, m, d) for y in range(o["start"].year, end.year + 1) for m, d in HOLIDAYS}
+        self.holidays = {h for h in holidays if o["start"] <= h <= end}
+        Holiday.objects.bulk_create([Holiday(date=h, title="Праздник") for h in sorted(self.holidays)])
+
+        overrides = {}
+        span = (end - o["start"]).days + 1
+        for _ in range(o["overrides"]):
+            t = rnd.choice(self.teachers)
+            day = o["start"] + timedelta(days=rnd.randrange(span))
+            off = rnd.random() < 0.5
+            overrides[(t.id, day)] = TeacherDayOverride(
+                teacher=t, date=day, is_off=off,
+                start=None if off else dtime(12, 0), end=None if off else dtime(18, 30),
+            )
+        TeacherDayOverride.objects.bulk_create(overrides.values(), batch_size=2000)
+
+    # ---------- занятия ----------
+    def week_template(self, lessons_per_day):
+        """[(weekday, slot, group, discipline, teacher, room|None, is_remote)] без накладок."""
+        rnd = self.rnd
+        n_slots = len(self.slots)
+        per_day = min(lessons_per_day, n_slots)
+        # у каждой группы в день — подряд идущие пары с разного начала
+        wants = {}
+        for g in self.groups:
+            for wd in range(6):
+                first = rnd.randint(0, n_slots - per_day)
+                for k in range(first, first + per_day):
+                    wants.setdefault((wd, k), []).append(g)
+
+        rooms_by_type = {}
+        for r in self.rooms:
+            rooms_by_type.setdefault(r.room_type_id, []).append(r)
+        out = []
+        for (wd, k), groups in sorted(wants.items(), key=lambda kv: kv[0]):
+            rnd.shuffle(groups)
+            busy_t, busy_r = set(), set()
+            for g in groups:
+                options = self.plan[g.id][:]
+                rnd.shuffle(options)
+                for disc, teacher in options:
+                    if teacher.id in busy_t or wd in self.days_off[teacher.id]:
+                        continue
+                    remote = disc.delivery_mode == "remote" or (disc.delivery_mode == "mixed" and rnd.random() < 0.5)
+                    room = None
+                    if not remote:
+                        pool = rooms_by_type.get(disc.required_room_type_id) or []
+                        start = rnd.randrange(len(pool)) if pool else 0
+                        room = next((r for r in pool[start:] + pool[:start]
+                                     if r.id not in busy_r and (r.capacity >= g.size or r.room_type_id)), None)
+                        if room is None:
+                            continue
+                        busy_r.add(room.id)
+                    busy_t.add(teacher.id)
+                    out.append((wd, self.slots[k], g, disc, teacher, room, remote))
+                    break
+        return out
+
+    def lessons(self, o) -> int:
+        rnd = self.rnd
+        templates = [self.week_template(o["lessons_per_day"]) for _ in range(2)]
+        academic = getattr(settings, "ACADEMIC_MINUTES", 45)
+        placed = Counter()
+        monday = o["start"] - timedelta(days=o["start"].weekday())
+        total, week_no = 0, 0
+        batch = []
+        while monday <= self.end:
+            for wd, slot, g, disc, teacher, room, remote in templates[week_no % 2]:
+                day = monday + timedelta(days=wd)
+                if day < o["start"] or day > self.end or day in self.holidays:
+                    continue
+                batch.append(Lesson(
+                    date=day, timeslot=slot, group=g, discipline=disc, teacher=teacher,
+                    lesson_type_id=disc.default_lesson_type_id, room=room, is_remote=remote,
+                    remote_platform="СДО" if remote else "",
+                ))
+                minutes = (slot.end_time.hour * 60 + slot.end_time.minute) - (slot.start_time.hour * 60 + slot.start_time.minute)
+                placed[(g.id, disc.id)] += minutes / academic
+            if len(batch) >= 20_000:
+                total += self._flush(batch, o["homework"])
+                batch = []
+            monday += timedelta(weeks=1)
+            week_no += 1
+        if batch:
+            total += self._flush(batch, o["homework"])
+
+        plans = []
+        for g in self.groups:
+            for disc, _t in self.plan[g.id]:
+                got = round(placed[(g.id, disc.id)])
+                plans.append(GroupDisciplinePlan(
+                    group=g, discipline=disc, hours_assigned=min(got, 32767),
+                    hours_total=min(round(got * (1 + o["plan_slack"])) or rnd.choice([36, 72]), 32767),
+                ))
+        GroupDisciplinePlan.objects.bulk_create(plans, batch_size=2000)
+        return total
+
+    def _flush(self, batch, homework_share) -> int:
+        created = Lesson.objects.bulk_create(batch, batch_size=2000)
+        if homework_share > 0:
+            HomeworkItem.objects.bulk_create([
+                HomeworkItem(lesson=l, text=f"Задание к занятию {l.date:%d.%m}: параграф {self.rnd.randint(1, 40)}")
+                for l in created if self.rnd.random() < homework_share
+            ], batch_size=2000)
+        return len(created)
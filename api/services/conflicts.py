@@ -0,0 +1,289 @@
+# api/services/conflicts.py
+"""
+Правила конфликтов занятий и пакетная проверка перед записью.
+
+is_legal_stream_teacher / is_legal_stream_room — правила «легального потока»,
+их же использует отчёт ranepa_conflicts. validate_lessons() применяет их к пачке
+кандидатов: занятость всех затронутых ячеек (date, slot) читается одним запросом,
+дальше — группировка в памяти (Cells). Число запросов не зависит от размера пачки.
+Так проверяет свою пачку генератор перед записью (generator.apply_proposals),
+а пакетный импорт (ranepa_import) — строки по одной теми же Cells.
+
+find_item_conflicts() — накладки во внешнем расписании (до импорта), без БД.
+"""
+from collections import defaultdict
+
+from directory.models import LessonType
+from scheduleapp.models import Lesson
+from .ranepa import norm
+
+TEACHER_BUSY = "Преподаватель уже занят в этот слот"
+ROOM_BUSY = "Аудитория занята"
+GROUP_BUSY = "Группа уже занята в этот слот"
+
+_ROW_FIELDS = (
+    "id", "date", "timeslot_id", "group_id", "teacher_id", "room_id", "discipline_id",
+    "lesson_type_id", "lesson_type__name", "is_remote", "remote_platform", "is_stream",
+)
+
+
+# === helpers for "legal stream" buckets (teacher/room) ===
+def stream_flag(row: dict) -> bool:
+    """True, если отмечено is_stream или тип пары содержит 'поток' (регистронезависимо)."""
+    lt = (row.get("lesson_type__name") or "").lower()
+    return bool(row.get("is_stream")) or ("поток" in lt)
+
+def _same(vals) -> bool:
+    it = iter(vals)
+    try:
+        first = next(it)
+    except StopIteration:
+        return True
+    return all(v == first for v in it)
+
+def is_legal_stream_teacher(lessons: list[dict]) -> bool:
+    """
+    Набор занятий для одного преподавателя в один слот считаем 'легальным потоком',
+    если:
+      - все помечены как поток (stream_flag=True)
+      - одинаковые discipline, lesson_type, is_remote, remote_platform
+      - если очно, то у всех одинаковая аудитория (чтобы не получить «один препод в двух аудиториях»)
+    """
+    if not lessons or not all(stream_flag(l) for l in lessons):
+        return False
+
+    if not _same(l.get("discipline_id") for l in lessons):
+        return False
+
+    # Тип пары: по id, а если пусто — по названию
+    lt_ids   = [l.get("lesson_type_id") for l in lessons]
+    lt_names = [(l.get("lesson_type__name") or "").strip().lower() for l in lessons]
+    if not _same(lt_ids):
+        # допускаем None, если все названия совпадают
+        if not (_same(lt_names) and all(bool(n) for n in lt_names)):
+            return False
+
+    if not _same(l.get("is_remote") for l in lessons):
+        return False
+
+    if not lessons[0]["is_remote"]:
+        # оффлайн-поток — одна аудитория
+        if not _same(l.get("room_id") for l in lessons):
+            return False
+    else:
+        # онлайн — одна и та же платформа/ссылка (или все пусто)
+        if not _same((l.get("remote_platform") or "").strip().lower() for l in lessons):
+            return False
+
+    return True
+
+def is_legal_stream_room(lessons: list[dict]) -> bool:
+    """
+    Набор занятий в одной аудитории в один слот считаем 'легальным потоком',
+    если:
+      - все помечены как поток (stream_flag=True)
+      - один и тот же преподаватель
+      - одинаковые discipline, lesson_type
+    """
+    if not lessons or not all(stream_flag(l) for l in lessons):
+        return False
+    if not _same(l.get("teacher_id") for l in lessons):
+        return False
+    if not _same(l.get("discipline_id") for l in lessons):
+        return False
+
+    lt_ids   = [l.get("lesson_type_id") for l in lessons]
+    lt_names = [(l.get("lesson_type__name") or "").strip().lower() for l in lessons]
+    if not _same(lt_ids):
+        if not (_same(lt_names) and all(bool(n) for n in lt_names)):
+            return False
+
+    return True
+
+
+def lesson_row(lesson: Lesson, lt_names: dict | None = None) -> dict:
+    """Занятие (модель) в виде строки _ROW_FIELDS — как их видят правила потока."""
+    return {
+        "id": lesson.pk,
+        "date": lesson.date,
+        "timeslot_id": lesson.timeslot_id,
+        "group_id": lesson.group_id,
+        "teacher_id": lesson.teacher_id,
+        "room_id": lesson.room_id,
+        "discipline_id": lesson.discipline_id,
+        "lesson_type_id": lesson.lesson_type_id,
+        "lesson_type__name": (lt_names or {}).get(lesson.lesson_type_id, ""),
+        "is_remote": lesson.is_remote,
+        "remote_platform": lesson.remote_platform,
+        "is_stream": lesson.is_stream,
+    }
+
+
+class Cells:
+    """
+    Занятость ячеек (date, slot): преподаватель / аудитория / группа -> {ссылка: строка занятия}.
+
+    Единственное место правил занятости ячейки: ими проверяет пачку validate_lessons
+    и построчно — пакетный импорт (ranepa_import), где ячейки меняются по ходу
+    (put/drop), а ссылка — pk занятия или метка ещё не записанной строки.
+    """
+
+    def __init__(self):
+        self.teacher = defaultdict(dict)
+        self.room = defaultdict(dict)
+        self.group = defaultdict(dict)
+        self._where = {}
+
+    @staticmethod
+    def _keys(row):
+        cell = (row["date"], row["timeslot_id"])
+        return ((cell, row.get("teacher_id"), "teacher"), (cell, row.get("room_id"), "room"),
+                (cell, row.get("group_id"), "group"))
+
+    def put(self, ref, row: dict):
+        self.drop(ref)
+        self._where[ref] = row
+        for cell, ident, kind in self._keys(row):
+            if ident:
+                getattr(self, kind)[(*cell, ident)][ref] = row
+
+    def drop(self, ref):
+        row = self._where.pop(ref, None)
+        if row:
+            for cell, ident, kind in self._keys(row):
+                if ident:
+                    getattr(self, kind)[(*cell, ident)].pop(ref, None)
+
+    def errors(self, row: dict, ref=None) -> dict:
+        """
+        {field: [сообщение]} для занятия row в его ячейке; занятия с той же ссылкой
+        (оно само, прежняя версия) не считаются. Преподаватель и аудитория могут
+        делиться только легальным потоком, группа — ни с кем.
+        """
+        errors = {}
+        for cell, ident, kind in self._keys(row):
+            if not ident:
+                continue
+            others = [r for k, r in getattr(self, kind).get((*cell, ident), {}).items() if k != ref]
+            if not others:
+                continue
+            if kind == "teacher" and not is_legal_stream_teacher(others + [row]):
+                errors["teacher"] = [TEACHER_BUSY]
+            elif kind == "room" and not is_legal_stream_room(others + [row]):
+                errors["room"] = [ROOM_BUSY]
+            elif kind == "group":
+                errors["group"] = [GROUP_BUSY]
+        return errors
+
+
+def validate_lessons(lessons, *, replace=True) -> list[dict]:
+    """
+    Пакетная проверка конфликтов для списка Lesson (сохранённых или новых).
+
+    Кандидат замещает свою же запись по pk, а при replace=True — и занятие той же группы
+    в той же ячейке (date, timeslot), как update существующей пары при импорте; при
+    replace=False такое занятие — занятость группы (GROUP_BUSY), как для новых записей генератора.
+    Остальные занятия ячейки и все кандидаты пачки составляют занятость (Cells).
+    Для каждого кандидата возвращает {field: [сообщения]} (как ValidationError.message_dict);
+    пустой dict — конфликтов нет. Запросов: два (типы занятий + занятость ячеек).
+    """
+    lessons = list(lessons)
+    if not lessons:
+        return []
+
+    lt_names = dict(LessonType.objects.values_list("id", "name"))
+    cand = [lesson_row(l, lt_names) for l in lessons]
+
+    cells = {(r["date"], r["timeslot_id"]) for r in cand}
+    replaced_pks = {r["id"] for r in cand if r["id"]}
+    replaced_groups = {(r["date"], r["timeslot_id"], r["group_id"]) for r in cand} if replace else set()
+    dates = [d for d, _ in cells]
+    existing = (
+        Lesson.objects.filter(date__range=(min(dates), max(dates)),
+                              timeslot_id__in={s for _, s in cells})
+        .values(*_ROW_FIELDS)
+    )
+
+    busy = Cells()
+    for r in existing:
+        cell = (r["date"], r["timeslot_id"])
+        if cell not in cells or r["id"] in replaced_pks or (*cell, r["group_id"]) in replaced_groups:
+            continue
+        busy.put(r["id"], r)
+    for i, r in enumerate(cand):
+        busy.put(("candidate", i), r)
+    return [busy.errors(r, ("candidate", i)) for i, r in enumerate(cand)]
+
+
+# === накладки во внешнем расписании (элементы fetch_week_from_ranepa) ===
+_ITEM_REASONS = (
+    ("group", "Одинаковая группа в одно время"),
+    ("teacher", "Преподаватель занят в другое занятие"),
+    ("room", "Одна и та же аудитория"),
+)
+
+
+def _item_keys(it: dict) -> dict:
+    """Нормализованные ключи элемента — один раз на элемент, а не на каждую пару."""
+    keys = {
+        "group": norm(it.get("group")).lower(),
+        "teacher": norm(it.get("teacher")).lower(),
+        "room": "" if it.get("is_remote") else (it.get("room") or "").strip(),
+    }
+    return {k: v for k, v in keys.items() if v}
+
+
+def _sweep_pairs(idx: list[int], items: list[dict]):
+    """Пары пересекающихся интервалов [start, end) — заметающая прямая по началу."""
+    active = []  # (end, i)
+    for i in sorted(idx, key=lambda k: (items[k]["start"], k)):
+        start = items[i]["start"]
+        active = [(e, j) for e, j in active if e > start]
+        for _, j in active:
+            yield (j, i) if j < i else (i, j)
+        active.append((items[i]["end"], i))
+
+
+def find_item_conflicts(items: list[dict]) -> list[dict]:
+    """
+    Накладки групп/преподавателей/аудиторий среди items одного или нескольких дней.
+
+    Элементы раскладываются по (date, нормализованный ключ); внутри корзины
+    с известным временем (start/end «HH:MM») пересечения ищутся заметающей прямой,
+    без времени — совпадением номера пары (order). Стоимость — O(n log n) плюс число
+    найденных пар, вместо сравнения всех пар дня.
+    Формат результата прежний: [{"date", "a", "b", "reasons"}] в порядке (день, a, b).
+    """
+    buckets = defaultdict(list)
+    for i, it in enumerate(items):
+        for kind, key in _item_keys(it).items():
+            buckets[(it["date"], kind, key)].append(i)
+
+    found = defaultdict(set)  # (i, j) -> {kind}
+    for (_, kind, _), idx in buckets.items():
+        if len(idx) < 2:
+            continue
+        timed = [i for i in idx if items[i].get("start") and items[i].get("end")]
+        for pair in _sweep_pairs(timed, items):
+            found[pair].add(kind)
+        by_order = defaultdict(list)
+        for i in idx:
+            if not (items[i].get("start") and items[i].get("end")):
+                by_order[items[i].get("order")].append(i)
+        for same in by_order.values():
+            for a in range(len(same)):
+                for b in range(a + 1, len(same)):
+                    found[(same[a], same[b])].add(kind)
+
+    day_rank = {}
+    for it in items:
+        day_rank.setdefault(it["date"], len(day_rank))
+    out = []
+    for i, j in sorted(found, key=lambda p: (day_rank[items[p[0]]["date"]], p)):
+        kinds = found[(i, j)]
+        out.append({
+            "date": items[i]["date"],
+            "a": items[i], "b": items[j],
+            "reasons": [text for kind, text in _ITEM_REASONS if kind in kinds],
+        })
+    return out
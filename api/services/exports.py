@@ -0,0 +1,309 @@
+# api/services/exports.py
+"""
+Потоковая выгрузка расписания.
+
+csv_chunks(qs) — CSV для export_csv: строки читаются .values_list().iterator(),
+пишутся пачками и сразу отдаются как bytes, так что в памяти держится одна
+пачка, а не весь файл (годовая выгрузка всего колледжа — сотни тысяч строк).
+Формат прежний: UTF-8 с BOM (чтобы Excel открыл по-русски), разделитель «;».
+
+ics_chunks(qs, ...) — то же для iCalendar (export_ics и лента export_ics_feed):
+события пишутся по мере чтения, строки сворачиваются по 75 октетов (RFC 5545).
+cache_tee() — отдаёт куски дальше и, если поток дошёл до конца, кладёт тело в кэш.
+
+write_npz / write_parquet — колоночная выгрузка для аналитики (period_all?format=):
+строки-справочники (группа, преподаватель, аудитория…) кодируются словарём,
+дата и пара — целые колонки; .npz пишется без numpy, parquet — через pyarrow.
+"""
+import codecs
+import csv
+import struct
+import sys
+import zipfile
+from array import array
+from datetime import date
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+
+CSV_HEADER = ["id", "date", "slot", "time", "group", "discipline", "lesson_type", "teacher",
+              "room", "building", "is_remote", "remote_platform"]
+
+CSV_FIELDS = (
+    "id", "date", "timeslot__order", "timeslot__start_time", "timeslot__end_time",
+    "group__code", "discipline__title", "lesson_type__name", "teacher__full_name",
+    "room__name", "room__building__name", "is_remote", "remote_platform",
+)
+
+CHUNK_ROWS = 2000
+
+
+def csv_chunks(qs, chunk_rows=CHUNK_ROWS):
+    """Генератор bytes-кусков CSV по queryset занятий (порядок задаёт вызывающий)."""
+    buf = StringIO()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(CSV_HEADER)
+    yield codecs.BOM_UTF8 + _drain(buf)
+
+    n = 0
+    for (pk, day, order, start, end, group, discipline, lesson_type, teacher,
+         room, building, is_remote, platform) in qs.values_list(*CSV_FIELDS).iterator(chunk_size=chunk_rows):
+        w.writerow([
+            pk,
+            day.isoformat(),
+            order,
+            f"{start.strftime('%H:%M')}–{end.strftime('%H:%M')}",
+            group or "",
+            discipline,
+            lesson_type or "",
+            teacher,
+            room or "",
+            building or "",
+            "1" if is_remote else "0",
+            platform or "",
+        ])
+        n += 1
+        if n % chunk_rows == 0:
+            yield _drain(buf)
+    if buf.tell():
+        yield _drain(buf)
+
+
+def _drain(buf) -> bytes:
+    data = buf.getvalue().encode("utf-8")
+    buf.seek(0)
+    buf.truncate()
+    return data
+
+
+# ---------- ICS ----------
+ICS_FIELDS = (
+    "id", "date", "timeslot__start_time", "timeslot__end_time", "group__code",
+    "discipline__title", "lesson_type__name", "teacher__full_name", "room__name",
+    "room__building__name", "is_remote", "remote_platform", "homework__text",
+)
+
+ICS_LINE_OCTETS = 75
+
+FEED_REFRESH = "PT15M"  # подсказка календарям, как часто опрашивать подписку
+
+
+def ics_escape(text) -> str:
+    """TEXT по RFC 5545: обратный слэш, «;», «,» и переводы строк."""
+    return (str(text).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def ics_fold(line: str) -> bytes:
+    """Строка контента + CRLF; длиннее 75 октетов — перенос с пробелом, не разрывая UTF-8 символ."""
+    data = line.encode("utf-8")
+    if len(data) <= ICS_LINE_OCTETS:
+        return data + b"\r\n"
+    parts = []
+    limit = ICS_LINE_OCTETS
+    while len(data) > limit:
+        cut = limit
+        while data[cut] & 0xC0 == 0x80:  # байт-продолжение UTF-8
+            cut -= 1
+        parts.append(data[:cut])
+        data = data[cut:]
+        limit = ICS_LINE_OCTETS - 1  # ведущий пробел переноса тоже считается
+    parts.append(data)
+    return b"\r\n ".join(parts) + b"\r\n"
+
+
+def _dt(d, t) -> str:  # без TZ, «плавающее» локальное время
+    return f"{d.year:04d}{d.month:02d}{d.day:02d}T{t.hour:02d}{t.minute:02d}00"
+
+
+def _vevent(row, dtstamp) -> list:
+    (pk, day, start, end, group, discipline, lesson_type, teacher, room, building,
+     is_remote, platform, homework) = row
+    summary = f"{discipline} — {group or ''}"
+    if lesson_type:
+        summary += f" ({lesson_type})"
+    location = "Дистанционно" if is_remote else f"{building or ''} {room or ''}"
+    desc = [f"Преподаватель: {teacher}", f"Формат: {'дистанционный' if is_remote else 'очный'}"]
+    if is_remote and platform:
+        desc.append(f"Платформа: {platform}")
+    if homework:
+        desc.append(f"ДЗ: {homework}")
+    return [
+        "BEGIN:VEVENT",
+        f"UID:lesson-{pk}@college",
+        f"DTSTAMP:{dtstamp}",
+        f"DTSTART:{_dt(day, start)}",
+        f"DTEND:{_dt(day, end)}",
+        f"SUMMARY:{ics_escape(summary)}",
+        f"LOCATION:{ics_escape(location)}",
+        "DESCRIPTION:" + "\\n".join(ics_escape(x) for x in desc),
+        "END:VEVENT",
+    ]
+
+
+def ics_chunks(qs, calname, *, dtstamp, feed=False, chunk_rows=CHUNK_ROWS):
+    """
+    Генератор bytes-кусков календаря по queryset занятий (порядок задаёт вызывающий).
+    ДЗ приходит тем же запросом (homework__text), без запроса на каждое событие.
+    dtstamp — UTC-время вида YYYYMMDDTHHMMSSZ (для ленты — момент версии расписания,
+    чтобы тело не менялось между опросами). feed=True — заголовки подписки.
+    """
+    head = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//College Schedule//RU", "CALSCALE:GREGORIAN"]
+    if feed:
+        head += ["METHOD:PUBLISH", f"REFRESH-INTERVAL;VALUE=DURATION:{FEED_REFRESH}", f"X-PUBLISHED-TTL:{FEED_REFRESH}"]
+    head.append(f"X-WR-CALNAME:{ics_escape(calname)}")
+    yield b"".join(ics_fold(x) for x in head)
+
+    out = []
+    for n, row in enumerate(qs.values_list(*ICS_FIELDS).iterator(chunk_size=chunk_rows), 1):
+        out += [ics_fold(x) for x in _vevent(row, dtstamp)]
+        if n % chunk_rows == 0:
+            yield b"".join(out)
+            out = []
+    out.append(ics_fold("END:VCALENDAR"))
+    yield b"".join(out)
+
+
+FEED_CACHE_MAX_BYTES = 5 * 2**20
+
+
+def cache_tee(key, chunks, max_bytes=FEED_CACHE_MAX_BYTES):
+    """Пропускает куски насквозь; дочитанное до конца тело не больше max_bytes кладёт в кэш по key."""
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= max_bytes:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        cache.set(key, b"".join(parts), getattr(settings, "SCHEDULE_CACHE_TIMEOUT", 60 * 60 * 24))
+
+
+# ---------- колоночная выгрузка (аналитика) ----------
+COLUMNAR_FIELDS = (
+    "id", "date", "timeslot__order", "group__code", "discipline__title", "teacher__full_name",
+    "lesson_type__name", "room__name", "room__building__name", "is_remote", "remote_platform",
+)
+# колонки-справочники: коды int32 (-1 — пусто) + словарь строк
+DICT_COLUMNS = ("group", "discipline", "teacher", "lesson_type", "room", "building", "remote_platform")
+
+EPOCH = date(1970, 1, 1)
+
+
+class _Dict:
+    """Словарное кодирование: строка -> номер по первому появлению."""
+    def __init__(self):
+        self.index = {}
+        self.codes = array("i")
+
+    def add(self, value):
+        if value is None or value == "":
+            self.codes.append(-1)
+            return
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.index)
+        self.codes.append(code)
+
+    def values(self) -> list:
+        return list(self.index)
+
+
+def columnar_columns(qs, chunk_rows=CHUNK_ROWS):
+    """
+    Читает занятия пачками через .values_list().iterator() в компактные array.array:
+    id (int64), date (дни от 1970-01-01), slot (номер пары), is_remote — числа,
+    DICT_COLUMNS — коды + словари. Возвращает (числовые колонки, справочники).
+    """
+    ids, days, slots, remote = array("q"), array("q"), array("h"), array("b")
+    dicts = {name: _Dict() for name in DICT_COLUMNS}
+    add_group, add_disc, add_teacher, add_type, add_room, add_building, add_platform = (
+        dicts[name].add for name in DICT_COLUMNS
+    )
+    for (pk, day, order, group, discipline, teacher, lesson_type, room, building,
+         is_remote, platform) in qs.values_list(*COLUMNAR_FIELDS).iterator(chunk_size=chunk_rows):
+        ids.append(pk)
+        days.append((day - EPOCH).days)
+        slots.append(order)
+        remote.append(1 if is_remote else 0)
+        add_group(group); add_disc(discipline); add_teacher(teacher); add_type(lesson_type)
+        add_room(room); add_building(building); add_platform(platform)
+    return {"id": ids, "date": days, "slot": slots, "is_remote": remote}, dicts
+
+
+def _npy(descr: str, n: int, data: bytes) -> bytes:
+    """Файл .npy версии 1.0 без numpy: заголовок-словарь, выровненный до 64 байт, и сырые данные."""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({n},), }}"
+    pad = 64 - (10 + len(header) + 1) % 64
+    header = (header + " " * pad + "\n").encode("latin1")
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header + data
+
+
+def _le(arr) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _npy_strings(values: list) -> bytes:
+    width = max((len(v) for v in values), default=1) or 1
+    data = b"".join(v.ljust(width, "\0").encode("utf-32-le") for v in values)
+    return _npy(f"<U{width}", len(values), data)
+
+
+NUMERIC_DESCR = {"id": "<i8", "date": "<M8[D]", "slot": "<i2", "is_remote": "|b1"}
+
+
+def write_npz(qs, fileobj):
+    """
+    Пишет .npz (zip из .npy, как numpy.savez_compressed) — numpy для записи не нужен.
+    Чтение: d = numpy.load(f); pandas.Categorical.from_codes(d["group"], d["group_values"]).
+    """
+    numeric, dicts = columnar_columns(qs)
+    n = len(numeric["id"])
+    with zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, arr in numeric.items():
+            zf.writestr(f"{name}.npy", _npy(NUMERIC_DESCR[name], n, _le(arr)))
+        for name, d in dicts.items():
+            zf.writestr(f"{name}.npy", _npy("<i4", n, _le(d.codes)))
+            zf.writestr(f"{name}_values.npy", _npy_strings(d.values()))
+
+
+def write_parquet(qs, fileobj, chunk_rows=50_000):
+    """
+    Parquet через pyarrow (необязательная зависимость: ImportError, если её нет).
+    Пишется по row group на пачку строк; справочные колонки — dictionary<int32, string>.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [("id", pa.int64()), ("date", pa.date32()), ("slot", pa.int16())]
+        + [(name, pa.dictionary(pa.int32(), pa.string())) for name in DICT_COLUMNS]
+        + [("is_remote", pa.bool_())]
+    )
+    cols = ("id", "date", "slot", "group", "discipline", "teacher", "lesson_type",
+            "room", "building", "is_remote", "remote_platform")
+
+    def batch(rows):
+        data = dict(zip(cols, zip(*rows)))
+        arrays = [pa.array(data["id"], pa.int64()), pa.array(data["date"], pa.date32()),
+                  pa.array(data["slot"], pa.int16())]
+        arrays += [pa.array([v or None for v in data[name]], pa.string()).dictionary_encode() for name in DICT_COLUMNS]
+        arrays.append(pa.array(data["is_remote"], pa.bool_()))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    with pq.ParquetWriter(fileobj, schema, compression="zstd") as writer:
+        rows = []
+        for row in qs.values_list(*COLUMNAR_FIELDS).iterator(chunk_size=CHUNK_ROWS):
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                writer.write_table(batch(rows))
+                rows = []
+        if rows:
+            writer.write_table(batch(rows))
@@ -0,0 +1,84 @@
+# api/services/generation_jobs.py
+"""
+Фоновое выполнение GenerationJob в локальном пуле потоков.
+
+Ручка только создаёт запись и ставит её в очередь; воркер после каждого дня
+пишет прогресс в строку задачи и проверяет флаг cancel_requested.
+Задачи, прерванные перезапуском процесса, остаются в статусе running —
+их видно в админке, повторно они не запускаются.
+"""
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from scheduleapp.models import GenerationJob
+from .generator import run_generation
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "GENERATION_JOB_WORKERS", 1),
+    thread_name_prefix="generation",
+)
+
+
+def submit(job: GenerationJob):
+    _executor.submit(_run_job, job.pk)
+
+
+def _run_job(job_id: int):
+    close_old_connections()
+    try:
+        jobs = GenerationJob.objects.filter(pk=job_id)
+        job = jobs.get()
+        if job.cancel_requested:
+            jobs.update(status="cancelled", finished_at=timezone.now())
+            return
+        jobs.update(status="running", started_at=timezone.now())
+
+        def on_progress(done, total, stats, n_conflicts):
+            jobs.update(days_done=done, days_total=total, placed=stats["placed"],
+                        skipped=stats["skipped"], conflicts=n_conflicts)
+
+        def should_stop():
+            return jobs.filter(cancel_requested=True).exists()
+
+        try:
+            result = run_generation(job.params, on_progress=on_progress, should_stop=should_stop)
+        except Exception:
+            jobs.update(status="failed", error=traceback.format_exc(), finished_at=timezone.now())
+            return
+
+        stats = result.get("stats", {})
+        jobs.update(
+            status=("cancelled" if result.get("cancelled") else "done"),
+            result=result,
+            placed=stats.get("placed", 0),
+            skipped=stats.get("skipped", 0),
+            conflicts=len(result.get("conflicts", [])),
+            finished_at=timezone.now(),
+        )
+    finally:
+        close_old_connections()
+
+
+def job_progress(job: GenerationJob, with_result=False) -> dict:
+    data = {
+        "id": job.id,
+        "status": job.status,
+        "params": job.params,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "days_total": job.days_total,
+        "days_done": job.days_done,
+        "placed": job.placed,
+        "skipped": job.skipped,
+        "conflicts": job.conflicts,
+        "cancel_requested": job.cancel_requested,
+        "error": job.error or None,
+    }
+    if with_result and job.status in ("done", "cancelled"):
+        data["result"] = job.result
+    return data
@@ -0,0 +1,531 @@
+# api/services/generator.py
+"""
+Движок генерации расписания: жадный проход day × slot × group с мягким бэктрекингом.
+
+Всё, что раньше пересчитывалось на каждой итерации внутри admin_generate_schedule,
+строится один раз при создании движка:
+  - битсеты подходящих аудиторий по классу (room_type, компьютеры, размер группы);
+  - порядок перебора аудиторий для пары (группа, дисциплина) с учётом BuildingPriority;
+  - очереди планов по группам (дисциплины со спец. аудиторией/ПК — первыми).
+Занятость хранится в scheduleapp.occupancy.Occupancy (битсеты по ячейке дата × слот),
+поэтому «есть ли свободная подходящая аудитория» — одна операция AND.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from directory.models import (
+    StudentGroup, Discipline, Room, TeachingAssignment, Holiday,
+    GroupDisciplinePlan, TeacherWorkload, TeacherDayOverride, BuildingPriority,
+)
+from scheduleapp.models import Lesson, TimeSlot
+from scheduleapp.occupancy import Occupancy
+from . import week_cache
+from .conflicts import validate_lessons
+
+
+def slot_minutes(ts: TimeSlot) -> int:
+    d0 = datetime.combine(datetime.min, ts.start_time)
+    d1 = datetime.combine(datetime.min, ts.end_time)
+    return int((d1 - d0).total_seconds() // 60)
+
+
+class GenerationContext:
+    """
+    Входные данные генератора — уже загруженные справочники, без обращений к БД.
+    existing: [(date, timeslot_id, group_id, teacher_id, room_id), ...] — занятия, уже стоящие в диапазоне.
+    """
+
+    def __init__(self, *, start_date, end_date, groups, slots, disciplines, plans, assignments,
+                 building_prefs, holidays, workloads, overrides, rooms, existing):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.groups = groups                  # [StudentGroup]
+        self.slots = slots                    # [TimeSlot] по order
+        self.disc_map = disciplines           # {discipline_id: Discipline}
+        self.plans = plans                    # {group_id: [GroupDisciplinePlan]}
+        self.assignments = assignments        # {group_id: {discipline_id: [Teacher]}}
+        self.building_prefs = building_prefs  # {(group_id, discipline_id): [BuildingPriority]}
+        self.holidays = holidays              # {date: Holiday}
+        self.workloads = workloads            # {teacher_id: TeacherWorkload}
+        self.overrides = overrides            # {(teacher_id, date): TeacherDayOverride}
+        self.rooms = rooms                    # [Room] по (capacity, computers, building__name, name)
+        self.existing = existing
+
+
+def load_context(start_date, end_date, groups) -> GenerationContext:
+    """Загружает всё нужное генератору фиксированным числом запросов (не зависит от числа групп)."""
+    group_ids = [g.id for g in groups]
+
+    plans = {g.id: [] for g in groups}
+    for p in GroupDisciplinePlan.objects.filter(group_id__in=group_ids).select_related("discipline").order_by("id"):
+        plans[p.group_id].append(p)
+
+    assignments = {g.id: {} for g in groups}
+    for a in TeachingAssignment.objects.filter(group_id__in=group_ids).select_related("teacher").order_by("id"):
+        assignments[a.group_id].setdefault(a.discipline_id, []).append(a.teacher)
+
+    building_prefs = {}
+    for pref in BuildingPriority.objects.all().select_related("group", "discipline", "building"):
+        building_prefs.setdefault((pref.group_id, pref.discipline_id), []).append(pref)
+
+    overrides = {}
+    for o in TeacherDayOverride.objects.all():
+        overrides.setdefault((o.teacher_id, o.date), o)
+
+    existing = list(
+        Lesson.objects.filter(date__range=(start_date, end_date))
+        .values_list("date", "timeslot_id", "group_id", "teacher_id", "room_id")
+    )
+
+    return GenerationContext(
+        start_date=start_date,
+        end_date=end_date,
+        groups=groups,
+        slots=list(TimeSlot.objects.all().order_by("order")),
+        disciplines={d.id: d for d in Discipline.objects.select_related("default_lesson_type", "required_room_type")},
+        plans=plans,
+        assignments=assignments,
+        building_prefs=building_prefs,
+        holidays={h.date: h for h in Holiday.objects.all()},
+        workloads={w.teacher_id: w for w in TeacherWorkload.objects.all()},
+        overrides=overrides,
+        rooms=list(Room.objects.select_related("building", "room_type")
+                   .order_by("capacity", "computers", "building__name", "name")),
+        existing=existing,
+    )
+
+
+def _lowest_bit(x: int) -> int:
+    return (x & -x).bit_length() - 1
+
+
+class GreedyEngine:
+    """
+    Жадный генератор. Логика выбора (преподаватель → аудитория → дистант для mixed,
+    сдвиг на следующий слот при backtrack) совпадает с прежней реализацией во вьюхе,
+    результат — те же proposals / conflicts / stats.
+    """
+
+    def __init__(self, ctx: GenerationContext, *, backtrack=True):
+        self.ctx = ctx
+        self.backtrack = backtrack
+        self.academic_min = getattr(settings, "ACADEMIC_MINUTES", 45)
+
+        self.proposals = []
+        self.conflicts = []
+        self.stats = {"placed": 0, "skipped": 0}
+
+        self._slot_min = {s.id: slot_minutes(s) for s in ctx.slots}
+        self._slot_time = {s.id: f"{s.start_time.strftime('%H:%M')}–{s.end_time.strftime('%H:%M')}" for s in ctx.slots}
+        # следующий слот (по order) для мягкого бэктрекинга
+        self._next_slot = {s.id: (ctx.slots[i + 1] if i + 1 < len(ctx.slots) else None)
+                           for i, s in enumerate(ctx.slots)}
+
+        # --- аудитории: бит i = i-я комната в «дефолтном» порядке предпочтения ---
+        self._rooms = sorted(ctx.rooms, key=lambda r: (r.capacity or 9999, r.computers or 9999, r.building.name, r.name))
+        self._room_bit = {r.id: i for i, r in enumerate(self._rooms)}  # совпадает с occ.room_bit
+        self._class_mask = {}   # (room_type_id, requires_computers, group_size) -> битсет подходящих
+        self._pref_order = {}   # (group_id, discipline_id) -> [биты в порядке BuildingPriority] | None
+
+        # --- преподаватели: выходные дни и недельные лимиты разобраны заранее ---
+        self._days_off = {}
+        self._limit_min = {}
+        for tid, w in ctx.workloads.items():
+            self._days_off[tid] = {int(x) for x in (w.days_off or "").split(",") if x.strip().isdigit()}
+            self._limit_min[tid] = w.weekly_hours_limit * 60 if w.weekly_hours_limit else None
+
+        # --- очереди планов: сортировка «сложные первыми» один раз, дальше только сдвиг указателя ---
+        def hard_first(p):
+            d = ctx.disc_map[p.discipline_id]
+            return 0 if (d.required_room_type_id or d.requires_computers) else 1
+        for glist in ctx.plans.values():
+            glist.sort(key=hard_first)
+        self._plan_pos = {gid: 0 for gid in ctx.plans}
+
+        # --- занятость: матрица день × слот с битсетами (биты аудиторий = порядок self._rooms) ---
+        self.occ = Occupancy(ctx.start_date, ctx.end_date, ctx.slots, self._rooms)
+        self.occ.load(ctx.existing)
+        self.weekly_minutes = {}    # (teacher_id, iso_year, iso_week) -> минуты
+        for day, slot_id, group_id, teacher_id, room_id in ctx.existing:
+            if teacher_id:
+                wk = (teacher_id, *day.isocalendar()[:2])
+                self.weekly_minutes[wk] = self.weekly_minutes.get(wk, 0) + self._slot_min.get(slot_id, 0)
+
+    # ---------- аудитории ----------
+    def _eligible_mask(self, group, disc) -> int:
+        gsize = group.size or 0
+        key = (disc.required_room_type_id, disc.requires_computers, gsize)
+        mask = self._class_mask.get(key)
+        if mask is None:
+            need_type, need_computers = key[0], key[1]
+            mask = 0
+            for i, r in enumerate(self._rooms):
+                if need_type and r.room_type_id != need_type:
+                    continue
+                if r.capacity and gsize and r.capacity < gsize:
+                    continue
+                if need_computers and (not r.computers or r.computers < gsize):
+                    continue
+                mask |= 1 << i
+            self._class_mask[key] = mask
+        return mask
+
+    def _room_order(self, group, disc, eligible: int):
+        key = (group.id, disc.id)
+        if key not in self._pref_order:
+            prefs = self.ctx.building_prefs.get(key)
+            order = None
+            if prefs:
+                order_map = {p.building_id: p.priority for p in prefs}
+                cand = [r for r in self.ctx.rooms if eligible >> self._room_bit[r.id] & 1]
+                cand.sort(key=lambda r: (order_map.get(r.building_id, 9999), r.capacity or 0, r.computers or 0))
+                order = [self._room_bit[r.id] for r in cand]
+            self._pref_order[key] = order
+        return self._pref_order[key]
+
+    def room_is_free(self, day, slot_id, room_id) -> bool:
+        return self.occ.room_free(day, slot_id, room_id)
+
+    def group_is_free(self, day, slot_id, group_id) -> bool:
+        return self.occ.group_free(day, slot_id, group_id)
+
+    def pick_room(self, group, disc, day, slot):
+        eligible = self._eligible_mask(group, disc)
+        free = self.occ.free_rooms_mask(day, slot.id, eligible)
+        if not free:
+            return None
+        order = self._room_order(group, disc, eligible)
+        if order is None:
+            return self._rooms[_lowest_bit(free)]
+        for i in order:
+            if free >> i & 1:
+                return self._rooms[i]
+        return None
+
+    # ---------- преподаватели ----------
+    def teacher_allowed_on_day(self, t, day) -> bool:
+        h = self.ctx.holidays.get(day)
+        if h and not h.is_working:
+            return False
+        ov = self.ctx.overrides.get((t.id, day))
+        if ov:
+            return not ov.is_off
+        return day.weekday() not in self._days_off.get(t.id, ())
+
+    def teacher_time_window_ok(self, t, slot, day) -> bool:
+        w = self.ctx.workloads.get(t.id)
+        ov = self.ctx.overrides.get((t.id, day))
+        start = ov.start if ov and ov.start else (w.default_start if w and w.default_start else None)
+        end = ov.end if ov and ov.end else (w.default_end if w and w.default_end else None)
+        if start and slot.start_time < start: return False
+        if end and slot.end_time > end: return False
+        return True
+
+    def pick_teacher(self, group, disc, day, slot):
+        for t in self.ctx.assignments.get(group.id, {}).get(disc.id, []):
+            if self.teacher_can(t, day, slot):
+                return t
+        return None
+
+    # ---------- планы ----------
+    def next_plan(self, group):
+        """Первая дисциплина группы с остатком часов; исчерпанные планы выпадают из очереди навсегда."""
+        glist = self.ctx.plans.get(group.id, [])
+        pos = self._plan_pos.get(group.id, 0)
+        while pos < len(glist) and glist[pos].hours_assigned >= glist[pos].hours_total:
+            pos += 1
+        self._plan_pos[group.id] = pos
+        return glist[pos] if pos < len(glist) else None
+
+    def commit(self, day, slot, group_id, teacher_id, room_id=None):
+        """Отмечает ячейку занятой для группы/преподавателя/аудитории и учитывает недельные минуты."""
+        self.occ.add(day, slot.id, group_id=group_id, teacher_id=teacher_id, room_id=room_id)
+        wk = (teacher_id, *day.isocalendar()[:2])
+        self.weekly_minutes[wk] = self.weekly_minutes.get(wk, 0) + self._slot_min[slot.id]
+
+    def release(self, day, slot, group_id, teacher_id, room_id=None):
+        """Обратное к commit: освобождает ячейку (для локального поиска и перестановок)."""
+        self.occ.remove(day, slot.id, group_id=group_id, teacher_id=teacher_id, room_id=room_id)
+        wk = (teacher_id, *day.isocalendar()[:2])
+        self.weekly_minutes[wk] = self.weekly_minutes.get(wk, 0) - self._slot_min[slot.id]
+
+    def teacher_can(self, t, day, slot) -> bool:
+        """Все проверки pick_teacher для конкретного преподавателя."""
+        if not self.occ.teacher_free(day, slot.id, t.id):
+            return False
+        if not self.teacher_allowed_on_day(t, day) or not self.teacher_time_window_ok(t, slot, day):
+            return False
+        limit = self._limit_min.get(t.id)
+        return not (limit and self.weekly_minutes.get((t.id, *day.isocalendar()[:2]), 0) + self._slot_min[slot.id] > limit)
+
+    def slot_minutes_of(self, slot_id) -> int:
+        return self._slot_min[slot_id]
+
+    def academic_hours(self, slot_id) -> float:
+        return self._slot_min[slot_id] / self.academic_min
+
+    # ---------- конфликты / размещение ----------
+    def add_conflict(self, reason, *, date, slot, group=None, discipline=None, teacher=None, room=None, details=None):
+        self.conflicts.append({
+            "reason": reason,
+            "date": date.isoformat(),
+            "slot": slot.order,
+            "time": self._slot_time[slot.id],
+            "group": getattr(group, "code", None),
+            "discipline": getattr(discipline, "title", None),
+            "teacher": getattr(teacher, "full_name", None),
+            "room": getattr(room, "name", None),
+            "room_building": getattr(getattr(room, "building", None), "name", None),
+            "links": {
+                # ссылки в админку
+                "group": f"/admin/directory/studentgroup/{getattr(group,'id',0)}/change/" if group else None,
+                "discipline": f"/admin/directory/discipline/{getattr(discipline,'id',0)}/change/" if discipline else None,
+                "teacher": f"/admin/directory/teacher/{getattr(teacher,'id',0)}/change/" if teacher else None,
+                "room": f"/admin/directory/room/{getattr(room,'id',0)}/change/" if room else None,
+            },
+            "details": details,
+        })
+
+    def try_place(self, group, plan, day, slot, try_shift=True) -> bool:
+        disc = self.ctx.disc_map[plan.discipline_id]
+        is_remote = (disc.delivery_mode == "remote")
+
+        t_ok = self.pick_teacher(group, disc, day, slot)
+        if not t_ok:
+            self.add_conflict("no_teacher", date=day, slot=slot, group=group, discipline=disc,
+                              details="Нет доступного преподавателя (время/лимит/занятость)")
+            return False
+
+        chosen_room = None
+        chosen_remote = is_remote
+        if not is_remote:
+            chosen_room = self.pick_room(group, disc, day, slot)
+            if not chosen_room and disc.delivery_mode == "mixed":
+                # смешанная дисциплина — провалим в дистанционную форму
+                chosen_remote = True
+
+        if not chosen_remote and chosen_room is None:
+            if try_shift:
+                return False  # пусть вызвавший код попробует иной слот
+            self.add_conflict("no_room", date=day, slot=slot, group=group, discipline=disc,
+                              teacher=t_ok, details="Нет подходящей аудитории: тип/вместимость/ПК/занятость")
+            return False
+
+        self.proposals.append({
+            "date": day.isoformat(),
+            "timeslot_id": slot.id,
+            "group_id": group.id,
+            "discipline_id": disc.id,
+            "teacher_id": t_ok.id,
+            "lesson_type_id": disc.default_lesson_type_id,
+            "room_id": (None if chosen_remote else chosen_room.id),
+            "is_remote": chosen_remote,
+        })
+
+        self.commit(day, slot, group.id, t_ok.id, None if chosen_remote else chosen_room.id)
+
+        # списываем часы из плана по длительности слота (в акад. часах)
+        plan.hours_assigned += self.academic_hours(slot.id)
+        return True
+
+    def run_day(self, day):
+        for slot in self.ctx.slots:
+            for g in self.ctx.groups:
+                if not self.occ.group_free(day, slot.id, g.id):
+                    continue
+                plan = self.next_plan(g)
+                if not plan:
+                    continue
+
+                placed = self.try_place(g, plan, day, slot, try_shift=self.backtrack)
+                if not placed and self.backtrack:
+                    # попробуем соседний слот ниже в этот день
+                    next_slot = self._next_slot[slot.id]
+                    disc = self.ctx.disc_map[plan.discipline_id]
+                    if next_slot and self.occ.group_free(day, next_slot.id, g.id):
+                        if self.try_place(g, plan, day, next_slot, try_shift=False):
+                            self.stats["placed"] += 1
+                        else:
+                            self.add_conflict("backtrack_failed", date=day, slot=slot, group=g, discipline=disc,
+                                              details="Перестановка на следующий слот не помогла")
+                            self.stats["skipped"] += 1
+                    else:
+                        self.add_conflict("no_slot_to_shift", date=day, slot=slot, group=g, discipline=disc,
+                                          details="Нет следующего свободного слота для группы")
+                        self.stats["skipped"] += 1
+                elif placed:
+                    self.stats["placed"] += 1
+                else:
+                    self.stats["skipped"] += 1
+
+    def working_days(self):
+        cur = self.ctx.start_date
+        while cur <= self.ctx.end_date:
+            hol = self.ctx.holidays.get(cur)
+            if not (hol and not hol.is_working):
+                yield cur
+            cur += timedelta(days=1)
+
+    def run(self, on_day=None, should_stop=None):
+        """
+        on_day(done, total) — вызывается после каждого рабочего дня (прогресс фоновой задачи);
+        should_stop() — опрашивается перед каждым днём, True прерывает проход (self.cancelled=True).
+        """
+        days = list(self.working_days())
+        self.cancelled = False
+        for i, day in enumerate(days, 1):
+            if should_stop and should_stop():
+                self.cancelled = True
+                break
+            self.run_day(day)
+            if on_day:
+                on_day(i, len(days))
+        return self
+
+
+def bulk_batch_size(model, objs) -> int:
+    """
+    Наибольшая пачка bulk_create для model, которую примет бэкенд.
+    На SQLite предел — число переменных в одном запросе (max_query_params), делённое на число колонок:
+    для Lesson это ~99 строк, и прежний batch_size=200 Django всё равно молча урезал.
+    """
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    return max(1, connection.ops.bulk_batch_size(fields, objs))
+
+
+def preview_rows(ctx: GenerationContext, proposals):
+    """Человекочитаемый превью предложений для dry_run. Без запросов к БД — только справочники из ctx."""
+    slots = {s.id: (s.order, f"{s.start_time.strftime('%H:%M')}–{s.end_time.strftime('%H:%M')}") for s in ctx.slots}
+    groups = {g.id: g.code for g in ctx.groups}
+    teachers = {t.id: t.full_name for by_disc in ctx.assignments.values() for ts in by_disc.values() for t in ts}
+    rooms = {r.id: f"{r.building.name} · {r.name}" for r in ctx.rooms}
+
+    pretty = []
+    for p in proposals:
+        order, time_text = slots[p["timeslot_id"]]
+        d = ctx.disc_map[p["discipline_id"]]
+        pretty.append({
+            "date": p["date"],
+            "slot": order,
+            "time": time_text,
+            "group": groups[p["group_id"]],
+            "discipline": d.title,
+            "teacher": teachers.get(p["teacher_id"]),
+            "room": "Дистанционно" if p["is_remote"] else rooms.get(p["room_id"]),
+            "delivery": d.delivery_mode,
+            "type": d.default_lesson_type.name if d.default_lesson_type_id else None
+        })
+    return pretty
+
+
+def build_lessons(proposals):
+    """Несохранённые Lesson по предложениям генератора (FK — только id, без запросов)."""
+    return [
+        Lesson(
+            date=datetime.fromisoformat(p["date"]).date(),
+            timeslot_id=p["timeslot_id"],
+            group_id=p["group_id"],
+            discipline_id=p["discipline_id"],
+            teacher_id=p["teacher_id"],
+            lesson_type_id=p["lesson_type_id"],
+            room_id=p["room_id"],
+            is_remote=p["is_remote"],
+            remote_platform=("Moodle" if p["is_remote"] else ""),  # при желании выбирайте платформу
+        )
+        for p in proposals
+    ]
+
+
+def apply_proposals(engine: GreedyEngine) -> int:
+    """
+    Записывает engine.proposals в Lesson и сохраняет списанные часы планов.
+    Перед записью пачка проверяется validate_lessons по текущей базе: пока шла генерация,
+    расписание могли поправить вручную. Предложения с конфликтом не пишутся — они уходят
+    в engine.conflicts (write_conflict), их часы возвращаются в план. Возвращает число записанных.
+    Запросов: 2 на проверку + bulk_create пачками по bulk_batch_size + bulk_update только затронутых планов.
+    """
+    ctx = engine.ctx
+    # часы меняются только у планов, по которым что-то поставлено (в том числе снятое проверкой)
+    touched = {(p["group_id"], p["discipline_id"]) for p in engine.proposals}
+    with transaction.atomic():
+        to_create = build_lessons(engine.proposals)
+        errors = validate_lessons(to_create, replace=False) if to_create else []
+        if any(errors):
+            plan_by_key = {(pl.group_id, pl.discipline_id): pl for glist in ctx.plans.values() for pl in glist}
+            slot_by_id = {s.id: s for s in ctx.slots}
+            group_by_id = {g.id: g for g in ctx.groups}
+            kept = []
+            for p, lesson, err in zip(engine.proposals, to_create, errors):
+                if not err:
+                    kept.append((p, lesson)); continue
+                slot = slot_by_id[p["timeslot_id"]]
+                plan = plan_by_key.get((p["group_id"], p["discipline_id"]))
+                if plan:
+                    plan.hours_assigned -= engine.academic_hours(slot.id)
+                engine.stats["placed"] -= 1
+                engine.stats["skipped"] += 1
+                engine.add_conflict("write_conflict", date=lesson.date, slot=slot, group=group_by_id.get(p["group_id"]),
+                                    discipline=ctx.disc_map[p["discipline_id"]],
+                                    details="; ".join(m for msgs in err.values() for m in msgs))
+            engine.proposals = [p for p, _ in kept]
+            to_create = [lesson for _, lesson in kept]
+
+        plans = [pl for glist in ctx.plans.values() for pl in glist if (pl.group_id, pl.discipline_id) in touched]
+        Lesson.objects.bulk_create(to_create, batch_size=bulk_batch_size(Lesson, to_create))
+        if plans:
+            GroupDisciplinePlan.objects.bulk_update(plans, ["hours_assigned"])
+    week_cache.invalidate_all()  # bulk_create идёт мимо сигналов
+    return len(to_create)
+
+
+def run_generation(params: dict, on_progress=None, should_stop=None) -> dict:
+    """
+    Полный цикл генерации по params (start, end, groups, dry_run, backtrack, workers, optimize) —
+    общий для синхронной ручки и фоновых GenerationJob.
+    on_progress(days_done, days_total, stats, conflicts_count) — после каждого дня
+    (в параллельном режиме — после каждой решённой части).
+    Возвращает JSON-ответ генератора; при отмене — {"cancelled": True, ...} без записи в БД.
+    """
+    start_date = datetime.fromisoformat(params["start"]).date()
+    end_date = datetime.fromisoformat(params["end"]).date()
+    codes = params.get("groups") or []
+    groups = list(StudentGroup.objects.filter(code__in=codes)) if codes else list(StudentGroup.objects.all())
+
+    ctx = load_context(start_date, end_date, groups)
+    backtrack = params.get("backtrack", True)
+    workers = params.get("workers") or 1
+
+    if workers > 1 and len(groups) > 1:
+        from .parallel import run_parallel
+        days_total = sum(1 for _ in GreedyEngine(ctx).working_days())
+
+        def on_part(done, total):
+            if on_progress:
+                on_progress(days_total * done // total, days_total, {"placed": 0, "skipped": 0}, 0)
+
+        engine = run_parallel(ctx, workers=workers, backtrack=backtrack, on_part=on_part, should_stop=should_stop)
+    else:
+        engine = GreedyEngine(ctx, backtrack=backtrack)
+
+        def on_day(done, total):
+            if on_progress:
+                on_progress(done, total, engine.stats, len(engine.conflicts))
+
+        engine.run(on_day=on_day, should_stop=should_stop)
+    if engine.cancelled:
+        return {"cancelled": True, "conflicts": engine.conflicts, "stats": engine.stats}
+
+    extra = {}
+    if params.get("optimize"):
+        from .optimizer import optimize
+        extra["optimize"] = optimize(engine, params["optimize"])
+
+    if params.get("dry_run", True):
+        return {"dry_run": True, "proposals": preview_rows(ctx, engine.proposals),
+                "conflicts": engine.conflicts, "stats": engine.stats, **extra}
+
+    created = apply_proposals(engine)
+    return {"dry_run": False, "created": created, "conflicts": engine.conflicts,
+            "stats": engine.stats, **extra}
@@ -0,0 +1,165 @@
+# api/services/incremental.py
+"""
+Инкрементальная перегенерация: после точечного изменения (override преподавателя,
+аудитория выведена из работы, изменилась группа) пересчитывается только затронутая часть.
+
+1. Берём занятия диапазона, попадающие под изменение (teacher / room / group).
+2. Недействительными считаем те, что нарушают текущие ограничения:
+   выходной/праздник, день или окно преподавателя (TeacherWorkload, TeacherDayOverride),
+   неподходящая аудитория (тип, вместимость, ПК). Для room — все занятия в ней:
+   аудитория выводится из работы на этот диапазон и в подбор не попадает.
+3. Освобождаем только их ячейки; все остальные занятия диапазона остаются занятостью движка.
+4. Возвращаем часы в планы (group, discipline) и ставим ровно эти часы тем же GreedyEngine.
+5. Домашние задания снятых занятий переносятся на новые занятия той же группы и дисциплины
+   (по порядку дат); не перенесённые из-за нехватки мест — в ответе homework_lost,
+   и при записи они удаляются вместе с занятием.
+"""
+import time
+
+from django.db import transaction
+
+from directory.models import GroupDisciplinePlan
+from scheduleapp.models import Lesson, HomeworkItem
+from .generator import GreedyEngine, load_context, preview_rows, build_lessons, bulk_batch_size
+from . import week_cache
+
+
+def _is_invalid(engine: GreedyEngine, lesson: Lesson, room_off) -> bool:
+    day, slot, teacher = lesson.date, lesson.timeslot, lesson.teacher
+    if not engine.teacher_allowed_on_day(teacher, day) or not engine.teacher_time_window_ok(teacher, slot, day):
+        return True
+    if lesson.room_id is None:
+        return False
+    if lesson.room_id == room_off or lesson.room_id not in engine._room_bit:
+        return True
+    return not engine._eligible_mask(lesson.group, lesson.discipline) >> engine._room_bit[lesson.room_id] & 1
+
+
+def _released_row(lesson: Lesson) -> dict:
+    ts = lesson.timeslot
+    return {
+        "id": lesson.id,
+        "date": lesson.date.isoformat(),
+        "slot": ts.order,
+        "time": f"{ts.start_time.strftime('%H:%M')}–{ts.end_time.strftime('%H:%M')}",
+        "group": lesson.group.code,
+        "discipline": lesson.discipline.title,
+        "teacher": lesson.teacher.full_name,
+        "room": "Дистанционно" if lesson.is_remote else (str(lesson.room) if lesson.room_id else None),
+    }
+
+
+def _carry_homework(released, proposals):
+    """
+    Домашние задания снятых занятий → индексы новых предложений той же (группа, дисциплина),
+    ранние задания — на ранние занятия. Возвращает ({индекс предложения: (занятие, текст)}, [занятия без места]).
+    """
+    texts = dict(HomeworkItem.objects.filter(lesson_id__in=[l.pk for l in released]).values_list("lesson_id", "text"))
+    if not texts:
+        return {}, []
+    queue = {}
+    for l in sorted((l for l in released if l.pk in texts), key=lambda l: (l.date, l.timeslot.order)):
+        queue.setdefault((l.group_id, l.discipline_id), []).append(l)
+    carried = {}
+    for i, p in enumerate(proposals):  # предложения идут по дням и парам
+        waiting = queue.get((p["group_id"], p["discipline_id"]))
+        if waiting:
+            l = waiting.pop(0)
+            carried[i] = (l, texts[l.pk])
+    return carried, [l for waiting in queue.values() for l in waiting]
+
+
+def regenerate(*, start_date, end_date, teacher_id=None, room_id=None, group_id=None, dry_run=True) -> dict:
+    """
+    Пересчитывает занятия [start_date, end_date], затронутые изменением teacher_id / room_id / group_id.
+    Возвращает released (снятые занятия), proposals/conflicts/stats в формате генератора и elapsed_ms.
+    """
+    t0 = time.perf_counter()
+    qs = (Lesson.objects.filter(date__range=(start_date, end_date))
+          .select_related("timeslot", "group", "discipline", "teacher", "room__building"))
+    if teacher_id:
+        qs = qs.filter(teacher_id=teacher_id)
+    if room_id:
+        qs = qs.filter(room_id=room_id)
+    if group_id:
+        qs = qs.filter(group_id=group_id)
+    candidates = list(qs)
+
+    groups = list({l.group_id: l.group for l in candidates}.values())
+    ctx = load_context(start_date, end_date, groups)
+    if room_id:
+        ctx.rooms = [r for r in ctx.rooms if r.id != room_id]
+
+    checker = GreedyEngine(ctx)  # только проверки ограничений и длительности слотов, без прохода
+    released = [l for l in candidates if _is_invalid(checker, l, room_id)]
+    if not released:
+        return {"dry_run": dry_run, "released": [], "proposals": [], "conflicts": [],
+                "stats": {"placed": 0, "skipped": 0}, "unplaced": [], "homework_moved": [], "homework_lost": [],
+                "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+    freed_cells = {(l.date, l.timeslot_id, l.group_id) for l in released}
+    ctx.existing = [e for e in ctx.existing if (e[0], e[1], e[2]) not in freed_cells]
+
+    # планы-«остатки»: ровно освобождённые часы по (группа, дисциплина)
+    real_plans = {(p.group_id, p.discipline_id): p for glist in ctx.plans.values() for p in glist}
+    freed, lesson_type, fallback_teacher = {}, {}, {}
+    for l in released:
+        key = (l.group_id, l.discipline_id)
+        freed[key] = freed.get(key, 0) + checker.academic_hours(l.timeslot_id)
+        lesson_type.setdefault(key, l.lesson_type_id)
+        fallback_teacher.setdefault(key, l.teacher)
+
+    affected = {gid for gid, _ in freed}
+    ctx.groups = [g for g in groups if g.id in affected]
+    ctx.plans = {gid: [] for gid in affected}
+    for (gid, did), hours in freed.items():
+        ctx.plans[gid].append(GroupDisciplinePlan(group_id=gid, discipline_id=did, hours_total=hours, hours_assigned=0))
+        by_disc = ctx.assignments.setdefault(gid, {})
+        if not by_disc.get(did):
+            # занятие из импорта без TeachingAssignment — переставляем с тем же преподавателем
+            by_disc[did] = [fallback_teacher[(gid, did)]]
+
+    engine = GreedyEngine(ctx).run()
+    for p in engine.proposals:
+        p["lesson_type_id"] = p["lesson_type_id"] or lesson_type[(p["group_id"], p["discipline_id"])]
+
+    placed = {(p.group_id, p.discipline_id): p.hours_assigned for glist in ctx.plans.values() for p in glist}
+    unplaced = [
+        {"group_id": gid, "discipline_id": did, "hours": round(freed[(gid, did)] - placed[(gid, did)], 2)}
+        for gid, did in freed if placed[(gid, did)] < freed[(gid, did)]
+    ]
+
+    homework, lost = _carry_homework(released, engine.proposals)
+    proposals = preview_rows(ctx, engine.proposals)
+    result = {
+        "dry_run": dry_run,
+        "released": [_released_row(l) for l in released],
+        "proposals": proposals,
+        "conflicts": engine.conflicts,
+        "stats": engine.stats,
+        "unplaced": unplaced,
+        "homework_moved": [{"from": l.id, "to": {k: proposals[i][k] for k in ("date", "slot", "time")}}
+                           for i, (l, _text) in homework.items()],
+        "homework_lost": [_released_row(l) for l in lost],
+    }
+
+    if not dry_run:
+        to_create = build_lessons(engine.proposals)
+        touched = []
+        for key, plan in real_plans.items():
+            if key in freed:
+                plan.hours_assigned = max(0, round(plan.hours_assigned - freed[key] + placed[key]))
+                touched.append(plan)
+        with transaction.atomic():
+            Lesson.objects.filter(pk__in=[l.pk for l in released]).delete()
+            Lesson.objects.bulk_create(to_create, batch_size=bulk_batch_size(Lesson, to_create))
+            if homework:
+                HomeworkItem.objects.bulk_create(
+                    [HomeworkItem(lesson=to_create[i], text=text) for i, (_l, text) in homework.items()])
+            if touched:
+                GroupDisciplinePlan.objects.bulk_update(touched, ["hours_assigned"])
+        week_cache.invalidate_all()
+        result["created"] = len(to_create)
+
+    result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
@@ -0,0 +1,299 @@
+# api/services/optimizer.py
+"""
+Локальный поиск поверх результата жадного генератора (?optimize=секунды).
+
+Работает на занятости самого GreedyEngine (матрица Occupancy: битсеты групп,
+преподавателей и аудиторий по ячейке дата × слот), поэтому проверка хода —
+несколько сдвигов и AND, без запросов к БД. Окрестности:
+  - insert — поставить час дисциплины с остатком плана в свободную ячейку группы;
+  - move   — перенести занятие в другую ячейку той же ISO-недели;
+  - swap   — поменять местами два занятия группы внутри недели.
+move/swap трогают только слоты одинаковой длительности, поэтому списанные часы
+планов и недельные минуты преподавателей при них не меняются.
+
+Целевая функция (меньше — лучше):
+  W_UNPLACED × неразмещённые акад. часы
+  + W_GAP × «окна» преподавателей (пустые пары между первой и последней за день)
+  + W_BUILDING × смены корпуса подряд идущих пар (у группы и у преподавателя).
+Принятие ходов — имитация отжига с геометрическим охлаждением по времени.
+Занятия, уже стоявшие в БД до генерации, не двигаются, но учитываются в окнах/корпусах.
+"""
+import math
+import random
+import time
+from collections import defaultdict
+
+W_UNPLACED = 10.0
+W_GAP = 1.0
+W_BUILDING = 2.0
+
+T_START = 2.0
+T_END = 0.05
+
+
+def _gaps(by_slot: dict) -> int:
+    if len(by_slot) < 2:
+        return 0
+    return max(by_slot) - min(by_slot) + 1 - len(by_slot)
+
+
+def _changes(by_slot: dict) -> int:
+    seq = [by_slot[i] for i in sorted(by_slot) if by_slot[i] is not None]
+    return sum(1 for a, b in zip(seq, seq[1:]) if a != b)
+
+
+class LocalSearch:
+    def __init__(self, engine, *, seed=0):
+        self.e = engine
+        ctx = engine.ctx
+        self.rnd = random.Random(seed)
+        self.slots = ctx.slots
+        self.slot_idx = {s.id: i for i, s in enumerate(ctx.slots)}
+        self.days = list(engine.working_days())
+        self.week_days = defaultdict(list)
+        for d in self.days:
+            self.week_days[d.isocalendar()[:2]].append(d)
+        self.room_building = {r.id: r.building_id for r in ctx.rooms}
+        self.groups = {g.id: g for g in ctx.groups}
+        self.group_pos = {g.id: k for k, g in enumerate(ctx.groups)}
+        self.teachers = {t.id: t for by_disc in ctx.assignments.values() for ts in by_disc.values() for t in ts}
+        self.plan_by_key = {(p.group_id, p.discipline_id): p for glist in ctx.plans.values() for p in glist}
+        self.plans = list(self.plan_by_key.values())
+        # планы с остатком часов и позиция каждого в списке: выбор для insert — O(1),
+        # закрытый план убирается перестановкой с последним
+        self.open_plans = [p for p in self.plans if p.hours_assigned < p.hours_total]
+        self._open_pos = {p.id: i for i, p in enumerate(self.open_plans)}
+
+        # (teacher_id | group_id, date) -> {индекс слота: building_id | None}
+        self.t_day = defaultdict(dict)
+        self.g_day = defaultdict(dict)
+        for day, slot_id, group_id, teacher_id, room_id in ctx.existing:
+            if slot_id not in self.slot_idx:
+                continue
+            b = self.room_building.get(room_id)
+            if teacher_id:
+                self.t_day[(teacher_id, day)][self.slot_idx[slot_id]] = b
+            if group_id in self.groups:
+                self.g_day[(group_id, day)][self.slot_idx[slot_id]] = b
+
+        # изменяемые записи предложений: day — date, slot — TimeSlot
+        from datetime import date
+        slot_by_id = {s.id: s for s in ctx.slots}
+        self.lessons = []
+        for p in engine.proposals:
+            rec = {**p, "day": date.fromisoformat(p["date"]), "slot": slot_by_id[p["timeslot_id"]]}
+            self._index(rec)
+            self.lessons.append(rec)
+
+    # ---------- структуры для стоимости ----------
+    def _index(self, rec):
+        i = self.slot_idx[rec["slot"].id]
+        b = self.room_building.get(rec["room_id"])
+        self.t_day[(rec["teacher_id"], rec["day"])][i] = b
+        self.g_day[(rec["group_id"], rec["day"])][i] = b
+
+    def _unindex(self, rec):
+        i = self.slot_idx[rec["slot"].id]
+        self.t_day[(rec["teacher_id"], rec["day"])].pop(i, None)
+        self.g_day[(rec["group_id"], rec["day"])].pop(i, None)
+
+    def _keys(self, *recs):
+        keys = set()
+        for r in recs:
+            keys.add(("t", r["teacher_id"], r["day"]))
+            keys.add(("g", r["group_id"], r["day"]))
+        return keys
+
+    def _cost(self, keys) -> float:
+        total = 0.0
+        for kind, ident, day in keys:
+            if kind == "t":
+                m = self.t_day.get((ident, day))
+                if m:
+                    total += W_GAP * _gaps(m) + W_BUILDING * _changes(m)
+            else:
+                m = self.g_day.get((ident, day))
+                if m:
+                    total += W_BUILDING * _changes(m)
+        return total
+
+    def breakdown(self) -> dict:
+        unplaced = sum(max(0.0, p.hours_total - p.hours_assigned) for p in self.plans)
+        gaps = sum(_gaps(m) for m in self.t_day.values())
+        changes = sum(_changes(m) for m in self.t_day.values()) + sum(_changes(m) for m in self.g_day.values())
+        return {
+            "objective": round(W_UNPLACED * unplaced + W_GAP * gaps + W_BUILDING * changes, 2),
+            "unplaced_hours": round(unplaced, 2),
+            "teacher_gaps": gaps,
+            "building_changes": changes,
+        }
+
+    # ---------- занятость ----------
+    def _remove(self, rec):
+        self.e.release(rec["day"], rec["slot"], rec["group_id"], rec["teacher_id"], rec["room_id"])
+        self._unindex(rec)
+
+    def _put(self, rec):
+        self.e.commit(rec["day"], rec["slot"], rec["group_id"], rec["teacher_id"], rec["room_id"])
+        self._index(rec)
+
+    def _fit(self, rec, day, slot):
+        """Можно ли поставить rec в (day, slot) — при уже освобождённой старой ячейке. Возвращает room_id/None или False."""
+        e = self.e
+        if not e.group_is_free(day, slot.id, rec["group_id"]):
+            return False
+        if not e.teacher_can(self.teachers[rec["teacher_id"]], day, slot):
+            return False
+        if rec["room_id"] is None:
+            return None
+        if e.room_is_free(day, slot.id, rec["room_id"]):
+            return rec["room_id"]
+        room = e.pick_room(self.groups[rec["group_id"]], e.ctx.disc_map[rec["discipline_id"]], day, slot)
+        return room.id if room else False
+
+    def _close_plan(self, plan):
+        i = self._open_pos.pop(plan.id)
+        last = self.open_plans.pop()
+        if last is not plan:
+            self.open_plans[i] = last
+            self._open_pos[last.id] = i
+
+    def _accept(self, delta, temp) -> bool:
+        return delta <= 0 or self.rnd.random() < math.exp(-delta / temp)
+
+    # ---------- ходы ----------
+    def _try_move(self, temp) -> bool:
+        rec = self.rnd.choice(self.lessons)
+        day = self.rnd.choice(self.week_days[rec["day"].isocalendar()[:2]])
+        slot = self.rnd.choice(self.slots)
+        if (day, slot.id) == (rec["day"], rec["slot"].id):
+            return False
+        if self.e.slot_minutes_of(slot.id) != self.e.slot_minutes_of(rec["slot"].id):
+            return False
+
+        old = dict(rec)
+        keys = self._keys(old) | self._keys({**old, "day": day})
+        before = self._cost(keys)
+        self._remove(rec)
+        room = self._fit(rec, day, slot)
+        if room is False:
+            self._put(rec)
+            return False
+        rec.update(day=day, slot=slot, room_id=room)
+        self._put(rec)
+        if self._accept(self._cost(keys) - before, temp):
+            return True
+        self._remove(rec)
+        rec.update(day=old["day"], slot=old["slot"], room_id=old["room_id"])
+        self._put(rec)
+        return False
+
+    def _try_swap(self, temp) -> bool:
+        a = self.rnd.choice(self.lessons)
+        week = a["day"].isocalendar()[:2]
+        b = self.rnd.choice(self.lessons)
+        if b is a or b["group_id"] != a["group_id"] or b["day"].isocalendar()[:2] != week:
+            return False
+        if self.e.slot_minutes_of(a["slot"].id) != self.e.slot_minutes_of(b["slot"].id):
+            return False
+
+        oa, ob = dict(a), dict(b)
+        keys = self._keys(oa, ob) | self._keys({**oa, "day": ob["day"]}, {**ob, "day": oa["day"]})
+        before = self._cost(keys)
+        self._remove(a); self._remove(b)
+        ra = self._fit(a, ob["day"], ob["slot"])
+        if ra is not False:
+            a.update(day=ob["day"], slot=ob["slot"], room_id=ra)
+            self._put(a)
+            rb = self._fit(b, oa["day"], oa["slot"])
+            if rb is not False:
+                b.update(day=oa["day"], slot=oa["slot"], room_id=rb)
+                self._put(b)
+                if self._accept(self._cost(keys) - before, temp):
+                    return True
+                self._remove(b)
+            self._remove(a)
+        a.update(day=oa["day"], slot=oa["slot"], room_id=oa["room_id"])
+        b.update(day=ob["day"], slot=ob["slot"], room_id=ob["room_id"])
+        self._put(a); self._put(b)
+        return False
+
+    def _try_insert(self, temp) -> bool:
+        if not self.open_plans:
+            return False
+        plan = self.rnd.choice(self.open_plans)
+        group = self.groups[plan.group_id]
+        disc = self.e.ctx.disc_map[plan.discipline_id]
+        day = self.rnd.choice(self.days)
+        slot = self.rnd.choice(self.slots)
+        if not self.e.group_is_free(day, slot.id, group.id):
+            return False
+        teacher = self.e.pick_teacher(group, disc, day, slot)
+        if not teacher:
+            return False
+        room_id = None
+        is_remote = disc.delivery_mode == "remote"
+        if not is_remote:
+            room = self.e.pick_room(group, disc, day, slot)
+            if room:
+                room_id = room.id
+            elif disc.delivery_mode == "mixed":
+                is_remote = True
+            else:
+                return False
+
+        hours = self.e.academic_hours(slot.id)
+        rec = {
+            "date": day.isoformat(), "timeslot_id": slot.id, "group_id": group.id,
+            "discipline_id": disc.id, "teacher_id": teacher.id,
+            "lesson_type_id": disc.default_lesson_type_id, "room_id": room_id, "is_remote": is_remote,
+            "day": day, "slot": slot,
+        }
+        keys = self._keys(rec)
+        before = self._cost(keys) + W_UNPLACED * min(hours, plan.hours_total - plan.hours_assigned)
+        self._put(rec)
+        if self._accept(self._cost(keys) - before, temp):
+            plan.hours_assigned += hours
+            if plan.hours_assigned >= plan.hours_total:
+                self._close_plan(plan)
+            self.lessons.append(rec)
+            return True
+        self._remove(rec)
+        return False
+
+    # ---------- основной цикл ----------
+    def run(self, seconds: float) -> dict:
+        report = {"seconds": seconds, "before": self.breakdown()}
+        iterations = accepted = inserted = 0
+        t0 = time.perf_counter()
+        deadline = t0 + seconds
+        temp = T_START
+        moves = (self._try_move, self._try_swap)
+        while self.lessons or self.open_plans:
+            if iterations % 256 == 0:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                temp = T_START * (T_END / T_START) ** ((now - t0) / seconds)
+            iterations += 1
+            if iterations % 4 == 0 or not self.lessons:
+                if self._try_insert(temp):
+                    accepted += 1; inserted += 1
+            elif self.rnd.choice(moves)(temp):
+                accepted += 1
+
+        self.e.stats["placed"] += inserted
+        self.e.proposals = [
+            {k: v for k, v in r.items() if k not in ("day", "slot")} | {"date": r["day"].isoformat(), "timeslot_id": r["slot"].id}
+            for r in sorted(self.lessons, key=lambda r: (r["day"], r["slot"].order, self.group_pos[r["group_id"]]))
+        ]
+        report.update(
+            after=self.breakdown(), iterations=iterations, accepted=accepted, inserted=inserted,
+            moves_per_second=round(iterations / max(time.perf_counter() - t0, 1e-9)),
+        )
+        return report
+
+
+def optimize(engine, seconds: float, seed=0) -> dict:
+    """Улучшает engine.proposals на месте за отведённое время, возвращает отчёт before/after."""
+    return LocalSearch(engine, seed=seed).run(seconds)
@@ -0,0 +1,207 @@
+# api/services/parallel.py
+"""
+Параллельный режим генератора (?workers=N).
+
+Группы, у которых нет общих преподавателей (по TeachingAssignment), не влияют
+друг на друга ни через занятость преподавателя, ни через недельные лимиты —
+их можно раскладывать в разных процессах. Компоненты связности графа
+«группа — преподаватель» раскладываются по N частям с учётом корпусов из
+BuildingPriority (компоненты одного корпуса стараются попасть в одну часть,
+чтобы реже делить аудитории). Общими между частями остаются только аудитории:
+шаг слияния проходит предложения в исходном порядке (дата, пара, группа)
+и для каждой повторной занятости аудитории ищет другую свободную подходящую,
+для mixed-дисциплин — уводит в дистант, иначе снимает предложение
+с конфликтом merge_room_clash.
+
+Недели по отдельности не считаются: списание часов плана переносится между
+неделями (какую дисциплину ставить дальше, зависит от уже поставленного).
+
+Модели импортируются внутри функций: при spawn-старте (Windows) дочерний
+процесс сначала выполняет _init_worker, и только потом — django.setup().
+"""
+from collections import Counter
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _solve_part(ctx, backtrack):
+    from .generator import GreedyEngine
+    engine = GreedyEngine(ctx, backtrack=backtrack).run()
+    hours = {p.id: p.hours_assigned for glist in ctx.plans.values() for p in glist}
+    return engine.proposals, engine.conflicts, engine.stats, hours
+
+
+def partition_groups(ctx, workers: int):
+    """Делит ctx.groups на не более чем workers частей без общих преподавателей."""
+    parent = {g.id: g.id for g in ctx.groups}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    owner = {}  # teacher_id -> первая группа, где он встретился
+    for g in ctx.groups:
+        for teachers in ctx.assignments.get(g.id, {}).values():
+            for t in teachers:
+                if t.id in owner:
+                    a, b = find(owner[t.id]), find(g.id)
+                    if a != b:
+                        parent[a] = b
+                else:
+                    owner[t.id] = g.id
+
+    comps = {}
+    for g in ctx.groups:
+        comps.setdefault(find(g.id), []).append(g)
+
+    # «домашний» корпус компоненты — самый частый корпус с наивысшим приоритетом у её групп
+    def home_building(groups):
+        ids = {g.id for g in groups}
+        cnt = Counter()
+        for (gid, _), prefs in ctx.building_prefs.items():
+            if gid in ids and prefs:
+                cnt[min(prefs, key=lambda p: p.priority).building_id] += 1
+        return cnt.most_common(1)[0][0] if cnt else None
+
+    n = max(1, min(workers, len(comps)))
+    target = len(ctx.groups) / n
+    bins = [[] for _ in range(n)]
+    bin_buildings = [set() for _ in range(n)]
+    for groups in sorted(comps.values(), key=len, reverse=True):
+        b = home_building(groups)
+        same = [i for i in range(n) if b is not None and b in bin_buildings[i] and len(bins[i]) + len(groups) <= target]
+        i = same[0] if same else min(range(n), key=lambda k: len(bins[k]))
+        bins[i].extend(groups)
+        if b is not None:
+            bin_buildings[i].add(b)
+
+    order = {g.id: k for k, g in enumerate(ctx.groups)}
+    return [sorted(part, key=lambda g: order[g.id]) for part in bins if part]
+
+
+def run_parallel(ctx, *, workers: int, backtrack=True, on_part=None, should_stop=None):
+    """
+    Решает части в пуле процессов и сливает результат.
+    Возвращает GreedyEngine на полном контексте с заполненными proposals/conflicts/stats
+    (его занятость — итоговая после слияния). on_part(done, total) — после каждой части.
+    """
+    from .generator import GenerationContext, GreedyEngine
+
+    parts = partition_groups(ctx, workers)
+    sub_ctxs = [
+        GenerationContext(
+            start_date=ctx.start_date, end_date=ctx.end_date, groups=part, slots=ctx.slots,
+            disciplines=ctx.disc_map,
+            plans={g.id: ctx.plans.get(g.id, []) for g in part},
+            assignments={g.id: ctx.assignments.get(g.id, {}) for g in part},
+            building_prefs=ctx.building_prefs, holidays=ctx.holidays, workloads=ctx.workloads,
+            overrides=ctx.overrides, rooms=ctx.rooms, existing=ctx.existing,
+        )
+        for part in parts
+    ]
+
+    merged = GreedyEngine(ctx, backtrack=backtrack)
+    merged.cancelled = False
+    results = []
+    with ProcessPoolExecutor(max_workers=len(parts), initializer=_init_worker) as pool:
+        futures = [pool.submit(_solve_part, sc, backtrack) for sc in sub_ctxs]
+        for done, fut in enumerate(as_completed(futures), 1):
+            results.append(fut.result())
+            if on_part:
+                on_part(done, len(futures))
+            if should_stop and should_stop():
+                merged.cancelled = True
+                # не ждать оставшиеся части: __exit__ после shutdown(wait=False) уже не блокирует
+                pool.shutdown(wait=False, cancel_futures=True)
+                return merged
+
+    plans_by_id = {p.id: p for glist in ctx.plans.values() for p in glist}
+    for proposals, conflicts, stats, hours in results:
+        for pid, h in hours.items():
+            plans_by_id[pid].hours_assigned = h
+        merged.proposals.extend(proposals)
+        merged.conflicts.extend(conflicts)
+        merged.stats["placed"] += stats["placed"]
+        merged.stats["skipped"] += stats["skipped"]
+
+    _merge_rooms(merged)
+    return merged
+
+
+def _merge_rooms(engine):
+    """
+    Разводит аудитории, занятые одновременно предложениями из разных частей.
+    Преподаватели и группы у частей не пересекаются, поэтому конфликт возможен только по аудитории:
+    сначала ищем другую аудиторию в той же ячейке, затем (mixed) — дистант,
+    затем — другой свободный слот того же дня для этой группы; иначе снимаем предложение.
+    """
+    ctx = engine.ctx
+    slot_by_id = {s.id: s for s in ctx.slots}
+    group_by_id = {g.id: g for g in ctx.groups}
+    group_pos = {g.id: k for k, g in enumerate(ctx.groups)}
+    plan_by_key = {(p.group_id, p.discipline_id): p for glist in ctx.plans.values() for p in glist}
+
+    engine.proposals.sort(key=lambda p: (p["date"], slot_by_id[p["timeslot_id"]].order, group_pos[p["group_id"]]))
+    kept, clashed = [], []
+    for p in engine.proposals:
+        day = date.fromisoformat(p["date"])
+        slot = slot_by_id[p["timeslot_id"]]
+        if p["room_id"] is None or engine.room_is_free(day, slot.id, p["room_id"]):
+            engine.commit(day, slot, p["group_id"], p["teacher_id"], p["room_id"])
+            kept.append(p); continue
+
+        disc = ctx.disc_map[p["discipline_id"]]
+        room = engine.pick_room(group_by_id[p["group_id"]], disc, day, slot)
+        if room:
+            p = {**p, "room_id": room.id}
+        elif disc.delivery_mode == "mixed":
+            p = {**p, "room_id": None, "is_remote": True}
+        else:
+            clashed.append(p); continue
+        engine.commit(day, slot, p["group_id"], p["teacher_id"], p["room_id"])
+        kept.append(p)
+
+    # вторая попытка — другой слот того же дня; занятость уже содержит все оставленные предложения
+    for p in clashed:
+        day = date.fromisoformat(p["date"])
+        group = group_by_id[p["group_id"]]
+        disc = ctx.disc_map[p["discipline_id"]]
+        moved = None
+        for slot in ctx.slots:
+            if not engine.group_is_free(day, slot.id, group.id):
+                continue
+            teacher = engine.pick_teacher(group, disc, day, slot)
+            room = engine.pick_room(group, disc, day, slot) if teacher else None
+            if room:
+                moved = {**p, "timeslot_id": slot.id, "teacher_id": teacher.id, "room_id": room.id}
+                engine.commit(day, slot, group.id, teacher.id, room.id)
+                break
+        plan = plan_by_key.get((group.id, disc.id))
+        if moved:
+            # слоты бывают разной длины — списание плана пересчитывается по новому слоту
+            if plan:
+                plan.hours_assigned += (engine.academic_hours(moved["timeslot_id"])
+                                        - engine.academic_hours(p["timeslot_id"]))
+            kept.append(moved); continue
+
+        # снять предложение и вернуть часы в план
+        slot = slot_by_id[p["timeslot_id"]]
+        if plan:
+            plan.hours_assigned -= engine.academic_hours(slot.id)
+        engine.stats["placed"] -= 1
+        engine.stats["skipped"] += 1
+        engine.add_conflict("merge_room_clash", date=day, slot=slot, group=group, discipline=disc,
+                            details="Аудиторию заняла параллельная часть, свободной замены в этот день нет")
+
+    kept.sort(key=lambda p: (p["date"], slot_by_id[p["timeslot_id"]].order, group_pos[p["group_id"]]))
+    engine.proposals = kept
+    engine.conflicts.sort(key=lambda c: (c["date"], c["slot"]))
@@ -1,8 +1,10 @@
 # api/services/ranepa.py
+import asyncio
 import re
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 import httpx
-from bs4 import BeautifulSoup
+from lxml import etree
 
 BASE = "https://zf-ranepa-rasp.ru"
 
@@ -24,102 +26,280 @@ def _week_slug(start_iso: str) -> str:
     e = s + timedelta(days=5)  # суббота
     return f"{MONTH_SLUGS[s.month]}{s.day:02d}-{MONTH_SLUGS[e.month]}{e.day:02d}"
 
-def _get(url: str) -> str:
-    with httpx.Client(headers={"User-Agent":"Mozilla/5.0"}) as cli:
-        r = cli.get(url, timeout=30)
-        r.raise_for_status()
-        return r.text
+def week_mondays(start: date, end: date) -> list[date]:
+    """Понедельники всех недель, задевающих [start, end]."""
+    monday = start - timedelta(days=start.weekday())
+    out = []
+    while monday <= end:
+        out.append(monday)
+        monday += timedelta(weeks=1)
+    return out
 
-def _parse_week_html(html: str, q: str, kind: str, week_start_iso: str):
+# ---------- загрузка страниц: один AsyncClient на диапазон ----------
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+async def _fetch_one(cli, sem, url, *, retries, backoff, headers=None):
+    """
+    Страница недели с повторами (сетевые ошибки, 429/5xx) и экспоненциальной паузой.
+    headers — условный запрос (If-None-Match/If-Modified-Since): на 304 html=None.
+    """
+    attempts, t0 = 0, time.perf_counter()
+    async with sem:
+        while True:
+            attempts += 1
+            try:
+                r = await cli.get(url, headers=headers)
+                if r.status_code == 304:
+                    return {"html": None, "status": 304, "attempts": attempts,
+                            "fetch_ms": round((time.perf_counter() - t0) * 1000, 1)}
+                if r.status_code in RETRY_STATUSES and attempts <= retries:
+                    raise httpx.HTTPStatusError(f"HTTP {r.status_code}", request=r.request, response=r)
+                r.raise_for_status()
+                return {"html": r.text, "status": r.status_code, "attempts": attempts,
+                        "etag": r.headers.get("etag"), "last_modified": r.headers.get("last-modified"),
+                        "fetch_ms": round((time.perf_counter() - t0) * 1000, 1)}
+            except httpx.HTTPError as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                retriable = status is None or status in RETRY_STATUSES
+                if not retriable or attempts > retries:
+                    return {"html": None, "status": status, "attempts": attempts, "error": str(e) or type(e).__name__,
+                            "fetch_ms": round((time.perf_counter() - t0) * 1000, 1)}
+                await asyncio.sleep(backoff * 2 ** (attempts - 1))
+
+async def _fetch_pages(urls, *, concurrency, retries, backoff, timeout, headers=None):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    sem = asyncio.Semaphore(concurrency)
+    headers = headers or [None] * len(urls)
+    async with httpx.AsyncClient(headers={"User-Agent": "Mozilla/5.0"}, limits=limits, timeout=timeout) as cli:
+        return await asyncio.gather(*(_fetch_one(cli, sem, u, retries=retries, backoff=backoff, headers=h)
+                                      for u, h in zip(urls, headers)))
+
+# ---------- разбор страницы недели ----------
+PARSER_VERSION = 2  # поднимать при любом изменении items: по нему сбрасывается кэш разборов (ranepa_pages)
+DAY_HEADER = re.compile(
+    r"^(понедельник|вторник|среда|четверг|пятница|суббота|воскресенье)\s*\|\s*(\d{1,2})\s+[а-я]+", re.I
+)
+COLUMNS_HEADER = re.compile(r"^группа;пара;дисциплина[^;]*;преподаватель;№ ауд.;\s*", re.I)
+_NO_TEXT = {"script", "style", "template"}  # их текст BeautifulSoup.get_text() не отдаёт
+
+
+class _TextLines:
+    """
+    Цель (target) lxml-парсера: строки текста страницы в порядке документа — то же,
+    что soup.get_text("\n", strip=True).splitlines() после замены <br> на пробел,
+    но без дерева: граница строки — любой тег, кроме голого <br>.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self._buf = []
+        self._skip = 0
+        self._br = False
+
+    def _flush(self):
+        if self._buf:
+            for ln in "".join(self._buf).splitlines():
+                ln = ln.strip()
+                if ln:
+                    self.lines.append(ln)
+            self._buf = []
+
+    def start(self, tag, attrib):
+        if tag == "br" and not attrib:
+            self._br = True
+            self._buf.append(" ")
+            return
+        self._flush()
+        if tag in _NO_TEXT:
+            self._skip += 1
+
+    def end(self, tag):
+        if tag == "br" and self._br:
+            self._br = False
+            return
+        self._flush()
+        if tag in _NO_TEXT:
+            self._skip -= 1
+
+    def data(self, text):
+        if not self._skip:
+            self._buf.append(text)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+
+    def take(self):
+        lines, self.lines = self.lines, []
+        return lines
+
+
+def _page_lines(html):
+    """Строки текста по мере подачи кусков страницы (str или итерируемое str)."""
+    target = _TextLines()
+    parser = etree.HTMLParser(target=target)
+    for chunk in ([html] if isinstance(html, str) else html):
+        parser.feed(chunk)
+        yield from target.take()
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass  # пустая страница
+    yield from target.take()
+
+
+def _day_items(lines, day: date, needle: str):
+    """Записи одного дня: текст после заголовка колонок, по пять полей через «;»."""
+    seg = " ".join(lines)
+    p = seg.lower().find("группа;пара;дисциплина")
+    if p != -1:
+        seg = seg[p:]
+    seg = COLUMNS_HEADER.sub("", seg)
+    # \xa0 заменён сразу на весь день: norm нужен, только если в тексте остался литеральный <br>
+    strip = norm if "<" in seg else str.strip
+    toks = [strip(t) for t in seg.replace("\xa0", " ").split(";") if t.strip()]
+    day_iso = day.isoformat()
+
+    for i in range(0, len(toks) - 4, 5):
+        group_field, pair_field, disc_type, teacher_field, room_field = toks[i:i + 5]
+
+        if needle and needle not in f"{group_field} {teacher_field} {disc_type}".lower():
+            continue
+
+        # делим предмет/вид по последней запятой
+        discipline, lesson_type = disc_type, None
+        if "," in disc_type:
+            left, right = disc_type.rsplit(",", 1)
+            discipline = strip(left)
+            lesson_type = strip(right)
+
+        # дистанционно?
+        is_remote = room_field.upper().startswith("СДО")
+
+        # корпус по номеру аудитории: до 100 — колледж
+        building = None
+        if not is_remote and room_field.isdigit():
+            building = "Колледж" if int(room_field) < 100 else "Высшее Образование"
+
+        yield {
+            "date": day_iso,
+            "order": int(pair_field) if pair_field.isdigit() else None,
+            "time": None,  # время возьмём из локальных слотов при предпросмотре/импорте
+            "discipline": discipline or None,
+            "lesson_type": lesson_type or None,
+            "teacher": teacher_field or None,
+            "group": group_field or None,
+            "room": None if is_remote else (room_field or None),
+            "building": building,
+            "is_remote": is_remote,
+            "remote_platform": "СДО" if is_remote else None,
+        }
+
+
+def iter_week_html(html, q: str, kind: str, week_start_iso: str):
     """
-    Разбираем «плоский» текст страницы недели.
+    Занятия страницы недели по одному, в порядке страницы (без сортировки).
+    html — строка или итерируемое кусков (например, Response.iter_text()):
+    lxml разбирает их по мере поступления, день отдаётся, как только начался следующий.
     Формат блоков по дню:
       понедельник | 8 сентября
       Группа;Пара;Дисциплина, Вид;Преподаватель;№ ауд.;
       23ИСПп3-о9;2;...;Фамилия И.О.;СДО; ...
     """
-    # <br> -> пробелы, затем тянем всё как текст
-    html = re.sub(r"<br\s*/?>", " ", html, flags=re.I)
-    soup = BeautifulSoup(html, "lxml")
-    text = soup.get_text("\n", strip=True)
-
     base = datetime.fromisoformat(week_start_iso).date()
-    day_header_re = re.compile(
-        r"^(понедельник|вторник|среда|четверг|пятница|суббота|воскресенье)\s*\|\s*(\d{1,2})\s+[а-я]+",
-        re.I
-    )
-
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    items, buf, cur_date = [], [], None
-
-    def _flush():
-        nonlocal buf, items, cur_date
-        if not buf or not cur_date:
-            buf = []; return
-        seg = " ".join(buf)
-        # вырезаем до заголовка колонок (если есть)
-        p = seg.lower().find("группа;пара;дисциплина")
-        if p != -1: seg = seg[p:]
-        seg = re.sub(r"^группа;пара;дисциплина[^;]*;преподаватель;№ ауд.;\s*", "", seg, flags=re.I)
-        toks = [t.strip() for t in seg.split(";") if t.strip()]
-
-        needle = (q or "").lower()
-        for i in range(0, len(toks) - 4, 5):
-            group_field   = norm(toks[i])
-            pair_field    = norm(toks[i+1])
-            disc_type     = norm(toks[i+2])
-            teacher_field = norm(toks[i+3])
-            room_field    = norm(toks[i+4])
-
-            if needle and needle not in f"{group_field} {teacher_field} {disc_type}".lower():
-                continue
-
-            # делим предмет/вид по последней запятой
-            discipline, lesson_type = disc_type, None
-            if "," in disc_type:
-                left, right = disc_type.rsplit(",", 1)
-                discipline = norm(left)
-                lesson_type = norm(right)
-
-            # дистанционно?
-            is_remote = room_field.upper().startswith("СДО")
-
-            # вычислим корпус по правилу из задания
-            building = None
-            if not is_remote:
-                rm = (room_field or "").strip()
-                if rm.isdigit():
-                    n = int(rm)
-                    building = "Колледж" if n < 100 else "Высшее Образование"
-            items.append({
-                "date": cur_date.isoformat(),
-                "order": int(pair_field) if pair_field.isdigit() else None,
-                "time": None,  # время возьмём из локальных слотов при предпросмотре/импорте
-                "discipline": discipline or None,
-                "lesson_type": lesson_type or None,
-                "teacher": teacher_field or None,
-                "group": group_field or None,
-                "room": None if is_remote else (room_field or None),
-                "building": building,
-                "is_remote": is_remote,
-                "remote_platform": "СДО" if is_remote else None,
-            })
-        buf = []
-
-    for ln in lines:
-        m = day_header_re.match(ln)
+    needle = (q or "").lower()
+    cur_date, buf = None, []
+    for ln in _page_lines(html):
+        m = DAY_HEADER.match(ln)
         if m:
-            _flush()
-            day_idx = RU_DAY_TO_IDX[m.group(1).lower()]
-            cur_date = base + timedelta(days=day_idx)
-            continue
-        if cur_date: buf.append(ln)
-    _flush()
+            if cur_date and buf:
+                yield from _day_items(buf, cur_date, needle)
+            cur_date, buf = base + timedelta(days=RU_DAY_TO_IDX[m.group(1).lower()]), []
+        elif cur_date:
+            buf.append(ln)
+    if cur_date and buf:
+        yield from _day_items(buf, cur_date, needle)
+
 
+def _parse_week_html(html: str, q: str, kind: str, week_start_iso: str):
+    """Все занятия страницы недели, по дате и номеру пары (см. iter_week_html)."""
+    items = list(iter_week_html(html, q, kind, week_start_iso))
     items.sort(key=lambda x: (x["date"], x["order"] if x["order"] is not None else 99))
     return items
 
+def fetch_range_from_ranepa(q: str, kind: str, sem: int, start: str, end: str, *,
+                            base: str = BASE, concurrency: int = 4, retries: int = 2,
+                            backoff: float = 0.5, timeout: float = 30, store=None, offline: bool = False):
+    """
+    Все недели между start и end (ISO) — параллельно, не больше concurrency запросов
+    сразу, через один AsyncClient с пулом соединений. Возвращает (items, weeks):
+    items — занятия диапазона [start, end] по порядку, weeks — по неделе
+    {week, slug, status, attempts, fetch_ms, parse_ms, items[, cache, sha256][, error]}.
+    Неделя, которая не загрузилась и после повторов, попадает в weeks с error.
+
+    store (ranepa_pages.PageStore) — условные запросы и кэш страниц/разборов:
+    cache = new | changed | unchanged | not_modified | offline. offline=True —
+    сеть не трогаем, недели берутся из store как есть.
+    """
+    d1, d2 = date.fromisoformat(start), date.fromisoformat(end)
+    mondays = week_mondays(d1, d2)
+    slugs = [_week_slug(m.isoformat()) for m in mondays]
+    urls = [f"{base.rstrip('/')}/{s}" for s in slugs]
+    if offline:
+        pages = [_offline_page(store, s) for s in slugs]
+    else:
+        pages = asyncio.run(_fetch_pages(urls, concurrency=concurrency, retries=retries, backoff=backoff,
+                                         timeout=timeout, headers=[store.validators(s) for s in slugs] if store else None))
+    items, weeks = [], []
+    for monday, slug, url, page in zip(mondays, slugs, urls, pages):
+        html, etag, last_modified = page.pop("html"), page.pop("etag", None), page.pop("last_modified", None)
+        week = {"week": monday.isoformat(), "slug": slug, **page, "parse_ms": 0.0, "items": 0}
+        sha = None
+        if store and not offline:
+            if page["status"] == 304:
+                sha, html = store.not_modified(slug)
+                week["cache"] = "not_modified"
+                if html is None:
+                    week["error"] = "304, а страницы нет в хранилище"
+            elif html is not None:
+                sha, week["cache"] = store.save(slug, url, html, etag=etag, last_modified=last_modified)
+        elif offline:
+            sha = week.get("sha256")
+        if html is not None:
+            t0 = time.perf_counter()
+            week_items = store.parsed(sha, PARSER_VERSION, monday.isoformat(), q) if sha else None
+            if week_items is None:
+                week_items = _parse_week_html(html, q=q, kind=kind, week_start_iso=monday.isoformat())
+                if sha:
+                    store.save_parsed(sha, PARSER_VERSION, monday.isoformat(), q, week_items)
+            got = [it for it in week_items if d1.isoformat() <= it["date"] <= d2.isoformat()]
+            week["parse_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            week["items"] = len(got)
+            items += got
+        if sha:
+            week["sha256"] = sha
+        weeks.append(week)
+    return items, weeks
+
+def _offline_page(store, slug):
+    """Неделя из хранилища без сети — в том же виде, что отдаёт _fetch_one."""
+    meta = store.meta(slug) if store else None
+    html = store.read(meta["sha256"]) if meta else None
+    if html is None:
+        return {"html": None, "status": None, "attempts": 0, "fetch_ms": 0.0, "cache": "offline",
+                "error": "страницы нет в хранилище"}
+    return {"html": html, "status": 200, "attempts": 0, "fetch_ms": 0.0, "cache": "offline",
+            "sha256": meta["sha256"]}
+
 def fetch_week_from_ranepa(q: str, kind: str, sem: int, start: str, end: str):
-    slug = _week_slug(start)  # ПН–СБ
-    html = _get(f"{BASE}/{slug}")
-    return _parse_week_html(html, q=q, kind=kind, week_start_iso=start)
+    """Занятия диапазона [start, end] одним списком (см. fetch_range_from_ranepa); сбой любой недели — исключение."""
+    items, weeks = fetch_range_from_ranepa(q=q, kind=kind, sem=sem, start=start, end=end)
+    failed = [w for w in weeks if w.get("error")]
+    if failed:
+        raise httpx.HTTPError(f"{failed[0]['slug']}: {failed[0]['error']}")
+    return items
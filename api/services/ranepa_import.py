@@ -0,0 +1,394 @@
+# api/services/ranepa_import.py
+"""
+Импорт занятий РАНХиГС (ручка ranepa_import) пакетом.
+
+Прежний импорт на каждую строку ходил в БД десяток раз (слот, четыре справочника,
+аудитория, группа, вместимость, поиск занятия, save с full_clean), и неделя
+всего колледжа стоила десятки тысяч запросов. Здесь — этапы:
+
+  1. разбор строк без БД (дата, пара, группы, названия, флаги);
+  2. справочники — по одному-два запроса на модель (field__in, остальное —
+     OR из field__iexact), недостающие — bulk_create;
+  3. занятия затронутых ячеек (date, slot) — одним запросом;
+  4. строки по порядку, в памяти: те же обходы (потоки, физкультура очно) и те же
+     проверки, что у Lesson.full_clean (поля + занятость преподавателя/аудитории
+     в ячейке), где «база» — занятость ячеек вместе с уже принятыми строками;
+     правила занятости — общие с validate_lessons (conflicts.Cells);
+  5. запись: bulk_create новых, bulk_update изменённых, подъём вместимости аудиторий.
+
+Импорт — разница с тем, что уже лежит в базе, по ключу (дата, пара, группа):
+строка новая (created), изменённая (updated) или без изменений (unchanged —
+её не пишем и не проверяем, кроме занятости ячейки); в UPDATE идут только
+занятия, итог которых отличается от базы, и только они считаются в updated.
+Новые занятия помечаются source=RANEPA. Занятия диапазона импорта с этой
+пометкой, которых в источнике больше нет, считаются в disappeared и удаляются
+только с meta.delete_missing; занятия генератора и ручные импорт не трогает.
+Повторный импорт той же недели не пишет в базу ничего.
+
+Отчёт: created / updated / unchanged / disappeared / deleted / skipped / errors /
+reasons / samples (до 12) / missing (до 12 пропавших занятий).
+"""
+import re
+from datetime import datetime, timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from directory.models import Building, Discipline, LessonType, Room, StudentGroup, Teacher
+from scheduleapp.models import Lesson, TimeSlot
+
+from .conflicts import Cells, lesson_row
+
+SPORTS_PREFIXES = ("физическая культура", "физкультура")
+MAX_SAMPLES = 12
+SOURCE = "RANEPA"  # Lesson.source занятий, созданных импортом
+IEXACT_CHUNK = 200  # условий OR в одном запросе (SQLite ограничивает глубину выражения)
+
+_LEADING_BR = re.compile(r'^(?:\s*(?:<br\s*/?>|\r?\n)+\s*)+', re.I)
+_GROUP_SPLIT = re.compile(r",\s*|;\s*")
+_FK_FIELDS = ["timeslot", "group", "discipline", "teacher", "lesson_type", "room"]
+_UPDATE_FIELDS = ["discipline", "teacher", "lesson_type", "room", "is_remote", "remote_platform", "is_stream"]
+_LESSON_VALUES = ("id", "date", "timeslot_id", "group_id", "discipline_id", "teacher_id",
+                  "lesson_type_id", "room_id", "is_remote", "remote_platform", "is_stream")
+
+
+def strip_leading_breaks(s: str | None) -> str:
+    return _LEADING_BR.sub('', (s or '')).strip()
+
+def _norm(s):
+    return re.sub(r"\s+", " ", (s or "").replace("\xa0", " ")).strip()
+
+def _safe_order(val):
+    if val is None: return None
+    s = str(val).strip()
+    if s.isdigit(): return int(s)
+    m = re.search(r"(\d+)", s)
+    return int(m.group(1)) if m else None
+
+def _derive_building_name(room_str: str|None) -> str|None:
+    if not room_str: return None
+    s = str(room_str).strip()
+    if s.upper().startswith("СДО"): return None
+    if re.fullmatch(r"\d+", s):
+        return "Колледж" if int(s) < 100 else "Высшее Образование"
+    return "Не указан"
+
+def _meta_date(meta, key):
+    try:
+        return datetime.fromisoformat(str(meta.get(key))).date()
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------- 1. разбор ----------
+def _parse(raw: dict, slots: dict) -> dict:
+    """Строка -> {"fail": (kind, reason)} или нормализованные поля (без обращений к БД)."""
+    try:
+        date = datetime.fromisoformat(raw.get("date")).date()
+    except Exception:
+        return {"fail": ("errors", "BAD_DATE")}
+    order = _safe_order(raw.get("order"))
+    if not order:
+        return {"fail": ("skipped", "NO_ORDER")}
+    ts = slots.get(order)
+    if not ts:
+        return {"fail": ("skipped", "NO_TIMESLOT")}
+    groups = [g for g in _GROUP_SPLIT.split(_norm(raw.get("group"))) if g]
+    if not groups:
+        return {"fail": ("skipped", "NO_GROUP")}
+
+    disc = strip_leading_breaks(_norm(raw.get("discipline"))) or "Без названия"
+    lt_name = _norm(raw.get("lesson_type"))
+    is_remote = bool(raw.get("is_remote"))
+    row = {
+        "date": date, "ts": ts, "groups": groups,
+        "discipline": disc, "teacher": _norm(raw.get("teacher")), "lesson_type": lt_name,
+        "is_stream": ("поток" in (lt_name or "").lower()) or (len(groups) > 1),
+        "is_remote": is_remote,
+        "is_sports": disc.strip().lower().startswith(SPORTS_PREFIXES),
+        "remote_platform": _norm(raw.get("remote_platform")) if is_remote else "",
+        "room": "", "building": "",
+    }
+    if not is_remote:
+        row["room"] = _norm(raw.get("room"))
+        row["building"] = _norm(raw.get("building")) or _derive_building_name(row["room"]) or "Не указан"
+    return row
+
+
+# ---------- 2. справочники ----------
+def _chunks(seq, n):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _resolve_ci(model, field, names, scope=None, defaults=None) -> tuple[dict, int]:
+    """
+    Регистронезависимый get_or_create пачкой. names — имена (или (id области, имя) при
+    scope, например building_id у аудиторий) в порядке строк импорта.
+    Возвращает ({ключ: объект}, сколько создано); ключ — имя как в строке (или (область, имя)).
+    Точное совпадение важнее совпадения без учёта регистра; из нескольких — меньший pk,
+    как .first() у прежнего get_or_create_ci. Новое имя создаётся в написании первой строки.
+    """
+    wanted = list(dict.fromkeys((item if scope else (None, item)) for item in names))
+    exact, folded = {}, {}
+
+    def take(qs):
+        for obj in qs.order_by("pk"):
+            s, name = (getattr(obj, scope) if scope else None), getattr(obj, field)
+            exact.setdefault((s, name), obj)
+            folded.setdefault((s, name.casefold()), obj)
+
+    if wanted:
+        cond = Q(**{f"{field}__in": {name for _, name in wanted}})
+        if scope:
+            cond &= Q(**{f"{scope}__in": {s for s, _ in wanted}})
+        take(model.objects.filter(cond))
+    rest = [(s, name) for s, name in wanted if (s, name.casefold()) not in folded]
+    for chunk in _chunks(rest, IEXACT_CHUNK):
+        cond = Q()
+        for s, name in chunk:
+            cond |= Q(**{f"{field}__iexact": name, **({scope: s} if scope else {})})
+        take(model.objects.filter(cond))
+
+    missing = {}
+    for s, name in wanted:
+        if (s, name) not in exact and (s, name.casefold()) not in folded:
+            missing.setdefault((s, name.casefold()), (s, name))
+    created = model.objects.bulk_create([
+        model(**{field: name, **({scope: s} if scope else {}), **(defaults or {})}) for s, name in missing.values()
+    ])
+    for k, obj in zip(missing, created):
+        folded[k] = obj
+
+    found = {}
+    for s, name in wanted:
+        obj = exact.get((s, name)) or folded[(s, name.casefold())]
+        found[(s, name) if scope else name] = obj
+    return found, len(created)
+
+
+# ---------- 4. проверка строки ----------
+def _update_values(lesson: Lesson) -> tuple:
+    return tuple(getattr(lesson, f.attname) for f in map(Lesson._meta.get_field, _UPDATE_FIELDS))
+
+
+def _full_clean_errors(lesson: Lesson, ref, cells: Cells) -> dict:
+    """Что сказал бы Lesson.full_clean для непотокового занятия: поля + занятость ячейки (Cells)."""
+    errors = {}
+    try:
+        lesson.clean_fields(exclude=_FK_FIELDS)  # FK-поля проверяем сами: без запроса на каждое
+    except ValidationError as e:
+        errors = e.message_dict
+    for name in ("teacher", "lesson_type"):
+        if getattr(lesson, f"{name}_id") is None:
+            errors.setdefault(name, []).append(Lesson._meta.get_field(name).error_messages["null"])
+    busy = cells.errors(lesson_row(lesson), ref)
+    # clean() бросает на первом конфликте: преподаватель, потом аудитория
+    for name in ("teacher", "room"):
+        if name in busy:
+            errors.setdefault(name, []).extend(busy[name])
+            break
+    return errors
+
+
+# ---------- пропавшие из источника ----------
+def _disappeared(rows, seen, groups, meta) -> list[dict]:
+    """
+    Занятия, заведённые импортом (source=RANEPA), групп импорта в его диапазоне дат
+    (meta.start–meta.end, иначе недели строк), ключа которых нет среди строк.
+    Занятия генератора и ручные сюда не попадают. Источник, отфильтрованный по q,
+    сравниваем с тем же фильтром по базе (группа, преподаватель, «дисциплина, вид»).
+    """
+    start, end = _meta_date(meta, "start"), _meta_date(meta, "end")
+    if start and end and start <= end:
+        scope = Q(date__range=(start, end))
+    else:
+        # без meta — недели (пн–вс), которых касаются строки
+        scope = Q()
+        for monday in {r["date"] - timedelta(days=r["date"].weekday()) for r in rows}:
+            scope |= Q(date__range=(monday, monday + timedelta(days=6)))
+    needle = str(meta.get("q") or "").strip().lower()
+    lessons = (Lesson.objects
+               .filter(scope, group_id__in={g.id for g in groups.values()}, source=SOURCE)
+               .order_by("date", "timeslot__order", "group__code")
+               .values_list("id", "date", "timeslot_id", "group_id", "timeslot__order", "group__code",
+                            "teacher__full_name", "discipline__title", "lesson_type__name"))
+    out = []
+    for pk, date, slot_id, group_id, order, code, teacher, disc, ltype in lessons:
+        if (date, slot_id, group_id) in seen:
+            continue
+        if needle and needle not in f"{code} {teacher or ''} {disc}, {ltype or ''}".lower():
+            continue
+        out.append({"id": pk, "date": date.isoformat(), "order": order, "group": code, "teacher": teacher,
+                    "discipline": disc})
+    return out
+
+
+def import_items(items: list[dict], meta: dict | None = None) -> tuple[dict, bool]:
+    """
+    Импорт строк внешнего расписания. Возвращает (report, менялись ли справочники).
+    meta — как у ручки: start/end/q задают, где искать пропавшие занятия,
+    delete_missing — удалить их.
+    """
+    meta = meta or {}
+    report = {"created": 0, "updated": 0, "unchanged": 0, "disappeared": 0, "deleted": 0,
+              "skipped": 0, "errors": 0, "reasons": {}, "samples": [], "missing": []}
+
+    def fail(kind, reason, item, messages=None):
+        report[kind] += 1
+        report["reasons"][reason] = report["reasons"].get(reason, 0) + 1
+        if len(report["samples"]) < MAX_SAMPLES:
+            sample = {"reason": reason, "item": item}
+            if messages is not None:
+                sample["messages"] = messages
+            report["samples"].append(sample)
+
+    # 1. разбор
+    slots = {ts.order: ts for ts in TimeSlot.objects.all()}
+    rows = [_parse(raw, slots) for raw in items]
+    good = [r for r in rows if "fail" not in r]
+
+    # 2. справочники
+    with transaction.atomic():
+        disciplines, n1 = _resolve_ci(Discipline, "title", [r["discipline"] for r in good])
+        teachers, n2 = _resolve_ci(Teacher, "full_name", [r["teacher"] for r in good if r["teacher"]])
+        ltypes, n3 = _resolve_ci(LessonType, "name", [r["lesson_type"] for r in good if r["lesson_type"]])
+        buildings, n4 = _resolve_ci(Building, "name", [r["building"] for r in good if r["building"]])
+        rooms, n5 = _resolve_ci(
+            Room, "name", [(buildings[r["building"]].id, r["room"]) for r in good if r["room"]],
+            scope="building_id", defaults={"capacity": 0, "computers": 0},
+        )
+        codes = {c.strip() for r in good for c in r["groups"] if c.strip()}
+        groups = {g.code: g for g in StudentGroup.objects.filter(code__in=codes)}
+        new_groups = StudentGroup.objects.bulk_create([StudentGroup(code=c, size=0) for c in codes if c not in groups])
+        groups.update({g.code: g for g in new_groups})
+    directory_changed = bool(n1 or n2 or n3 or n4 or n5 or new_groups)
+    sizes = {g.code.casefold(): g.size for g in groups.values() if g.size}
+
+    # 3. занятия затронутых ячеек
+    cells_wanted = {(r["date"], r["ts"].id) for r in good}
+    cells = Cells()
+    by_key = {}
+    stored = {}  # pk -> значения _UPDATE_FIELDS в базе: в UPDATE уходит только то, что в итоге отличается
+    if cells_wanted:
+        existing = (Lesson.objects
+                    .filter(date__in={d for d, _ in cells_wanted}, timeslot_id__in={s for _, s in cells_wanted})
+                    .values(*_LESSON_VALUES))
+        for v in existing:
+            if (v["date"], v["timeslot_id"]) not in cells_wanted:
+                continue
+            lesson = by_key[(v["date"], v["timeslot_id"], v["group_id"])] = Lesson(**v)
+            stored[v["id"]] = _update_values(lesson)
+            cells.put(v["id"], v)
+
+    # 4. строки по порядку
+    to_create, to_bulk_insert, dirty, raised = [], [], {}, {}
+    refs = {}        # id(Lesson) -> ссылка в cells (pk или ("new", n))
+    deferred = set()  # ссылки отложенных вставок — в занятость не попадают
+    seen = set()      # ключи (date, slot, group) всех строк источника — для пропавших
+    for raw, row in zip(items, rows):
+        if "fail" in row:
+            fail(*row["fail"], raw)
+            continue
+
+        room = None
+        if row["room"]:
+            room = rooms[(buildings[row["building"]].id, row["room"])]
+            need = max((sizes.get(c.strip().casefold(), 0) for c in row["groups"]), default=0)
+            current = raised.get(room.id, room.capacity)
+            if need and current and current < need:
+                raised[room.id] = need
+
+        values = dict(
+            discipline_id=disciplines[row["discipline"]].id,
+            teacher_id=teachers[row["teacher"]].id if row["teacher"] else None,
+            lesson_type_id=ltypes[row["lesson_type"]].id if row["lesson_type"] else None,
+            room_id=room.id if room else None,
+            is_remote=row["is_remote"],
+            remote_platform=row["remote_platform"] or "",
+            is_stream=row["is_stream"],
+        )
+        # обход модельной валидации: поток или физкультура очно (аудитория «может совпадать»)
+        allow_bypass = row["is_stream"] or (row["is_sports"] and not row["is_remote"])
+
+        for code in row["groups"]:
+            code = code.strip()
+            if not code:
+                report["skipped"] += 1
+                report["reasons"]["EMPTY_GROUP_TOKEN"] = report["reasons"].get("EMPTY_GROUP_TOKEN", 0) + 1
+                continue
+            group = groups[code]
+            key = (row["date"], row["ts"].id, group.id)
+            seen.add(key)
+            lesson = by_key.get(key)
+
+            if allow_bypass and (values["teacher_id"] is None or values["lesson_type_id"] is None):
+                # прежний update()/bulk_create падал на NOT NULL
+                fail("errors", "IntegrityError", raw)
+                break
+
+            if lesson is None:
+                lesson = Lesson(date=row["date"], timeslot_id=row["ts"].id, group_id=group.id,
+                                source=SOURCE, **values)
+                ref = refs[id(lesson)] = ("new", len(refs))
+                if allow_bypass:
+                    # отложенная вставка, как и раньше: проверки следующих строк её не видят
+                    to_bulk_insert.append(lesson)
+                    deferred.add(ref)
+                    by_key[key] = lesson
+                    continue
+                errors = _full_clean_errors(lesson, ref, cells)
+                if errors:
+                    fail("errors", "ValidationError", {**raw, "group": code}, errors)
+                    continue
+                to_create.append(lesson)
+                by_key[key] = lesson
+                cells.put(ref, lesson_row(lesson))
+                report["created"] += 1
+                continue
+
+            ref = lesson.pk if lesson.pk else refs[id(lesson)]
+            unchanged = all(getattr(lesson, k) == v for k, v in values.items())
+            if unchanged and (allow_bypass or not cells.errors(lesson_row(lesson), ref)):
+                # занятие уже такое: поля не проверяем и не пишем, занятость ячейки та же
+                report["unchanged"] += 1
+                continue
+            if not allow_bypass:
+                candidate = Lesson(pk=lesson.pk, date=lesson.date, timeslot_id=lesson.timeslot_id,
+                                   group_id=lesson.group_id, **values)
+                errors = _full_clean_errors(candidate, ref, cells)
+                if errors:
+                    fail("errors", "ValidationError", {**raw, "group": code}, errors)
+                    continue
+            for k, v in values.items():
+                setattr(lesson, k, v)
+            if lesson.pk:
+                dirty[lesson.pk] = lesson
+            if ref not in deferred:
+                cells.put(ref, lesson_row(lesson))
+
+    missing = _disappeared(good, seen, groups, meta) if good else []
+    report["disappeared"] = len(missing)
+    report["missing"] = missing[:MAX_SAMPLES]
+
+    # 5. запись
+    with transaction.atomic():
+        if raised:
+            Room.objects.bulk_update([Room(id=pk, capacity=cap) for pk, cap in raised.items()], ["capacity"])
+        if to_create:
+            Lesson.objects.bulk_create(to_create, batch_size=500)
+        # updated — занятия, которые в итоге отличаются от базы, а не строки по пути
+        changed = [l for pk, l in dirty.items() if _update_values(l) != stored[pk]]
+        report["updated"] = len(changed)
+        if changed:
+            Lesson.objects.bulk_update(changed, _UPDATE_FIELDS, batch_size=500)
+        if to_bulk_insert:
+            Lesson.objects.bulk_create(to_bulk_insert, batch_size=500)
+            report["created"] += len(to_bulk_insert)
+        if missing and meta.get("delete_missing"):
+            # по одному delete() на пачку: сигналы post_delete сбросят кэш недель, ДЗ уйдут каскадом
+            for chunk in _chunks([m["id"] for m in missing], 500):
+                Lesson.objects.filter(pk__in=chunk).delete()
+            report["deleted"] = len(missing)
+    return report, directory_changed
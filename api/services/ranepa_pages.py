@@ -0,0 +1,151 @@
+# api/services/ranepa_pages.py
+"""
+Локальное хранилище страниц недель RANEPA: MEDIA_ROOT/ranepa_pages/.
+
+  objects/<sha[:2]>/<sha256>.html — текст страницы; имя — хэш содержимого,
+                                    одинаковые версии не дублируются;
+  parsed/<sha256>.json            — разбор этой версии: {parser, week, queries: {q: items}};
+  weeks/<slug>.json               — неделя: текущий sha256, ETag, Last-Modified, время
+                                    загрузки/проверки и история версий.
+
+fetch_range_from_ranepa шлёт If-None-Match / If-Modified-Since из weeks/<slug>.json;
+на 304 или на ту же страницу (тот же хэш) текст и разбор берутся с диска.
+История версий — корпус для офлайн-повторов и бенчмарков (manage.py export_ranepa_pages).
+
+Хранилище — кэш: ошибки записи глотаются, прочитать не вышло — значит промах.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+
+HISTORY = 50        # версий недели в weeks/<slug>.json
+PARSED_QUERIES = 32  # разборов с разными q на одну версию страницы
+
+
+def sha256(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _write(path: Path, text: str):
+    """Атомарная запись (через временный файл рядом): параллельные загрузки не видят половину файла."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass  # кэш не должен ронять загрузку
+
+
+def _read_json(path: Path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class PageStore:
+    def __init__(self, root):
+        self.root = Path(root)
+
+    # ---------- страницы ----------
+    def _object(self, sha: str) -> Path:
+        return self.root / "objects" / sha[:2] / f"{sha}.html"
+
+    def _week(self, slug: str) -> Path:
+        return self.root / "weeks" / f"{slug}.json"
+
+    def meta(self, slug: str):
+        return _read_json(self._week(slug))
+
+    def read(self, sha: str):
+        try:
+            return self._object(sha).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def validators(self, slug: str) -> dict:
+        """Заголовки условного запроса — только если сама страница на диске (иначе 304 нечем обслужить)."""
+        meta = self.meta(slug)
+        if not meta or not self._object(meta["sha256"]).exists():
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def save(self, slug: str, url: str, html: str, *, etag=None, last_modified=None):
+        """Страница с ответом 200. Возвращает (sha256, cache): new | changed | unchanged."""
+        sha = sha256(html)
+        obj = self._object(sha)
+        if not obj.exists():
+            _write(obj, html)
+        meta = self.meta(slug) or {}
+        now = _now()
+        history = meta.get("history") or []
+        if meta.get("sha256") != sha:
+            history = (history + [{"sha256": sha, "fetched_at": now}])[-HISTORY:]
+        cache = "unchanged" if meta.get("sha256") == sha else ("changed" if meta else "new")
+        self._save_meta(slug, {
+            "slug": slug, "url": url, "sha256": sha, "etag": etag, "last_modified": last_modified,
+            "fetched_at": now if cache != "unchanged" else meta.get("fetched_at", now),
+            "checked_at": now, "history": history,
+        })
+        return sha, cache
+
+    def not_modified(self, slug: str):
+        """Ответ 304: отмечаем проверку, возвращаем (sha256, текст) текущей версии."""
+        meta = self.meta(slug)
+        if not meta:
+            return None, None
+        self._save_meta(slug, {**meta, "checked_at": _now()})
+        return meta["sha256"], self.read(meta["sha256"])
+
+    def _save_meta(self, slug, meta):
+        _write(self._week(slug), json.dumps(meta, ensure_ascii=False, indent=1))
+
+    def weeks(self):
+        """Метаданные всех сохранённых недель, по slug."""
+        for path in sorted((self.root / "weeks").glob("*.json")):
+            meta = _read_json(path)
+            if meta:
+                yield meta
+
+    # ---------- разбор ----------
+    def _parsed(self, sha: str) -> Path:
+        return self.root / "parsed" / f"{sha}.json"
+
+    def parsed(self, sha: str, parser: int, week: str, q: str):
+        """Разбор версии sha для запроса q или None (другая версия разбора/неделя — промах)."""
+        data = _read_json(self._parsed(sha))
+        if not data or data.get("parser") != parser or data.get("week") != week:
+            return None
+        return data["queries"].get((q or "").lower())
+
+    def save_parsed(self, sha: str, parser: int, week: str, q: str, items):
+        data = _read_json(self._parsed(sha))
+        if not data or data.get("parser") != parser or data.get("week") != week:
+            data = {"parser": parser, "week": week, "queries": {}}
+        queries = data["queries"]
+        queries[(q or "").lower()] = items
+        while len(queries) > PARSED_QUERIES:
+            queries.pop(next(iter(queries)))
+        _write(self._parsed(sha), json.dumps(data, ensure_ascii=False))
+
+
+def default_store():
+    """Хранилище из настроек (RANEPA_PAGE_STORE=False — без него: каждая загрузка целиком)."""
+    if not getattr(settings, "RANEPA_PAGE_STORE", True):
+        return None
+    return PageStore(Path(settings.MEDIA_ROOT) / "ranepa_pages")
@@ -0,0 +1,204 @@
+# api/services/suggest.py
+"""
+Индекс подсказок поиска (группы, преподаватели, дисциплины) в памяти процесса.
+
+Строка нормализуется fold(): casefold, ё→е, всё кроме букв и цифр — пробел.
+Для каждой записи хранятся ключи: нормализованная строка и она же без пробелов
+(«исп31» находит «ИСП-31»). Поиск:
+  * 1–2 символа — по префиксам слов (словарь префиксов);
+  * от 3 символов — пересечение списков триграмм, затем проверка подстрокой.
+Ранжирование: начало строки → начало слова → середина слова, дальше короче и по алфавиту.
+
+Индекс строится лениво при первом запросе. Изменения справочников применяются
+точечно сигналами (после коммита) в этом процессе; остальные процессы видят
+новый глобальный штамп api.services.versions (его сбрасывают те же сигналы и
+массовые записи) и перестраивают индекс целиком.
+"""
+import re
+import threading
+from collections import defaultdict
+
+from directory.models import Discipline, StudentGroup, Teacher
+
+from . import versions
+
+TYPES = ("group", "teacher", "discipline")
+SOURCES = {
+    "group": (StudentGroup, "code"),
+    "teacher": (Teacher, "full_name"),
+    "discipline": (Discipline, "title"),
+}
+SHORT = 2  # запросы до этой длины — только по префиксам слов
+
+_NON_WORD = re.compile(r"[^\w]+|_")
+
+
+def fold(s: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", (s or "").casefold().replace("ё", "е")).split())
+
+
+def _trigrams(s: str):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class SuggestIndex:
+    def __init__(self):
+        self.entries = {}                    # (type, id) -> (label, keys)
+        self.grams = defaultdict(set)        # триграмма -> {(type, id)}
+        self.prefixes = defaultdict(set)     # 1–2 первых символа слова -> {(type, id)}
+        self.short_hits = {}                 # ответы на 1–2 символа: кандидатов много, а вариантов запроса мало
+        self.stamp = None
+
+    # ---------- построение ----------
+    def add(self, kind, pk, label):
+        self.remove(kind, pk)
+        self.short_hits.clear()
+        folded = fold(label)
+        if not folded:
+            return
+        keys = [folded]
+        compact = folded.replace(" ", "")
+        if compact != folded:
+            keys.append(compact)
+        ref = (kind, pk)
+        self.entries[ref] = (label, keys)
+        for g in self._grams_of(keys):
+            self.grams[g].add(ref)
+        for p in self._prefixes_of(keys):
+            self.prefixes[p].add(ref)
+
+    def remove(self, kind, pk):
+        ref = (kind, pk)
+        old = self.entries.pop(ref, None)
+        if old is None:
+            return
+        self.short_hits.clear()
+        for g in self._grams_of(old[1]):
+            self.grams[g].discard(ref)
+            if not self.grams[g]:
+                del self.grams[g]
+        for p in self._prefixes_of(old[1]):
+            self.prefixes[p].discard(ref)
+            if not self.prefixes[p]:
+                del self.prefixes[p]
+
+    @staticmethod
+    def _grams_of(keys):
+        out = set()
+        for k in keys:
+            out |= _trigrams(k)
+        return out
+
+    @staticmethod
+    def _prefixes_of(keys):
+        out = set()
+        for k in keys:
+            for word in k.split(" "):
+                out.update(word[:n] for n in range(1, SHORT + 1) if len(word) >= n)
+        return out
+
+    # ---------- поиск ----------
+    def search(self, q, *, types=TYPES, limit=10, per_type=None):
+        """[{type, id, label}] по убыванию релевантности; per_type — не больше стольких записей каждого типа."""
+        q = fold(q)
+        if not q:
+            return []
+        if len(q) <= SHORT:
+            memo = (q, tuple(types), limit, per_type)
+            hit = self.short_hits.get(memo)
+            if hit is None:
+                if len(self.short_hits) > 4096:
+                    self.short_hits.clear()
+                hit = self.short_hits[memo] = self._search(q, tuple(self.prefixes.get(q, ())), types, limit, per_type)
+            return list(hit)
+        postings = sorted((self.grams.get(g, ()) for g in _trigrams(q)), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = postings[0].intersection(*postings[1:]) if len(postings) > 1 else tuple(postings[0])
+        return self._search(q, candidates, types, limit, per_type)
+
+    def _search(self, q, candidates, types, limit, per_type):
+        # candidates — копия: apply() может править множества индекса из сигнала
+        scored = []
+        for ref in candidates:
+            if ref[0] not in types:
+                continue
+            entry = self.entries.get(ref)
+            if entry is None:
+                continue
+            label, keys = entry
+            rank = min(self._rank(k, q) for k in keys)
+            if rank < 3:
+                scored.append((rank, len(label), label, ref))
+        scored.sort()
+
+        out, taken = [], defaultdict(int)
+        for rank, _, label, (kind, pk) in scored:
+            if per_type and taken[kind] >= per_type:
+                continue
+            taken[kind] += 1
+            out.append({"type": kind, "id": pk, "label": label})
+            if len(out) >= limit:
+                break
+        return out
+
+    @staticmethod
+    def _rank(key, q):
+        """0 — начало строки, 1 — начало слова, 2 — внутри слова, 3 — нет совпадения."""
+        if key.startswith(q):
+            return 0
+        pos = key.find(q)
+        if pos < 0:
+            return 3
+        if key[pos - 1] == " " or f" {q}" in key:
+            return 1
+        return 2
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def _build(stamp) -> SuggestIndex:
+    index = SuggestIndex()
+    for kind, (model, field) in SOURCES.items():
+        for pk, label in model.objects.values_list("id", field).iterator():
+            index.add(kind, pk, label)
+    index.stamp = stamp
+    return index
+
+
+def get_index() -> SuggestIndex:
+    """Индекс процесса; перестраивается, если глобальный штамп ушёл вперёд без нас."""
+    global _index
+    stamp = versions.get(versions.GLOBAL)
+    index = _index
+    if index is None or index.stamp != stamp:
+        with _lock:
+            if _index is None or _index.stamp != stamp:
+                _index = _build(stamp)
+            index = _index
+    return index
+
+
+def search(q, **kwargs):
+    return get_index().search(q, **kwargs)
+
+
+def apply(kind, pk, label=None, stamps=None):
+    """
+    Точечное обновление после сохранения (label) или удаления (None) записи справочника.
+    stamps — (прежний, новый) глобальный штамп, сдвинутый этой правкой (сигнал week_cache).
+    """
+    index = _index
+    if index is None:
+        return  # ещё не строили — соберётся при первом запросе
+    with _lock:
+        if label is None:
+            index.remove(kind, pk)
+        else:
+            index.add(kind, pk, label)
+        # штамп двигаем, только если индекс видел всё до этой правки и сдвиг сделала она;
+        # чужой сдвиг (например, bulk_create импорта без сигналов) — перестройка в get_index()
+        if stamps and index.stamp == stamps[0]:
+            index.stamp = stamps[1]
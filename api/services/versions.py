@@ -0,0 +1,160 @@
+# api/services/versions.py
+"""
+Версии (штампы) областей расписания для условных ответов ETag / Last-Modified.
+
+Область — "group:<id>", "teacher:<id>", "lessons" (любое занятие) или "global"
+(справочники, слоты, массовые записи). Штамп — время последнего изменения в
+микросекундах (строго растёт), хранится в кэше Django; при холодном кэше
+штамп = «сейчас», поэтому старые ETag клиентов заведомо не совпадут.
+
+Сбрасывает штампы api.services.week_cache (invalidate / invalidate_all), то есть
+те же сигналы Lesson / HomeworkItem / TimeSlot и массовые записи.
+
+@conditional(...) на вьюхе: ETag и Last-Modified считаются только по штампам из
+кэша, и на совпавший If-None-Match / If-Modified-Since отдаётся 304 без запроса
+к занятиям. Счётчики 200/304 по вьюхам — stats() (ручка /api/admin/cache/stats/).
+
+Штампы годятся для 304, только если их видят все процессы: bump() в воркере, где
+сохранили занятие, должен сдвинуть ETag и у остальных. Поэтому CACHES должен быть
+общим (settings.REDIS_URL); LocMemCache — для одного процесса, см. api.checks.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+GLOBAL = "global"
+LESSONS = "lessons"
+
+_COUNTED = {"week_cache"}  # имена счётчиков, для stats()
+
+
+def scope(kind, ident=None) -> str:
+    return kind if ident is None else f"{kind}:{quote(str(ident), safe='')}"
+
+
+def _key(name) -> str:
+    return f"version:{name}"
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+def get_many(scopes) -> dict:
+    """{область: штамп}; отсутствующие в кэше заводятся текущим временем."""
+    keys = {_key(s): s for s in scopes}
+    found = cache.get_many(list(keys))
+    out = {}
+    for k, s in keys.items():
+        v = found.get(k)
+        if v is None:
+            cache.add(k, _now_us(), None)
+            v = cache.get(k)
+        out[s] = v
+    return out
+
+
+def get(name) -> int:
+    return get_many([name])[name]
+
+
+def bump(*scopes) -> dict:
+    """
+    Новый штамп для областей: не меньше текущего времени и строго больше прежнего.
+    Возвращает {область: (прежний штамп или None, новый)}.
+    """
+    keys = {_key(s): s for s in scopes if s}
+    if not keys:
+        return {}
+    found = cache.get_many(list(keys))
+    now = _now_us()
+    stamps = {k: max(now, found.get(k, 0) + 1) for k in keys}
+    cache.set_many(stamps, None)
+    return {s: (found.get(k), stamps[k]) for k, s in keys.items()}
+
+
+# ---------- счётчики ----------
+def count(name, hit: bool):
+    key = f"version:stats:{name}:{'hit' if hit else 'miss'}"
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:  # ключ успел истечь/вытесниться
+            cache.set(key, 1, None)
+
+
+def stats() -> dict:
+    names = sorted(_COUNTED)
+    keys = [f"version:stats:{n}:{kind}" for n in names for kind in ("hit", "miss")]
+    found = cache.get_many(keys)
+    out = {}
+    for n in names:
+        hits = found.get(f"version:stats:{n}:hit", 0)
+        misses = found.get(f"version:stats:{n}:miss", 0)
+        total = hits + misses
+        out[n] = {"hits": hits, "misses": misses, "ratio": round(hits / total, 3) if total else None}
+    return out
+
+
+# ---------- условные ответы ----------
+def conditional(name, scopes_of):
+    """
+    Декоратор вьюхи: ETag / Last-Modified из штампов областей.
+    scopes_of(request) -> None (параметры кривые — пусть вьюха сама ответит 400)
+    или (области, extra, since): extra — что ещё влияет на тело (строка),
+    since — datetime, не раньше которого тело могло поменяться без штампов
+    (например, смена статусов пар по времени), либо None.
+    Глобальная область добавляется всегда, строка запроса входит в ETag.
+    """
+    def _state(request):
+        if not hasattr(request, "_version_state"):
+            parts = scopes_of(request)
+            state = None
+            if parts is not None:
+                scopes, extra, since = parts
+                stamps = get_many([GLOBAL, *scopes])
+                raw = "|".join([
+                    name,
+                    ";".join(f"{s}={stamps[s]}" for s in sorted(stamps)),
+                    "&".join(f"{k}={v}" for k, vs in sorted(request.GET.lists()) for v in vs),
+                    extra or "",
+                ])
+                modified = datetime.fromtimestamp(max(stamps.values()) / 1e6, tz=dt_timezone.utc)
+                if since is not None and since > modified:
+                    modified = since
+                state = (hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32], modified)
+            request._version_state = state
+        return request._version_state
+
+    def etag_func(request, *args, **kwargs):
+        state = _state(request)
+        return state and state[0]
+
+    def last_modified_func(request, *args, **kwargs):
+        state = _state(request)
+        return state and state[1]
+
+    _COUNTED.add(name)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+                count(name, response.status_code == 304)
+            return response
+        return wrapper
+    return decorator
+
+
+def modified(request):
+    """Last-Modified, посчитанный @conditional для этого запроса (datetime UTC), или None."""
+    state = getattr(request, "_version_state", None)
+    return state and state[1]
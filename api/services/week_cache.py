@@ -0,0 +1,209 @@
+# api/services/week_cache.py
+"""
+Кэш готовой недельной сетки для schedule_today / schedule_period.
+
+Ключ — (id группы | id преподавателя, ISO-неделя). В кэше лежит то, что не зависит от
+текущего времени: слоты недели и занятия по (дата, слот) без status/badge;
+статусы достраиваются на каждый запрос (status_at), поэтому попадание в кэш
+не трогает БД вовсе (код группы из запроса → id тоже лежит в кэше, group_id()).
+Сигналам Lesson ключ известен без запросов: date / group_id / teacher_id экземпляра.
+
+Сброс:
+  - post_save/post_delete Lesson и HomeworkItem (api.signals) — точечно, ключи
+    затронутых группы/преподавателя и недели (для Lesson — и значения, с которыми
+    занятие было прочитано из базы);
+  - массовые записи в обход save() (bulk_create, update(), правка справочников) —
+    invalidate_all(): номер поколения входит в ключ, старые записи просто перестают читаться.
+Заодно сдвигаются штампы api.services.versions (ETag ответов): поколение кэша —
+это и есть глобальный штамп.
+
+Кэш — CACHES["default"]: сброс в одном процессе виден другим, только если кэш общий
+(Redis — settings.REDIS_URL). LocMemCache — лишь для одного процесса (runserver, тесты);
+manage.py check --deploy предупреждает о нём (api.checks).
+"""
+from datetime import timedelta
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils import timezone
+
+from directory.models import StudentGroup
+from scheduleapp.models import Lesson, TimeSlot
+
+from . import versions
+
+
+def _timeout():
+    return getattr(settings, "SCHEDULE_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def _generation() -> int:
+    return versions.get(versions.GLOBAL)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _key(gen, kind, ident, monday) -> str:
+    y, w, _ = monday.isocalendar()
+    return f"schedule:week:{gen}:{kind}:{quote(str(ident), safe='')}:{y}-{w:02d}"
+
+
+def invalidate_all():
+    """Новое поколение; возвращает (прежний, новый) глобальный штамп."""
+    return versions.bump(versions.GLOBAL)[versions.GLOBAL]
+
+
+def group_id(code) -> int | None:
+    """id группы по коду из запроса; запоминается в кэше до смены поколения (правка StudentGroup — invalidate_all)."""
+    key = f"schedule:group:{_generation()}:{quote(str(code), safe='')}"
+    pk = cache.get(key)
+    if pk is None:
+        pk = StudentGroup.objects.filter(code=code).values_list("id", flat=True).first() or 0
+        cache.set(key, pk, _timeout())
+    return pk or None
+
+
+def invalidate(*, day, group_id=None, teacher_id=None):
+    gen = _generation()
+    monday = week_start(day)
+    keys = []
+    if group_id:
+        keys.append(_key(gen, "group", group_id, monday))
+    if teacher_id:
+        keys.append(_key(gen, "teacher", teacher_id, monday))
+    if keys:
+        cache.delete_many(keys)
+    versions.bump(
+        versions.LESSONS,
+        group_id and versions.scope("group", group_id),
+        teacher_id and versions.scope("teacher", teacher_id),
+    )
+
+
+def _build_week(kind, ident, monday) -> dict:
+    """Сетка недели: {"slots": [...], "days": {date_iso: {slot_id: item}}} — без статусов."""
+    qs = (
+        Lesson.objects
+        .filter(date__range=(monday, monday + timedelta(days=6)))
+        .select_related("timeslot", "discipline", "teacher", "lesson_type", "room", "room__building")
+        .select_related("homework")
+    )
+    qs = qs.filter(group_id=ident) if kind == "group" else qs.filter(teacher_id=ident)
+
+    days = {}
+    for lesson in qs:
+        try:
+            hw_text = lesson.homework.text
+        except ObjectDoesNotExist:
+            hw_text = None
+        days.setdefault(lesson.date.isoformat(), {})[lesson.timeslot_id] = {
+            "teacher_id": lesson.teacher_id,  # для фильтра group+teacher, в ответ не попадает
+            "id": lesson.id,
+            "discipline": lesson.discipline.title,
+            "teacher": lesson.teacher.full_name,
+            "lesson_type": lesson.lesson_type.name,
+            "room": lesson.room.name if lesson.room else None,
+            "building": lesson.room.building.name if lesson.room else None,
+            "is_remote": lesson.is_remote,
+            "remote_platform": lesson.remote_platform,
+            "homework": hw_text,
+        }
+    slots = [
+        {"id": s.id, "order": s.order, "start": s.start_time, "end": s.end_time,
+         "time": f"{s.start_time.strftime('%H:%M')}–{s.end_time.strftime('%H:%M')}"}
+        for s in TimeSlot.objects.all().order_by("order")
+    ]
+    return {"slots": slots, "days": days}
+
+
+def get_weeks(kind, ident, start_date, end_date) -> dict:
+    """{monday: сетка} для всех недель диапазона; промахи строятся и кладутся в кэш одной пачкой."""
+    gen = _generation()
+    mondays = []
+    cur = week_start(start_date)
+    while cur <= end_date:
+        mondays.append(cur)
+        cur += timedelta(days=7)
+    keys = {m: _key(gen, kind, ident, m) for m in mondays}
+    found = cache.get_many(list(keys.values()))
+    weeks, missing = {}, {}
+    for m, k in keys.items():
+        if k in found:
+            weeks[m] = found[k]
+        else:
+            weeks[m] = missing[k] = _build_week(kind, ident, m)
+    if missing:
+        cache.set_many(missing, _timeout())
+    versions.count("week_cache", not missing)
+    return weeks
+
+
+def slot_bounds() -> list:
+    """[(start_time, end_time)] всех слотов — для ETag, зависящих от «сейчас»; кэшируется по поколению."""
+    key = f"schedule:slots:{_generation()}"
+    bounds = cache.get(key)
+    if bounds is None:
+        bounds = list(TimeSlot.objects.order_by("order").values_list("start_time", "end_time"))
+        cache.set(key, bounds, _timeout())
+    return bounds
+
+
+def status_since(start_date, end_date, now):
+    """
+    С какого момента статусы пар в [start_date, end_date] такие, как сейчас:
+    начало сегодняшнего дня, а если сегодня в диапазоне — последняя пройденная
+    граница слота (начало или конец пары).
+    """
+    today = now.date()
+    since = timezone.make_aware(timezone.datetime.combine(today, timezone.datetime.min.time()))
+    if start_date <= today <= end_date:
+        # как в status_at: пара идёт при start <= now <= end, прошла при now > end
+        for start, end in slot_bounds():
+            s = timezone.make_aware(timezone.datetime.combine(today, start))
+            e = timezone.make_aware(timezone.datetime.combine(today, end))
+            if since < s <= now:
+                since = s
+            if since < e < now:
+                since = e
+    return since
+
+
+def day_items(weeks: dict, day, now, teacher_id=None) -> list:
+    """Слоты дня из кэшированной сетки: пары со status/badge на момент now или «перерывы»."""
+    week = weeks[week_start(day)]
+    by_slot = week["days"].get(day.isoformat(), {})
+    items = []
+    for slot in week["slots"]:
+        cached = by_slot.get(slot["id"])
+        if cached and (teacher_id is None or cached["teacher_id"] == teacher_id):
+            item = {"id": cached["id"], "order": slot["order"], "time": slot["time"]}
+            item.update((k, v) for k, v in cached.items() if k not in ("id", "teacher_id", "homework"))
+            st = status_at(day, slot, now)
+            item["status"] = st
+            item["badge"] = badge_for(st, cached["is_remote"])
+            item["homework"] = cached["homework"]
+            items.append(item)
+        else:
+            items.append({"order": slot["order"], "time": slot["time"], "break": True})
+    return items
+
+
+def badge_for(status, is_remote):
+    if is_remote:
+        return "remote"
+    return {"ongoing": "ongoing", "upcoming": "upcoming", "past": "past"}.get(status, "past")
+
+
+def status_at(day, slot, now) -> str:
+    """То же, что Lesson.status_for_now, но по дате/слоту из кэша и заданному now."""
+    if day != now.date():
+        return "past" if day < now.date() else "upcoming"
+    start = timezone.make_aware(timezone.datetime.combine(day, slot["start"]))
+    end = timezone.make_aware(timezone.datetime.combine(day, slot["end"]))
+    if start <= now <= end:
+        return "ongoing"
+    return "past" if now > end else "upcoming"
@@ -0,0 +1,79 @@
+# api/signals.py
+"""
+Сброс кэша недельной сетки (api.services.week_cache) при изменении расписания
+и точечное обновление индекса подсказок (api.services.suggest).
+Подключается в ApiConfig.ready().
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from directory.models import Building, Discipline, LessonType, Room, StudentGroup, Teacher
+from scheduleapp.models import HomeworkItem, Lesson, TimeSlot
+
+from .services import suggest, week_cache
+
+
+_KEY_FIELDS = ("date", "group_id", "teacher_id")
+
+
+def _invalidate_lesson(date, group_id, teacher_id):
+    if date:
+        week_cache.invalidate(day=date, group_id=group_id, teacher_id=teacher_id)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def lesson_changed(sender, instance, **kwargs):
+    """Неделя занятия и — если оно переехало — та, где оно было при чтении из базы (Lesson.from_db)."""
+    new = tuple(getattr(instance, f) for f in _KEY_FIELDS)
+    _invalidate_lesson(*new)
+    loaded = getattr(instance, "_loaded_values", None)
+    if loaded is not None:
+        old = tuple(loaded.get(f) for f in _KEY_FIELDS)
+        if old != new:
+            _invalidate_lesson(*old)
+        loaded.update(zip(_KEY_FIELDS, new))  # следующий save того же экземпляра сравнивает с записанным
+
+
+@receiver(post_save, sender=HomeworkItem)
+@receiver(post_delete, sender=HomeworkItem)
+def homework_changed(sender, instance, **kwargs):
+    if HomeworkItem.lesson.is_cached(instance):
+        lesson = instance.lesson
+        row = (lesson.date, lesson.group_id, lesson.teacher_id)
+    else:
+        row = Lesson.objects.filter(pk=instance.lesson_id).values_list(*_KEY_FIELDS).first()
+    if row:
+        _invalidate_lesson(*row)
+
+
+def _directory_changed(sender, instance, **kwargs):
+    # названия/время слотов лежат в сетке всех недель — проще сбросить всё;
+    # (прежний, новый) глобальный штамп — для индекса подсказок ниже
+    instance._global_stamps = week_cache.invalidate_all()
+
+
+for _model in (TimeSlot, Teacher, Discipline, Room, LessonType, Building, StudentGroup):
+    post_save.connect(_directory_changed, sender=_model, dispatch_uid=f"week_cache_{_model.__name__}_save")
+    post_delete.connect(_directory_changed, sender=_model, dispatch_uid=f"week_cache_{_model.__name__}_delete")
+
+
+# подсказки: подключены после week_cache, чтобы взять штампы, которые сдвинула эта правка
+def _suggest_saved(sender, instance, **kwargs):
+    kind = _SUGGEST_KINDS[sender]
+    label = getattr(instance, suggest.SOURCES[kind][1])
+    stamps = getattr(instance, "_global_stamps", None)
+    transaction.on_commit(lambda: suggest.apply(kind, instance.pk, label, stamps=stamps))
+
+
+def _suggest_deleted(sender, instance, **kwargs):
+    kind, pk = _SUGGEST_KINDS[sender], instance.pk
+    stamps = getattr(instance, "_global_stamps", None)
+    transaction.on_commit(lambda: suggest.apply(kind, pk, stamps=stamps))
+
+
+_SUGGEST_KINDS = {model: kind for kind, (model, _field) in suggest.SOURCES.items()}
+for _model in _SUGGEST_KINDS:
+    post_save.connect(_suggest_saved, sender=_model, dispatch_uid=f"suggest_{_model.__name__}_save")
+    post_delete.connect(_suggest_deleted, sender=_model, dispatch_uid=f"suggest_{_model.__name__}_delete")
@@ -1,3 +1,1426 @@
-from django.test import TestCase
+import ast
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import threading
+import time as clock
+import zipfile
+from array import array
+from datetime import date, time, timedelta
+from email.utils import parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock, skipIf, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import post_save
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import metrics
+from core.middleware import InstrumentationMiddleware
+from directory.models import (
+    Building, Room, LessonType, Discipline, Teacher, StudentGroup,
+    GroupDisciplinePlan, TeachingAssignment, TeacherDayOverride,
+)
+from scheduleapp.models import HomeworkItem, Lesson, TimeSlot
+from scheduleapp.occupancy import Occupancy
+from api.services.generator import (
+    GreedyEngine, load_context, preview_rows, apply_proposals, bulk_batch_size, run_generation,
+)
+from api.services.incremental import regenerate
+from api.services.optimizer import LocalSearch
+from api.services.conflicts import validate_lessons
+from api.services import exports, generation_jobs, parallel, ranepa_pages, versions
+from api.services import suggest as suggest_index
+from api.services.ranepa_import import import_items
+from api.views import _cell_conflicts
+from api.services.ranepa import _parse_week_html, fetch_range_from_ranepa, iter_week_html, week_mondays
+
+RANEPA_PAGES = Path(__file__).resolve().parent / "testdata" / "ranepa"
+
+
+class GeneratorQueryCountTests(TestCase):
+    """Превью и запись результатов генератора не должны делать запросов на каждое предложение."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Главный")
+        for i in range(30):
+            Room.objects.create(building=building, name=f"{100 + i}", capacity=30)
+        for order, (h0, h1) in enumerate([(9, 10), (10, 11), (11, 12), (12, 13)], 1):
+            TimeSlot.objects.create(order=order, start_time=time(h0), end_time=time(h1, 30))
+        lecture = LessonType.objects.create(name="Лекция")
+        disciplines = [Discipline.objects.create(title=f"Дисциплина {i}", default_lesson_type=lecture) for i in range(3)]
+        for g in range(12):
+            group = StudentGroup.objects.create(code=f"ГР-{g:02d}", size=20)
+            for k, disc in enumerate(disciplines):
+                teacher = Teacher.objects.create(full_name=f"Преподаватель {g}-{k}")
+                GroupDisciplinePlan.objects.create(group=group, discipline=disc, hours_total=40)
+                TeachingAssignment.objects.create(group=group, discipline=disc, teacher=teacher)
+
+    def _engine(self, n_groups):
+        groups = list(StudentGroup.objects.order_by("code")[:n_groups])
+        ctx = load_context(date(2025, 9, 15), date(2025, 9, 27), groups)
+        return ctx, GreedyEngine(ctx).run()
+
+    def test_preview_makes_no_queries(self):
+        ctx, engine = self._engine(12)
+        self.assertGreater(len(engine.proposals), 300)
+        with self.assertNumQueries(0):
+            rows = preview_rows(ctx, engine.proposals)
+        self.assertEqual(len(rows), len(engine.proposals))
+        self.assertTrue(all(r["teacher"] and r["room"] for r in rows))
+
+    def test_apply_query_count_depends_only_on_batches(self):
+        ctx, engine = self._engine(12)
+        objs = [Lesson() for _ in engine.proposals]
+        batches = -(-len(objs) // bulk_batch_size(Lesson, objs))
+        self.assertGreater(batches, 1)
+        # SAVEPOINT + проверка (типы занятий, занятость ячеек) + INSERT-пачки + один UPDATE планов + RELEASE SAVEPOINT
+        with self.assertNumQueries(batches + 5):
+            self.assertEqual(apply_proposals(engine), len(engine.proposals))
+        self.assertEqual(Lesson.objects.count(), len(engine.proposals))
+        plan = GroupDisciplinePlan.objects.get(group__code="ГР-00", discipline__title="Дисциплина 0")
+        self.assertGreater(plan.hours_assigned, 0)
+
+    def test_apply_skips_proposals_clashing_with_lessons_written_meanwhile(self):
+        ctx, engine = self._engine(2)
+        first = engine.proposals[0]
+        plan = next(pl for pl in ctx.plans[first["group_id"]] if pl.discipline_id == first["discipline_id"])
+        hours = plan.hours_assigned
+        # пока генерация шла, аудиторию первого предложения заняли вручную
+        Lesson.objects.create(date=date.fromisoformat(first["date"]), timeslot_id=first["timeslot_id"],
+                              group=StudentGroup.objects.get(code="ГР-11"), discipline_id=first["discipline_id"],
+                              teacher=Teacher.objects.get(full_name="Преподаватель 11-0"),
+                              lesson_type=LessonType.objects.get(), room_id=first["room_id"])
+        total = len(engine.proposals)
+        self.assertEqual(apply_proposals(engine), total - 1)
+        self.assertEqual(Lesson.objects.count(), total)
+        self.assertEqual([(c["reason"], c["details"]) for c in engine.conflicts], [("write_conflict", "Аудитория занята")])
+        self.assertEqual((engine.stats["placed"], len(engine.proposals)), (total - 1, total - 1))
+        plan.refresh_from_db()
+        self.assertEqual(plan.hours_assigned, hours - engine.academic_hours(first["timeslot_id"]))
+
+    def test_dry_run_query_count_does_not_grow_with_proposals(self):
+        counts = []
+        for codes in (["ГР-00"], [f"ГР-{g:02d}" for g in range(12)]):
+            params = {"start": "2025-09-15", "end": "2025-09-27", "groups": codes, "dry_run": True}
+            with self.assertNumQueries(11):  # группы + справочники load_context, без записи
+                result = run_generation(params)
+            counts.append(len(result["proposals"]))
+        self.assertGreater(counts[1], counts[0])
+
+
+class GenerationJobTests(TestCase):
+    """Фоновые задачи генератора: очередь (POST), прогресс по дням и отмена."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Главный")
+        for i in range(4):
+            Room.objects.create(building=building, name=f"{100 + i}", capacity=30)
+        for order, (h0, h1) in enumerate([(9, 10), (10, 11)], 1):
+            TimeSlot.objects.create(order=order, start_time=time(h0), end_time=time(h1, 30))
+        disc = Discipline.objects.create(title="Дисциплина", default_lesson_type=LessonType.objects.create(name="Лекция"))
+        for g in range(2):
+            group = StudentGroup.objects.create(code=f"ГР-{g:02d}", size=20)
+            GroupDisciplinePlan.objects.create(group=group, discipline=disc, hours_total=40)
+            TeachingAssignment.objects.create(group=group, discipline=disc,
+                                              teacher=Teacher.objects.create(full_name=f"Преподаватель {g}"))
+        cls.admin = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.queued = []
+        patcher = mock.patch("api.views.submit_generation", side_effect=lambda job: self.queued.append(job.pk))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queue(self, **extra):
+        data = {"start": "2025-09-15", "end": "2025-09-20", "dry_run": "1", **extra}
+        r = self.client.post("/api/admin/generate/jobs/", data)
+        self.assertEqual(r.status_code, 202)
+        return r.json()["id"]
+
+    def progress(self, pk):
+        return self.client.get(f"/api/admin/generate/jobs/{pk}/").json()
+
+    def test_queue_run_and_progress(self):
+        pk = self.queue()
+        self.assertEqual(self.queued, [pk])
+        job = self.progress(pk)
+        self.assertEqual((job["status"], job["params"]["groups"], job["params"]["dry_run"]), ("pending", [], True))
+        self.assertNotIn("result", job)
+
+        generation_jobs._run_job(pk)
+        job = self.progress(pk)
+        self.assertEqual(job["status"], "done")
+        self.assertEqual((job["days_done"], job["days_total"]), (6, 6))
+        self.assertEqual(job["placed"], len(job["result"]["proposals"]))
+        self.assertGreater(job["placed"], 0)
+        self.assertEqual(Lesson.objects.count(), 0)  # dry_run
+
+    def test_cancel_pending_and_running(self):
+        pending = self.queue()
+        r = self.client.post(f"/api/admin/generate/jobs/{pending}/cancel/")
+        self.assertEqual(r.json(), {"ok": True, "cancel_requested": True})
+        generation_jobs._run_job(pending)
+        self.assertEqual(self.progress(pending)["status"], "cancelled")
+
+        running = self.queue(dry_run="0")
+        real = generation_jobs.run_generation
+
+        def cancel_after_first_day(params, on_progress=None, should_stop=None):
+            def progress(done, *rest):
+                on_progress(done, *rest)
+                if done == 1:
+                    self.client.post(f"/api/admin/generate/jobs/{running}/cancel/")
+            return real(params, on_progress=progress, should_stop=should_stop)
+
+        with mock.patch.object(generation_jobs, "run_generation", cancel_after_first_day):
+            generation_jobs._run_job(running)
+        job = self.progress(running)
+        self.assertEqual((job["status"], job["days_done"], job["cancel_requested"]), ("cancelled", 1, True))
+        self.assertEqual(Lesson.objects.count(), 0)  # отменённая задача ничего не пишет
+        # завершённую задачу отменить уже нельзя
+        self.assertEqual(self.client.post(f"/api/admin/generate/jobs/{running}/cancel/").json()["cancel_requested"], False)
+        self.assertEqual(self.client.post("/api/admin/generate/jobs/999/cancel/").status_code, 404)
+
+    def test_queue_and_cancel_are_post_only(self):
+        pk = self.queue()
+        self.assertEqual(self.client.get("/api/admin/generate/jobs/", {"start": "2025-09-15", "end": "2025-09-20"}).status_code, 405)
+        self.assertEqual(self.client.get(f"/api/admin/generate/jobs/{pk}/cancel/").status_code, 405)
+        self.assertEqual(self.client.post("/api/admin/generate/jobs/", {"start": "2025-09-20", "end": "2025-09-15"}).status_code, 400)
+        self.assertEqual(self.queued, [pk])
+
+
+class OptimizerTests(TestCase):
+    """Локальный поиск: индекс планов с остатком часов согласован с самими планами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Главный")
+        Room.objects.create(building=building, name="101", capacity=30)
+        for order, (h0, h1) in enumerate([(9, 10), (10, 11), (11, 12)], 1):
+            TimeSlot.objects.create(order=order, start_time=time(h0), end_time=time(h1, 30))
+        lecture = LessonType.objects.create(name="Лекция")
+        for g in range(4):
+            group = StudentGroup.objects.create(code=f"ГР-{g:02d}", size=20)
+            for k in range(2):
+                disc = Discipline.objects.create(title=f"Дисциплина {g}-{k}", default_lesson_type=lecture,
+                                                 delivery_mode="mixed" if k else "in_person")
+                GroupDisciplinePlan.objects.create(group=group, discipline=disc, hours_total=4 + 4 * k)
+                TeachingAssignment.objects.create(group=group, discipline=disc,
+                                                  teacher=Teacher.objects.create(full_name=f"Преподаватель {g}-{k}"))
+
+    def test_open_plans_track_inserts(self):
+        ctx = load_context(date(2025, 9, 15), date(2025, 9, 16), list(StudentGroup.objects.all()))
+        engine = GreedyEngine(ctx).run()
+        search = LocalSearch(engine, seed=1)
+        open_before = len(search.open_plans)
+        self.assertGreater(open_before, 0)
+        report = search.run(0.2)
+        self.assertGreater(report["inserted"], 0)
+        expected = {p.id for p in search.plans if p.hours_assigned < p.hours_total}
+        self.assertEqual({p.id for p in search.open_plans}, expected)
+        self.assertEqual(search._open_pos, {p.id: i for i, p in enumerate(search.open_plans)})
+        self.assertLess(len(search.open_plans), open_before)
+
+
+class ParallelMergeTests(TestCase):
+    """Слияние частей параллельного режима: перенос в слот другой длины пересчитывает часы плана."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(building=Building.objects.create(name="Главный"), name="101", capacity=30)
+        cls.long = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))      # 2 ак. ч
+        cls.short = TimeSlot.objects.create(order=2, start_time=time(10, 40), end_time=time(11, 25))  # 1 ак. ч
+        cls.disc = Discipline.objects.create(title="История", default_lesson_type=LessonType.objects.create(name="Лекция"))
+        for g in range(2):
+            group = StudentGroup.objects.create(code=f"ГР-{g}", size=20)
+            GroupDisciplinePlan.objects.create(group=group, discipline=cls.disc, hours_total=40)
+            TeachingAssignment.objects.create(group=group, discipline=cls.disc,
+                                              teacher=Teacher.objects.create(full_name=f"Преподаватель {g}"))
+
+    def test_moved_proposal_is_charged_by_new_slot(self):
+        day = date(2025, 9, 15)
+        ctx = load_context(day, day, list(StudentGroup.objects.order_by("code")))
+        engine = GreedyEngine(ctx)
+        # обе части поставили свою группу в единственную аудиторию на первую пару
+        for g in ctx.groups:
+            teacher = ctx.assignments[g.id][self.disc.id][0]
+            engine.proposals.append({
+                "date": day.isoformat(), "timeslot_id": self.long.id, "group_id": g.id,
+                "discipline_id": self.disc.id, "teacher_id": teacher.id, "lesson_type_id": None,
+                "room_id": self.room.id, "is_remote": False,
+            })
+            ctx.plans[g.id][0].hours_assigned = 2
+        engine.stats["placed"] = 2
+
+        parallel._merge_rooms(engine)
+        self.assertEqual([(p["group_id"], p["timeslot_id"]) for p in engine.proposals],
+                         [(ctx.groups[0].id, self.long.id), (ctx.groups[1].id, self.short.id)])
+        self.assertEqual([ctx.plans[g.id][0].hours_assigned for g in ctx.groups], [2, 1])
+        self.assertEqual(engine.conflicts, [])
+
+
+class IncrementalRegenerateTests(TestCase):
+    """regenerate: снимаются только недействительные занятия, часы плана сходятся, ДЗ не теряются молча."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Главный")
+        cls.room = Room.objects.create(building=building, name="101", capacity=30)
+        cls.small = Room.objects.create(building=building, name="102", capacity=5)
+        cls.slots = [TimeSlot.objects.create(order=o, start_time=time(h), end_time=time(h + 1, 30))
+                     for o, h in ((1, 9), (2, 11))]
+        cls.lecture = LessonType.objects.create(name="Лекция")
+        cls.disc = Discipline.objects.create(title="История", default_lesson_type=cls.lecture)
+        cls.teacher = Teacher.objects.create(full_name="Иванова Е.Ю.")
+        cls.group = StudentGroup.objects.create(code="ГР-1", size=20)
+        cls.plan = GroupDisciplinePlan.objects.create(group=cls.group, discipline=cls.disc, hours_total=8, hours_assigned=4)
+        TeachingAssignment.objects.create(group=cls.group, discipline=cls.disc, teacher=cls.teacher)
+        cls.mon, cls.tue = date(2025, 9, 15), date(2025, 9, 16)
+        cls.lessons = [
+            Lesson.objects.create(date=d, timeslot=cls.slots[0], group=cls.group, discipline=cls.disc,
+                                  teacher=cls.teacher, lesson_type=cls.lecture, room=cls.room)
+            for d in (cls.mon, cls.tue)
+        ]
+        HomeworkItem.objects.create(lesson=cls.lessons[0], text="§ 3, вопросы 1–5")
+
+    def run_regenerate(self, dry_run, **kwargs):
+        return regenerate(start_date=self.mon, end_date=date(2025, 9, 20), dry_run=dry_run, **kwargs)
+
+    def test_only_invalid_lessons_are_released_and_homework_moves(self):
+        TeacherDayOverride.objects.create(teacher=self.teacher, date=self.mon, is_off=True)
+        preview = self.run_regenerate(True, teacher_id=self.teacher.id)
+        self.assertEqual([r["id"] for r in preview["released"]], [self.lessons[0].id])
+        self.assertEqual(len(preview["proposals"]), 1)
+        self.assertNotEqual(preview["proposals"][0]["date"], self.mon.isoformat())
+        self.assertEqual(preview["homework_moved"], [{"from": self.lessons[0].id, "to": {
+            k: preview["proposals"][0][k] for k in ("date", "slot", "time")}}])
+        self.assertEqual(preview["homework_lost"], [])
+        self.assertTrue(Lesson.objects.filter(pk=self.lessons[0].pk).exists())  # dry_run ничего не пишет
+
+        result = self.run_regenerate(False, teacher_id=self.teacher.id)
+        self.assertEqual(result["created"], 1)
+        self.assertTrue(Lesson.objects.filter(pk=self.lessons[1].pk).exists())  # действительное занятие не тронуто
+        hw = HomeworkItem.objects.select_related("lesson__timeslot").get()
+        self.assertEqual(hw.text, "§ 3, вопросы 1–5")
+        self.assertEqual((hw.lesson.date.isoformat(), hw.lesson.timeslot.order),
+                         (preview["proposals"][0]["date"], preview["proposals"][0]["slot"]))
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.hours_assigned, 4)
+
+    def test_unplaced_hours_return_to_plan_and_lost_homework_is_reported(self):
+        # аудитория выведена из работы, вторая слишком мала для группы — поставить некуда
+        preview = self.run_regenerate(True, room_id=self.room.id)
+        self.assertEqual(len(preview["released"]), 2)
+        self.assertEqual(preview["proposals"], [])
+        self.assertEqual(preview["unplaced"], [{"group_id": self.group.id, "discipline_id": self.disc.id, "hours": 4}])
+        self.assertEqual([r["id"] for r in preview["homework_lost"]], [self.lessons[0].id])
+        self.assertEqual(HomeworkItem.objects.count(), 1)
+
+        self.run_regenerate(False, room_id=self.room.id)
+        self.plan.refresh_from_db()
+        self.assertEqual(self.plan.hours_assigned, 0)
+        self.assertFalse(Lesson.objects.exists())
+        self.assertFalse(HomeworkItem.objects.exists())
+
+    def test_get_never_writes(self):
+        self.client.force_login(User.objects.create_user("admin", password="x", is_staff=True))
+        params = {"start": self.mon.isoformat(), "end": "2025-09-20", "room": self.room.id, "dry_run": "0"}
+        r = self.client.get("/api/admin/generate/incremental/", params)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()["released"]), 2)
+        self.assertEqual(Lesson.objects.count(), 2)
+        self.assertEqual(HomeworkItem.objects.count(), 1)
+
+        r = self.client.post("/api/admin/generate/incremental/", params)
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(Lesson.objects.exists())
+
+
+class OccupancyTests(SimpleTestCase):
+    def test_unknown_room_and_cell_are_free(self):
+        slot = TimeSlot(id=1, order=1, start_time=time(9), end_time=time(10, 30))
+        day = date(2025, 9, 15)
+        occ = Occupancy(day, day, [slot], [Room(id=7)])
+        occ.add(day, 1, room_id=7)
+        occ.add(day, 1, room_id=8)  # не из rooms — не отслеживается
+        self.assertFalse(occ.room_free(day, 1, 7))
+        self.assertTrue(occ.room_free(day, 1, 8))
+        self.assertTrue(occ.room_free(date(2025, 9, 16), 1, 7))
+
+
+class WeekCacheInvalidationTests(TestCase):
+    """Сетка недели из кэша сбрасывается сигналами Lesson без лишних запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Главный")
+        cls.rooms = [Room.objects.create(building=building, name=f"{100 + i}", capacity=30) for i in range(2)]
+        cls.slot = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))
+        cls.lecture = LessonType.objects.create(name="Лекция")
+        cls.discs = [Discipline.objects.create(title=t) for t in ("История", "Право")]
+        cls.teacher = Teacher.objects.create(full_name="Иванова Е.Ю.")
+        cls.groups = [StudentGroup.objects.create(code=c) for c in ("ГР-1", "ГР-2")]
+        cls.mon = date(2025, 9, 15)
+        cls.lesson = Lesson.objects.create(date=cls.mon, timeslot=cls.slot, group=cls.groups[0], discipline=cls.discs[0],
+                                           teacher=cls.teacher, lesson_type=cls.lecture, room=cls.rooms[0])
+
+    def setUp(self):
+        cache.clear()
+
+    def week(self, group="ГР-1", monday=None):
+        monday = monday or self.mon
+        r = self.client.get("/api/schedule/period/", {"group": group, "start": monday.isoformat(),
+                                                      "end": (monday + timedelta(days=6)).isoformat()})
+        return [(d["date"], i["discipline"]) for d in r.json() for i in d["items"] if not i.get("break")]
+
+    def lesson_queries(self, fn, *args):
+        with CaptureQueriesContext(connection) as ctx:
+            fn(*args)
+        return sum('"scheduleapp_lesson"' in q["sql"] for q in ctx.captured_queries)
+
+    def test_cached_week_is_served_without_lesson_queries(self):
+        self.assertEqual(self.week(), [("2025-09-15", "История")])
+        self.assertEqual(self.lesson_queries(self.week), 0)
+
+    def test_save_move_and_delete_invalidate_weeks(self):
+        self.week(); self.week("ГР-2"); self.week(monday=self.mon + timedelta(days=7))
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        lesson.discipline = self.discs[1]
+        lesson.save()
+        self.assertEqual(self.week(), [("2025-09-15", "Право")])
+
+        # переезд в другую группу и на следующую неделю: обе старые сетки тоже сброшены
+        lesson.group, lesson.date = self.groups[1], self.mon + timedelta(days=8)
+        lesson.save()
+        self.assertEqual(self.week(), [])
+        self.assertEqual(self.week("ГР-2", self.mon + timedelta(days=7)), [("2025-09-23", "Право")])
+
+        lesson.delete()
+        self.assertEqual(self.week("ГР-2", self.mon + timedelta(days=7)), [])
+
+    def test_signals_need_no_queries(self):
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        self.week()
+        with self.assertNumQueries(0):
+            post_save.send(sender=Lesson, instance=lesson, created=False)
+        self.assertEqual(self.lesson_queries(self.week), 1)  # сетка строится заново
+
+        hw = HomeworkItem(lesson=lesson, text="§ 1")
+        with self.assertNumQueries(0):
+            post_save.send(sender=HomeworkItem, instance=hw, created=True)
+        self.assertEqual(self.lesson_queries(self.week), 1)
+
+
+class ConditionalScheduleTests(TestCase):
+    """ETag / Last-Modified schedule_period: 304 без изменений, новый штамп после правки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.room = Room.objects.create(building=Building.objects.create(name="Главный"), name="101", capacity=30)
+        cls.slot = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))
+        cls.lecture = LessonType.objects.create(name="Лекция")
+        cls.disc = Discipline.objects.create(title="История")
+        cls.teachers = [Teacher.objects.create(full_name=f"Преподаватель {i}") for i in range(2)]
+        cls.groups = [StudentGroup.objects.create(code=c) for c in ("ГР-1", "ГР-2")]
+        cls.lessons = [
+            Lesson.objects.create(date=date(2025, 9, 15), timeslot=cls.slot, group=g, discipline=cls.disc,
+                                  teacher=t, lesson_type=cls.lecture, room=None, is_remote=True)
+            for g, t in zip(cls.groups, cls.teachers)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, group="ГР-1", **headers):
+        return self.client.get("/api/schedule/period/", {"group": group, "start": "2025-09-15", "end": "2025-09-21"},
+                               **headers)
+
+    def test_etag_and_last_modified_give_304(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"] and first["Last-Modified"])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+        self.assertEqual(versions.stats()["schedule_period"], {"hits": 2, "misses": 2, "ratio": 0.5})
+
+    def test_stamp_moves_after_lesson_and_timeslot_changes(self):
+        etag = self.get()["ETag"]
+        other = Lesson.objects.get(pk=self.lessons[1].pk)
+        other.remote_platform = "Teams"
+        other.save()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)  # чужая группа — ETag тот же
+
+        lesson = Lesson.objects.get(pk=self.lessons[0].pk)
+        lesson.remote_platform = "Teams"
+        lesson.save()
+        r = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+        etag = r["ETag"]
+        self.slot.end_time = time(10, 35)
+        self.slot.save()  # слоты — глобальная область
+        r = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()[0]["items"][0]["time"], "09:00–10:35")
+
+
+class IcsFeedTests(TestCase):
+    """Лента ICS: свёртка строк по 75 октетов без разрыва UTF-8, экранирование TEXT, кэш тела."""
+
+    @classmethod
+    def setUpTestData(cls):
+        room = Room.objects.create(building=Building.objects.create(name="Главный"), name="101", capacity=30)
+        slot = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))
+        lesson = Lesson.objects.create(
+            date=date(2025, 9, 15), timeslot=slot, group=StudentGroup.objects.create(code="ГР-1"),
+            discipline=Discipline.objects.create(title="Право; теория, практика и история государства Российского"),
+            teacher=Teacher.objects.create(full_name="Иванова Е.Ю."), lesson_type=LessonType.objects.create(name="Лекция"),
+            room=room,
+        )
+        HomeworkItem.objects.create(lesson=lesson, text="§ 3\nвопросы 1, 2; C:\\temp")
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self):
+        r = self.client.get("/api/export/ics/feed/", {"group": "ГР-1", "start": "2025-09-15", "end": "2025-09-21"})
+        self.assertEqual(r.status_code, 200)
+        return b"".join(r.streaming_content) if r.streaming else r.content
+
+    def test_folding_and_escaping(self):
+        body = self.feed()
+        self.assertTrue(body.endswith(b"END:VCALENDAR\r\n"))
+        physical = body.split(b"\r\n")[:-1]
+        self.assertTrue(all(len(line) <= 75 for line in physical))
+        self.assertTrue(any(line.startswith(b" ") for line in physical))  # длинные строки свёрнуты
+        for line in physical:
+            line.decode("utf-8")  # перенос не режет многобайтовый символ
+        lines = body.decode("utf-8").replace("\r\n ", "").split("\r\n")
+        self.assertIn("SUMMARY:Право\\; теория\\, практика и история государства Российского — ГР-1 (Лекция)", lines)
+        self.assertIn("LOCATION:Главный 101", lines)
+        desc = next(l for l in lines if l.startswith("DESCRIPTION:"))
+        self.assertEqual(desc, "DESCRIPTION:Преподаватель: Иванова Е.Ю.\\nФормат: очный"
+                               "\\nДЗ: § 3\\nвопросы 1\\, 2\\; C:\\\\temp")
+        self.assertIn("REFRESH-INTERVAL;VALUE=DURATION:PT15M", lines)
+
+    def test_unchanged_feed_is_served_from_cache(self):
+        body = self.feed()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.feed(), body)
+        self.assertFalse(any('"scheduleapp_lesson"' in q["sql"] for q in ctx.captured_queries))
+
+    def test_export_body_is_fixed_by_etag(self):
+        self.client.force_login(User.objects.create_user("viewer", password="x"))
+        params = {"group": "ГР-1", "start": "2025-09-15", "end": "2025-09-21"}
+        first = self.client.get("/api/export/ics/", params)
+        later = timezone.now() + timedelta(hours=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            second = self.client.get("/api/export/ics/", params)
+        self.assertEqual(first["ETag"], second["ETag"])
+        body = b"".join(first.streaming_content)
+        self.assertEqual(b"".join(second.streaming_content), body)
+        stamp = parsedate_to_datetime(first["Last-Modified"]).strftime("%Y%m%dT%H%M%SZ")
+        self.assertIn(f"DTSTAMP:{stamp}".encode(), body)
+
+
+def _read_npy(data: bytes):
+    """(descr, shape, значения) из .npy 1.0 — без numpy, как его пишет exports._npy."""
+    assert data[:8] == b"\x93NUMPY\x01\x00"
+    hlen = int.from_bytes(data[8:10], "little")
+    header = ast.literal_eval(data[10:10 + hlen].decode("latin1"))
+    assert (10 + hlen) % 64 == 0
+    raw, descr = data[10 + hlen:], header["descr"]
+    if descr.startswith("<U"):
+        width = int(descr[2:])
+        values = [raw[i:i + 4 * width].decode("utf-32-le").rstrip("\0") for i in range(0, len(raw), 4 * width)]
+    else:
+        values = array({"<i8": "q", "<M8[D]": "q", "<i2": "h", "|b1": "b", "<i4": "i"}[descr], raw).tolist()
+    return descr, header["shape"], values
+
+
+class ColumnarExportTests(TestCase):
+    """period_all?format=npz|parquet: раскладка колонок и словарей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        room = Room.objects.create(building=Building.objects.create(name="Главный"), name="101", capacity=30)
+        slots = [TimeSlot.objects.create(order=o, start_time=time(8 + o), end_time=time(9 + o)) for o in (1, 2)]
+        lecture = LessonType.objects.create(name="Лекция")
+        disc = Discipline.objects.create(title="История")
+        cls.groups = [StudentGroup.objects.create(code=c) for c in ("ГР-2", "ГР-1")]
+        for g, slot, remote in ((cls.groups[0], slots[1], False), (cls.groups[1], slots[0], True), (cls.groups[0], slots[0], False)):
+            teacher = Teacher.objects.create(full_name=f"Преподаватель {g.code}")
+            Lesson.objects.create(date=date(2025, 9, 15), timeslot=slot, group=g, discipline=disc, teacher=teacher,
+                                  lesson_type=lecture, room=None if remote else room, is_remote=remote,
+                                  remote_platform="Teams" if remote else "")
+        cls.admin = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def get(self, fmt):
+        self.client.force_login(self.admin)
+        return self.client.get("/api/admin/schedule/period_all/", {"start": "2025-09-15", "end": "2025-09-21", "format": fmt})
+
+    def test_npz_layout(self):
+        r = self.get("npz")
+        self.assertEqual(r["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(r.streaming_content))) as zf:
+            cols = {name[:-4]: _read_npy(zf.read(name)) for name in zf.namelist()}
+        expected = {"id", "date", "slot", "is_remote"} | {c for name in exports.DICT_COLUMNS for c in (name, f"{name}_values")}
+        self.assertEqual(set(cols), expected)
+        self.assertEqual({k: cols[k][:2] for k in ("id", "date", "slot", "is_remote", "group")}, {
+            "id": ("<i8", (3,)), "date": ("<M8[D]", (3,)), "slot": ("<i2", (3,)),
+            "is_remote": ("|b1", (3,)), "group": ("<i4", (3,)),
+        })
+        # порядок — дата, пара, группа; словари — по первому появлению, -1 — пусто
+        self.assertEqual(cols["slot"][2], [1, 1, 2])
+        self.assertEqual(cols["date"][2], [(date(2025, 9, 15) - date(1970, 1, 1)).days] * 3)
+        self.assertEqual(cols["group_values"][2], ["ГР-1", "ГР-2"])
+        self.assertEqual(cols["group"][2], [0, 1, 1])
+        self.assertEqual(cols["is_remote"][2], [1, 0, 0])
+        self.assertEqual((cols["room"][2], cols["room_values"][2]), ([-1, 0, 0], ["101"]))
+        self.assertEqual((cols["remote_platform"][2], cols["remote_platform_values"][2]), ([0, -1, -1], ["Teams"]))
+
+    @skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow не установлен")
+    def test_parquet_layout(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pq.read_table(io.BytesIO(b"".join(self.get("parquet").streaming_content)))
+        self.assertEqual(table.schema.field("date").type, pa.date32())
+        self.assertEqual(table.schema.field("group").type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertEqual(table.column("group").to_pylist(), ["ГР-1", "ГР-2", "ГР-2"])
+        self.assertEqual(table.column("room").to_pylist(), [None, "101", "101"])
+
+    @skipIf(importlib.util.find_spec("pyarrow"), "pyarrow установлен")
+    def test_parquet_without_pyarrow_is_400(self):
+        self.assertEqual(self.get("parquet").status_code, 400)
+
+
+class StudioLessonsPageTests(TestCase):
+    """Студия: страницы занятий по курсору (date, пара, id), фильтры и fields."""
+
+    @classmethod
+    def setUpTestData(cls):
+        slots = [TimeSlot.objects.create(order=o, start_time=time(8 + o), end_time=time(9 + o)) for o in (1, 2)]
+        lecture = LessonType.objects.create(name="Лекция")
+        disc = Discipline.objects.create(title="История")
+        cls.groups = [StudentGroup.objects.create(code=f"ГР-{i}") for i in range(3)]
+        # вставляем в обратном порядке, чтобы id не совпадал с порядком страниц
+        for day in (date(2025, 9, 16), date(2025, 9, 15)):
+            for slot in reversed(slots):
+                for g in cls.groups:
+                    Lesson.objects.create(date=day, timeslot=slot, group=g, discipline=disc, lesson_type=lecture,
+                                          teacher=Teacher.objects.create(full_name=f"П {g.code}"), is_remote=True)
+        cls.admin = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def page(self, **params):
+        r = self.client.get("/api/studio/lessons/", params)
+        self.assertEqual(r.status_code, 200, r.content)
+        return r.json()
+
+    def test_cursor_pages_follow_key_order(self):
+        expected = list(Lesson.objects.order_by("date", "timeslot__order", "id").values_list("id", flat=True))
+        seen, after, pages = [], None, 0
+        while True:
+            data = self.page(limit=5, **({"after": after} if after else {}))
+            seen += [r["id"] for r in data["results"]]
+            pages += 1
+            after = data["next"]
+            if not after:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)  # 12 строк по 5
+
+    def test_filters_and_fields(self):
+        group = self.groups[1]
+        data = self.page(group=group.id, start="2025-09-16", fields="group__code,room_id")
+        self.assertEqual(len(data["results"]), 2)
+        self.assertEqual(set(data["results"][0]), {"id", "date", "timeslot__order", "group__code", "room_id"})
+        self.assertEqual({r["group__code"] for r in data["results"]}, {group.code})
+        self.assertEqual({r["date"] for r in data["results"]}, {"2025-09-16"})
+        self.assertIsNone(data["next"])
+
+        r = self.client.get("/api/studio/lessons/", {"fields": "id,password"})
+        self.assertEqual((r.status_code, r.json()["error"]), (400, "Неизвестные поля: password"))
+        self.assertEqual(self.client.get("/api/studio/lessons/", {"after": "2025-09-15,1"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/studio/lessons/", {"limit": "0"}).status_code, 400)
+
+
+class SuggestTests(TestCase):
+    """/api/suggest/: ранжирование и точечное обновление индекса после сохранения справочника."""
+
+    @classmethod
+    def setUpTestData(cls):
+        StudentGroup.objects.create(code="ИСП-31")
+        Discipline.objects.create(title="Испанский язык")
+        Discipline.objects.create(title="Основы испытаний")
+        Teacher.objects.create(full_name="Алиспов И.И.")
+        Teacher.objects.create(full_name="Петров П.П.")
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(suggest_index, "_index", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def labels(self, q, **params):
+        r = self.client.get("/api/suggest/", {"q": q, **params})
+        self.assertEqual(r.status_code, 200)
+        return [(it["type"], it["label"]) for it in r.json()]
+
+    def test_ranking(self):
+        # начало строки (короче — выше) → начало слова → середина слова
+        self.assertEqual(self.labels("исп"), [
+            ("group", "ИСП-31"), ("discipline", "Испанский язык"),
+            ("discipline", "Основы испытаний"), ("teacher", "Алиспов И.И."),
+        ])
+        self.assertEqual(self.labels("исп31"), [("group", "ИСП-31")])  # без дефиса
+        self.assertEqual(self.labels("ис", types="discipline"), [("discipline", "Испанский язык"),
+                                                                 ("discipline", "Основы испытаний")])
+        self.assertEqual(self.labels("исп", per_type=1), [
+            ("group", "ИСП-31"), ("discipline", "Испанский язык"), ("teacher", "Алиспов И.И."),
+        ])
+
+    def test_save_patches_index_in_place(self):
+        self.labels("исп")
+        index = suggest_index.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher = Teacher.objects.create(full_name="Испанова Е.Ю.")
+        self.assertIn(("teacher", "Испанова Е.Ю."), self.labels("испан"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher.full_name = "Смирнова Е.Ю."
+            teacher.save()
+        self.assertNotIn(("teacher", "Испанова Е.Ю."), self.labels("испан"))
+        self.assertEqual(self.labels("смирн"), [("teacher", "Смирнова Е.Ю.")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            teacher.delete()
+        self.assertEqual(self.labels("смирн"), [])
+        self.assertIs(suggest_index.get_index(), index)  # правки применены точечно, без перестройки
+
+    def test_foreign_bump_before_commit_forces_rebuild(self):
+        self.labels("исп")
+        index = suggest_index.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Teacher.objects.create(full_name="Испанова Е.Ю.")
+            # другой процесс: bulk_create без сигналов и только сдвиг глобального штампа
+            Teacher.objects.bulk_create([Teacher(full_name="Испытателев И.И.")])
+            versions.bump(versions.GLOBAL)
+        self.assertIs(suggest_index._index, index)
+        self.assertIn(("teacher", "Испытателев И.И."), self.labels("испыт"))
+        self.assertIsNot(suggest_index.get_index(), index)
+
+
+@override_settings(INSTRUMENTATION=True, INSTRUMENTATION_BUFFER=4, INSTRUMENTATION_DUMP_SECONDS=0)
+class InstrumentationTests(TestCase):
+    """InstrumentationMiddleware и core.metrics: включение, SQL и дубли, потоковые ответы, сводка."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(metrics, "_buffer", None)  # буфер с maxlen из настроек теста
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def entries(self):
+        return list(metrics._ring())
+
+    def test_disabled_by_default(self):
+        with override_settings(INSTRUMENTATION=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                InstrumentationMiddleware(lambda request: HttpResponse())
+            self.client.get("/api/suggest/", {"q": "ис"})
+        self.assertEqual(self.entries(), [])
+
+    def test_queries_and_duplicates(self):
+        def view(request):
+            for pk in range(4):
+                Teacher.objects.filter(pk=pk).exists()  # один шаблон SQL — N+1
+            StudentGroup.objects.count()
+            return HttpResponse("ok")
+
+        InstrumentationMiddleware(view)(RequestFactory().get("/x/"))
+        [entry] = self.entries()
+        self.assertEqual((entry["name"], entry["status"], entry["size"]), ("<unresolved>", 200, 2))
+        self.assertEqual((entry["queries"], entry["duplicates"]), (5, 3))
+        [top] = entry["top"]
+        self.assertEqual(top["count"], 4)
+        self.assertTrue(top["site"].startswith("api/tests.py:"), top["site"])
+
+    def test_streaming_response_is_recorded_when_consumed(self):
+        def chunks():
+            for code in ("ГР-1", "ГР-2"):
+                StudentGroup.objects.filter(code=code).exists()  # SQL во время отдачи тела
+                yield b"abc"
+
+        response = InstrumentationMiddleware(lambda request: StreamingHttpResponse(chunks()))(
+            RequestFactory().get("/x/"))
+        self.assertEqual(self.entries(), [])  # тело ещё не прочитано
+        self.assertEqual(b"".join(response.streaming_content), b"abcabc")
+        [entry] = self.entries()
+        self.assertEqual((entry["queries"], entry["duplicates"], entry["size"]), (2, 1, 6))
+
+    def test_percentiles_and_ring_eviction(self):
+        for wall in (100, 10, 20, 30, 40, 50):
+            metrics.record("view", "GET", 200, wall, None, metrics.QueryRecorder())
+        summary = metrics.summary()
+        self.assertEqual((summary["requests"], summary["buffer"]), (4, 4))  # 100 и 10 вытеснены
+        [row] = summary["endpoints"]
+        self.assertEqual((row["count"], row["p50"], row["p95"], row["max"]), (4, 35.0, 48.5, 50))
+        self.assertIsNone(row["size_mean"])
+
+    def test_endpoint_is_admin_only(self):
+        self.client.get("/api/suggest/", {"q": "ис"})
+        self.assertEqual(self.client.get("/api/admin/metrics/").status_code, 302)
+        self.client.force_login(User.objects.create_user("user", password="x"))
+        self.assertEqual(self.client.get("/api/admin/metrics/").status_code, 302)
+
+        self.client.force_login(User.objects.create_user("admin", password="x", is_staff=True))
+        r = self.client.get("/api/admin/metrics/", {"sort": "count"})
+        self.assertEqual(r.status_code, 200)
+        self.assertIn("api.views.suggest", [row["name"] for row in r.json()["endpoints"]])
+        self.assertEqual(self.client.delete("/api/admin/metrics/").status_code, 200)
+        self.assertEqual(self.entries()[-1]["method"], "DELETE")  # после сброса — только сам DELETE
+        self.assertEqual(len(self.entries()), 1)
+
+
+class RanepaConflictsReportTests(TestCase):
+    """Отчёт ranepa_conflicts: один проход по занятиям диапазона, потоки не считаются конфликтом."""
+
+    URL = "/api/integrations/ranepa/conflicts/"
+    DAY = date(2025, 9, 15)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.building = Building.objects.create(name="Главный")
+        cls.slot = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))
+        cls.lecture = LessonType.objects.create(name="Лекция")
+        cls.disc = Discipline.objects.create(title="История")
+        cls.admin = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.n = 0
+
+    def lesson(self, day, teacher, room, **kwargs):
+        # bulk_create: накладки в базе бывают (импорт потоков, update()), full_clean их бы не пустил
+        self.n += 1
+        group = StudentGroup.objects.create(code=f"ГР-{self.n}")
+        [lesson] = Lesson.objects.bulk_create([Lesson(
+            date=day, timeslot=self.slot, group=group, discipline=self.disc, lesson_type=self.lecture,
+            teacher=teacher, room=room, **kwargs)])
+        return lesson
+
+    def room(self, name):
+        return Room.objects.create(building=self.building, name=name, capacity=30)
+
+    def clashes(self, day):
+        """Легальный поток, накладка преподавателя и накладка аудитории в одной ячейке."""
+        t1, t2, t3, t4 = (Teacher.objects.create(full_name=f"Преподаватель {day:%d}-{i}") for i in range(4))
+        hall, r2, r3, r4 = (self.room(f"{day:%d}-{i}") for i in range(4))
+        return {
+            "stream": [self.lesson(day, t1, hall, is_stream=True) for _ in range(2)],
+            "teacher": [self.lesson(day, t2, r2), self.lesson(day, t2, r3)],
+            "room": [self.lesson(day, t3, r4), self.lesson(day, t4, r4)],
+        }
+
+    def report(self, day, end=None, **params):
+        r = self.client.get(self.URL, {"start": day.isoformat(), "end": (end or day).isoformat(), **params})
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def test_report(self):
+        made = self.clashes(self.DAY)
+        a, b = made["teacher"]
+        c, d = made["room"]
+        day = self.DAY.isoformat()
+        self.assertEqual(self.report(self.DAY), {
+            "teacher": [{
+                "date": day, "slot": self.slot.id, "teacher": a.teacher.full_name,
+                "lessons": [{"id": l.id, "group__code": l.group.code, "room__name": l.room.name, "is_remote": False}
+                            for l in (a, b)],
+                "reason": "Преподаватель назначен на несколько пар в один слот",
+            }],
+            "room": [{
+                "date": day, "slot": self.slot.id, "room": c.room.name, "building": "Главный",
+                "lessons": [{"id": l.id, "group__code": l.group.code, "teacher__full_name": l.teacher.full_name}
+                            for l in (c, d)],
+                "reason": "Аудитория занята несколькими парами",
+            }],
+            # (date, timeslot, group) уникальны в базе — накладка группы проверяется ниже, без БД
+            "group": [],
+        })
+        self.assertEqual(self.report(self.DAY, format="summary"),
+                         {"teacher": 1, "room": 1, "group": 0, "total": 2, "lessons": 6})
+
+    def test_stream_needs_every_lesson_flagged(self):
+        made = self.clashes(self.DAY)
+        first, second = made["stream"]
+        Lesson.objects.filter(pk=second.pk).update(is_stream=False)  # преподаватель в потоке и вне его
+        summary = self.report(self.DAY, format="summary")
+        self.assertEqual((summary["teacher"], summary["room"]), (2, 2))
+
+    def test_group_clash(self):
+        row = {"teacher_id": None, "room_id": None, "group_id": 1, "group__code": "ГР-1",
+               "discipline__title": "История", "teacher__full_name": None}
+        out = {"teacher": [], "room": [], "group": []}
+        _cell_conflicts(self.DAY, 1, [{**row, "id": 1}, {**row, "id": 2, "discipline__title": "Право"}], out)
+        self.assertEqual(out["group"], [{
+            "date": self.DAY.isoformat(), "slot": 1, "group": "ГР-1",
+            "lessons": [{"id": 1, "discipline__title": "История", "teacher__full_name": None},
+                        {"id": 2, "discipline__title": "Право", "teacher__full_name": None}],
+            "reason": "На группу назначено >1 пары в один слот",
+        }])
+
+    def queries(self, end):
+        with CaptureQueriesContext(connection) as ctx:
+            self.report(self.DAY, end)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_collisions(self):
+        self.clashes(self.DAY)
+        few = self.queries(self.DAY + timedelta(days=6))
+        for i in range(1, 6):
+            self.clashes(self.DAY + timedelta(days=i))
+        self.assertEqual(self.report(self.DAY, self.DAY + timedelta(days=6), format="summary")["total"], 12)
+        self.assertEqual(self.queries(self.DAY + timedelta(days=6)), few)
+
+
+class BatchConflictValidationTests(TestCase):
+    """validate_lessons: правила потоков как в ranepa_conflicts и постоянное число запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name="Корпус")
+        cls.rooms = [Room.objects.create(building=building, name=f"{i}", capacity=0) for i in range(1, 4)]
+        cls.slot = TimeSlot.objects.create(order=1, start_time=time(9), end_time=time(10, 30))
+        cls.lecture = LessonType.objects.create(name="Лекция")
+        cls.stream = LessonType.objects.create(name="Лекция (поток)")
+        cls.disc = Discipline.objects.create(title="История")
+        cls.teachers = [Teacher.objects.create(full_name=f"Преподаватель {i}") for i in range(2)]
+        cls.groups = [StudentGroup.objects.create(code=f"П-{i}") for i in range(4)]
+        cls.day = date(2025, 9, 15)
+        Lesson.objects.create(date=cls.day, timeslot=cls.slot, group=cls.groups[0], discipline=cls.disc,
+                              teacher=cls.teachers[0], lesson_type=cls.lecture, room=cls.rooms[0])
+
+    def _lesson(self, group, teacher, room, lesson_type=None, **extra):
+        return Lesson(date=self.day, timeslot=self.slot, group=group, discipline=self.disc, teacher=teacher,
+                      lesson_type=lesson_type or self.lecture, room=room, **extra)
+
+    def test_teacher_room_and_group_clashes(self):
+        res = validate_lessons([
+            self._lesson(self.groups[1], self.teachers[0], self.rooms[1]),   # преподаватель занят
+            self._lesson(self.groups[2], self.teachers[1], self.rooms[0]),   # аудитория занята
+            self._lesson(self.groups[3], self.teachers[1], self.rooms[2]),   # тот же преподаватель в пачке
+        ])
+        self.assertEqual(set(res[0]), {"teacher"})
+        self.assertEqual(set(res[1]), {"room", "teacher"})
+        self.assertEqual(set(res[2]), {"teacher"})
+
+    def test_replacing_same_group_cell_and_legal_stream(self):
+        # кандидат той же группы в той же ячейке замещает существующее занятие — не конфликт
+        self.assertEqual(validate_lessons([self._lesson(self.groups[0], self.teachers[0], self.rooms[0])]), [{}])
+        # без замещения (новые записи генератора) занятие группы в ячейке — занятость
+        res = validate_lessons([self._lesson(self.groups[0], self.teachers[1], self.rooms[1])], replace=False)
+        self.assertEqual(set(res[0]), {"group"})
+        # поток: один преподаватель, одна аудитория, одинаковые дисциплина/тип — не конфликт
+        Lesson.objects.all().delete()
+        res = validate_lessons([
+            self._lesson(g, self.teachers[0], self.rooms[0], lesson_type=self.stream, is_stream=True)
+            for g in self.groups
+        ])
+        self.assertEqual(res, [{}] * len(self.groups))
+
+    def test_query_count_is_constant(self):
+        extra = [StudentGroup(code=f"X-{i}") for i in range(300)]
+        StudentGroup.objects.bulk_create(extra)
+        batch = [self._lesson(g, None, None) for g in StudentGroup.objects.filter(code__startswith="X-")]
+        with self.assertNumQueries(2):
+            res = validate_lessons(batch)
+        self.assertEqual(res, [{}] * len(batch))
+
+
+class RanepaStub:
+    """
+    Локальный HTTP-сервер с записанными страницами недель (api/testdata/ranepa/<slug>.html).
+    fail={slug: [статус, ...]} — первые ответы для недели; delay — пауза на ответ;
+    validators — отдавать ETag/Last-Modified и отвечать 304 на условный запрос;
+    pages={slug: html} — подменить содержимое недели.
+    Считает запросы, соединения (порты клиентов) и максимум одновременных запросов.
+    """
+
+    def __init__(self, fail=None, delay=0.0, validators=False):
+        self.fail = {k: list(v) for k, v in (fail or {}).items()}
+        self.delay = delay
+        self.validators = validators
+        self.pages = {}
+        self.headers = []
+        self.requests, self.peers = [], set()
+        self.active = self.max_active = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive: видно, переиспользует ли клиент соединения
+
+            def do_GET(self):
+                slug = self.path.strip("/")
+                with stub.lock:
+                    stub.requests.append(slug)
+                    stub.headers.append(dict(self.headers))
+                    stub.peers.add(self.client_address)
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    queued = stub.fail.get(slug)
+                    status = queued.pop(0) if queued else None
+                try:
+                    clock.sleep(stub.delay)
+                    page = RANEPA_PAGES / f"{slug}.html"
+                    html = stub.pages.get(slug) or (page.read_text(encoding="utf-8") if page.exists() else None)
+                    if status is None:
+                        status = 200 if html is not None else 404
+                    body = html.encode() if status == 200 else b"error"
+                    etag = f'"{ranepa_pages.sha256(html)[:16]}"' if html is not None else None
+                    if status == 200 and stub.validators and self.headers.get("If-None-Match") == etag:
+                        status, body = 304, b""
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    if stub.validators and etag:
+                        self.send_header("ETag", etag)
+                        self.send_header("Last-Modified", "Fri, 26 Sep 2025 10:00:00 GMT")
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub.lock:
+                        stub.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RanepaRangeFetchTests(SimpleTestCase):
+    """fetch_range_from_ranepa: все недели диапазона, общий пул соединений, ограничение параллельности, повторы."""
+
+    def test_week_mondays(self):
+        self.assertEqual(week_mondays(date(2025, 9, 10), date(2025, 9, 30)),
+                         [date(2025, 9, 8), date(2025, 9, 15), date(2025, 9, 22), date(2025, 9, 29)])
+        self.assertEqual(week_mondays(date(2025, 9, 8), date(2025, 9, 13)), [date(2025, 9, 8)])
+
+    def test_fetches_all_weeks_with_bounded_concurrency(self):
+        with RanepaStub(delay=0.05) as stub:
+            items, weeks = fetch_range_from_ranepa("", "group", 1, "2025-09-08", "2025-10-04",
+                                                   base=stub.url, concurrency=2)
+        self.assertEqual([w["slug"] for w in weeks], ["sep08-sep13", "sep15-sep20", "sep22-sep27", "sep29-oct04"])
+        self.assertEqual(sorted(stub.requests), sorted(w["slug"] for w in weeks))
+        self.assertEqual(stub.max_active, 2)
+        self.assertLessEqual(len(stub.peers), 2)  # соединения пула переиспользуются между неделями
+        self.assertTrue(all(w["status"] == 200 and w["attempts"] == 1 and w["items"] > 0 for w in weeks))
+        self.assertTrue(all(w["fetch_ms"] >= 50 for w in weeks))
+        self.assertEqual(len(items), sum(w["items"] for w in weeks))
+        self.assertEqual(items[0]["date"], "2025-09-08")
+        self.assertEqual(items[-1]["date"], "2025-10-04")
+        self.assertEqual([it["date"] for it in items], sorted(it["date"] for it in items))
+
+    def test_single_connection_when_serial(self):
+        with RanepaStub() as stub:
+            _, weeks = fetch_range_from_ranepa("", "group", 1, "2025-09-08", "2025-09-27",
+                                               base=stub.url, concurrency=1)
+        self.assertEqual(len(weeks), 3)
+        self.assertEqual(len(stub.peers), 1)
+
+    def test_range_is_trimmed_to_start_end(self):
+        with RanepaStub() as stub:
+            items, weeks = fetch_range_from_ranepa("", "group", 1, "2025-09-10", "2025-09-16", base=stub.url)
+        self.assertEqual(len(weeks), 2)
+        self.assertTrue(items)
+        self.assertTrue(all("2025-09-10" <= it["date"] <= "2025-09-16" for it in items))
+
+    def test_retries_transient_errors_and_reports_failures(self):
+        fail = {"sep08-sep13": [503, 502], "sep15-sep20": [503, 503, 503], "sep22-sep27": [404]}
+        with RanepaStub(fail=fail) as stub:
+            items, weeks = fetch_range_from_ranepa("", "group", 1, "2025-09-08", "2025-09-27",
+                                                   base=stub.url, retries=2, backoff=0.01)
+        ok, failed, missing = weeks
+        self.assertEqual((ok["status"], ok["attempts"]), (200, 3))
+        self.assertEqual((failed["status"], failed["attempts"], failed["items"]), (503, 3, 0))
+        self.assertIn("503", failed["error"])
+        self.assertEqual(stub.requests.count("sep15-sep20"), 3)
+        self.assertEqual(missing["status"], 404)  # 404 не повторяем
+        self.assertEqual(missing["attempts"], 1)
+        self.assertEqual(len(items), ok["items"])
+        self.assertTrue(all(it["date"] <= "2025-09-13" for it in items))
+
+
+class RanepaFetchViewTests(TestCase):
+    """GET /api/integrations/ranepa/fetch/ — диапазон недель с заглушкой вместо сайта."""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("ranepa_admin", password=None))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        media = override_settings(MEDIA_ROOT=tmp.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_range_and_week_timing(self):
+        with RanepaStub() as stub, override_settings(RANEPA_BASE_URL=stub.url):
+            r = self.client.get("/api/integrations/ranepa/fetch/",
+                                {"start": "2025-09-08", "end": "2025-09-20", "q": "23ИСПп3"})
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual([w["slug"] for w in data["weeks"]], ["sep08-sep13", "sep15-sep20"])
+        self.assertTrue(data["items"])
+        self.assertTrue(all("23ИСПп3" in it["group"] for it in data["items"]))
+
+    def test_offline_replays_stored_pages(self):
+        week = {"start": "2025-09-08", "end": "2025-09-13"}
+        with RanepaStub(validators=True) as stub, override_settings(RANEPA_BASE_URL=stub.url):
+            online = self.client.get("/api/integrations/ranepa/fetch/", week).json()
+        r = self.client.get("/api/integrations/ranepa/fetch/", {**week, "offline": "1"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["items"], online["items"])
+        self.assertEqual(r.json()["weeks"][0]["cache"], "offline")
+        with override_settings(RANEPA_PAGE_STORE=False):
+            r = self.client.get("/api/integrations/ranepa/fetch/", {**week, "offline": "1"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_bad_range_and_unreachable_site(self):
+        r = self.client.get("/api/integrations/ranepa/fetch/", {"start": "2025-09-20", "end": "2025-09-08"})
+        self.assertEqual(r.status_code, 400)
+        with RanepaStub(fail={"sep08-sep13": [500] * 5}) as stub, \
+                override_settings(RANEPA_BASE_URL=stub.url, RANEPA_FETCH_RETRIES=1, RANEPA_FETCH_BACKOFF=0.01):
+            r = self.client.get("/api/integrations/ranepa/fetch/", {"start": "2025-09-08", "end": "2025-09-13"})
+        self.assertEqual(r.status_code, 502)
+
+
+class RanepaParserTests(SimpleTestCase):
+    """
+    Разбор страницы недели сверяется с эталоном expected.json — его пишет прежний
+    разбор через BeautifulSoup (tools/bench_ranepa_parse.py --write-expected).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(RANEPA_PAGES / "expected.json", encoding="utf-8") as f:
+            cls.expected = json.load(f)
+
+    def page(self, slug):
+        return (RANEPA_PAGES / f"{slug}.html").read_text(encoding="utf-8")
+
+    def test_matches_legacy_parser_on_corpus(self):
+        self.assertEqual(set(self.expected), {p.stem for p in RANEPA_PAGES.glob("*.html")})
+        for slug, exp in self.expected.items():
+            for q, items in exp["queries"].items():
+                with self.subTest(slug=slug, q=q):
+                    self.assertEqual(_parse_week_html(self.page(slug), q=q, kind="group",
+                                                      week_start_iso=exp["week"]), items)
+
+    def test_streaming_chunks_give_same_items(self):
+        exp = self.expected["oct06-oct11"]
+        html = self.page("oct06-oct11")
+        whole = list(iter_week_html(html, "", "group", exp["week"]))
+        for size in (1, 7, 64):
+            chunks = (html[i:i + size] for i in range(0, len(html), size))
+            self.assertEqual(list(iter_week_html(chunks, "", "group", exp["week"])), whole)
+        key = lambda x: (x["date"], x["order"] if x["order"] is not None else 99)
+        self.assertEqual(sorted(whole, key=key), exp["queries"][""])
+
+    def test_iterator_yields_day_before_page_ends(self):
+        exp = self.expected["sep08-sep13"]
+        html = self.page("sep08-sep13")
+        cut = html.index("вторник |")
+        it = iter_week_html(iter([html[:cut], html[cut:]]), "", "group", exp["week"])
+        self.assertEqual(next(it)["date"], "2025-09-08")
+
+    def test_page_quirks(self):
+        items = _parse_week_html(self.page("oct06-oct11"), q="", kind="group", week_start_iso="2025-10-06")
+        by_key = {(it["date"], it["order"], it["group"]): it for it in items}
+        # &nbsp; и перенос строк внутри ячейки, <b> в виде занятия, тексты <script>/<template> не попадают
+        self.assertEqual(by_key[("2025-10-06", 1, "23ИСПп3-о9")]["teacher"], "Сёмин Д.В.")
+        self.assertEqual(by_key[("2025-10-06", 2, "24ЮРп1-о1")]["lesson_type"], "Практическое занятие")
+        self.assertEqual(by_key[("2025-10-06", 1, "24ЮРп1-о1")]["lesson_type"], "Лекция")
+        self.assertTrue(by_key[("2025-10-06", 2, "22ЭКп4-о3")]["is_remote"])
+        self.assertEqual(by_key[("2025-10-06", 2, "22ЭКп4-о3")]["discipline"], "R&D в экономике")
+        self.assertNotIn("Черновик", {it["discipline"] for it in items})
+        self.assertEqual({it["date"] for it in items}, {"2025-10-06", "2025-10-07", "2025-10-11"})
+        self.assertEqual(_parse_week_html("", q="", kind="group", week_start_iso="2025-10-06"), [])
+
+
+class RanepaPageStoreTests(SimpleTestCase):
+    """Хранилище страниц: условные запросы, разбор из кэша по хэшу, история версий, офлайн."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = Path(tmp.name)
+        self.store = ranepa_pages.PageStore(self.media / "ranepa_pages")
+
+    def fetch(self, stub, start="2025-09-08", end="2025-09-20", **kwargs):
+        return fetch_range_from_ranepa("", "group", 1, start, end, base=stub.url, store=self.store, **kwargs)
+
+    def test_conditional_get_reuses_page_and_parse(self):
+        with RanepaStub(validators=True) as stub:
+            items, weeks = self.fetch(stub)
+            self.assertEqual([w["cache"] for w in weeks], ["new", "new"])
+            with mock.patch("api.services.ranepa._parse_week_html", side_effect=AssertionError("разбор не из кэша")):
+                again, weeks2 = self.fetch(stub)
+        self.assertEqual(again, items)
+        self.assertEqual([(w["status"], w["cache"]) for w in weeks2], [(304, "not_modified")] * 2)
+        self.assertEqual([w["sha256"] for w in weeks2], [w["sha256"] for w in weeks])
+        sent = stub.headers[2:]
+        self.assertTrue(all(h.get("If-None-Match") and h.get("If-Modified-Since") for h in sent))
+        meta = self.store.meta("sep08-sep13")
+        self.assertEqual(meta["last_modified"], "Fri, 26 Sep 2025 10:00:00 GMT")
+        self.assertEqual(len(meta["history"]), 1)
+
+    def test_same_content_without_validators_and_new_version(self):
+        with RanepaStub() as stub:
+            _, weeks = self.fetch(stub, end="2025-09-13")
+            self.assertNotIn("If-None-Match", stub.headers[0])
+            with mock.patch("api.services.ranepa._parse_week_html", side_effect=AssertionError("разбор не из кэша")):
+                _, weeks = self.fetch(stub, end="2025-09-13")
+            self.assertEqual(weeks[0]["cache"], "unchanged")
+
+            html = (RANEPA_PAGES / "sep08-sep13.html").read_text(encoding="utf-8")
+            stub.pages["sep08-sep13"] = html.replace("Сёмин Д.В.", "Сёмина А.А.")
+            items, weeks = self.fetch(stub, end="2025-09-13")
+        self.assertEqual(weeks[0]["cache"], "changed")
+        self.assertIn("Сёмина А.А.", {it["teacher"] for it in items})
+        history = self.store.meta("sep08-sep13")["history"]
+        self.assertEqual([h["sha256"] for h in history][-1], weeks[0]["sha256"])
+        self.assertEqual(len(history), 2)
+
+    def test_parse_cache_is_per_query_and_parser_version(self):
+        with RanepaStub(validators=True) as stub:
+            all_items, weeks = self.fetch(stub, end="2025-09-13")
+            mine, _ = fetch_range_from_ranepa("23ИСПп3", "group", 1, "2025-09-08", "2025-09-13",
+                                              base=stub.url, store=self.store)
+        sha = weeks[0]["sha256"]
+        self.assertEqual(mine, [it for it in all_items if "23испп3" in it["group"].lower()])
+        self.assertEqual(self.store.parsed(sha, 2, "2025-09-08", "23испп3"), mine)
+        self.assertIsNone(self.store.parsed(sha, 99, "2025-09-08", ""))
+
+    def test_offline_replay_and_export(self):
+        with RanepaStub(validators=True) as stub:
+            items, _ = self.fetch(stub)
+        again, weeks = fetch_range_from_ranepa("", "group", 1, "2025-09-08", "2025-09-27",
+                                               store=self.store, offline=True)
+        self.assertEqual(again[:len(items)], items)
+        self.assertEqual([w["cache"] for w in weeks], ["offline"] * 3)
+        self.assertEqual(weeks[2]["error"], "страницы нет в хранилище")
+
+        out = self.media / "corpus"
+        with override_settings(MEDIA_ROOT=self.media):
+            call_command("export_ranepa_pages", str(out), stdout=open(os.devnull, "w"))
+        self.assertEqual(sorted(p.name for p in out.iterdir()), ["sep08-sep13.html", "sep15-sep20.html"])
+        self.assertEqual((out / "sep08-sep13.html").read_text(encoding="utf-8"),
+                         (RANEPA_PAGES / "sep08-sep13.html").read_text(encoding="utf-8"))
+
+
+class RanepaDiffImportTests(TestCase):
+    """ranepa_import пишет только разницу с базой по ключу (дата, пара, группа)."""
+
+    WEEK = {"start": "2025-09-08", "end": "2025-09-13"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for order in range(1, 7):
+            TimeSlot.objects.create(order=order, start_time=time(8 + order), end_time=time(9 + order))
+
+    def setUp(self):
+        page = (RANEPA_PAGES / "sep08-sep13.html").read_text(encoding="utf-8")
+        # страница записана вручную и местами с накладками — берём строки без них
+        self.items, busy = [], set()
+        for it in _parse_week_html(page, q="", kind="group", week_start_iso="2025-09-08"):
+            cell = (it["date"], it["order"])
+            groups = {(*cell, "g", g.strip()) for g in it["group"].split(",")}
+            keys = {(*cell, "t", it["teacher"])} | ({(*cell, "r", it["room"])} if it["room"] else set())
+            if not groups & busy and ("поток" in (it["lesson_type"] or "") or not keys & busy):
+                busy |= groups | keys
+                self.items.append(it)
+        report, _ = import_items(self.items, self.WEEK)
+        self.assertEqual(report["errors"], 0)
+        self.lessons = Lesson.objects.count()
+
+    def reimport(self, items, meta=None):
+        with CaptureQueriesContext(connection) as ctx:
+            report, _ = import_items(items, {**self.WEEK, **(meta or {})})
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].split()[0] in ("INSERT", "UPDATE", "DELETE")]
+        return report, writes
+
+    def test_unchanged_week_writes_nothing(self):
+        report, writes = self.reimport(self.items)
+        self.assertEqual(writes, [])
+        self.assertEqual(report["unchanged"], self.lessons)
+        self.assertEqual((report["created"], report["updated"], report["disappeared"]), (0, 0, 0))
+
+    def test_only_changed_and_new_rows_are_written(self):
+        items = [dict(it) for it in self.items]
+        moved = next(it for it in items if not it["is_remote"] and it["group"] == "24ЮРп1-о1")
+        moved["room"] = "999"
+        items.append({**moved, "order": 6, "room": "998"})
+        report, writes = self.reimport(items)
+        self.assertEqual((report["created"], report["updated"]), (1, 1))
+        self.assertEqual(report["unchanged"], self.lessons - 1)
+        lesson_writes = [sql for sql in writes if "scheduleapp_lesson" in sql]
+        self.assertEqual(len(lesson_writes), 2)  # один INSERT, один UPDATE
+        lesson = Lesson.objects.get(date=moved["date"], timeslot__order=moved["order"], group__code="24ЮРп1-о1")
+        self.assertEqual(lesson.room.name, "999")
+
+    def test_row_reverted_within_batch_is_not_written(self):
+        first = next(it for it in self.items if not it["is_remote"])
+        report, writes = self.reimport([{**first, "room": "999"}] + self.items)
+        self.assertEqual(report["updated"], 0)  # туда и обратно: в итоге как в базе
+        self.assertEqual([sql for sql in writes if "scheduleapp_lesson" in sql], [])
+
+    def test_disappeared_lessons_are_reported_and_deleted_on_request(self):
+        kept = self.items[2:]
+        report, writes = self.reimport(kept)
+        self.assertEqual(writes, [])
+        self.assertEqual(report["disappeared"], 2)
+        self.assertEqual({(m["date"], m["order"], m["group"]) for m in report["missing"]},
+                         {(it["date"], it["order"], it["group"]) for it in self.items[:2]})
+        self.assertEqual(Lesson.objects.count(), self.lessons)
+
+        report, _ = self.reimport(kept, {"delete_missing": True})
+        self.assertEqual(report["deleted"], 2)
+        self.assertEqual(Lesson.objects.count(), self.lessons - 2)
+
+    def test_lessons_not_created_by_import_survive_delete_missing(self):
+        imported = Lesson.objects.filter(group__code="24ЮРп1-о1").first()
+        self.assertEqual(imported.source, "RANEPA")
+        manual = Lesson.objects.create(
+            date=imported.date, timeslot=TimeSlot.objects.get(order=6), group=imported.group,
+            discipline=imported.discipline, lesson_type=imported.lesson_type,
+            teacher=Teacher.objects.create(full_name="Ручной Р.Р."),
+        )
+        HomeworkItem.objects.create(lesson=manual, text="§ 3")
+        report, _ = self.reimport(self.items, {"delete_missing": True})
+        self.assertEqual((report["disappeared"], report["deleted"]), (0, 0))
+        self.assertTrue(HomeworkItem.objects.filter(lesson=manual).exists())
+        self.assertEqual(Lesson.objects.count(), self.lessons + 1)
+
+    def test_filtered_source_only_compares_matching_lessons(self):
+        mine = [it for it in self.items if "23ИСПп3-о9" in it["group"]]
+        report, _ = self.reimport(mine, {"q": "23испп3-о9"})
+        self.assertEqual(report["disappeared"], 0)
+        self.assertEqual(report["unchanged"], len(mine))
+        # без q сравниваются все занятия групп пакета, группы вне пакета не считаются
+        report, _ = self.reimport(mine[1:])
+        self.assertEqual(report["disappeared"], 1)
+
+    def test_view_reports_diff_in_import_job(self):
+        from scheduleapp.models import ImportJob
+        self.client.force_login(User.objects.create_superuser("diff_admin", password=None))
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            r = self.client.post("/api/integrations/ranepa/import/",
+                                 json.dumps({"items": self.items[1:], "meta": self.WEEK}),
+                                 content_type="application/json")
+        self.assertEqual(r.status_code, 200)
+        totals = ImportJob.objects.get(pk=r.json()["job_id"]).totals
+        self.assertEqual((totals["unchanged"], totals["disappeared"], totals["updated"]),
+                         (self.lessons - 1, 1, 0))
+
+
+def _load_bench(name):
+    spec = importlib.util.spec_from_file_location(name, Path(__file__).resolve().parents[1] / "tools" / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class RanepaImportParityTests(TestCase):
+    """Пакетный импорт отдаёт тот же отчёт и то же состояние базы, что прежний построчный цикл."""
+
+    SEED = [  # уже в базе
+        {"date": "2025-09-08", "order": 1, "group": "Г-1", "teacher": "Антонов А.А.", "discipline": "Право",
+         "lesson_type": "Лекция", "room": "12"},
+        {"date": "2025-09-08", "order": 2, "group": "Г-2", "teacher": "Борисов Б.Б.", "discipline": "Право",
+         "lesson_type": "Лекция", "room": "14"},
+    ]
+    ITEMS = [
+        SEED[0],                                                    # без изменений
+        {**SEED[0], "group": "Г-3", "room": "15"},                  # преподаватель занят занятием из базы
+        {**SEED[1], "group": "Г-3", "teacher": "Власов В.В."},      # аудитория занята
+        {**SEED[1], "teacher": "Гусев Г.Г.", "room": "16"},         # правка занятия освобождает ячейку…
+        {**SEED[1], "group": "Г-3"},                                # …и строка ниже её занимает
+        {"date": "2025-09-08", "order": 3, "group": "Г-1, Г-2", "teacher": "Дмитриев Д.Д.",
+         "discipline": "История", "lesson_type": "Лекция (поток)", "room": "20"},
+        {"date": "2025-09-08", "order": 3, "group": "Г-3", "teacher": "Егоров Е.Е.",
+         "discipline": "Физическая культура", "lesson_type": "Практика", "room": "20"},
+        {"date": "2025-09-08", "order": 4, "group": "Г-3", "teacher": "Дмитриев Д.Д.", "discipline": "Новая",
+         "lesson_type": "Практика", "is_remote": True, "remote_platform": "СДО"},
+        {"date": "2025-09-08", "order": 4, "group": "Г-1", "teacher": "Дмитриев Д.Д.", "discipline": "Право",
+         "lesson_type": "Практика", "is_remote": True, "remote_platform": "СДО"},  # накладка строкой выше
+        {"date": "2025-09-08", "order": 4, "group": "Г-2", "teacher": "", "discipline": "Право",
+         "lesson_type": "Практика", "room": "21"},                  # без преподавателя
+        {"date": "31.02", "order": 1, "group": "Г-1"},
+        {"date": "2025-09-08", "order": "", "group": "Г-1"},
+        {"date": "2025-09-08", "order": 9, "group": "Г-1"},
+    ]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.bench = _load_bench("bench_ranepa_import")  # legacy_import, run (в транзакции с откатом)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        for order in range(1, 5):
+            TimeSlot.objects.create(order=order, start_time=time(8 + order), end_time=time(9 + order))
+
+    def setUp(self):
+        report, _ = import_items(self.SEED)
+        self.assertEqual(report["created"], 2)
+
+    def assertSameAsLegacy(self, items):
+        _, _, legacy, legacy_state = self.bench.run(self.bench.legacy_import, items)
+        _, _, report, state = self.bench.run(import_items, items)
+        for key in ("created", "skipped", "errors", "reasons", "samples"):
+            self.assertEqual(report[key], legacy[key], key)
+        self.assertEqual(state, legacy_state)
+        return report, legacy
+
+    def test_first_import(self):
+        report, legacy = self.assertSameAsLegacy(self.ITEMS)
+        # прежний импорт считал «обновлёнными» и строки без изменений
+        self.assertEqual(report["updated"] + report["unchanged"], legacy["updated"])
+        self.assertEqual(report["reasons"]["ValidationError"], 4)
+        self.assertEqual(report["samples"][0]["messages"], {"teacher": ["Преподаватель уже занят в этот слот"]})
+        self.assertEqual(report["samples"][1]["messages"], {"room": ["Аудитория занята"]})
+
+    def test_repeated_import(self):
+        import_items(self.ITEMS)
+        report, _ = self.assertSameAsLegacy(self.ITEMS)
+        # прежний считал каждую строку поверх занятия, здесь — только занятия, записанные в базу
+        self.assertEqual((report["created"], report["updated"]), (0, 0))
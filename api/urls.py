@@ -4,6 +4,7 @@ from .views import ranepa_conflicts
 from django.views.generic import TemplateView
 
 urlpatterns = [
+    path("suggest/", views.suggest),
     path("suggest/groups/", views.suggest_groups),
     path("suggest/teachers/", views.suggest_teachers),
     path("suggest/disciplines/", views.suggest_disciplines),
@@ -18,10 +19,16 @@ urlpatterns = [
     path("teacher/me/schedule/", views.teacher_me_schedule),
     path("teacher/me/stats/", views.teacher_me_stats),
     path("admin/generate/", views.admin_generate_schedule),
+    path("admin/generate/jobs/", views.admin_generate_jobs),
+    path("admin/generate/jobs/<int:pk>/", views.admin_generate_job),
+    path("admin/generate/jobs/<int:pk>/cancel/", views.admin_generate_job_cancel),
+    path("admin/generate/incremental/", views.admin_generate_incremental),
     path("admin/groups/", views.admin_list_groups),
     path("admin/teachers/", views.admin_list_teachers),
     path("admin/teacher/schedule/", views.admin_teacher_schedule),
     path("admin/schedule/period_all/", views.admin_schedule_period_all),
+    path("admin/cache/stats/", views.admin_cache_stats),
+    path("admin/metrics/", views.admin_metrics),
 
     # Studio CRUD
     path("studio/teachers/", views.studio_teachers),
@@ -55,6 +62,7 @@ urlpatterns = [
 
     #exports
     path("export/ics/", views.export_ics),
+    path("export/ics/feed/", views.export_ics_feed),
     path("export/csv/", views.export_csv),
 
     #интеграция под актуалочку с зфранепарасп
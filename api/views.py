@@ -1,8 +1,9 @@
-from datetime import datetime, timedelta
-from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.http import JsonResponse, HttpResponseBadRequest, HttpResponse, StreamingHttpResponse, FileResponse
 from django.db.models import Q
 from django.db import transaction
 from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth.decorators import user_passes_test
 from directory.models import (
     StudentGroup, Discipline, Teacher, Room, TeachingAssignment, Holiday, Building,
@@ -11,36 +12,39 @@ from directory.models import (
 )
 from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from scheduleapp.models import Lesson, TimeSlot, HomeworkItem, Room, ImportJob
+from scheduleapp.models import Lesson, TimeSlot, HomeworkItem, Room, ImportJob, GenerationJob
+from scheduleapp.occupancy import Occupancy
 from urllib.parse import quote, unquote
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Group, User
 from directory.models import Room
-import csv
-from io import StringIO
 from django.contrib.auth import logout
 from django.shortcuts import redirect
 from django.views.decorators.http import require_POST
 from django.views.decorators.http import require_GET
-import json, re
+import json, re, os, tempfile
+from itertools import groupby
+from operator import itemgetter
 from django.db import IntegrityError
 from pathlib import Path
 from django.forms.models import model_to_dict
 from django.db.models import Count
 from django.utils.dateparse import parse_date
 from django.core.exceptions import ValidationError
+from .services.generator import run_generation
+from .services.generation_jobs import submit as submit_generation, job_progress
+from .services.incremental import regenerate
+from .services import exports, ranepa_pages, week_cache, versions
+from .services import suggest as suggest_index
+from .services.ranepa_import import SPORTS_PREFIXES, strip_leading_breaks, import_items as import_lessons
+from .services.week_cache import badge_for
+from .services.conflicts import is_legal_stream_teacher, is_legal_stream_room
+from core import metrics
 
 COOKIE_NAME = "preferred_group"
 
-SPORTS_PREFIXES = ("физическая культура", "физкультура")
-
 # >>> ADD: helpers (case-insensitive get_or_create + очистка дисциплины)
-_LEADING_BR = re.compile(r'^(?:\s*(?:<br\s*/?>|\r?\n)+\s*)+', re.I)
-
-def strip_leading_breaks(s: str | None) -> str:
-    return _LEADING_BR.sub('', (s or '')).strip()
-
 def get_or_create_ci(model, field: str, value: str | None, defaults: dict | None = None):
     """Case-insensitive get_or_create без дубликатов по регистру."""
     if not value:
@@ -76,43 +80,45 @@ def _get_teacher_for_user(user):
         return Teacher.objects.filter(full_name__iexact=full).first()
     return None
 
-def badge_for(status, is_remote):
-    if is_remote:
-        return "remote"
-    return {"ongoing": "ongoing", "upcoming": "upcoming", "past": "past"}.get(status, "past")
-
 def _q(request, key="q"):
     return (request.GET.get(key) or "").strip()
 
-def suggest_any(request):
-    q = (request.GET.get("q") or "").strip()
+def suggest(request):
+    """
+    GET /api/suggest/?q=...&types=group,teacher,discipline&limit=30&per_type=10
+    Одна ручка для поиска на главной: индекс api.services.suggest в памяти вместо LIKE по трём таблицам.
+    Ответ — [{type, id, label}] по релевантности (начало строки, начало слова, середина).
+    """
+    q = _q(request)
     if not q:
         return JsonResponse([], safe=False)
-    res = []
+    types = tuple(t for t in (request.GET.get("types") or "").split(",") if t in suggest_index.TYPES) or suggest_index.TYPES
+    try:
+        limit = min(max(int(request.GET.get("limit") or 30), 1), 100)
+        per_type = min(max(int(request.GET.get("per_type") or 10), 1), 100)
+    except ValueError:
+        return HttpResponseBadRequest("limit/per_type — числа")
+    return JsonResponse(suggest_index.search(q, types=types, limit=limit, per_type=per_type), safe=False)
 
-    for g in StudentGroup.objects.filter(code__icontains=q)[:5]:
-        res.append({"type":"group","id":g.id,"label":g.code})
-    for t in Teacher.objects.filter(full_name__icontains=q)[:5]:
-        res.append({"type":"teacher","id":t.id,"label":t.full_name})
-    for d in Discipline.objects.filter(title__icontains=q)[:5]:
-        res.append({"type":"discipline","id":d.id,"label":d.title})
+def suggest_any(request):
+    q = _q(request)
+    if not q:
+        return JsonResponse([], safe=False)
+    return JsonResponse(suggest_index.search(q, limit=15, per_type=5), safe=False)
 
-    return JsonResponse(res, safe=False)
+def _suggest_one(request, kind):
+    q = _q(request)
+    items = suggest_index.search(q, types=(kind,), limit=10) if q else []
+    return JsonResponse([{"id": it["id"], "label": it["label"]} for it in items], safe=False)
 
 def suggest_groups(request):
-    q = _q(request)
-    qs = StudentGroup.objects.filter(code__icontains=q)[:10] if q else StudentGroup.objects.none()
-    return JsonResponse([{"id": g.id, "label": g.code} for g in qs], safe=False)
+    return _suggest_one(request, "group")
 
 def suggest_teachers(request):
-    q = _q(request)
-    qs = Teacher.objects.filter(full_name__icontains=q)[:10] if q else Teacher.objects.none()
-    return JsonResponse([{"id": t.id, "label": t.full_name} for t in qs], safe=False)
+    return _suggest_one(request, "teacher")
 
 def suggest_disciplines(request):
-    q = _q(request)
-    qs = Discipline.objects.filter(title__icontains=q)[:10] if q else Discipline.objects.none()
-    return JsonResponse([{"id": d.id, "label": d.title} for d in qs], safe=False)
+    return _suggest_one(request, "discipline")
 
 def _json(request):
     try:
@@ -156,81 +162,68 @@ from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
 from scheduleapp.models import Lesson, TimeSlot
 
-def schedule_today(request):
+def _schedule_scope(request):
+    """(kind, ident, teacher_filter) для кэша недельной сетки или (None, HttpResponseBadRequest, None)."""
     group_code = request.GET.get("group")
     teacher_id = request.GET.get("teacher")
-
     if not group_code and not teacher_id:
-        return HttpResponseBadRequest("Нужно указать ?group=КОД_ГРУППЫ или ?teacher=ID")
-
-    today = timezone.localdate()
-
-    lessons_qs = (
-        Lesson.objects
-        .filter(date=today)
-        .select_related("timeslot", "discipline", "teacher", "lesson_type", "room", "room__building")
-        .select_related("homework")
-    )
-
-    if group_code:
-        lessons_qs = lessons_qs.filter(group__code=group_code)
+        return None, HttpResponseBadRequest("Нужно указать ?group=КОД_ГРУППЫ или ?teacher=ID"), None
     if teacher_id:
         try:
             teacher_id = int(teacher_id)
         except ValueError:
-            return HttpResponseBadRequest("teacher должен быть числом (ID преподавателя).")
-        lessons_qs = lessons_qs.filter(teacher_id=teacher_id)
+            return None, HttpResponseBadRequest("teacher должен быть числом (ID преподавателя)."), None
+    if group_code:
+        # group+teacher — сетка группы, отфильтрованная по преподавателю; ключ кэша — id группы
+        return "group", week_cache.group_id(group_code), teacher_id or None
+    return "teacher", teacher_id, None
+
+def _schedule_versions(request, start_date, end_date):
+    """Области и момент последней смены статусов — для ETag schedule_today/period."""
+    kind, ident, _ = _schedule_scope(request)
+    if kind is None:
+        return None
+    since = week_cache.status_since(start_date, end_date, timezone.localtime())
+    return [versions.scope(kind, ident)], since.isoformat(), since
 
-    slots = list(TimeSlot.objects.all().order_by("order"))
-    lessons_by_slot = {l.timeslot_id: l for l in lessons_qs}
-
-    schedule = []
-    for slot in slots:
-        lesson = lessons_by_slot.get(slot.id)
-        time_str = f"{slot.start_time.strftime('%H:%M')}–{slot.end_time.strftime('%H:%M')}"
-        if lesson:
-            try:
-                hw_text = lesson.homework.text
-            except ObjectDoesNotExist:
-                hw_text = None
-
-            st = lesson.status_for_now()  # 👈 вычисляем статус один раз
-            schedule.append({
-            	"id": lesson.id,
-                "order": slot.order,
-                "time": time_str,
-                "discipline": lesson.discipline.title,
-                "teacher": lesson.teacher.full_name,
-                "lesson_type": lesson.lesson_type.name,
-                "room": lesson.room.name if lesson.room else None,
-                "building": lesson.room.building.name if lesson.room else None,
-                "is_remote": lesson.is_remote,
-                "remote_platform": lesson.remote_platform,
-                "status": st,                         # ongoing / upcoming / past
-                "badge": badge_for(st, lesson.is_remote),  # 👈 добавили бейдж
-                "homework": hw_text,
-            })
-        else:
-            schedule.append({
-                "order": slot.order,
-                "time": time_str,
-                "break": True
-            })
+def _today_versions(request):
+    today = timezone.localdate()
+    return _schedule_versions(request, today, today)
 
+def _period_versions(request):
+    try:
+        start_date = timezone.datetime.fromisoformat(request.GET.get("start")).date()
+        end_date = timezone.datetime.fromisoformat(request.GET.get("end")).date()
+    except (TypeError, ValueError):
+        return None
+    if start_date > end_date:
+        return None
+    return _schedule_versions(request, start_date, end_date)
+
+@versions.conditional("schedule_today", _today_versions)
+def schedule_today(request):
+    kind, ident, teacher_filter = _schedule_scope(request)
+    if kind is None:
+        return ident
+
+    now = timezone.localtime()
+    today = now.date()
+    weeks = week_cache.get_weeks(kind, ident, today, today)
+    schedule = week_cache.day_items(weeks, today, now, teacher_id=teacher_filter)
     return JsonResponse(schedule, safe=False)
 
+@versions.conditional("schedule_period", _period_versions)
 def schedule_period(request):
     """
     GET /api/schedule/period/?start=YYYY-MM-DD&end=YYYY-MM-DD&group=КОД | &teacher=ID
     Возвращает по дням: слоты с парами или 'перерывами'. 
+    Сетка недели берётся из кэша (api.services.week_cache), статусы считаются на каждый запрос.
     """
-    group_code = request.GET.get("group")
-    teacher_id = request.GET.get("teacher")
+    kind, ident, teacher_filter = _schedule_scope(request)
+    if kind is None:
+        return ident
     start = request.GET.get("start")
     end = request.GET.get("end")
-
-    if not (group_code or teacher_id):
-        return HttpResponseBadRequest("Нужно указать ?group=КОД_ГРУППЫ или ?teacher=ID")
     if not (start and end):
         return HttpResponseBadRequest("Нужно указать ?start=YYYY-MM-DD и ?end=YYYY-MM-DD")
 
@@ -243,76 +236,16 @@ def schedule_period(request):
     if start_date > end_date:
         return HttpResponseBadRequest("start не может быть позже end.")
 
-    lessons_qs = (
-        Lesson.objects
-        .filter(date__range=(start_date, end_date))
-        .select_related("timeslot", "discipline", "teacher", "lesson_type", "room", "room__building")
-        .select_related("homework")
-    )
-    if group_code:
-        lessons_qs = lessons_qs.filter(group__code=group_code)
-    if teacher_id:
-        try:
-            teacher_id = int(teacher_id)
-        except ValueError:
-            return HttpResponseBadRequest("teacher должен быть числом (ID преподавателя).")
-        lessons_qs = lessons_qs.filter(teacher_id=teacher_id)
-
-    slots = list(TimeSlot.objects.all().order_by("order"))
-    # сгруппируем уроки по дате и по слоту
-    lessons_map = {}
-    for l in lessons_qs:
-        lessons_map.setdefault(l.date, {})[l.timeslot_id] = l
+    weeks = week_cache.get_weeks(kind, ident, start_date, end_date)
+    now = timezone.localtime()
 
     # формируем ответ по каждому дню
     result = []
     cur = start_date
-    today = timezone.localdate()
     while cur <= end_date:
-        day_items = []
-        day_lessons_by_slot = lessons_map.get(cur, {})
-
-        for slot in slots:
-            lesson = day_lessons_by_slot.get(slot.id)
-            time_str = f"{slot.start_time.strftime('%H:%M')}–{slot.end_time.strftime('%H:%M')}"
-            if lesson:
-                try:
-                    hw_text = lesson.homework.text
-                except ObjectDoesNotExist:
-                    hw_text = None
-
-                # статус относительно конкретного дня/времени
-                if cur != today:
-                    status = "past" if cur < today else "upcoming"
-                else:
-                    status = lesson.status_for_now()
-
-                # внутри if lesson:
-                day_items.append({
-                	"id": lesson.id,
-                    "order": slot.order,
-                    "time": time_str,
-                    "discipline": lesson.discipline.title,
-                    "teacher": lesson.teacher.full_name,
-                    "lesson_type": lesson.lesson_type.name,
-                    "room": lesson.room.name if lesson.room else None,
-                    "building": lesson.room.building.name if lesson.room else None,
-                    "is_remote": lesson.is_remote,
-                    "remote_platform": lesson.remote_platform,
-                    "status": status,
-                    "badge": badge_for(status, lesson.is_remote),  # 👈
-                    "homework": hw_text,
-                })
-            else:
-                day_items.append({
-                    "order": slot.order,
-                    "time": time_str,
-                    "break": True
-                })
-
         result.append({
             "date": cur.isoformat(),
-            "items": day_items
+            "items": week_cache.day_items(weeks, cur, now, teacher_id=teacher_filter)
         })
         cur += timedelta(days=1)
 
@@ -377,16 +310,18 @@ def teacher_free_rooms(request):
     except Lesson.DoesNotExist:
         return HttpResponseBadRequest("Пара не найдена или не ваша.")
 
-    # Находим занятые комнаты в этот слот/дату
-    busy_room_ids = Lesson.objects.filter(date=lesson.date, timeslot=lesson.timeslot, room__isnull=False)\
-                                  .exclude(pk=lesson.pk).values_list("room_id", flat=True)
-
-    qs = Room.objects.exclude(id__in=busy_room_ids)
+    # занятость ячейки (дата, слот) без текущей пары — общая матрица с генератором
+    occ = Occupancy.from_lessons(
+        lesson.date, lesson.date, slots=[lesson.timeslot],
+        lessons=Lesson.objects.filter(date=lesson.date, timeslot=lesson.timeslot), exclude_pk=lesson.pk,
+    )
+    rooms = occ.free_rooms(lesson.date, lesson.timeslot_id)
     # фильтры по вместимости и ПК, если есть размер группы
-    if lesson.group and lesson.group.size:
-        qs = qs.filter(Q(capacity__gte=lesson.group.size) | Q(capacity=0))
-        qs = qs.filter(Q(computers__gte=lesson.group.size) | Q(computers=0) | Q(computers__isnull=True))
-    data = [{"id": r.id, "title": f"{r.building.name} · {r.name}", "capacity": r.capacity, "computers": r.computers} for r in qs.order_by("building__name","name")]
+    size = lesson.group.size if lesson.group else 0
+    if size:
+        rooms = [r for r in rooms if (r.capacity >= size or r.capacity == 0)
+                 and (not r.computers or r.computers >= size)]
+    data = [{"id": r.id, "title": f"{r.building.name} · {r.name}", "capacity": r.capacity, "computers": r.computers} for r in rooms]
     return JsonResponse(data, safe=False)
 
 @login_required
@@ -528,358 +463,155 @@ def teacher_me_stats(request):
         "working_days": days_with_lessons,
     })
 
-@user_passes_test(_is_admin)
-def admin_generate_schedule(request):
-    """
-    GET /api/admin/generate/?start=YYYY-MM-DD&end=YYYY-MM-DD&groups=КОД1,КОД2&dry_run=1&backtrack=1
-    Улучшенный жадный генератор с мягким бэктрекингом, подробными конфликтами,
-    учётом delivery_mode/required_room_type/компьютеров и приоритетов корпусов.
-    """
-    q_start = request.GET.get("start"); q_end = request.GET.get("end")
-    dry_run = request.GET.get("dry_run", "1") != "0"
-    backtrack = request.GET.get("backtrack", "1") != "0"  # NEW: включить бэктрекинг
-    groups_csv = (request.GET.get("groups") or "").strip()
+def _generator_params(query):
+    """Разбор параметров генератора из GET/POST: (params, None) или (None, HttpResponseBadRequest)."""
+    q_start = query.get("start"); q_end = query.get("end")
+    groups_csv = (query.get("groups") or "").strip()
 
     if not (q_start and q_end):
-        return HttpResponseBadRequest("Нужно ?start и ?end")
+        return None, HttpResponseBadRequest("Нужно ?start и ?end")
     try:
         start_date = datetime.fromisoformat(q_start).date()
         end_date = datetime.fromisoformat(q_end).date()
     except ValueError:
-        return HttpResponseBadRequest("Неверный формат дат.")
+        return None, HttpResponseBadRequest("Неверный формат дат.")
     if start_date > end_date:
-        return HttpResponseBadRequest("start>end")
+        return None, HttpResponseBadRequest("start>end")
 
-    groups = list(StudentGroup.objects.filter(code__in=[s.strip() for s in groups_csv.split(",") if s.strip()])) if groups_csv else list(StudentGroup.objects.all())
-    if not groups:
-        return HttpResponseBadRequest("Не найдены группы.")
+    codes = [s.strip() for s in groups_csv.split(",") if s.strip()]
+    if codes and not StudentGroup.objects.filter(code__in=codes).exists():
+        return None, HttpResponseBadRequest("Не найдены группы.")
+    if not codes and not StudentGroup.objects.exists():
+        return None, HttpResponseBadRequest("Не найдены группы.")
 
-    slots = list(TimeSlot.objects.all().order_by("order"))
-
-    # Подтянем дисциплины разом (с новыми полями)
-    disciplines = Discipline.objects.select_related("default_lesson_type", "required_room_type")
-    disc_map = {d.id: d for d in disciplines}
-
-    # планы часов
-    plans = {g.id: list(GroupDisciplinePlan.objects.filter(group=g).select_related("discipline")) for g in groups}
-
-    # назначения преподавателей
-    assignments = {}
-    for g in groups:
-        by_disc = {}
-        for a in TeachingAssignment.objects.filter(group=g).select_related("discipline", "teacher"):
-            by_disc.setdefault(a.discipline_id, []).append(a.teacher)
-        assignments[g.id] = by_disc
-
-    # приоритеты зданий
-    building_prefs = {}
-    for pref in BuildingPriority.objects.all().select_related("group", "discipline", "building"):
-        building_prefs.setdefault((pref.group_id, pref.discipline_id), []).append(pref)
-
-    holidays = {h.date: h for h in Holiday.objects.all()}
-    workloads = {w.teacher_id: w for w in TeacherWorkload.objects.select_related("teacher")}
-    overrides = {}
-    for o in TeacherDayOverride.objects.all():
-        overrides.setdefault((o.teacher_id, o.date), o)
-
-    # существующие занятия в диапазоне
-    existing = Lesson.objects.filter(date__range=(start_date, end_date))\
-        .select_related("timeslot", "group", "teacher", "room")
-    busy_room = set((l.date, l.timeslot_id, l.room_id) for l in existing if l.room_id)
-    busy_teacher = set((l.date, l.timeslot_id, l.teacher_id) for l in existing)
-    busy_group = set((l.date, l.timeslot_id, l.group_id) for l in existing)
-
-    rooms_all = list(Room.objects.select_related("building", "room_type").order_by("capacity", "computers", "building__name", "name"))
-
-    # вспомогалки
-    ACADEMIC_MIN = getattr(settings, "ACADEMIC_MINUTES", 45)
-
-    def slot_minutes(ts: TimeSlot):
-        d0 = datetime.combine(start_date, ts.start_time)
-        d1 = datetime.combine(start_date, ts.end_time)
-        return int((d1 - d0).total_seconds() // 60)
-
-    def slot_to_academic_hours(ts: TimeSlot):
-        return slot_minutes(ts) / ACADEMIC_MIN
-
-    def teacher_allowed_on_day(t: Teacher, day):
-        h = holidays.get(day)
-        if h and not h.is_working:
-            return False
-        ov = overrides.get((t.id, day))
-        if ov:
-            return not ov.is_off
-        w = workloads.get(t.id)
-        if not w or not w.days_off:
-            return True
-        offs = {int(x) for x in w.days_off.split(",") if x.strip().isdigit()}
-        return (day.weekday() not in offs)
-
-    def teacher_time_window_ok(t: Teacher, slot: TimeSlot, day):
-        w = workloads.get(t.id)
-        ov = overrides.get((t.id, day))
-        start = ov.start if ov and ov.start else (w.default_start if w and w.default_start else None)
-        end = ov.end if ov and ov.end else (w.default_end if w and w.default_end else None)
-        if start and slot.start_time < start: return False
-        if end and slot.end_time > end: return False
-        return True
-
-    weekly_minutes = {}
-    for l in existing:
-        wkey = (l.teacher_id, *l.date.isocalendar()[:2])
-        weekly_minutes[wkey] = weekly_minutes.get(wkey, 0) + slot_minutes(l.timeslot)
-
-    # подберём комнаты с учётом типа, компьютеров и приоритетов корпусов
-    def candidate_rooms_for(group, disc: Discipline, day, slot):
-        need_type = disc.required_room_type_id
-        need_computers = disc.requires_computers
-        gsize = group.size or 0
-
-        # если дисциплина дистанционная — без кабинета
-        if disc.delivery_mode == "remote":
-            return []  # «нет комнат» как признак дистанта
-
-        # смешанный/очный — выбираем аудитории
-        cand = []
-        for r in rooms_all:
-            if (day, slot.id, r.id) in busy_room:
-                continue
-            if need_type and (r.room_type_id != need_type):
-                continue
-            # вместимость
-            if r.capacity and gsize and r.capacity < gsize:
-                continue
-            # компьютеры
-            if need_computers:
-                if not r.computers or r.computers < gsize:
-                    continue
-            cand.append(r)
-
-        # приоритет корпусов: (group, discipline) → отсортируем по BuildingPriority
-        prefs = building_prefs.get((group.id, disc.id))
-        if prefs:
-            order_map = {p.building_id: p.priority for p in prefs}
-            cand.sort(key=lambda r: (order_map.get(r.building_id, 9999), r.capacity or 0, r.computers or 0))
-        else:
-            # дефолт: минимально подходящая вместимость, затем компьютеры
-            cand.sort(key=lambda r: (r.capacity or 9999, r.computers or 9999, r.building.name, r.name))
-
-        return cand
-
-    def pick_default_lessontype(disc: Discipline):
-        return disc.default_lesson_type
-
-    # подробные конфликты
-    conflicts = []
-    proposals = []
-    stats = {"placed": 0, "skipped": 0}
+    try:
+        workers = int(query.get("workers") or 1)
+    except ValueError:
+        return None, HttpResponseBadRequest("workers должен быть числом")
+    workers = max(1, min(workers, os.cpu_count() or 1))
 
-    def add_conflict(reason, *, date, slot, group=None, discipline=None, teacher=None, room=None, details=None):
-        conflicts.append({
-            "reason": reason,
-            "date": date.isoformat(),
-            "slot": slot.order,
-            "time": f"{slot.start_time.strftime('%H:%M')}–{slot.end_time.strftime('%H:%M')}",
-            "group": getattr(group, "code", None),
-            "discipline": getattr(discipline, "title", None),
-            "teacher": getattr(teacher, "full_name", None),
-            "room": getattr(room, "name", None),
-            "room_building": getattr(getattr(room, "building", None), "name", None),
-            "links": {
-                # ссылки в админку
-                "group": f"/admin/directory/studentgroup/{getattr(group,'id',0)}/change/" if group else None,
-                "discipline": f"/admin/directory/discipline/{getattr(discipline,'id',0)}/change/" if discipline else None,
-                "teacher": f"/admin/directory/teacher/{getattr(teacher,'id',0)}/change/" if teacher else None,
-                "room": f"/admin/directory/room/{getattr(room,'id',0)}/change/" if room else None,
-            },
-            "details": details,
-        })
+    try:
+        optimize = float(query.get("optimize") or 0)
+    except ValueError:
+        return None, HttpResponseBadRequest("optimize должен быть числом секунд")
+    optimize = max(0.0, min(optimize, 300.0))
+
+    return {
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "groups": codes,
+        "dry_run": query.get("dry_run", "1") != "0",
+        "backtrack": query.get("backtrack", "1") != "0",  # NEW: включить бэктрекинг
+        "workers": workers,  # >1 — параллельный режим по независимым частям групп
+        "optimize": optimize,  # секунды локального поиска после жадного прохода, 0 — выключен
+    }, None
 
-    # МЯГКИЙ БЭКТРЕКИНГ: попытка переставить на соседний слот в тот же день (вниз), если конфликт
-    def try_place(group, p_item, day, slot, try_shift=True):
-        """
-        p_item: плановая запись { 'plan': GroupDisciplinePlan, 'discipline': Discipline }
-        """
-        disc = p_item["discipline"]
-        plan = p_item["plan"]
-
-        # дистанционный курс — без аудитории
-        is_remote = (disc.delivery_mode == "remote")
-        # смешанный допускает любую доставку; начнём с очной (если есть аудитории), потом удалённо
-        try_remote_as_fallback = (disc.delivery_mode == "mixed")
-
-        # выберем преподавателя
-        teachers = assignments.get(group.id, {}).get(disc.id, [])
-        t_ok = None
-        for t in teachers:
-            if (day, slot.id, t.id) in busy_teacher:
-                continue
-            if not teacher_allowed_on_day(t, day):
-                continue
-            if not teacher_time_window_ok(t, slot, day):
-                continue
-            # недельный лимит — в минутах
-            wk = (t.id, *day.isocalendar()[:2])
-            limit = workloads.get(t.id).weekly_hours_limit * 60 if workloads.get(t.id) and workloads.get(t.id).weekly_hours_limit else None
-            new_total = weekly_minutes.get(wk, 0) + slot_minutes(slot)
-            if limit and new_total > limit:
-                continue
-            t_ok = t
-            break
-        if not t_ok:
-            add_conflict("no_teacher", date=day, slot=slot, group=group, discipline=disc,
-                         details="Нет доступного преподавателя (время/лимит/занятость)")
-            return False
-
-        # если очный/смешанный — попробуем комнату
-        rooms_try = [] if is_remote else candidate_rooms_for(group, disc, day, slot)
-        chosen_room = None
-        chosen_remote = is_remote
-
-        if not is_remote:
-            for r in rooms_try:
-                if (day, slot.id, r.id) in busy_room:
-                    continue
-                chosen_room = r
-                break
-
-            if not chosen_room and try_remote_as_fallback:
-                # смешанная дисциплина — провалим в дистанционную форму
-                chosen_remote = True
-
-        # если и очное нельзя, и дистант не разрешён — конфликт (с опцией сдвига)
-        if not chosen_remote and chosen_room is None:
-            if try_shift:
-                return False  # пусть вызвавший код попробует иной слот
-            add_conflict("no_room", date=day, slot=slot, group=group, discipline=disc,
-                         teacher=t_ok, details="Нет подходящей аудитории: тип/вместимость/ПК/занятость")
-            return False
-
-        # ок — фиксируем
-        proposals.append({
-            "date": day.isoformat(),
-            "timeslot_id": slot.id,
-            "group_id": group.id,
-            "discipline_id": disc.id,
-            "teacher_id": t_ok.id,
-            "lesson_type_id": (pick_default_lessontype(disc).id if pick_default_lessontype(disc) else None),
-            "room_id": (None if chosen_remote else (chosen_room.id if chosen_room else None)),
-            "is_remote": chosen_remote,
-        })
+@user_passes_test(_is_admin)
+def admin_generate_schedule(request):
+    """
+    GET /api/admin/generate/?start=YYYY-MM-DD&end=YYYY-MM-DD&groups=КОД1,КОД2&dry_run=1&backtrack=1&workers=1&optimize=0
+    Улучшенный жадный генератор с мягким бэктрекингом, подробными конфликтами,
+    учётом delivery_mode/required_room_type/компьютеров и приоритетов корпусов.
+    Синхронный вариант; для семестра используйте фоновые задачи (admin/generate/jobs/).
+    """
+    params, error = _generator_params(request.GET)
+    if error:
+        return error
+    return JsonResponse(run_generation(params), safe=False)
 
-        # занятости и счётчики
-        busy_group.add((day, slot.id, group.id))
-        busy_teacher.add((day, slot.id, t_ok.id))
-        if not chosen_remote and chosen_room:
-            busy_room.add((day, slot.id, chosen_room.id))
-        wk = (t_ok.id, *day.isocalendar()[:2])
-        weekly_minutes[wk] = weekly_minutes.get(wk, 0) + slot_minutes(slot)
+@login_required
+@user_passes_test(_is_admin)
+@require_POST
+def admin_generate_jobs(request):
+    """POST /api/admin/generate/jobs/  (те же параметры, что у admin/generate/, в теле) — поставить генерацию в очередь."""
+    params, error = _generator_params(request.POST)
+    if error:
+        return error
+    job = GenerationJob.objects.create(user=request.user, params=params)
+    submit_generation(job)
+    return _ok(job_progress(job), status=202)
 
-        # списываем часы из плана по длительности слота (в акад. часах)
-        plan.hours_assigned += slot_to_academic_hours(slot)
+@login_required
+@user_passes_test(_is_admin)
+@require_GET
+def admin_generate_job(request, pk):
+    """GET /api/admin/generate/jobs/<id>/ — прогресс (дни, размещения, конфликты) и результат по завершении."""
+    try: job = GenerationJob.objects.get(pk=pk)
+    except GenerationJob.DoesNotExist: return _err("not found", 404)
+    return _ok(job_progress(job, with_result=True))
 
-        return True
+@login_required
+@user_passes_test(_is_admin)
+@require_POST
+def admin_generate_job_cancel(request, pk):
+    """POST /api/admin/generate/jobs/<id>/cancel/ — воркер остановится перед следующим днём, в БД ничего не запишет."""
+    updated = GenerationJob.objects.filter(pk=pk, status__in=("pending", "running")).update(cancel_requested=True)
+    if not updated and not GenerationJob.objects.filter(pk=pk).exists():
+        return _err("not found", 404)
+    return _ok({"ok": True, "cancel_requested": bool(updated)})
 
-    # основной проход
-    cur = start_date
-    while cur <= end_date:
-        if (hol := holidays.get(cur)) and not hol.is_working:
-            cur += timedelta(days=1); continue
+@login_required
+@user_passes_test(_is_admin)
+@require_http_methods(["GET","POST"])
+def admin_generate_incremental(request):
+    """
+    GET|POST /api/admin/generate/incremental/?start=YYYY-MM-DD&end=YYYY-MM-DD&teacher=<id>&room=<id>&group=<КОД>&dry_run=1
+    Пересобирает только занятия, ставшие недействительными после изменения преподавателя/аудитории/группы;
+    остальные занятия диапазона не трогаются. room=<id> — аудитория выведена из работы на весь диапазон.
+    GET — только предпросмотр (dry_run игнорируется); записать — POST с dry_run=0.
+    """
+    q = request.POST if request.method == "POST" else request.GET
+    try:
+        start_date = datetime.fromisoformat(q.get("start") or "").date()
+        end_date = datetime.fromisoformat(q.get("end") or "").date()
+    except ValueError:
+        return HttpResponseBadRequest("Нужно ?start и ?end в формате YYYY-MM-DD")
+    if start_date > end_date:
+        return HttpResponseBadRequest("start>end")
 
-        for slot in slots:
-            for g in groups:
-                if (cur, slot.id, g.id) in busy_group:
-                    continue
-
-                # выбери первую дисциплину с остатком часов
-                p_items = plans.get(g.id, [])
-                # сортировка: дисциплины с required_room_type/ПК — выше приоритета (их сложнее поставить)
-                p_items.sort(key=lambda x: (
-                    0 if (disc_map[x.discipline_id].required_room_type_id or disc_map[x.discipline_id].requires_computers) else 1
-                ))
-                candidate = None
-                for p in p_items:
-                    if p.hours_assigned < p.hours_total:
-                        candidate = {"plan": p, "discipline": disc_map[p.discipline_id]}
-                        break
-                if not candidate:
-                    continue
-
-                placed = try_place(g, candidate, cur, slot, try_shift=backtrack)
-                if not placed and backtrack:
-                    # попробуем соседний слот ниже в этот день
-                    next_slot = next((s for s in slots if s.order > slot.order), None)
-                    if next_slot and (cur, next_slot.id, g.id) not in busy_group:
-                        placed2 = try_place(g, candidate, cur, next_slot, try_shift=False)
-                        if not placed2:
-                            add_conflict("backtrack_failed", date=cur, slot=slot, group=g,
-                                         discipline=candidate["discipline"],
-                                         details="Перестановка на следующий слот не помогла")
-                            stats["skipped"] += 1
-                        else:
-                            stats["placed"] += 1
-                    else:
-                        add_conflict("no_slot_to_shift", date=cur, slot=slot, group=g,
-                                     discipline=candidate["discipline"],
-                                     details="Нет следующего свободного слота для группы")
-                        stats["skipped"] += 1
-                elif placed:
-                    stats["placed"] += 1
-                else:
-                    stats["skipped"] += 1
+    try:
+        teacher_id = int(q["teacher"]) if q.get("teacher") else None
+        room_id = int(q["room"]) if q.get("room") else None
+    except ValueError:
+        return HttpResponseBadRequest("teacher и room — числовые id")
+    group_id = None
+    if q.get("group"):
+        group = StudentGroup.objects.filter(code=q["group"].strip()).first()
+        if not group:
+            return HttpResponseBadRequest("Не найдена группа.")
+        group_id = group.id
+    if not (teacher_id or room_id or group_id):
+        return HttpResponseBadRequest("Укажите teacher, room или group")
+
+    return _ok(regenerate(start_date=start_date, end_date=end_date, teacher_id=teacher_id,
+                          room_id=room_id, group_id=group_id,
+                          dry_run=request.method != "POST" or q.get("dry_run", "1") != "0"))
 
-        cur += timedelta(days=1)
+@login_required
+@user_passes_test(_is_admin)
+@require_GET
+def admin_cache_stats(request):
+    """Счётчики условных ответов (hits — 304) и кэша недельной сетки."""
+    return JsonResponse(versions.stats())
 
-    if dry_run:
-        # человекочитаемый превью
-        pretty = []
-        for p in proposals:
-            ts = next(s for s in slots if s.id == p["timeslot_id"])
-            g = next(gr for gr in groups if gr.id == p["group_id"])
-            d = disc_map[p["discipline_id"]]
-            t = Teacher.objects.get(pk=p["teacher_id"])
-            room_text = "Дистанционно" if p["is_remote"] else (
-                (lambda rid: (f"{Room.objects.get(pk=rid).building.name} · {Room.objects.get(pk=rid).name}") if rid else None)(p["room_id"])
-            )
-            pretty.append({
-                "date": p["date"],
-                "slot": ts.order,
-                "time": f"{ts.start_time.strftime('%H:%M')}–{ts.end_time.strftime('%H:%M')}",
-                "group": g.code,
-                "discipline": d.title,
-                "teacher": t.full_name,
-                "room": room_text,
-                "delivery": d.delivery_mode,
-                "type": d.default_lesson_type.name if d.default_lesson_type_id else None
-            })
-        return JsonResponse({"dry_run": True, "proposals": pretty, "conflicts": conflicts, "stats": stats}, safe=False)
-
-    # применение
-    with transaction.atomic():
-        to_create = []
-        for p in proposals:
-            ts = next(s for s in slots if s.id == p["timeslot_id"])
-            lt = LessonType.objects.filter(pk=p["lesson_type_id"]).first()
-            to_create.append(Lesson(
-                date=datetime.fromisoformat(p["date"]).date(),
-                timeslot=ts,
-                group_id=p["group_id"],
-                discipline_id=p["discipline_id"],
-                teacher_id=p["teacher_id"],
-                lesson_type=lt,
-                room_id=p["room_id"],
-                is_remote=p["is_remote"],
-                remote_platform=("Moodle" if p["is_remote"] else ""),  # при желании выбирайте платформу
-            ))
-        Lesson.objects.bulk_create(to_create, batch_size=200)
-
-        # обновим планы
-        all_plans = []
-        for glist in plans.values():
-            all_plans.extend(glist)
-        GroupDisciplinePlan.objects.bulk_update(all_plans, ["hours_assigned"], batch_size=200)
-
-    return JsonResponse({"dry_run": False, "created": len(proposals), "conflicts": conflicts, "stats": stats})
+@login_required
+@user_passes_test(_is_admin)
+@require_http_methods(["GET", "DELETE"])
+def admin_metrics(request):
+    """
+    GET /api/admin/metrics/?sort=p95|p50|max|queries|duplicates|count&limit=20
+    Сводка InstrumentationMiddleware по маршрутам этого процесса; DELETE — очистить буфер.
+    """
+    if not getattr(settings, "INSTRUMENTATION", False):
+        return _err("instrumentation disabled (settings.INSTRUMENTATION)", 404)
+    if request.method == "DELETE":
+        metrics.reset()
+        return _ok({"reset": True})
+    try:
+        limit = int(request.GET.get("limit") or 0) or None
+    except ValueError:
+        return _err("bad limit")
+    return JsonResponse(metrics.summary(request.GET.get("sort") or "p95", limit))
 
 @login_required
 @user_passes_test(_is_admin)
@@ -963,13 +695,33 @@ def admin_teacher_schedule(request):
 
     return JsonResponse(result, safe=False)
 
+COLUMNAR_FORMATS = {
+    "npz": (exports.write_npz, "application/zip"),
+    "parquet": (exports.write_parquet, "application/vnd.apache.parquet"),
+}
+
+def _columnar_response(fmt, start_date, end_date):
+    write, content_type = COLUMNAR_FORMATS[fmt]
+    qs = Lesson.objects.filter(date__range=(start_date, end_date)).order_by("date", "timeslot__order", "group__code")
+    # до 32 МБ в памяти, дальше — временный файл
+    buf = tempfile.SpooledTemporaryFile(max_size=32 * 2**20)
+    try:
+        write(qs, buf)
+    except ImportError:
+        buf.close()
+        return HttpResponseBadRequest("Для format=parquet нужен pyarrow; без него — format=npz")
+    buf.seek(0)
+    return FileResponse(buf, as_attachment=True, content_type=content_type,
+                        filename=f"lessons_{start_date}_{end_date}.{fmt}")
+
 @login_required
 @user_passes_test(_is_admin)
 def admin_schedule_period_all(request):
     """
-    GET /api/admin/schedule/period_all/?start=YYYY-MM-DD&end=YYYY-MM-DD
+    GET /api/admin/schedule/period_all/?start=YYYY-MM-DD&end=YYYY-MM-DD [&format=json|npz|parquet]
     Плоский список занятий всех групп за период, с ключевыми полями.
     Удобно для админ-обзора и экспорта.
+    format=npz|parquet — колоночный файл для аналитики (см. exports.write_npz), без status/badge.
     """
     start = request.GET.get("start")
     end = request.GET.get("end")
@@ -981,6 +733,12 @@ def admin_schedule_period_all(request):
     except ValueError:
         return HttpResponseBadRequest("Неверный формат дат")
 
+    fmt = request.GET.get("format", "json")
+    if fmt in COLUMNAR_FORMATS:
+        return _columnar_response(fmt, start_date, end_date)
+    if fmt != "json":
+        return HttpResponseBadRequest("format: json, npz или parquet")
+
     lessons = (
         Lesson.objects.filter(date__range=(start_date, end_date))
         .select_related("timeslot","group","discipline","teacher","lesson_type","room","room__building")
@@ -1248,16 +1006,73 @@ def studio_plans_item(request, pk):
     p.save(); return _ok(model_to_dict(p))
 
 # Lessons (расписание)
+STUDIO_LESSON_FIELDS = (
+    "id","date","timeslot_id","timeslot__order","group_id","group__code","discipline_id","discipline__title",
+    "teacher_id","teacher__full_name","lesson_type_id","lesson_type__name","room_id","room__name","room__building__name",
+    "is_remote","remote_platform",
+)
+STUDIO_PAGE_DEFAULT = 200
+STUDIO_PAGE_MAX = 1000
+
+def _studio_lessons_page(request):
+    """
+    GET /api/studio/lessons/?[start=&end=][&group=ID][&teacher=ID][&room=ID][&fields=a,b][&limit=N][&after=КУРСОР]
+    Страница занятий по ключу (date, timeslot__order, id): {"results": [...], "next": курсор | null}.
+    Курсор — "YYYY-MM-DD,пара,id" последней строки; следующая страница — WHERE (date, order, id) > курсор,
+    без OFFSET, поэтому глубокие страницы не дороже первой.
+    fields — подмножество STUDIO_LESSON_FIELDS; id, date и timeslot__order отдаются всегда (нужны курсору).
+    """
+    qs = Lesson.objects.all()
+    try:
+        if request.GET.get("start"):
+            qs = qs.filter(date__gte=datetime.fromisoformat(request.GET["start"]).date())
+        if request.GET.get("end"):
+            qs = qs.filter(date__lte=datetime.fromisoformat(request.GET["end"]).date())
+        for param, field in (("group", "group_id"), ("teacher", "teacher_id"), ("room", "room_id")):
+            if request.GET.get(param):
+                qs = qs.filter(**{field: int(request.GET[param])})
+        limit = min(int(request.GET.get("limit") or STUDIO_PAGE_DEFAULT), STUDIO_PAGE_MAX)
+    except ValueError:
+        return _err("Неверные параметры: start/end — YYYY-MM-DD, group/teacher/room/limit — числа")
+    if limit < 1:
+        return _err("limit должен быть положительным")
+
+    after = request.GET.get("after")
+    if after:
+        try:
+            d, order, pk = after.split(",")
+            d, order, pk = datetime.fromisoformat(d).date(), int(order), int(pk)
+        except ValueError:
+            return _err("Неверный курсор after")
+        # date >= d отдельным условием — чтобы SQLite взял диапазон по индексу, а не обходил всё
+        qs = qs.filter(date__gte=d).filter(
+            Q(date__gt=d)
+            | Q(date=d, timeslot__order__gt=order)
+            | Q(date=d, timeslot__order=order, id__gt=pk)
+        )
+
+    fields = STUDIO_LESSON_FIELDS
+    if request.GET.get("fields"):
+        wanted = [f.strip() for f in request.GET["fields"].split(",") if f.strip()]
+        unknown = [f for f in wanted if f not in STUDIO_LESSON_FIELDS]
+        if unknown:
+            return _err(f"Неизвестные поля: {', '.join(unknown)}")
+        fields = tuple(dict.fromkeys(["id", "date", "timeslot__order", *wanted]))
+
+    rows = list(qs.order_by("date", "timeslot__order", "id").values(*fields)[:limit + 1])
+    nxt = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        nxt = f"{last['date'].isoformat()},{last['timeslot__order']},{last['id']}"
+    return _ok({"results": rows, "next": nxt})
+
 @login_required
 @user_passes_test(_is_admin)
 @require_http_methods(["GET","POST"])
 def studio_lessons(request):
     if request.method == "GET":
-        rows = list(Lesson.objects.select_related("group","discipline","teacher","lesson_type","room","room__building","timeslot")
-            .values("id","date","timeslot_id","timeslot__order","group_id","group__code","discipline_id","discipline__title",
-                    "teacher_id","teacher__full_name","lesson_type_id","lesson_type__name","room_id","room__name","room__building__name",
-                    "is_remote","remote_platform"))
-        return _ok(rows)
+        return _studio_lessons_page(request)
     data = _json(request) or {}
     try:
         with transaction.atomic():
@@ -1308,23 +1123,32 @@ def studio_options(request):
     }
     return JsonResponse(data)
 
-@login_required
-def export_ics(request):
-    """
-    GET /api/export/ics/?group=КОД | &teacher=ID [&start=YYYY-MM-DD&end=YYYY-MM-DD]
-    """
+def _export_versions(request):
+    """Области export_ics/export_csv: группа и/или преподаватель, без них — все занятия."""
     group_code = request.GET.get("group")
     teacher_id = request.GET.get("teacher")
-    if not group_code and not teacher_id:
-        return HttpResponseBadRequest("Нужно ?group=КОД или ?teacher=ID")
-
+    scopes = []
+    if group_code:
+        scopes.append(versions.scope("group", week_cache.group_id(group_code)))
+    if teacher_id:
+        try:
+            scopes.append(versions.scope("teacher", int(teacher_id)))
+        except ValueError:
+            return None
     start_date, end_date = _daterange_from_params(request)
     if not start_date:
-        return HttpResponseBadRequest("Неверные даты")
+        return None
+    # без start/end диапазон — текущая неделя, поэтому он входит в ETag явно
+    return scopes or [versions.LESSONS], f"{start_date}:{end_date}", None
 
-    qs = Lesson.objects.filter(date__range=(start_date, end_date)).select_related(
-        "timeslot","group","discipline","teacher","lesson_type","room","room__building"
-    )
+def _ics_source(request, start_date, end_date):
+    """(queryset, calname, имя файла) для календаря группы/преподавателя или HttpResponseBadRequest."""
+    group_code = request.GET.get("group")
+    teacher_id = request.GET.get("teacher")
+    if not group_code and not teacher_id:
+        return HttpResponseBadRequest("Нужно ?group=КОД или ?teacher=ID")
+
+    qs = Lesson.objects.filter(date__range=(start_date, end_date))
     if group_code:
         qs = qs.filter(group__code=group_code)
         filename = f"schedule_{group_code}_{start_date}_{end_date}.ics"
@@ -1334,62 +1158,86 @@ def export_ics(request):
             teacher_id = int(teacher_id)
         except ValueError:
             return HttpResponseBadRequest("teacher должен быть числом")
-        t = Teacher.objects.filter(id=teacher_id).first()
+        t = Teacher.objects.filter(id=teacher_id).values_list("full_name", flat=True).first()
         qs = qs.filter(teacher_id=teacher_id)
         filename = f"schedule_teacher_{teacher_id}_{start_date}_{end_date}.ics"
-        calname = f"Расписание преподавателя {t.full_name if t else teacher_id}"
-
-    # ICS
-    def dtfmt(d, t):  # без TZ, «плавающее» локальное время
-        return f"{d.year:04d}{d.month:02d}{d.day:02d}T{t.hour:02d}{t.minute:02d}00"
-
-    out = []
-    out.append("BEGIN:VCALENDAR")
-    out.append("VERSION:2.0")
-    out.append(f"PRODID:-//College Schedule//RU")
-    out.append(f"X-WR-CALNAME:{calname}")
-    for l in qs.order_by("date","timeslot__order"):
-        dtstart = dtfmt(l.date, l.timeslot.start_time)
-        dtend   = dtfmt(l.date, l.timeslot.end_time)
-        uid = f"lesson-{l.id}@college"
-        summary = f"{l.discipline.title} — {l.group.code if l.group_id else ''}"
-        if l.lesson_type:
-            summary += f" ({l.lesson_type.name})"
-        location = "Дистанционно" if l.is_remote else (
-            f"{l.room.building.name if l.room and l.room.building else ''} {l.room.name if l.room else ''}"
-        )
-        desc_lines = [
-            f"Преподаватель: {l.teacher.full_name}",
-            f"Формат: {'дистанционный' if l.is_remote else 'очный'}",
-        ]
-        if l.is_remote and l.remote_platform:
-            desc_lines.append(f"Платформа: {l.remote_platform}")
-        try:
-            hw = l.homework.text
-            if hw: desc_lines.append(f"ДЗ: {hw}")
-        except ObjectDoesNotExist:
-            pass
-        description = "\\n".join(desc_lines)
-
-        out += [
-            "BEGIN:VEVENT",
-            f"UID:{uid}",
-            f"DTSTART:{dtstart}",
-            f"DTEND:{dtend}",
-            f"SUMMARY:{summary}",
-            f"LOCATION:{location}",
-            f"DESCRIPTION:{description}",
-            "END:VEVENT",
-        ]
-    out.append("END:VCALENDAR")
-    body = "\r\n".join(out)
-
-    resp = HttpResponse(body, content_type="text/calendar; charset=utf-8")
+        calname = f"Расписание преподавателя {t or teacher_id}"
+    return qs.order_by("date", "timeslot__order"), calname, filename
+
+@login_required
+@versions.conditional("export_ics", _export_versions)
+def export_ics(request):
+    """
+    GET /api/export/ics/?group=КОД | &teacher=ID [&start=YYYY-MM-DD&end=YYYY-MM-DD]
+    """
+    start_date, end_date = _daterange_from_params(request)
+    if not start_date:
+        return HttpResponseBadRequest("Неверные даты")
+    src = _ics_source(request, start_date, end_date)
+    if isinstance(src, HttpResponse):
+        return src
+    qs, calname, filename = src
+
+    # DTSTAMP = Last-Modified: один ETag — одно и то же тело
+    dtstamp = (versions.modified(request) or timezone.now()).strftime("%Y%m%dT%H%M%SZ")
+    resp = StreamingHttpResponse(exports.ics_chunks(qs, calname, dtstamp=dtstamp),
+                                 content_type="text/calendar; charset=utf-8")
     resp["Content-Disposition"] = f'attachment; filename="{filename}"'
     return resp
 
+FEED_WEEKS_BACK = 2
+FEED_WEEKS_AHEAD = 8
+
+def _feed_range(request):
+    """Явные start/end или скользящее окно вокруг текущей недели."""
+    if request.GET.get("start") or request.GET.get("end"):
+        return _daterange_from_params(request)
+    monday = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+    return monday - timedelta(weeks=FEED_WEEKS_BACK), monday + timedelta(weeks=FEED_WEEKS_AHEAD, days=-1)
+
+def _feed_versions(request):
+    parts = _export_versions(request)
+    if parts is None or not (request.GET.get("group") or request.GET.get("teacher")):
+        return None
+    start_date, end_date = _feed_range(request)
+    return parts[0], f"{start_date}:{end_date}", None
+
+@versions.conditional("export_ics_feed", _feed_versions)
+def export_ics_feed(request):
+    """
+    GET /api/export/ics/feed/?group=КОД | &teacher=ID [&start=YYYY-MM-DD&end=YYYY-MM-DD]
+    Лента для подписки календаря (webcal://…), без входа — как schedule/period.
+    По умолчанию окно: FEED_WEEKS_BACK недель назад … FEED_WEEKS_AHEAD вперёд.
+    Готовое тело кэшируется по (область, диапазон, версия расписания): опрос
+    без изменений — 304 по ETag или отдача из кэша без запросов к занятиям.
+    """
+    start_date, end_date = _feed_range(request)
+    if not start_date:
+        return HttpResponseBadRequest("Неверные даты")
+    parts = _feed_versions(request)
+    if parts is None:
+        return _ics_source(request, start_date, end_date)  # параметры кривые — вернёт 400 с причиной
+    stamps = versions.get_many([versions.GLOBAL, *parts[0]])
+    key = "ics:feed:" + ":".join(f"{s}={v}" for s, v in sorted(stamps.items())) + f":{start_date}:{end_date}"
+
+    body = cache.get(key)
+    if body is not None:
+        resp = HttpResponse(body, content_type="text/calendar; charset=utf-8")
+    else:
+        src = _ics_source(request, start_date, end_date)
+        if isinstance(src, HttpResponse):
+            return src
+        qs, calname, filename = src
+        # DTSTAMP = момент версии: тело не меняется, пока не поменялось расписание
+        dtstamp = datetime.fromtimestamp(max(stamps.values()) / 1e6, tz=dt_timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        chunks = exports.ics_chunks(qs, calname, dtstamp=dtstamp, feed=True)
+        resp = StreamingHttpResponse(exports.cache_tee(key, chunks), content_type="text/calendar; charset=utf-8")
+    resp["Content-Disposition"] = "inline"
+    return resp
+
 @login_required
 @user_passes_test(_is_admin)
+@versions.conditional("export_csv", _export_versions)
 def export_csv(request):
     """
     GET /api/export/csv/?start=YYYY-MM-DD&end=YYYY-MM-DD [&group=КОД | &teacher=ID]
@@ -1399,9 +1247,8 @@ def export_csv(request):
     if not start_date:
         return HttpResponseBadRequest("Неверные даты")
 
-    qs = Lesson.objects.filter(date__range=(start_date, end_date)).select_related(
-        "timeslot","group","discipline","teacher","lesson_type","room","room__building"
-    )
+    # только .values_list() в exports.csv_chunks — select_related не нужен
+    qs = Lesson.objects.filter(date__range=(start_date, end_date))
     group_code = request.GET.get("group")
     teacher_id = request.GET.get("teacher")
     fname_hint = "all"
@@ -1414,26 +1261,8 @@ def export_csv(request):
         qs = qs.filter(teacher_id=teacher_id)
         fname_hint = f"teacher_{teacher_id}"
 
-    si = StringIO()
-    w = csv.writer(si, delimiter=";")
-    w.writerow(["id","date","slot","time","group","discipline","lesson_type","teacher","room","building","is_remote","remote_platform"])
-    for l in qs.order_by("date","timeslot__order","group__code"):
-        w.writerow([
-            l.id,
-            l.date.isoformat(),
-            l.timeslot.order,
-            f"{l.timeslot.start_time.strftime('%H:%M')}–{l.timeslot.end_time.strftime('%H:%M')}",
-            l.group.code if l.group_id else "",
-            l.discipline.title,
-            l.lesson_type.name if l.lesson_type_id else "",
-            l.teacher.full_name,
-            l.room.name if l.room_id else "",
-            l.room.building.name if (l.room_id and l.room.building_id) else "",
-            "1" if l.is_remote else "0",
-            l.remote_platform or "",
-        ])
-    csv_bytes = si.getvalue().encode("utf-8-sig")  # с BOM, чтобы Excel открыл по-русски
-    resp = HttpResponse(csv_bytes, content_type="text/csv; charset=utf-8")
+    qs = qs.order_by("date", "timeslot__order", "group__code")
+    resp = StreamingHttpResponse(exports.csv_chunks(qs), content_type="text/csv; charset=utf-8")
     resp["Content-Disposition"] = f'attachment; filename="schedule_{fname_hint}_{start_date}_{end_date}.csv"'
     return resp
 
@@ -1442,6 +1271,8 @@ def logout_view(request):
     logout(request)
     return redirect("index")  # или: return redirect("/")
 
+RANEPA_FETCH_MAX_WEEKS = 26
+
 @login_required
 @user_passes_test(_is_admin)
 @require_GET
@@ -1449,32 +1280,32 @@ def ranepa_fetch(request):
     q = (request.GET.get("q") or "").strip()  # МОЖЕТ быть пустым => значит "вытянуть всё"
     kind = request.GET.get("kind") or "group"
     sem = int(request.GET.get("sem") or 1)
-    start = request.GET.get("start")
-    end   = request.GET.get("end")
+    start = parse_date(request.GET.get("start") or "")
+    end   = parse_date(request.GET.get("end") or "")
     if not (start and end):
         return HttpResponseBadRequest("start, end обязательны")
-
-    from .services.ranepa import fetch_week_from_ranepa
-    items = fetch_week_from_ranepa(q=q, kind=kind, sem=sem, start=start, end=end)
-    return JsonResponse({"items": items})
-
-def _derive_building_name(room_str: str|None) -> str|None:
-    if not room_str: return None
-    s = str(room_str).strip()
-    if s.upper().startswith("СДО"): return None
-    if re.fullmatch(r"\d+", s):
-        return "Колледж" if int(s) < 100 else "Высшее Образование"
-    return "Не указан"
-
-def _safe_order(val):
-    if val is None: return None
-    s = str(val).strip()
-    if s.isdigit(): return int(s)
-    m = re.search(r"(\d+)", s)
-    return int(m.group(1)) if m else None
-
-def _norm(s):
-    return re.sub(r"\s+", " ", (s or "").replace("\xa0", " ")).strip()
+    if end < start or (end - start).days > 7 * RANEPA_FETCH_MAX_WEEKS:
+        return HttpResponseBadRequest(f"диапазон: от start до end, не больше {RANEPA_FETCH_MAX_WEEKS} недель")
+
+    # ?offline=1 — без сети, страницы из локального хранилища (повтор прошлой загрузки)
+    offline = request.GET.get("offline") in ("1", "true", "yes")
+    store = ranepa_pages.default_store()
+    if offline and store is None:
+        return HttpResponseBadRequest("offline: хранилище страниц выключено (RANEPA_PAGE_STORE)")
+
+    # все недели диапазона — параллельно через один пул соединений, условными запросами
+    from .services.ranepa import BASE, fetch_range_from_ranepa
+    items, weeks = fetch_range_from_ranepa(
+        q=q, kind=kind, sem=sem, start=start.isoformat(), end=end.isoformat(),
+        base=getattr(settings, "RANEPA_BASE_URL", BASE),
+        concurrency=getattr(settings, "RANEPA_FETCH_CONCURRENCY", 4),
+        retries=getattr(settings, "RANEPA_FETCH_RETRIES", 2),
+        backoff=getattr(settings, "RANEPA_FETCH_BACKOFF", 0.5),
+        store=store, offline=offline,
+    )
+    if weeks and all(w.get("error") for w in weeks):
+        return _err(f"RANEPA недоступна: {weeks[0]['error']}", 502)
+    return JsonResponse({"items": items, "weeks": weeks})
 
 @login_required
 @user_passes_test(_is_admin)
@@ -1497,199 +1328,12 @@ def ranepa_import(request):
     except Exception:
         return HttpResponseBadRequest("bad json")
 
-    report = {"created":0,"updated":0,"skipped":0,"errors":0,"reasons":{}, "samples":[]}
-    # Сообщения вида «Преподаватель уже занят», «Аудитория занята», «занят в этот слот» считаем мягкими конфликтами
-    def _is_soft_conflict_validation(e: ValidationError) -> bool:
-        msgs = []
-        if hasattr(e, "message_dict") and isinstance(e.message_dict, dict):
-            for v in e.message_dict.values():
-                if isinstance(v, (list, tuple)):
-                    msgs.extend(v)
-                else:
-                    msgs.append(str(v))
-        else:
-            msgs.extend(getattr(e, "messages", []) or [])
-        txt = " ".join(msgs).lower()
-        keys = (
-            "преподаватель уже занят",
-            "аудитория занята",
-            "группа уже занята",
-            "занят в этот слот",
-        )
-        return any(k in txt for k in keys)
-
-    def bump(reason): report["reasons"][reason] = report["reasons"].get(reason,0)+1
-
-    to_bulk_insert = []  # bypass-вставки (потоки и физра по аудитории)
-
-    for raw in items:
-        try:
-            # ----- дата / слот -----
-            try:
-                date = datetime.fromisoformat(raw.get("date")).date()
-            except Exception:
-                report["errors"] += 1; bump("BAD_DATE")
-                if len(report["samples"])<12: report["samples"].append({"reason":"BAD_DATE","item":raw})
-                continue
-
-            order = _safe_order(raw.get("order"))
-            if not order:
-                report["skipped"] += 1; bump("NO_ORDER")
-                if len(report["samples"])<12: report["samples"].append({"reason":"NO_ORDER","item":raw})
-                continue
-
-            ts = TimeSlot.objects.filter(order=order).first()
-            if not ts:
-                report["skipped"] += 1; bump("NO_TIMESLOT")
-                if len(report["samples"])<12: report["samples"].append({"reason":"NO_TIMESLOT","item":raw})
-                continue
-
-            # ----- группы (может быть поток) -----
-            groups_raw = re.split(r",\s*|;\s*", _norm(raw.get("group")))
-            groups_raw = [g for g in groups_raw if g]
-            if not groups_raw:
-                report["skipped"] += 1; bump("NO_GROUP")
-                if len(report["samples"])<12: report["samples"].append({"reason":"NO_GROUP","item":raw})
-                continue
-
-            # ----- справочники без дублей (CI) -----
-            disc_title = strip_leading_breaks(_norm(raw.get("discipline"))) or "Без названия"
-            discipline = get_or_create_ci(Discipline, "title", disc_title)
-
-            teacher = None
-            t_name  = _norm(raw.get("teacher"))
-            if t_name:
-                teacher = get_or_create_ci(Teacher, "full_name", t_name)
-
-            lesson_type = None
-            lt_name = _norm(raw.get("lesson_type"))
-            if lt_name:
-                lesson_type = get_or_create_ci(LessonType, "name", lt_name)
-
-            # ----- флаги -----
-            is_stream = ("поток" in (lt_name or "").lower()) or (len(groups_raw) > 1)
-            is_remote = bool(raw.get("is_remote"))
-            is_sports = (disc_title.strip().lower().startswith(SPORTS_PREFIXES))
-
-            # ----- аудитория / корпус -----
-            room_obj = None
-            remote_pl = _norm(raw.get("remote_platform")) if is_remote else ""
-            if not is_remote:
-                room_name = _norm(raw.get("room"))
-                bname = _norm(raw.get("building")) or _derive_building_name(room_name)
-                building = get_or_create_ci(Building, "name", bname) if bname else None
-                if not building:
-                    building = get_or_create_ci(Building, "name", "Не указан")
-                if room_name:
-                    room_obj = Room.objects.filter(name__iexact=room_name, building=building).first()
-                    if not room_obj:
-                        # capacity=0, computers=0 — чтобы не падать на "вместимость < размер группы"
-                        room_obj = Room.objects.create(
-                            name=room_name,
-                            building=building,
-                            capacity=0,
-                            computers=0,
-                        )
-                    else:
-                        # (опционально) если известен размер группы и он больше заявленной вместимости — поднимем её
-                        try:
-                            # вычислим max размер среди всех групп этого «пакета»
-                            sizes = []
-                            for code in groups_raw:
-                                g = StudentGroup.objects.filter(code__iexact=code.strip()).first()
-                                if g and (g.size or 0) > 0:
-                                    sizes.append(g.size)
-                            need = max(sizes) if sizes else 0
-                            if need and room_obj.capacity and room_obj.capacity < need:
-                                room_obj.capacity = need
-                                room_obj.save(update_fields=["capacity"])
-                        except Exception:
-                            pass
-
-            # ====== СОХРАНЕНИЕ (bypass для потоков и физры по аудитории) ======
-            for code in groups_raw:
-                code = code.strip()
-                if not code:
-                    report["skipped"] += 1; bump("EMPTY_GROUP_TOKEN"); continue
-
-                group, _ = StudentGroup.objects.get_or_create(code=code, defaults={"size": 0})
-
-                values = dict(
-                    discipline=discipline,
-                    teacher=teacher,
-                    lesson_type=lesson_type,
-                    room=room_obj,
-                    is_remote=is_remote,
-                    remote_platform=remote_pl or "",
-                    is_stream=is_stream,
-                )
-
-                # Разрешённый обход модельной валидации:
-                #  - поток (is_stream=True)
-                #  - физкультура очно (не удалённо): аудитория «может совпадать», пропускаем конфликт по комнате
-                allow_bypass = is_stream or (is_sports and not is_remote)
-
-                existing = Lesson.objects.filter(date=date, timeslot=ts, group=group).first()
-                if existing:
-                    if allow_bypass:
-                        # update() обходит save()/clean() → не сработают «жёсткие» валидаторы
-                        Lesson.objects.filter(pk=existing.pk).update(**values)
-                        report["updated"] += 1
-                    else:
-                        try:
-                            with transaction.atomic():
-                                for k, v in values.items():
-                                    setattr(existing, k, v)
-                                existing.save()
-                                report["updated"] += 1
-                        except ValidationError as e:
-                            report["errors"] += 1; bump("ValidationError")
-                            if len(report["samples"]) < 12:
-                                report["samples"].append({
-                                    "reason": "ValidationError",
-                                    "item": {**raw, "group": code},
-                                    "messages": e.message_dict if hasattr(e, "message_dict") else e.messages
-                                })
-                        except IntegrityError:
-                            report["errors"] += 1; bump("DB_INTEGRITY")
-                            if len(report["samples"]) < 12:
-                                report["samples"].append({
-                                    "reason": "DB_INTEGRITY",
-                                    "item": {**raw, "group": code}
-                                })
-                else:
-                    if allow_bypass:
-                        to_bulk_insert.append(Lesson(group=group, date=date, timeslot=ts, **values))
-                    else:
-                        try:
-                            with transaction.atomic():
-                                Lesson.objects.create(group=group, date=date, timeslot=ts, **values)
-                                report["created"] += 1
-                        except ValidationError as e:
-                            report["errors"] += 1; bump("ValidationError")
-                            if len(report["samples"]) < 12:
-                                report["samples"].append({
-                                    "reason": "ValidationError",
-                                    "item": {**raw, "group": code},
-                                    "messages": e.message_dict if hasattr(e, "message_dict") else e.messages
-                                })
-                        except IntegrityError:
-                            report["errors"] += 1; bump("DB_INTEGRITY")
-                            if len(report["samples"]) < 12:
-                                report["samples"].append({
-                                    "reason": "DB_INTEGRITY",
-                                    "item": {**raw, "group": code}
-                                })
-
-        except Exception as e:
-            report["errors"] += 1; bump(type(e).__name__)
-            if len(report["samples"])<12:
-                report["samples"].append({"reason":type(e).__name__,"item":raw})
-
-    # дозаливаем bypass-пакет
-    if to_bulk_insert:
-        Lesson.objects.bulk_create(to_bulk_insert, batch_size=500)
-        report["created"] += len(to_bulk_insert)
+    # разбор, справочники и занятия затронутых ячеек — пачками (api.services.ranepa_import)
+    # только разница с базой: неизменённые занятия не пишутся, пропавшие — в отчёте
+    # (только созданные импортом, source=RANEPA; удаляются с meta.delete_missing)
+    report, directory_changed = import_lessons(items, import_meta)
+    if report["created"] or report["updated"] or directory_changed:
+        week_cache.invalidate_all()  # bulk_create и bulk_update не шлют сигналы
 
     # ===== лог и запись ImportJob =====
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1769,179 +1413,95 @@ def import_items(items, meta):
             log.append(str(e))
     return {"created":created,"updated":updated,"skipped":skipped,"errors":errors,"log":log}
 
-# === helpers for "legal stream" buckets (teacher/room) ===
-def _stream_flag(row: dict) -> bool:
-    """True, если отмечено is_stream или тип пары содержит 'поток' (регистронезависимо)."""
-    lt = (row.get("lesson_type__name") or "").lower()
-    return bool(row.get("is_stream")) or ("поток" in lt)
-
-def _same(vals) -> bool:
-    it = iter(vals)
-    try:
-        first = next(it)
-    except StopIteration:
-        return True
-    return all(v == first for v in it)
-
-def _is_legal_stream_teacher(lessons: list[dict]) -> bool:
-    """
-    Набор занятий для одного преподавателя в один слот считаем 'легальным потоком',
-    если:
-      - все помечены как поток (_stream_flag=True)
-      - одинаковые discipline, lesson_type, is_remote, remote_platform
-      - если очно, то у всех одинаковая аудитория (чтобы не получить «один препод в двух аудиториях»)
-    """
-    if not lessons or not all(_stream_flag(l) for l in lessons):
-        return False
-
-    if not _same(l.get("discipline_id") for l in lessons):
-        return False
-
-    # Тип пары: по id, а если пусто — по названию
-    lt_ids   = [l.get("lesson_type_id") for l in lessons]
-    lt_names = [(l.get("lesson_type__name") or "").strip().lower() for l in lessons]
-    if not _same(lt_ids):
-        # допускаем None, если все названия совпадают
-        if not (_same(lt_names) and all(bool(n) for n in lt_names)):
-            return False
-
-    if not _same(l.get("is_remote") for l in lessons):
-        return False
-
-    if not lessons[0]["is_remote"]:
-        # оффлайн-поток — одна аудитория
-        if not _same(l.get("room_id") for l in lessons):
-            return False
-    else:
-        # онлайн — одна и та же платформа/ссылка (или все пусто)
-        if not _same((l.get("remote_platform") or "").strip().lower() for l in lessons):
-            return False
-
-    return True
-
-def _is_legal_stream_room(lessons: list[dict]) -> bool:
-    """
-    Набор занятий в одной аудитории в один слот считаем 'легальным потоком',
-    если:
-      - все помечены как поток (_stream_flag=True)
-      - один и тот же преподаватель
-      - одинаковые discipline, lesson_type
-    """
-    if not lessons or not all(_stream_flag(l) for l in lessons):
-        return False
-    if not _same(l.get("teacher_id") for l in lessons):
-        return False
-    if not _same(l.get("discipline_id") for l in lessons):
-        return False
-
-    lt_ids   = [l.get("lesson_type_id") for l in lessons]
-    lt_names = [(l.get("lesson_type__name") or "").strip().lower() for l in lessons]
-    if not _same(lt_ids):
-        if not (_same(lt_names) and all(bool(n) for n in lt_names)):
-            return False
-
-    return True
-
 def _is_sports_title(title: str|None) -> bool:
     t = (title or "").strip().lower()
     return t.startswith(SPORTS_PREFIXES)
 
-@login_required
-@user_passes_test(_is_admin)
-@require_GET
-def ranepa_conflicts(request):
-    start = parse_date(request.GET.get("start") or "")
-    end   = parse_date(request.GET.get("end") or "")
-    if not (start and end):
-        return HttpResponseBadRequest("start,end required")
-
-    qs = Lesson.objects.select_related("group","teacher","room","timeslot")\
-        .filter(date__gte=start, date__lte=end)
-
-    out = {"teacher":[], "room":[], "group":[]}
-
-    # === 1) Преподаватель на нескольких парах одновременно ===
-    dup_teachers = (qs.filter(teacher__isnull=False)
-                      .values("date","timeslot_id","teacher__id","teacher__full_name")
-                      .annotate(n=Count("id")).filter(n__gt=1))
-    for row in dup_teachers:
-        # Подтягиваем подробности набора в этот слот
-        lessons = list(
-            Lesson.objects.filter(
-                date=row["date"], timeslot_id=row["timeslot_id"], teacher_id=row["teacher__id"]
-            ).values(
-                "id",
-                "group__code",
-                "room_id", "room__name",
-                "is_remote", "remote_platform",
-                "discipline_id",
-                "lesson_type_id", "lesson_type__name",
-                "teacher_id"
-            )
-        )
+_CONFLICT_FIELDS = (
+    "id", "date", "timeslot_id",
+    "group_id", "group__code",
+    "teacher_id", "teacher__full_name",
+    "room_id", "room__name", "room__building__name",
+    "discipline_id", "discipline__title",
+    "lesson_type_id", "lesson_type__name",
+    "is_remote", "remote_platform", "is_stream",
+)
 
+def _cell_conflicts(date, slot_id, rows, out):
+    """Конфликты одной ячейки (date, slot): группируем её занятия по преподавателю, аудитории и группе."""
+    by_teacher, by_room, by_group = {}, {}, {}
+    for r in rows:
+        if r["teacher_id"]:
+            by_teacher.setdefault(r["teacher_id"], []).append(r)
+        if r["room_id"]:
+            by_room.setdefault(r["room_id"], []).append(r)
+        by_group.setdefault(r["group_id"], []).append(r)
+
+    for _, lessons in sorted(by_teacher.items()):
         # Поток? — тогда не показываем это как конфликт
-        if _is_legal_stream_teacher(lessons):
+        if len(lessons) < 2 or is_legal_stream_teacher(lessons):
             continue
-
         out["teacher"].append({
-            "date": row["date"].isoformat(),
-            "slot": row["timeslot_id"],
-            "teacher": row["teacher__full_name"],
-            "lessons": [
-                {k:v for k,v in l.items() if k in ("id","group__code","room__name","is_remote")}
-                for l in lessons
-            ],
+            "date": date.isoformat(),
+            "slot": slot_id,
+            "teacher": lessons[0]["teacher__full_name"],
+            "lessons": [{k: l[k] for k in ("id","group__code","room__name","is_remote")} for l in lessons],
             "reason": "Преподаватель назначен на несколько пар в один слот"
         })
 
-    # === 2) Аудитория занята несколькими группами ===
-    dup_rooms = (qs.filter(room__isnull=False)
-                   .values("date","timeslot_id","room__id","room__name","room__building__name")
-                   .annotate(n=Count("id")).filter(n__gt=1))
-    for row in dup_rooms:
-        lessons = list(
-            Lesson.objects.filter(
-                date=row["date"], timeslot_id=row["timeslot_id"], room_id=row["room__id"]
-            ).values(
-                "id",
-                "group__code",
-                "teacher_id","teacher__full_name",
-                "discipline_id",
-                "lesson_type_id","lesson_type__name",
-                "is_stream"
-            )
-        )
-
-        if _is_legal_stream_room(lessons):
+    for _, lessons in sorted(by_room.items()):
+        if len(lessons) < 2 or is_legal_stream_room(lessons):
             continue
-
         out["room"].append({
-            "date": row["date"].isoformat(),
-            "slot": row["timeslot_id"],
-            "room": row["room__name"],
-            "building": row["room__building__name"],
-            "lessons": [
-                {k:v for k,v in l.items() if k in ("id","group__code","teacher__full_name")}
-                for l in lessons
-            ],
+            "date": date.isoformat(),
+            "slot": slot_id,
+            "room": lessons[0]["room__name"],
+            "building": lessons[0]["room__building__name"],
+            "lessons": [{k: l[k] for k in ("id","group__code","teacher__full_name")} for l in lessons],
             "reason": "Аудитория занята несколькими парами"
         })
 
-    # === 3) На одну группу больше одной пары (потоки не влияют) ===
-    for row in (qs.values("date","timeslot_id","group__id","group__code")
-                  .annotate(n=Count("id")).filter(n__gt=1)):
-        lessons = list(
-          Lesson.objects.filter(
-              date=row["date"], timeslot_id=row["timeslot_id"], group_id=row["group__id"]
-          ).values("id","discipline__title","teacher__full_name")
-        )
+    # На одну группу больше одной пары (потоки не влияют)
+    for _, lessons in sorted(by_group.items()):
+        if len(lessons) < 2:
+            continue
         out["group"].append({
-          "date": row["date"].isoformat(),
-          "slot": row["timeslot_id"],
-          "group": row["group__code"],
-          "lessons": lessons,
-          "reason": "На группу назначено >1 пары в один слот"
+            "date": date.isoformat(),
+            "slot": slot_id,
+            "group": lessons[0]["group__code"],
+            "lessons": [{k: l[k] for k in ("id","discipline__title","teacher__full_name")} for l in lessons],
+            "reason": "На группу назначено >1 пары в один слот"
         })
 
-    return JsonResponse(out, safe=False)
\ No newline at end of file
+@login_required
+@user_passes_test(_is_admin)
+@require_GET
+def ranepa_conflicts(request):
+    """
+    GET ?start=YYYY-MM-DD&end=YYYY-MM-DD[&format=summary]
+    Один проход по занятиям диапазона, отсортированным по (date, timeslot): занятия ячейки
+    собираются в памяти и делятся по преподавателю/аудитории/группе, правила потоков — прежние.
+    format=summary — только количества (для дашбордов).
+    """
+    start = parse_date(request.GET.get("start") or "")
+    end   = parse_date(request.GET.get("end") or "")
+    if not (start and end):
+        return HttpResponseBadRequest("start,end required")
+
+    rows = (Lesson.objects.filter(date__gte=start, date__lte=end)
+            .order_by("date", "timeslot_id", "id")
+            .values(*_CONFLICT_FIELDS)
+            .iterator(chunk_size=2000))
+
+    out = {"teacher":[], "room":[], "group":[]}
+    scanned = 0
+    for (date, slot_id), cell in groupby(rows, key=itemgetter("date", "timeslot_id")):
+        cell = list(cell)
+        scanned += len(cell)
+        if len(cell) > 1:
+            _cell_conflicts(date, slot_id, cell, out)
+
+    if request.GET.get("format") == "summary":
+        counts = {k: len(v) for k, v in out.items()}
+        return JsonResponse({**counts, "total": sum(counts.values()), "lessons": scanned})
+    return JsonResponse(out, safe=False)
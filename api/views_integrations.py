@@ -3,7 +3,8 @@ from __future__ import annotations
 from django.http import JsonResponse, HttpRequest
 from django.views.decorators.http import require_GET
 from django.contrib.admin.views.decorators import staff_member_required
-from .services.ranepa import fetch_week_from_ranepa, norm
+from .services.ranepa import fetch_week_from_ranepa
+from .services.conflicts import find_item_conflicts
 
 @staff_member_required
 @require_GET
@@ -34,44 +35,10 @@ def ranepa_conflicts(request: HttpRequest):
         if not m: return None, None
         return f"{int(m.group(1)):02d}:{m.group(2)}", f"{int(m.group(3)):02d}:{m.group(4)}"
 
-    # Группируем по дате, потом проверяем накладки для: group, teacher, room
-    from collections import defaultdict
-    by_date = defaultdict(list)
+    # время пары — один раз на элемент; накладки ищутся корзинами (дата, группа/преподаватель/аудитория)
+    rows = []
     for it in items:
         start_hm, end_hm = tr(it.get("order"))
-        by_date[it["date"]].append({
-            **it, "start": start_hm, "end": end_hm
-        })
+        rows.append({**it, "start": start_hm, "end": end_hm})
 
-    def overlap(a_start, a_end, b_start, b_end):
-        # если нет времени — считаем, что одна и та же пара (order) конфликтует
-        if not a_start or not b_start:
-            return True
-        return not (a_end <= b_start or b_end <= a_start)
-
-    conflicts = []
-    for day, arr in by_date.items():
-        n = len(arr)
-        for i in range(n):
-            A = arr[i]
-            for j in range(i+1, n):
-                B = arr[j]
-                if not overlap(A["start"], A["end"], B["start"], B["end"]):
-                    continue
-                reasons = []
-                if A.get("group") and B.get("group") and norm(A["group"]).lower()==norm(B["group"]).lower():
-                    reasons.append("Одинаковая группа в одно время")
-                if A.get("teacher") and B.get("teacher") and norm(A["teacher"]).lower()==norm(B["teacher"]).lower():
-                    reasons.append("Преподаватель занят в другое занятие")
-                if not A.get("is_remote") and not B.get("is_remote"):
-                    r1, r2 = (A.get("room") or "").strip(), (B.get("room") or "").strip()
-                    if r1 and r2 and r1==r2:
-                        reasons.append("Одна и та же аудитория")
-                if reasons:
-                    conflicts.append({
-                        "date": day,
-                        "a": A, "b": B,
-                        "reasons": reasons,
-                    })
-
-    return JsonResponse({"conflicts": conflicts})
+    return JsonResponse({"conflicts": find_item_conflicts(rows)})
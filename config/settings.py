@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -52,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.InstrumentationMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -129,6 +131,15 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.1/howto/static-files/
 
+# загрузка расписания РАНХиГС (api.services.ranepa.fetch_range_from_ranepa):
+# недели диапазона тянутся параллельно, повторы на сетевые ошибки и 429/5xx с паузой BACKOFF·2^n
+RANEPA_BASE_URL = "https://zf-ranepa-rasp.ru"
+RANEPA_FETCH_CONCURRENCY = 4
+RANEPA_FETCH_RETRIES = 2
+RANEPA_FETCH_BACKOFF = 0.5
+# страницы и их разбор — в MEDIA_ROOT/ranepa_pages (api.services.ranepa_pages), запросы условные (ETag)
+RANEPA_PAGE_STORE = True
+
 STATIC_URL = "static/"
 
 # Default primary key field type
@@ -150,6 +161,32 @@ LOGOUT_REDIRECT_URL = "/"
 
 ACADEMIC_MINUTES = 45
 
+# фоновые задачи генератора расписания (потоки внутри процесса веб-сервера)
+GENERATION_JOB_WORKERS = 1
+
+# кэш недельной сетки schedule_today/period (api.services.week_cache), секунды;
+# сбрасывается сигналами, так что срок — лишь страховка. Там же штампы ETag
+# (api.services.versions) и поколение индекса подсказок
+SCHEDULE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сигнал сброса кэша срабатывает в том процессе, где сохранили занятие: при нескольких
+# воркерах (gunicorn/uwsgi) кэш должен быть общим, иначе остальные отдают старую неделю
+# и 304 по старому ETag. REDIS_URL=redis://host:6379/0 — общий Redis (пакет redis);
+# без него LocMemCache — только для одного процесса (runserver, тесты),
+# manage.py check --deploy предупреждает (api.W001).
+REDIS_URL = os.environ.get("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# замеры запросов (core.middleware.InstrumentationMiddleware): время, SQL, дубли N+1,
+# сводка — /api/admin/metrics/. Буфер — последние N запросов каждого процесса;
+# DUMP_SECONDS > 0 — раз в столько секунд сводка в MEDIA_ROOT/metrics/
+INSTRUMENTATION = False
+INSTRUMENTATION_BUFFER = 5000
+INSTRUMENTATION_DUMP_SECONDS = 0
+
 STATIC_URL = "static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 
@@ -0,0 +1,161 @@
+# core/metrics.py
+"""
+Замеры запросов для InstrumentationMiddleware: кольцевой буфер последних
+запросов процесса и сводка по имени маршрута (перцентили времени, SQL, дубли).
+
+Буфер — в памяти процесса (deque с maxlen), у каждого воркера свой; сводка
+считается при чтении. Дубли — повторы одного и того же SQL-шаблона (параметры
+не учитываются) в рамках одного запроса: это и есть N+1. Для шаблона, который
+повторился DUPLICATE_SITE_AFTER раз, запоминается место вызова в коде проекта
+(первый кадр стека вне django/site-packages), чтобы сразу видеть цикл.
+"""
+import json
+import os
+import statistics
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from pathlib import Path
+
+from django.conf import settings
+
+DUPLICATE_SITE_AFTER = 3   # с какого повтора искать место вызова
+TOP_DUPLICATES = 5          # шаблонов с наибольшим числом повторов в сводке
+
+_lock = threading.Lock()
+_buffer = None
+_last_dump = time.monotonic()
+_PROJECT = str(Path(settings.BASE_DIR).resolve())
+
+
+def _ring() -> deque:
+    global _buffer
+    if _buffer is None:
+        _buffer = deque(maxlen=getattr(settings, "INSTRUMENTATION_BUFFER", 5000))
+    return _buffer
+
+
+def _call_site() -> str:
+    """«файл:строка функция» первого кадра из кода проекта (не Django и не этот модуль)."""
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        path = frame.filename
+        if (path.startswith(_PROJECT) and "site-packages" not in path
+                and not path.endswith(("core/metrics.py", "core/middleware.py"))):
+            return f"{os.path.relpath(path, _PROJECT)}:{frame.lineno} {frame.name}"
+    return ""
+
+
+class QueryRecorder:
+    """connection.execute_wrapper на время одного запроса: число, время БД, повторы шаблонов."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.templates = Counter()
+        self.sites = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        t0 = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_ms += (time.perf_counter() - t0) * 1000
+            self.count += 1
+            self.templates[sql] += 1
+            if self.templates[sql] == DUPLICATE_SITE_AFTER:
+                self.sites[sql] = _call_site()
+
+    @property
+    def duplicates(self) -> int:
+        return sum(n - 1 for n in self.templates.values() if n > 1)
+
+    def top_duplicates(self):
+        return [{"sql": sql[:300], "count": n, "site": self.sites.get(sql, "")}
+                for sql, n in self.templates.most_common(TOP_DUPLICATES) if n > 1]
+
+
+def record(name, method, status, wall_ms, size, rec: QueryRecorder):
+    entry = {
+        "name": name, "method": method, "status": status, "at": time.time(),
+        "wall_ms": wall_ms, "db_ms": rec.db_ms, "queries": rec.count,
+        "duplicates": rec.duplicates, "size": size, "top": rec.top_duplicates(),
+    }
+    with _lock:
+        _ring().append(entry)
+    _maybe_dump()
+
+
+def reset():
+    with _lock:
+        _ring().clear()
+
+
+def _pct(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return round(values[lo] + (values[hi] - values[lo]) * (k - lo), 2)
+
+
+def summary(sort="p95", limit=None) -> dict:
+    """Сводка по маршрутам, отсортированная по убыванию sort (p95, p50, max, queries, duplicates, count)."""
+    with _lock:
+        entries = list(_ring())
+    by_name = {}
+    for e in entries:
+        by_name.setdefault(e["name"], []).append(e)
+
+    rows = []
+    for name, es in by_name.items():
+        wall = [e["wall_ms"] for e in es]
+        dups = {}
+        for e in es:
+            for d in e["top"]:
+                cur = dups.get(d["sql"])
+                if cur is None or d["count"] > cur["count"]:
+                    dups[d["sql"]] = d
+        rows.append({
+            "name": name, "count": len(es),
+            "errors": sum(1 for e in es if e["status"] >= 500),
+            "p50": _pct(wall, 50), "p95": _pct(wall, 95), "p99": _pct(wall, 99), "max": round(max(wall), 2),
+            "db_ms_mean": round(statistics.fmean(e["db_ms"] for e in es), 2),
+            "queries": round(statistics.fmean(e["queries"] for e in es), 1),
+            "queries_max": max(e["queries"] for e in es),
+            "duplicates": max(e["duplicates"] for e in es),
+            "size_mean": round(statistics.fmean(e["size"] for e in es if e["size"] is not None), 0)
+            if any(e["size"] is not None for e in es) else None,
+            "top_duplicates": sorted(dups.values(), key=lambda d: -d["count"])[:TOP_DUPLICATES],
+        })
+    key = {"queries": "queries_max"}.get(sort, sort)
+    if rows and key not in rows[0]:
+        key = "p95"
+    rows.sort(key=lambda r: r[key] or 0, reverse=True)
+    return {
+        "pid": os.getpid(), "requests": len(entries), "buffer": _ring().maxlen,
+        "since": min((e["at"] for e in entries), default=None),
+        "endpoints": rows[:limit] if limit else rows,
+    }
+
+
+def _maybe_dump():
+    """Раз в INSTRUMENTATION_DUMP_SECONDS пишет сводку в MEDIA_ROOT/metrics/metrics_<pid>.json (0 — выключено)."""
+    global _last_dump
+    every = getattr(settings, "INSTRUMENTATION_DUMP_SECONDS", 0)
+    if not every:
+        return
+    now = time.monotonic()
+    with _lock:
+        if now - _last_dump < every:
+            return
+        _last_dump = now
+    out_dir = Path(settings.MEDIA_ROOT) / "metrics"
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        tmp = out_dir / f".metrics_{os.getpid()}.json"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(summary(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, out_dir / f"metrics_{os.getpid()}.json")
+    except OSError:
+        pass  # замеры не должны ронять запрос
@@ -1,9 +1,15 @@
+import time
+
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
 from django.shortcuts import render
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
 from django.shortcuts import resolve_url
 
+from . import metrics
+
 EXEMPT_PREFIXES = ("/admin/", "/static/", "/media/")
 
 def _get_cfg():
@@ -45,3 +51,46 @@ class MaintenanceModeMiddleware(MiddlewareMixin):
             return render(request, "maintenance.html", {"message": cfg.message}, status=503)
 
         return None
+
+
+class InstrumentationMiddleware:
+    """
+    Замеры по каждому запросу (включается INSTRUMENTATION = True): время целиком,
+    время и число SQL, повторы одного SQL-шаблона (N+1) и размер ответа — в
+    кольцевой буфер core.metrics, сводка — /api/admin/metrics/.
+    Потоковые ответы досчитываются, когда клиент дочитает тело.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rec = metrics.QueryRecorder()
+        t0 = time.perf_counter()
+        with connection.execute_wrapper(rec):
+            response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        name = (match.view_name if match else None) or "<unresolved>"
+
+        if not getattr(response, "streaming", False):
+            size = len(response.content) if hasattr(response, "content") else None
+            metrics.record(name, request.method, response.status_code,
+                           (time.perf_counter() - t0) * 1000, size, rec)
+            return response
+
+        response.streaming_content = self._tail(response.streaming_content, name, request.method,
+                                                response.status_code, t0, rec)
+        return response
+
+    @staticmethod
+    def _tail(chunks, name, method, status, t0, rec):
+        size = 0
+        try:
+            with connection.execute_wrapper(rec):
+                for chunk in chunks:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            metrics.record(name, method, status, (time.perf_counter() - t0) * 1000, size, rec)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TimeSlot, Lesson, HomeworkItem, ImportJob
+from .models import TimeSlot, Lesson, HomeworkItem, ImportJob, GenerationJob
 
 admin.site.register(TimeSlot)
 admin.site.register(Lesson)
@@ -12,4 +12,11 @@ class ImportJobAdmin(admin.ModelAdmin):
     def _created(self,obj): return (obj.totals or {}).get("created",0)
     def _updated(self,obj): return (obj.totals or {}).get("updated",0)
     def _skipped(self,obj): return (obj.totals or {}).get("skipped",0)
-    def _errors(self,obj):  return (obj.totals or {}).get("errors",0)
\ No newline at end of file
+    def _errors(self,obj):  return (obj.totals or {}).get("errors",0)
+
+@admin.register(GenerationJob)
+class GenerationJobAdmin(admin.ModelAdmin):
+    list_display = ("created_at","status","user","days_done","days_total","placed","skipped","conflicts")
+    list_filter = ("status",)
+    readonly_fields = ("created_at","started_at","finished_at","status","user","params",
+                       "days_total","days_done","placed","skipped","conflicts","cancel_requested","result","error")
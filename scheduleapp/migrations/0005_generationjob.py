@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduleapp', '0004_lesson_is_stream'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Запущено')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка'), ('cancelled', 'Отменено')], default='pending', max_length=16, verbose_name='Статус')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Параметры запуска')),
+                ('days_total', models.PositiveIntegerField(default=0, verbose_name='Дней всего')),
+                ('days_done', models.PositiveIntegerField(default=0, verbose_name='Дней обработано')),
+                ('placed', models.PositiveIntegerField(default=0, verbose_name='Размещено')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='Пропущено')),
+                ('conflicts', models.PositiveIntegerField(default=0, verbose_name='Конфликтов')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='Запрошена отмена')),
+                ('result', models.JSONField(blank=True, default=dict, verbose_name='Результат')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Генерация',
+                'verbose_name_plural': 'Генерации',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduleapp', '0006_lesson_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='source',
+            field=models.CharField(blank=True, choices=[('', 'Вручную / генератор'), ('RANEPA', 'RANEPA')], default='', max_length=32, verbose_name='Источник'),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.utils import timezone
 from directory.models import Room, LessonType, Discipline, Teacher, StudentGroup
 from django.core.exceptions import ValidationError
 from django.conf import settings
+from .occupancy import Occupancy
 
 class TimeSlot(models.Model):
     # порядковый номер пары в дне: 1,2,3...
@@ -18,6 +19,11 @@ class TimeSlot(models.Model):
         return f"{self.order} пара: {self.start_time}–{self.end_time}"
 
 class Lesson(models.Model):
+    SOURCE_CHOICES = [
+        ("", "Вручную / генератор"),
+        ("RANEPA", "RANEPA"),
+    ]
+
     date = models.DateField()
     timeslot = models.ForeignKey(TimeSlot, on_delete=models.PROTECT)
     group = models.ForeignKey(StudentGroup, on_delete=models.PROTECT, related_name="lessons")
@@ -31,10 +37,28 @@ class Lesson(models.Model):
         default=False,
         help_text="Потоковая лекция (одно занятие для нескольких групп одновременно)"
     )
+    # кто завёл занятие: импорт удаляет пропавшие из источника только среди своих
+    source = models.CharField(max_length=32, choices=SOURCE_CHOICES, blank=True, default="",
+                              verbose_name="Источник")
 
     class Meta:
         ordering = ["date", "timeslot__order"]
         unique_together = ("date", "timeslot", "group")  # одна группа — одна пара в этот слот
+        # под реальные выборки (см. manage.py explain_queries):
+        #  - расписание/экспорт преподавателя и группы: teacher|group = X AND date BETWEEN …
+        #  - занятость ячейки (Lesson.clean, teacher_free_rooms): date, timeslot, room
+        indexes = [
+            models.Index(fields=["teacher", "date"], name="lesson_teacher_date_idx"),
+            models.Index(fields=["group", "date"], name="lesson_group_date_idx"),
+            models.Index(fields=["date", "timeslot", "room"], name="lesson_date_slot_room_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # значения из базы: сигналы сбрасывают и кэш той недели/группы, откуда занятие ушло, без SELECT
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     def status_for_now(self):
         now = timezone.localtime()
@@ -48,11 +72,20 @@ class Lesson(models.Model):
 
     def clean(self):
         super().clean()
+        if not (self.date and self.timeslot_id):
+            return
         # Ищем все занятия в тот же день и слот
-        qs = Lesson.objects.filter(date=self.date, timeslot=self.timeslot).exclude(pk=self.pk)
+        qs = Lesson.objects.filter(date=self.date, timeslot_id=self.timeslot_id).exclude(pk=self.pk)
+
+        # Занятость ячейки одним запросом; подробные выборки ниже — только если есть пересечение
+        occ = Occupancy.from_lessons(
+            self.date, self.date, lessons=qs,
+            slots=[TimeSlot(id=self.timeslot_id)],
+            rooms=[Room(id=self.room_id)] if self.room_id else [],
+        )
 
         # ---- Teacher conflicts ----
-        if self.teacher_id:
+        if self.teacher_id and not occ.teacher_free(self.date, self.timeslot_id, self.teacher_id):
             clashes = qs.filter(teacher_id=self.teacher_id)
 
             # Разрешаем «одновременность», если это один и тот же поток:
@@ -75,7 +108,7 @@ class Lesson(models.Model):
         # ---- Room conflicts ----
         # Для потоков разрешаем делить одну аудиторию несколькими группами,
         # если это один и тот же «поток» (см. критерии выше)
-        if self.room_id:
+        if self.room_id and not occ.room_free(self.date, self.timeslot_id, self.room_id):
             r_clashes = qs.filter(room_id=self.room_id)
             if self.is_stream:
                 bad = r_clashes.exclude(
@@ -131,4 +164,46 @@ class ImportJob(models.Model):
         verbose_name_plural = "Импорты"
 
     def __str__(self):
-        return f"[{self.source}] {self.created_at:%Y-%m-%d %H:%M}"
\ No newline at end of file
+        return f"[{self.source}] {self.created_at:%Y-%m-%d %H:%M}"
+
+class GenerationJob(models.Model):
+    """Фоновый запуск генератора расписания (см. api.services.generation_jobs)."""
+    STATUS_CHOICES = [
+        ("pending", "В очереди"),
+        ("running", "Выполняется"),
+        ("done", "Готово"),
+        ("failed", "Ошибка"),
+        ("cancelled", "Отменено"),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        verbose_name="Пользователь"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Запущено")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершено")
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="pending", verbose_name="Статус")
+
+    # start/end/groups/dry_run/backtrack — как в GET /api/admin/generate/
+    params = models.JSONField(default=dict, blank=True, verbose_name="Параметры запуска")
+
+    # прогресс: обновляется воркером после каждого обработанного дня
+    days_total = models.PositiveIntegerField(default=0, verbose_name="Дней всего")
+    days_done = models.PositiveIntegerField(default=0, verbose_name="Дней обработано")
+    placed = models.PositiveIntegerField(default=0, verbose_name="Размещено")
+    skipped = models.PositiveIntegerField(default=0, verbose_name="Пропущено")
+    conflicts = models.PositiveIntegerField(default=0, verbose_name="Конфликтов")
+
+    cancel_requested = models.BooleanField(default=False, verbose_name="Запрошена отмена")
+    # итоговый ответ генератора (тот же JSON, что отдаёт синхронная ручка)
+    result = models.JSONField(default=dict, blank=True, verbose_name="Результат")
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Генерация"
+        verbose_name_plural = "Генерации"
+
+    def __str__(self):
+        return f"[{self.status}] {self.created_at:%Y-%m-%d %H:%M}"
@@ -0,0 +1,155 @@
+# scheduleapp/occupancy.py
+"""
+Компактная матрица занятости: ячейка = (индекс дня в диапазоне) × (позиция слота),
+в каждой ячейке — три целых-битсета: аудитории, преподаватели, группы.
+
+Вместо множеств кортежей (date, timeslot_id, id) — три плоских списка int длиной
+days × slots. Проверка «свободен ли X» — индекс ячейки + сдвиг и AND, «все свободные
+аудитории ячейки» — одна операция над битсетом (при желании — с маской подходящих).
+
+Биты аудиторий задаются порядком rooms (генератор передаёт свой порядок предпочтения,
+поэтому номер бита = позиция аудитории в этом порядке). Биты преподавателей и групп
+раздаются по мере появления id.
+
+Структуру используют генератор (GreedyEngine), подбор свободных аудиторий
+(teacher_free_rooms) и проверка конфликтов в Lesson.clean.
+"""
+import sys
+from datetime import timedelta
+
+
+class Occupancy:
+    def __init__(self, start_date, end_date, slots, rooms=()):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.slots = list(slots)
+        self.rooms = list(rooms)
+        self.n_slots = len(self.slots)
+        self.n_days = max(0, (end_date - start_date).days + 1)
+        self.slot_pos = {s.id: i for i, s in enumerate(self.slots)}
+        self.day_pos = {start_date + timedelta(days=i): i for i in range(self.n_days)}
+        # (date, slot_id) -> индекс ячейки: один поиск в dict на проверку
+        self._cell = {(day, s.id): d * self.n_slots + k
+                      for day, d in self.day_pos.items() for k, s in enumerate(self.slots)}
+        self.room_bit = {r.id: i for i, r in enumerate(self.rooms)}
+        self.teacher_bit = {}
+        self.group_bit = {}
+
+        size = self.n_days * self.n_slots
+        self.room = [0] * size
+        self.teacher = [0] * size
+        self.group = [0] * size
+
+    @classmethod
+    def from_lessons(cls, start_date, end_date, *, slots=None, rooms=None, lessons=None, exclude_pk=None):
+        """
+        Загружает занятость одним запросом по Lesson за [start_date, end_date].
+        lessons — уже отфильтрованный queryset (например, одна ячейка), exclude_pk — не учитывать это занятие.
+        """
+        from scheduleapp.models import Lesson, TimeSlot
+        from directory.models import Room
+
+        if slots is None:
+            slots = TimeSlot.objects.order_by("order")
+        if rooms is None:
+            rooms = Room.objects.select_related("building").order_by("building__name", "name")
+        occ = cls(start_date, end_date, slots, rooms)
+        qs = lessons if lessons is not None else Lesson.objects.filter(date__range=(start_date, end_date))
+        if exclude_pk:
+            qs = qs.exclude(pk=exclude_pk)
+        occ.load(qs.values_list("date", "timeslot_id", "group_id", "teacher_id", "room_id"))
+        return occ
+
+    # ---------- индексы ----------
+    def cell(self, day, slot_id):
+        """Индекс ячейки или None, если день/слот вне матрицы."""
+        return self._cell.get((day, slot_id))
+
+    def _bit(self, bits: dict, ident) -> int:
+        b = bits.get(ident)
+        if b is None:
+            b = bits[ident] = len(bits)
+        return b
+
+    # ---------- запись ----------
+    def load(self, rows):
+        """rows: итерируемое (date, timeslot_id, group_id, teacher_id, room_id)."""
+        cells, gbit, tbit, rbit = self._cell, self.group_bit, self.teacher_bit, self.room_bit
+        group, teacher, room = self.group, self.teacher, self.room
+        for day, slot_id, group_id, teacher_id, room_id in rows:
+            c = cells.get((day, slot_id))
+            if c is None:
+                continue
+            if group_id:
+                group[c] |= 1 << gbit.setdefault(group_id, len(gbit))
+            if teacher_id:
+                teacher[c] |= 1 << tbit.setdefault(teacher_id, len(tbit))
+            if room_id in rbit:
+                room[c] |= 1 << rbit[room_id]
+
+    def add(self, day, slot_id, *, group_id=None, teacher_id=None, room_id=None):
+        c = self.cell(day, slot_id)
+        if c is None:
+            return
+        if group_id:
+            self.group[c] |= 1 << self._bit(self.group_bit, group_id)
+        if teacher_id:
+            self.teacher[c] |= 1 << self._bit(self.teacher_bit, teacher_id)
+        if room_id and room_id in self.room_bit:
+            self.room[c] |= 1 << self.room_bit[room_id]
+
+    def remove(self, day, slot_id, *, group_id=None, teacher_id=None, room_id=None):
+        c = self.cell(day, slot_id)
+        if c is None:
+            return
+        if group_id in self.group_bit:
+            self.group[c] &= ~(1 << self.group_bit[group_id])
+        if teacher_id in self.teacher_bit:
+            self.teacher[c] &= ~(1 << self.teacher_bit[teacher_id])
+        if room_id in self.room_bit:
+            self.room[c] &= ~(1 << self.room_bit[room_id])
+
+    # ---------- запросы ----------
+    def group_free(self, day, slot_id, group_id) -> bool:
+        b = self.group_bit.get(group_id)
+        c = self.cell(day, slot_id)
+        return b is None or c is None or not (self.group[c] >> b & 1)
+
+    def teacher_free(self, day, slot_id, teacher_id) -> bool:
+        b = self.teacher_bit.get(teacher_id)
+        c = self.cell(day, slot_id)
+        return b is None or c is None or not (self.teacher[c] >> b & 1)
+
+    def room_free(self, day, slot_id, room_id) -> bool:
+        """Аудитория вне rooms не отслеживается (как и день/слот вне матрицы) — считается свободной."""
+        b = self.room_bit.get(room_id)
+        c = self.cell(day, slot_id)
+        return b is None or c is None or not (self.room[c] >> b & 1)
+
+    def busy_rooms_mask(self, day, slot_id) -> int:
+        c = self.cell(day, slot_id)
+        return 0 if c is None else self.room[c]
+
+    def free_rooms_mask(self, day, slot_id, eligible=None) -> int:
+        """Битсет свободных аудиторий ячейки (в пределах eligible, если задан)."""
+        full = eligible if eligible is not None else (1 << len(self.rooms)) - 1
+        return full & ~self.busy_rooms_mask(day, slot_id)
+
+    def free_rooms(self, day, slot_id, eligible=None):
+        """Свободные аудитории ячейки в порядке rooms."""
+        mask = self.free_rooms_mask(day, slot_id, eligible)
+        out = []
+        while mask:
+            low = mask & -mask
+            out.append(self.rooms[low.bit_length() - 1])
+            mask ^= low
+        return out
+
+    def nbytes(self) -> int:
+        """Приблизительный объём в памяти: списки ячеек, битсеты и словари индексов."""
+        total = 0
+        for arr in (self.room, self.teacher, self.group):
+            total += sys.getsizeof(arr) + sum(sys.getsizeof(x) for x in arr if x)
+        for d in (self.slot_pos, self.day_pos, self._cell, self.room_bit, self.teacher_bit, self.group_bit):
+            total += sys.getsizeof(d)
+        return total
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+Бенчмарк памяти export_csv: прежняя сборка файла в StringIO vs потоковая
+выгрузка (api.services.exports.csv_chunks).
+
+Берёт копию SQLite-базы из настроек, размножает имеющиеся занятия по неделям
+на --years лет вперёд (bulk_create во временной копии, рабочая база не трогается)
+и для каждого диапазона запускает выгрузку всего колледжа в отдельном процессе,
+чтобы пиковый RSS (ru_maxrss) не смешивался между прогонами.
+
+    python tools/bench_export_csv.py --years 1,5
+"""
+import os, sys, argparse, json, resource, shutil, subprocess, tempfile, time
+from pathlib import Path
+from datetime import date, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+from django.conf import settings
+
+
+def setup(db_path=None):
+    """django.setup(); db_path — подменить файл SQLite до первого подключения."""
+    django.setup()
+    if db_path:
+        settings.DATABASES["default"]["NAME"] = str(db_path)
+
+
+def rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux: КБ
+
+
+def legacy_export(qs):
+    """Прежний export_csv: весь файл в StringIO, потом одним bytes."""
+    import csv
+    from io import StringIO
+    si = StringIO()
+    w = csv.writer(si, delimiter=";")
+    w.writerow(["id","date","slot","time","group","discipline","lesson_type","teacher","room","building","is_remote","remote_platform"])
+    for l in qs.select_related("timeslot","group","discipline","teacher","lesson_type","room","room__building"):
+        w.writerow([
+            l.id, l.date.isoformat(), l.timeslot.order,
+            f"{l.timeslot.start_time.strftime('%H:%M')}–{l.timeslot.end_time.strftime('%H:%M')}",
+            l.group.code if l.group_id else "", l.discipline.title,
+            l.lesson_type.name if l.lesson_type_id else "", l.teacher.full_name,
+            l.room.name if l.room_id else "",
+            l.room.building.name if (l.room_id and l.room.building_id) else "",
+            "1" if l.is_remote else "0", l.remote_platform or "",
+        ])
+    csv_bytes = si.getvalue().encode("utf-8-sig")
+    yield csv_bytes
+
+
+def worker(args):
+    """Один прогон выгрузки; печатает JSON с размером, временем и RSS."""
+    setup(args.db)
+    from scheduleapp.models import Lesson
+    from api.services.exports import csv_chunks
+
+    qs = (Lesson.objects.filter(date__range=(args.start, args.end))
+          .order_by("date", "timeslot__order", "group__code"))
+    base = rss_kb()
+    t0 = time.perf_counter()
+    chunks = legacy_export(qs) if args.worker == "legacy" else csv_chunks(qs)
+    size = 0
+    with open(os.devnull, "wb") as sink:
+        for chunk in chunks:
+            size += len(chunk)
+            sink.write(chunk)
+    print(json.dumps({"bytes": size, "seconds": time.perf_counter() - t0,
+                      "rss_base_kb": base, "rss_peak_kb": rss_kb()}))
+
+
+def fill(db_path, years):
+    """Копирует существующие занятия по неделям до start + years лет. Возвращает (start, rows)."""
+    setup(db_path)
+    from scheduleapp.models import Lesson
+
+    first = Lesson.objects.order_by("date").values_list("date", flat=True).first()
+    if first is None:
+        sys.exit("В базе нет занятий — размножать нечего")
+    start = first - timedelta(days=first.weekday())
+    fields = [f.attname for f in Lesson._meta.concrete_fields if f.attname != "id"]
+    week = list(Lesson.objects.filter(date__range=(start, start + timedelta(days=6))).values(*fields))
+    Lesson.objects.filter(date__gt=start + timedelta(days=6)).delete()
+
+    weeks = int(years * 52.2) + 1
+    batch = []
+    for k in range(1, weeks):
+        shift = timedelta(weeks=k)
+        batch += [Lesson(**{**row, "date": row["date"] + shift}) for row in week]
+        if len(batch) >= 20_000:
+            Lesson.objects.bulk_create(batch, batch_size=2000)
+            batch = []
+    if batch:
+        Lesson.objects.bulk_create(batch, batch_size=2000)
+    return start, len(week) * weeks
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Пиковая память export_csv: StringIO vs поток")
+    ap.add_argument("--years", default="1,5")
+    ap.add_argument("--worker", choices=["legacy", "stream"], help=argparse.SUPPRESS)
+    ap.add_argument("--db", help=argparse.SUPPRESS)
+    ap.add_argument("--start", type=date.fromisoformat, help=argparse.SUPPRESS)
+    ap.add_argument("--end", type=date.fromisoformat, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.worker:
+        return worker(args)
+
+    src = settings.DATABASES["default"]
+    if "sqlite" not in src["ENGINE"]:
+        sys.exit("Бенчмарк работает с копией SQLite-базы")
+    years = [float(y) for y in args.years.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "bench.sqlite3"
+        shutil.copy(src["NAME"], db)
+        t0 = time.perf_counter()
+        start, total = fill(db, max(years))
+        print(f"Набор: {total} занятий на {max(years):g} лет ({time.perf_counter() - t0:.1f} с)")
+
+        print(f"{'лет':>5}{'режим':>8}{'МБ CSV':>9}{'сек':>8}{'RSS база, МБ':>14}{'пик, МБ':>10}{'прирост, МБ':>13}")
+        for y in years:
+            end = start + timedelta(days=int(y * 365.25) - 1)
+            for mode in ("legacy", "stream"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--worker", mode, "--db", str(db),
+                     "--start", start.isoformat(), "--end", end.isoformat()],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                print(f"{y:5g}{mode:>8}{r['bytes'] / 2**20:9.1f}{r['seconds']:8.1f}"
+                      f"{r['rss_base_kb'] / 1024:14.1f}{r['rss_peak_kb'] / 1024:10.1f}"
+                      f"{(r['rss_peak_kb'] - r['rss_base_kb']) / 1024:13.1f}")
+
+
+if __name__ == "__main__":
+    main()
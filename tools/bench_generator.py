@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+"""
+Бенчмарк генератора расписания: прежний вложенный жадный цикл vs GreedyEngine.
+
+Оба алгоритма получают один и тот же синтетический набор данных (без БД, только
+объекты моделей в памяти) и должны выдать одинаковые предложения.
+
+    python tools/bench_generator.py --groups 150 --rooms 200 --days 28 [--optimize 10]
+"""
+import os, sys, argparse, random, time
+from pathlib import Path
+from datetime import date, datetime, time as dtime, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from directory.models import (
+    Building, RoomType, Room, LessonType, Discipline, Teacher, StudentGroup,
+    TeacherWorkload, GroupDisciplinePlan, BuildingPriority,
+)
+from scheduleapp.models import TimeSlot
+from api.services.generator import GenerationContext, GreedyEngine, slot_minutes
+from api.services.parallel import run_parallel, partition_groups
+from api.services.optimizer import optimize
+
+BELL = [(8, 20, 9, 50), (10, 0, 11, 30), (11, 35, 13, 5), (13, 35, 15, 5), (15, 10, 16, 40), (16, 50, 18, 20)]
+
+
+def synthetic_context(*, seed, n_groups, n_rooms, n_teachers, days, start=date(2025, 9, 1)):
+    rnd = random.Random(seed)
+    buildings = [Building(id=i + 1, name=f"Корпус {chr(0x410 + i)}") for i in range(4)]
+    rtypes = [RoomType(id=1, name="компьютерный"), RoomType(id=2, name="спортзал"), RoomType(id=3, name="лаборатория")]
+    ltype = LessonType(id=1, name="Лекция")
+
+    rooms = []
+    for i in range(n_rooms):
+        b = rnd.choice(buildings)
+        rt = rnd.choice([None] * 6 + rtypes)
+        r = Room(id=i + 1, name=str(100 + i), building=b, room_type=rt,
+                 capacity=rnd.choice([0, 20, 25, 30, 40, 60, 120]),
+                 computers=(rnd.choice([15, 25, 30]) if rt and rt.id == 1 else 0))
+        rooms.append(r)
+    rooms.sort(key=lambda r: (r.capacity, r.computers, r.building.name, r.name))
+
+    disciplines = {}
+    for i in range(40):
+        rt = rtypes[i % 3] if i % 5 == 0 else None
+        disciplines[i + 1] = Discipline(
+            id=i + 1, title=f"Дисциплина {i + 1}",
+            delivery_mode=rnd.choice(["in_person"] * 6 + ["mixed", "remote"]),
+            default_lesson_type=ltype, required_room_type=rt,
+            requires_computers=bool(rt and rt.id == 1),
+        )
+
+    teachers = [Teacher(id=i + 1, full_name=f"Преподаватель {i + 1}") for i in range(n_teachers)]
+    workloads = {t.id: TeacherWorkload(teacher=t, weekly_hours_limit=rnd.choice([18, 24, 36]),
+                                       days_off=rnd.choice(["", "", "5", "0", "2"]))
+                 for t in teachers}
+
+    groups = [StudentGroup(id=i + 1, code=f"Г-{i + 1:03d}", size=rnd.choice([15, 20, 25, 30])) for i in range(n_groups)]
+    plans, assignments, prefs = {}, {}, {}
+    pid = 0
+    for g in groups:
+        plans[g.id], assignments[g.id] = [], {}
+        for did in rnd.sample(list(disciplines), 8):
+            pid += 1
+            plans[g.id].append(GroupDisciplinePlan(id=pid, group=g, discipline=disciplines[did],
+                                                   hours_total=rnd.choice([36, 54, 72]), hours_assigned=0))
+            # преподаватели — из своего отделения (отделений 10), как в реальном колледже
+            dept = teachers[(g.id % 10)::10]
+            assignments[g.id][did] = rnd.sample(dept, rnd.choice([1, 2]))
+            if rnd.random() < 0.3:
+                prefs[(g.id, did)] = [BuildingPriority(group=g, discipline=disciplines[did], building=b, priority=k)
+                                      for k, b in enumerate(rnd.sample(buildings, 2))]
+
+    slots = [TimeSlot(id=i + 1, order=i + 1, start_time=dtime(a, b), end_time=dtime(c, d))
+             for i, (a, b, c, d) in enumerate(BELL)]
+
+    return GenerationContext(
+        start_date=start, end_date=start + timedelta(days=days - 1),
+        groups=groups, slots=slots, disciplines=disciplines, plans=plans,
+        assignments=assignments, building_prefs=prefs, holidays={}, workloads=workloads,
+        overrides={}, rooms=rooms, existing=[],
+    )
+
+
+def legacy_greedy(ctx, backtrack=True, academic_min=45):
+    """Прежний алгоритм из admin_generate_schedule (до выноса в GreedyEngine), без ORM-загрузки."""
+    start_date, end_date = ctx.start_date, ctx.end_date
+    groups, slots, disc_map, plans = ctx.groups, ctx.slots, ctx.disc_map, ctx.plans
+    assignments, building_prefs = ctx.assignments, ctx.building_prefs
+    holidays, workloads, overrides, rooms_all = ctx.holidays, ctx.workloads, ctx.overrides, ctx.rooms
+
+    busy_room = set((d, s, r) for d, s, g, t, r in ctx.existing if r)
+    busy_teacher = set((d, s, t) for d, s, g, t, r in ctx.existing)
+    busy_group = set((d, s, g) for d, s, g, t, r in ctx.existing)
+
+    def teacher_allowed_on_day(t, day):
+        h = holidays.get(day)
+        if h and not h.is_working:
+            return False
+        ov = overrides.get((t.id, day))
+        if ov:
+            return not ov.is_off
+        w = workloads.get(t.id)
+        if not w or not w.days_off:
+            return True
+        offs = {int(x) for x in w.days_off.split(",") if x.strip().isdigit()}
+        return (day.weekday() not in offs)
+
+    def teacher_time_window_ok(t, slot, day):
+        w = workloads.get(t.id)
+        ov = overrides.get((t.id, day))
+        start = ov.start if ov and ov.start else (w.default_start if w and w.default_start else None)
+        end = ov.end if ov and ov.end else (w.default_end if w and w.default_end else None)
+        if start and slot.start_time < start: return False
+        if end and slot.end_time > end: return False
+        return True
+
+    weekly_minutes = {}
+
+    def candidate_rooms_for(group, disc, day, slot):
+        need_type = disc.required_room_type_id
+        need_computers = disc.requires_computers
+        gsize = group.size or 0
+        if disc.delivery_mode == "remote":
+            return []
+        cand = []
+        for r in rooms_all:
+            if (day, slot.id, r.id) in busy_room:
+                continue
+            if need_type and (r.room_type_id != need_type):
+                continue
+            if r.capacity and gsize and r.capacity < gsize:
+                continue
+            if need_computers:
+                if not r.computers or r.computers < gsize:
+                    continue
+            cand.append(r)
+        prefs = building_prefs.get((group.id, disc.id))
+        if prefs:
+            order_map = {p.building_id: p.priority for p in prefs}
+            cand.sort(key=lambda r: (order_map.get(r.building_id, 9999), r.capacity or 0, r.computers or 0))
+        else:
+            cand.sort(key=lambda r: (r.capacity or 9999, r.computers or 9999, r.building.name, r.name))
+        return cand
+
+    conflicts, proposals = [], []
+    stats = {"placed": 0, "skipped": 0}
+
+    def try_place(group, p_item, day, slot, try_shift=True):
+        disc = p_item["discipline"]
+        plan = p_item["plan"]
+        is_remote = (disc.delivery_mode == "remote")
+        try_remote_as_fallback = (disc.delivery_mode == "mixed")
+        teachers = assignments.get(group.id, {}).get(disc.id, [])
+        t_ok = None
+        for t in teachers:
+            if (day, slot.id, t.id) in busy_teacher:
+                continue
+            if not teacher_allowed_on_day(t, day):
+                continue
+            if not teacher_time_window_ok(t, slot, day):
+                continue
+            wk = (t.id, *day.isocalendar()[:2])
+            limit = workloads.get(t.id).weekly_hours_limit * 60 if workloads.get(t.id) and workloads.get(t.id).weekly_hours_limit else None
+            new_total = weekly_minutes.get(wk, 0) + slot_minutes(slot)
+            if limit and new_total > limit:
+                continue
+            t_ok = t
+            break
+        if not t_ok:
+            conflicts.append(("no_teacher", day, slot.order, group.id))
+            return False
+        rooms_try = [] if is_remote else candidate_rooms_for(group, disc, day, slot)
+        chosen_room = None
+        chosen_remote = is_remote
+        if not is_remote:
+            for r in rooms_try:
+                if (day, slot.id, r.id) in busy_room:
+                    continue
+                chosen_room = r
+                break
+            if not chosen_room and try_remote_as_fallback:
+                chosen_remote = True
+        if not chosen_remote and chosen_room is None:
+            if try_shift:
+                return False
+            conflicts.append(("no_room", day, slot.order, group.id))
+            return False
+        proposals.append({
+            "date": day.isoformat(), "timeslot_id": slot.id, "group_id": group.id,
+            "discipline_id": disc.id, "teacher_id": t_ok.id,
+            "lesson_type_id": disc.default_lesson_type_id,
+            "room_id": (None if chosen_remote else (chosen_room.id if chosen_room else None)),
+            "is_remote": chosen_remote,
+        })
+        busy_group.add((day, slot.id, group.id))
+        busy_teacher.add((day, slot.id, t_ok.id))
+        if not chosen_remote and chosen_room:
+            busy_room.add((day, slot.id, chosen_room.id))
+        wk = (t_ok.id, *day.isocalendar()[:2])
+        weekly_minutes[wk] = weekly_minutes.get(wk, 0) + slot_minutes(slot)
+        plan.hours_assigned += slot_minutes(slot) / academic_min
+        return True
+
+    cur = start_date
+    while cur <= end_date:
+        if (hol := holidays.get(cur)) and not hol.is_working:
+            cur += timedelta(days=1); continue
+        for slot in slots:
+            for g in groups:
+                if (cur, slot.id, g.id) in busy_group:
+                    continue
+                p_items = plans.get(g.id, [])
+                p_items.sort(key=lambda x: (
+                    0 if (disc_map[x.discipline_id].required_room_type_id or disc_map[x.discipline_id].requires_computers) else 1
+                ))
+                candidate = None
+                for p in p_items:
+                    if p.hours_assigned < p.hours_total:
+                        candidate = {"plan": p, "discipline": disc_map[p.discipline_id]}
+                        break
+                if not candidate:
+                    continue
+                placed = try_place(g, candidate, cur, slot, try_shift=backtrack)
+                if not placed and backtrack:
+                    next_slot = next((s for s in slots if s.order > slot.order), None)
+                    if next_slot and (cur, next_slot.id, g.id) not in busy_group:
+                        placed2 = try_place(g, candidate, cur, next_slot, try_shift=False)
+                        if not placed2:
+                            conflicts.append(("backtrack_failed", cur, slot.order, g.id))
+                            stats["skipped"] += 1
+                        else:
+                            stats["placed"] += 1
+                    else:
+                        conflicts.append(("no_slot_to_shift", cur, slot.order, g.id))
+                        stats["skipped"] += 1
+                elif placed:
+                    stats["placed"] += 1
+                else:
+                    stats["skipped"] += 1
+        cur += timedelta(days=1)
+    return proposals, conflicts, stats
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Размещений в секунду: прежний жадный цикл vs GreedyEngine")
+    ap.add_argument("--groups", type=int, default=150)
+    ap.add_argument("--rooms", type=int, default=200)
+    ap.add_argument("--teachers", type=int, default=250)
+    ap.add_argument("--days", type=int, default=28)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=0, help="дополнительно прогнать параллельный режим на N процессах")
+    ap.add_argument("--optimize", type=float, default=0, help="секунд локального поиска после GreedyEngine")
+    args = ap.parse_args()
+
+    def build():
+        return synthetic_context(seed=args.seed, n_groups=args.groups, n_rooms=args.rooms,
+                                 n_teachers=args.teachers, days=args.days)
+
+    print(f"Набор: {args.groups} групп, {args.rooms} аудиторий, {args.teachers} преподавателей, {args.days} дней")
+
+    ctx = build()
+    t0 = time.perf_counter()
+    legacy_props, _, legacy_stats = legacy_greedy(ctx)
+    t_legacy = time.perf_counter() - t0
+
+    ctx = build()
+    t0 = time.perf_counter()
+    engine = GreedyEngine(ctx).run()
+    t_engine = time.perf_counter() - t0
+
+    runs = [("legacy", t_legacy, legacy_stats), ("engine", t_engine, engine.stats)]
+    if args.workers > 1:
+        ctx = build()
+        t0 = time.perf_counter()
+        par = run_parallel(ctx, workers=args.workers)
+        runs.append((f"par x{args.workers}", time.perf_counter() - t0, par.stats))
+        clashes = sum(1 for c in par.conflicts if c["reason"] == "merge_room_clash")
+        print(f"параллельно: частей={len(partition_groups(build(), args.workers))}, снято при слиянии={clashes}")
+
+    for name, dt, stats in runs:
+        print(f"[{name:6}] {dt:8.3f} c  размещено={stats['placed']:6d}  пропущено={stats['skipped']:6d}  "
+              f"{stats['placed'] / dt if dt else 0:10.0f} размещений/с")
+    print(f"ускорение: x{t_legacy / t_engine:.1f}")
+    print("предложения совпадают" if legacy_props == engine.proposals else "ВНИМАНИЕ: предложения различаются")
+
+    if args.optimize > 0:
+        rep = optimize(engine, args.optimize, seed=args.seed)
+        print(f"оптимизация {args.optimize:.0f} c: {rep['iterations']} ходов ({rep['moves_per_second']}/с), "
+              f"принято {rep['accepted']}, вставлено {rep['inserted']}")
+        for k in ("objective", "unplaced_hours", "teacher_gaps", "building_changes"):
+            print(f"  {k:17} {rep['before'][k]:>10} -> {rep['after'][k]}")
+        cells = [(p["date"], p["timeslot_id"], who, p[key]) for p in engine.proposals
+                 for who, key in (("g", "group_id"), ("t", "teacher_id"), ("r", "room_id")) if p[key] is not None]
+        print("жёсткие ограничения соблюдены" if len(cells) == len(set(cells)) else "ВНИМАНИЕ: двойная занятость")
+
+
+if __name__ == "__main__":
+    main()
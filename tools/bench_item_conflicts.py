@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Бенчмарк поиска накладок во внешнем расписании (views_integrations.ranepa_conflicts):
+прежнее попарное сравнение внутри дня vs find_item_conflicts (корзины + заметающая прямая).
+
+Синтетическая неделя (ПН–СБ, 8 пар) с заданным числом строк; на размерах до --legacy-max
+прогоняется и старый алгоритм, результаты сравниваются.
+
+    python tools/bench_item_conflicts.py --sizes 2500,5000,10000,20000
+"""
+import os, sys, argparse, random, time
+from pathlib import Path
+from datetime import date, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from api.services.ranepa import norm
+from api.services.conflicts import find_item_conflicts
+
+TIMES = {1: ("08:20", "09:50"), 2: ("10:00", "11:30"), 3: ("11:40", "13:10"), 4: ("13:40", "15:10"),
+         5: ("15:20", "16:50"), 6: ("17:00", "18:30"), 7: ("18:40", "20:10"), 8: ("20:20", "21:50")}
+
+
+def synthetic_week(rnd, n):
+    """n занятий недели; пространство групп/преподавателей/аудиторий растёт с n, чтобы накладки были, но редкими."""
+    monday = date(2025, 9, 8)
+    days = [(monday + timedelta(days=d)).isoformat() for d in range(6)]
+    n_groups = max(10, n // 40)
+    n_teachers = max(10, n // 45)
+    n_rooms = max(10, n // 50)
+    items = []
+    for _ in range(n):
+        order = rnd.randint(1, 8)
+        remote = rnd.random() < 0.15
+        items.append({
+            "date": rnd.choice(days),
+            "order": order,
+            "group": f" {rnd.randrange(n_groups)}ГР-о9\xa0",
+            "teacher": f"Преподаватель  {rnd.randrange(n_teachers)} А.Б.",
+            "room": "" if remote else str(100 + rnd.randrange(n_rooms)),
+            "is_remote": remote,
+            "discipline": "Дисциплина",
+            "start": TIMES[order][0],
+            "end": TIMES[order][1],
+        })
+    items.sort(key=lambda it: it["date"])  # fetch отдаёт неделю по дням
+    return items
+
+
+def legacy_conflicts(items):
+    """Прежний цикл из views_integrations: все пары внутри дня."""
+    from collections import defaultdict
+    by_date = defaultdict(list)
+    for it in items:
+        by_date[it["date"]].append(it)
+
+    def overlap(a_start, a_end, b_start, b_end):
+        if not a_start or not b_start:
+            return True
+        return not (a_end <= b_start or b_end <= a_start)
+
+    conflicts = []
+    for day, arr in by_date.items():
+        n = len(arr)
+        for i in range(n):
+            A = arr[i]
+            for j in range(i + 1, n):
+                B = arr[j]
+                if not overlap(A["start"], A["end"], B["start"], B["end"]):
+                    continue
+                reasons = []
+                if A.get("group") and B.get("group") and norm(A["group"]).lower() == norm(B["group"]).lower():
+                    reasons.append("Одинаковая группа в одно время")
+                if A.get("teacher") and B.get("teacher") and norm(A["teacher"]).lower() == norm(B["teacher"]).lower():
+                    reasons.append("Преподаватель занят в другое занятие")
+                if not A.get("is_remote") and not B.get("is_remote"):
+                    r1, r2 = (A.get("room") or "").strip(), (B.get("room") or "").strip()
+                    if r1 and r2 and r1 == r2:
+                        reasons.append("Одна и та же аудитория")
+                if reasons:
+                    conflicts.append({"date": day, "a": A, "b": B, "reasons": reasons})
+    return conflicts
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Накладки внешнего расписания: попарно vs корзины")
+    ap.add_argument("--sizes", default="2500,5000,10000,20000")
+    ap.add_argument("--legacy-max", type=int, default=5000, help="до какого размера гонять старый алгоритм")
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    print(f"{'строк':>8}{'накладок':>10}{'новый, мс':>12}{'мкс/строку':>12}{'старый, мс':>12}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        items = synthetic_week(random.Random(args.seed), n)
+        t0 = time.perf_counter()
+        new = find_item_conflicts(items)
+        t_new = time.perf_counter() - t0
+
+        old_txt = "-"
+        if n <= args.legacy_max:
+            t0 = time.perf_counter()
+            old = legacy_conflicts(items)
+            t_old = time.perf_counter() - t0
+            same = [(id(c["a"]), id(c["b"]), c["reasons"]) for c in old] == \
+                   [(id(c["a"]), id(c["b"]), c["reasons"]) for c in new]
+            old_txt = f"{t_old * 1000:.0f}" + ("" if same else " (РАЗЛИЧИЕ!)")
+        print(f"{n:8d}{len(new):10d}{t_new * 1000:12.1f}{t_new / n * 1e6:12.1f}{old_txt:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Бенчмарк занятости: множества кортежей (date, timeslot_id, id) vs scheduleapp.occupancy.Occupancy.
+
+Оба варианта заполняются одинаковым синтетическим семестром (без БД) и отвечают
+на одни и те же запросы: «свободна ли аудитория/преподаватель/группа» и
+«все свободные аудитории ячейки». Печатает память (tracemalloc) и время.
+
+    python tools/bench_occupancy.py --days 120 --rooms 200 --teachers 300 --groups 200
+"""
+import os, sys, argparse, random, time, tracemalloc
+from pathlib import Path
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from scheduleapp.occupancy import Occupancy
+
+
+def synthetic_rows(rnd, days, slots, rooms, teachers, groups, fill):
+    """Занятия семестра: в каждой ячейке fill·groups групп с разными преподавателями и аудиториями."""
+    start = date(2025, 9, 1)
+    rows = []
+    for d in range(days):
+        day = start + timedelta(days=d)
+        for s in slots:
+            n = int(len(groups) * fill)
+            for g, t, r in zip(rnd.sample(groups, n), rnd.sample(teachers, n), rnd.sample(rooms, min(n, len(rooms)))):
+                rows.append((day, s, g, t, r))
+    return start, rows
+
+
+def build_sets(rows):
+    busy_room, busy_teacher, busy_group = set(), set(), set()
+    for day, s, g, t, r in rows:
+        busy_group.add((day, s, g))
+        busy_teacher.add((day, s, t))
+        busy_room.add((day, s, r))
+    return busy_room, busy_teacher, busy_group
+
+
+def measure(fn):
+    """(объект, время построения, удерживаемая память). Время — отдельным прогоном: tracemalloc сам тормозит аллокации."""
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    tracemalloc.start()
+    obj = fn()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, dt, size
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Память и скорость: множества кортежей vs Occupancy")
+    ap.add_argument("--days", type=int, default=120)
+    ap.add_argument("--slots", type=int, default=8)
+    ap.add_argument("--rooms", type=int, default=200)
+    ap.add_argument("--teachers", type=int, default=300)
+    ap.add_argument("--groups", type=int, default=200)
+    ap.add_argument("--fill", type=float, default=0.6, help="доля групп, занятых в каждой ячейке")
+    ap.add_argument("--queries", type=int, default=200_000)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    rnd = random.Random(args.seed)
+    slots = list(range(1, args.slots + 1))
+    rooms = list(range(1, args.rooms + 1))
+    teachers = list(range(1, args.teachers + 1))
+    groups = list(range(1, args.groups + 1))
+    start, rows = synthetic_rows(rnd, args.days, slots, rooms, teachers, groups, args.fill)
+    end = start + timedelta(days=args.days - 1)
+    print(f"Набор: {args.days} дней × {args.slots} слотов, {len(rows)} занятий, "
+          f"{args.rooms} аудиторий, {args.teachers} преподавателей, {args.groups} групп")
+
+    (busy_room, busy_teacher, busy_group), t_sets, m_sets = measure(lambda: build_sets(rows))
+
+    def build_occ():
+        occ = Occupancy(start, end, [SimpleNamespace(id=s) for s in slots], [SimpleNamespace(id=r) for r in rooms])
+        occ.load(rows)
+        return occ
+    occ, t_occ, m_occ = measure(build_occ)
+
+    days = [start + timedelta(days=d) for d in range(args.days)]
+    probes = [(rnd.choice(days), rnd.choice(slots), rnd.choice(rooms), rnd.choice(teachers), rnd.choice(groups))
+              for _ in range(args.queries)]
+
+    t0 = time.perf_counter()
+    a = [((d, s, r) in busy_room, (d, s, t) in busy_teacher, (d, s, g) in busy_group) for d, s, r, t, g in probes]
+    t_check_sets = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    b = [(not occ.room_free(d, s, r), not occ.teacher_free(d, s, t), not occ.group_free(d, s, g))
+         for d, s, r, t, g in probes]
+    t_check_occ = time.perf_counter() - t0
+    assert a == b, "ответы различаются"
+
+    cells = probes[: max(1, args.queries // 20)]
+    t0 = time.perf_counter()
+    fa = [[r for r in rooms if (d, s, r) not in busy_room] for d, s, *_ in cells]
+    t_free_sets = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    fb = [[r.id for r in occ.free_rooms(d, s)] for d, s, *_ in cells]
+    t_free_occ = time.perf_counter() - t0
+    assert fa == fb, "списки свободных аудиторий различаются"
+
+    print(f"{'':22}{'множества':>14}{'Occupancy':>14}")
+    print(f"{'память, КБ':22}{m_sets / 1024:14.0f}{m_occ / 1024:14.0f}")
+    print(f"{'загрузка, мс':22}{t_sets * 1000:14.1f}{t_occ * 1000:14.1f}")
+    print(f"{'проверки x3, нс/шт':22}{t_check_sets / len(probes) * 1e9:14.0f}{t_check_occ / len(probes) * 1e9:14.0f}")
+    print(f"{'свободные ауд., мкс':22}{t_free_sets / len(cells) * 1e6:14.1f}{t_free_occ / len(cells) * 1e6:14.1f}")
+    print("ответы совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+"""
+Бенчмарк ranepa_import: прежний построчный импорт vs пакетный
+(api.services.ranepa_import.import_items).
+
+Пакет строится из занятий первых --weeks недель текущей базы (как их отдал бы
+fetch): часть строк — поверх имеющихся занятий, часть сдвинута на свободные
+недели (создание), плюс потоки, физкультура, накладки преподавателей/аудиторий,
+новые справочники и битые строки. Каждый вариант — в транзакции с откатом;
+печатаются время, число запросов и строки/с, отчёты сравниваются между собой
+вместе с итоговым состоянием затронутых занятий. В конце — повторный импорт
+того же пакета поверх первого: база уже такая, записей быть не должно.
+
+Имена в другом регистре в набор не входят: на SQLite прежний name__iexact (LIKE)
+не сворачивает регистр кириллицы и заводил дубликат, а пакетный путь сопоставляет
+casefold — как прежний код на PostgreSQL.
+
+Большая база — manage.py generate_dataset:
+
+    python tools/bench_ranepa_import.py --weeks 1 [--repeat 3]
+"""
+import os, sys, argparse, json, random, re, time
+from pathlib import Path
+from datetime import datetime, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+
+from directory.models import Building, Discipline, LessonType, Room, StudentGroup, Teacher
+from scheduleapp.models import Lesson, TimeSlot
+from api.services.ranepa_import import (
+    SPORTS_PREFIXES, _derive_building_name, _norm, _safe_order, strip_leading_breaks, import_items,
+)
+from api.views import get_or_create_ci
+
+
+def legacy_import(items):
+    """Прежний цикл ranepa_import: по нескольку запросов на строку, save() с full_clean."""
+
+    report = {"created":0,"updated":0,"skipped":0,"errors":0,"reasons":{}, "samples":[]}
+    def bump(reason): report["reasons"][reason] = report["reasons"].get(reason,0)+1
+
+    to_bulk_insert = []  # bypass-вставки (потоки и физра по аудитории)
+
+    for raw in items:
+        try:
+            # ----- дата / слот -----
+            try:
+                date = datetime.fromisoformat(raw.get("date")).date()
+            except Exception:
+                report["errors"] += 1; bump("BAD_DATE")
+                if len(report["samples"])<12: report["samples"].append({"reason":"BAD_DATE","item":raw})
+                continue
+
+            order = _safe_order(raw.get("order"))
+            if not order:
+                report["skipped"] += 1; bump("NO_ORDER")
+                if len(report["samples"])<12: report["samples"].append({"reason":"NO_ORDER","item":raw})
+                continue
+
+            ts = TimeSlot.objects.filter(order=order).first()
+            if not ts:
+                report["skipped"] += 1; bump("NO_TIMESLOT")
+                if len(report["samples"])<12: report["samples"].append({"reason":"NO_TIMESLOT","item":raw})
+                continue
+
+            # ----- группы (может быть поток) -----
+            groups_raw = re.split(r",\s*|;\s*", _norm(raw.get("group")))
+            groups_raw = [g for g in groups_raw if g]
+            if not groups_raw:
+                report["skipped"] += 1; bump("NO_GROUP")
+                if len(report["samples"])<12: report["samples"].append({"reason":"NO_GROUP","item":raw})
+                continue
+
+            # ----- справочники без дублей (CI) -----
+            disc_title = strip_leading_breaks(_norm(raw.get("discipline"))) or "Без названия"
+            discipline = get_or_create_ci(Discipline, "title", disc_title)
+
+            teacher = None
+            t_name  = _norm(raw.get("teacher"))
+            if t_name:
+                teacher = get_or_create_ci(Teacher, "full_name", t_name)
+
+            lesson_type = None
+            lt_name = _norm(raw.get("lesson_type"))
+            if lt_name:
+                lesson_type = get_or_create_ci(LessonType, "name", lt_name)
+
+            # ----- флаги -----
+            is_stream = ("поток" in (lt_name or "").lower()) or (len(groups_raw) > 1)
+            is_remote = bool(raw.get("is_remote"))
+            is_sports = (disc_title.strip().lower().startswith(SPORTS_PREFIXES))
+
+            # ----- аудитория / корпус -----
+            room_obj = None
+            remote_pl = _norm(raw.get("remote_platform")) if is_remote else ""
+            if not is_remote:
+                room_name = _norm(raw.get("room"))
+                bname = _norm(raw.get("building")) or _derive_building_name(room_name)
+                building = get_or_create_ci(Building, "name", bname) if bname else None
+                if not building:
+                    building = get_or_create_ci(Building, "name", "Не указан")
+                if room_name:
+                    room_obj = Room.objects.filter(name__iexact=room_name, building=building).first()
+                    if not room_obj:
+                        # capacity=0, computers=0 — чтобы не падать на "вместимость < размер группы"
+                        room_obj = Room.objects.create(
+                            name=room_name,
+                            building=building,
+                            capacity=0,
+                            computers=0,
+                        )
+                    else:
+                        # (опционально) если известен размер группы и он больше заявленной вместимости — поднимем её
+                        try:
+                            # вычислим max размер среди всех групп этого «пакета»
+                            sizes = []
+                            for code in groups_raw:
+                                g = StudentGroup.objects.filter(code__iexact=code.strip()).first()
+                                if g and (g.size or 0) > 0:
+                                    sizes.append(g.size)
+                            need = max(sizes) if sizes else 0
+                            if need and room_obj.capacity and room_obj.capacity < need:
+                                room_obj.capacity = need
+                                room_obj.save(update_fields=["capacity"])
+                        except Exception:
+                            pass
+
+            # ====== СОХРАНЕНИЕ (bypass для потоков и физры по аудитории) ======
+            for code in groups_raw:
+                code = code.strip()
+                if not code:
+                    report["skipped"] += 1; bump("EMPTY_GROUP_TOKEN"); continue
+
+                group, _ = StudentGroup.objects.get_or_create(code=code, defaults={"size": 0})
+
+                values = dict(
+                    discipline=discipline,
+                    teacher=teacher,
+                    lesson_type=lesson_type,
+                    room=room_obj,
+                    is_remote=is_remote,
+                    remote_platform=remote_pl or "",
+                    is_stream=is_stream,
+                )
+
+                # Разрешённый обход модельной валидации:
+                #  - поток (is_stream=True)
+                #  - физкультура очно (не удалённо): аудитория «может совпадать», пропускаем конфликт по комнате
+                allow_bypass = is_stream or (is_sports and not is_remote)
+
+                existing = Lesson.objects.filter(date=date, timeslot=ts, group=group).first()
+                if existing:
+                    if allow_bypass:
+                        # update() обходит save()/clean() → не сработают «жёсткие» валидаторы
+                        Lesson.objects.filter(pk=existing.pk).update(**values)
+                        report["updated"] += 1
+                    else:
+                        try:
+                            with transaction.atomic():
+                                for k, v in values.items():
+                                    setattr(existing, k, v)
+                                existing.save()
+                                report["updated"] += 1
+                        except ValidationError as e:
+                            report["errors"] += 1; bump("ValidationError")
+                            if len(report["samples"]) < 12:
+                                report["samples"].append({
+                                    "reason": "ValidationError",
+                                    "item": {**raw, "group": code},
+                                    "messages": e.message_dict if hasattr(e, "message_dict") else e.messages
+                                })
+                        except IntegrityError:
+                            report["errors"] += 1; bump("DB_INTEGRITY")
+                            if len(report["samples"]) < 12:
+                                report["samples"].append({
+                                    "reason": "DB_INTEGRITY",
+                                    "item": {**raw, "group": code}
+                                })
+                else:
+                    if allow_bypass:
+                        to_bulk_insert.append(Lesson(group=group, date=date, timeslot=ts, **values))
+                    else:
+                        try:
+                            with transaction.atomic():
+                                Lesson.objects.create(group=group, date=date, timeslot=ts, **values)
+                                report["created"] += 1
+                        except ValidationError as e:
+                            report["errors"] += 1; bump("ValidationError")
+                            if len(report["samples"]) < 12:
+                                report["samples"].append({
+                                    "reason": "ValidationError",
+                                    "item": {**raw, "group": code},
+                                    "messages": e.message_dict if hasattr(e, "message_dict") else e.messages
+                                })
+                        except IntegrityError:
+                            report["errors"] += 1; bump("DB_INTEGRITY")
+                            if len(report["samples"]) < 12:
+                                report["samples"].append({
+                                    "reason": "DB_INTEGRITY",
+                                    "item": {**raw, "group": code}
+                                })
+
+        except Exception as e:
+            report["errors"] += 1; bump(type(e).__name__)
+            if len(report["samples"])<12:
+                report["samples"].append({"reason":type(e).__name__,"item":raw})
+
+    # дозаливаем bypass-пакет
+    if to_bulk_insert:
+        Lesson.objects.bulk_create(to_bulk_insert, batch_size=500)
+        report["created"] += len(to_bulk_insert)
+    return report
+
+
+# ---------- набор строк ----------
+def build_items(weeks, seed, mutate=True):
+    rnd = random.Random(seed)
+    first = Lesson.objects.order_by("date").values_list("date", flat=True).first()
+    last = Lesson.objects.order_by("-date").values_list("date", flat=True).first()
+    if first is None:
+        sys.exit("В базе нет занятий — сначала manage.py generate_dataset")
+    monday = first - timedelta(days=first.weekday())
+    free = last - timedelta(days=last.weekday()) + timedelta(weeks=1)
+    rows = (Lesson.objects.filter(date__range=(monday, monday + timedelta(weeks=weeks, days=-1)))
+            .order_by("date", "timeslot__order", "group__code")
+            .values_list("date", "timeslot__order", "group__code", "teacher__full_name", "discipline__title",
+                         "lesson_type__name", "room__name", "room__building__name", "is_remote", "remote_platform"))
+    items = []
+    for d, order, group, teacher, disc, ltype, room, building, remote, platform_ in rows:
+        it = {"date": d.isoformat(), "order": order, "group": group, "teacher": teacher or "",
+              "discipline": disc, "lesson_type": ltype or "", "room": room or "", "building": building or "",
+              "is_remote": remote, "remote_platform": platform_ or ""}
+        roll = rnd.random() if mutate else 1.0
+        if roll < 0.35:
+            it["date"] = (d + (free - monday)).isoformat()          # новая неделя — создание
+        elif roll < 0.45:
+            it["teacher"] = rnd.choice(items)["teacher"] if items else it["teacher"]  # накладка
+        elif roll < 0.48:
+            it["discipline"] = f"Новая дисциплина {rnd.randint(1, 20)}"
+        elif roll < 0.50:
+            it["lesson_type"] = "Лекция (поток)"                     # поток мимо проверок
+        elif roll < 0.51:
+            it["date"] = "31.02"                                     # битая дата
+        elif roll < 0.52:
+            it["order"] = ""
+        items.append(it)
+    return items
+
+
+# ---------- замер ----------
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        if sql.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.writes += 1
+        return execute(sql, params, many, context)
+
+
+def snapshot(items):
+    """Итог по затронутым датам: {(date, slot, group): (teacher, discipline, type, room, remote, stream)}."""
+    dates = set()
+    for it in items:
+        try:
+            dates.add(datetime.fromisoformat(it["date"]).date())
+        except (TypeError, ValueError):
+            pass
+    rows = (Lesson.objects.filter(date__in=dates)
+            .values_list("date", "timeslot__order", "group__code", "teacher__full_name", "discipline__title",
+                         "lesson_type__name", "room__name", "is_remote", "is_stream"))
+    return {r[:3]: r[3:] for r in rows}
+
+
+def run(fn, items):
+    counter = QueryCounter()
+    with transaction.atomic():
+        with connection.execute_wrapper(counter):
+            t0 = time.perf_counter()
+            out = fn(items)
+            seconds = time.perf_counter() - t0
+        report = out[0] if isinstance(out, tuple) else out
+        state = snapshot(items)
+        transaction.set_rollback(True)
+    return seconds, counter.count, report, state
+
+
+def resync(items):
+    """Тот же пакет второй раз (первый прогон приводит базу к нему): (сек, запросов, записей, отчёт)."""
+    counter = QueryCounter()
+    with transaction.atomic():
+        import_items(items)
+        with connection.execute_wrapper(counter):
+            t0 = time.perf_counter()
+            report, _ = import_items(items)
+            seconds = time.perf_counter() - t0
+        transaction.set_rollback(True)
+    return seconds, counter.count, counter.writes, report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="ranepa_import: построчно vs пакетом")
+    ap.add_argument("--weeks", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--skip-legacy", action="store_true")
+    args = ap.parse_args()
+
+    items = build_items(args.weeks, args.seed)
+    print(f"Строк: {len(items)}, занятий в базе: {Lesson.objects.count()}")
+    print(f"{'режим':>8}{'сек':>9}{'запросов':>10}{'строк/с':>10}  отчёт")
+    results = {}
+    for name, fn in (("legacy", legacy_import), ("bulk", import_items)):
+        if name == "legacy" and args.skip_legacy:
+            continue
+        best = None
+        for _ in range(args.repeat):
+            r = run(fn, items)
+            best = r if best is None or r[0] < best[0] else best
+        seconds, queries, report, state = best
+        results[name] = (report, state)
+        totals = {k: report[k] for k in ("created", "updated", "unchanged", "skipped", "errors") if k in report}
+        print(f"{name:>8}{seconds:9.2f}{queries:10d}{len(items) / seconds:10.0f}  {json.dumps(totals)}")
+
+    if len(results) == 2:
+        (ra, sa), (rb, sb) = results["legacy"], results["bulk"]
+        # прежний импорт считал «обновлёнными» и строки без изменений
+        same_report = (all(ra[k] == rb[k] for k in ("created", "skipped", "errors", "reasons"))
+                       and ra["updated"] == rb["updated"] + rb["unchanged"])
+        print(f"отчёты {'совпадают' if same_report else 'РАЗЛИЧАЮТСЯ'}; "
+              f"итоговые занятия {'совпадают' if sa == sb else 'РАЗЛИЧАЮТСЯ'}")
+        if not same_report:
+            print(json.dumps({"legacy": ra["reasons"], "bulk": rb["reasons"]}, ensure_ascii=False))
+        if sa != sb:
+            diff = [k for k in sa.keys() | sb.keys() if sa.get(k) != sb.get(k)]
+            print(f"  расхождений: {len(diff)}, например {diff[:3]}")
+
+    for title, pack in (("повторный импорт того же пакета", items),
+                        ("повторный импорт недели без правок", build_items(args.weeks, args.seed, mutate=False))):
+        seconds, queries, writes, report = resync(pack)
+        totals = {k: report[k] for k in ("created", "updated", "unchanged", "disappeared", "errors")}
+        print(f"{title}: {seconds * 1000:.0f} мс, запросов {queries}, из них записей {writes}; {json.dumps(totals)}")
+
+
+if __name__ == "__main__":
+    main()
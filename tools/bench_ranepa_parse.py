@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+"""
+Бенчмарк разбора страницы недели RANEPA: прежний разбор через BeautifulSoup
+(плоский текст → склейка → split по «;», копия ниже) vs потоковый
+api.services.ranepa.iter_week_html (цель lxml-парсера, без дерева).
+
+Корпус — сохранённые страницы api/testdata/ranepa/*.html (или --pages DIR);
+--inflate K размножает строки каждого дня, чтобы посмотреть на большие страницы.
+По каждому варианту: мс на страницу, строк/с, пик памяти Python (tracemalloc,
+отдельным прогоном) и прирост пика RSS (каждый вариант — в своём подпроцессе,
+Linux: память libxml2 tracemalloc не видит). Результаты обоих разборов сравниваются.
+
+--write-expected пересобирает эталон api/testdata/ranepa/expected.json прежним
+разбором — по нему тесты проверяют, что новый разбор отдаёт то же самое.
+
+    python tools/bench_ranepa_parse.py [--repeat 50] [--inflate 20]
+    python tools/bench_ranepa_parse.py --write-expected
+"""
+import os, sys, argparse, json, re, subprocess, time, tracemalloc
+from pathlib import Path
+from datetime import datetime, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from bs4 import BeautifulSoup
+
+from api.services.ranepa import MONTH_SLUGS, RU_DAY_TO_IDX, iter_week_html, norm
+
+CORPUS = BASE_DIR / "api" / "testdata" / "ranepa"
+QUERIES = ("", "23испп3", "иванова")  # запросы, для которых пишется эталон
+SLUG_RE = re.compile(r"^([a-z]{3})(\d{2})-")
+MONTHS = {v: k for k, v in MONTH_SLUGS.items()}
+
+
+# ---------- прежний разбор (как был в api/services/ranepa.py) ----------
+def legacy_parse(html: str, q: str, kind: str, week_start_iso: str):
+    html = re.sub(r"<br\s*/?>", " ", html, flags=re.I)
+    soup = BeautifulSoup(html, "lxml")
+    text = soup.get_text("\n", strip=True)
+
+    base = datetime.fromisoformat(week_start_iso).date()
+    day_header_re = re.compile(
+        r"^(понедельник|вторник|среда|четверг|пятница|суббота|воскресенье)\s*\|\s*(\d{1,2})\s+[а-я]+",
+        re.I
+    )
+
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    items, buf, cur_date = [], [], None
+
+    def _flush():
+        nonlocal buf, items, cur_date
+        if not buf or not cur_date:
+            buf = []; return
+        seg = " ".join(buf)
+        p = seg.lower().find("группа;пара;дисциплина")
+        if p != -1: seg = seg[p:]
+        seg = re.sub(r"^группа;пара;дисциплина[^;]*;преподаватель;№ ауд.;\s*", "", seg, flags=re.I)
+        toks = [t.strip() for t in seg.split(";") if t.strip()]
+
+        needle = (q or "").lower()
+        for i in range(0, len(toks) - 4, 5):
+            group_field   = norm(toks[i])
+            pair_field    = norm(toks[i+1])
+            disc_type     = norm(toks[i+2])
+            teacher_field = norm(toks[i+3])
+            room_field    = norm(toks[i+4])
+
+            if needle and needle not in f"{group_field} {teacher_field} {disc_type}".lower():
+                continue
+
+            discipline, lesson_type = disc_type, None
+            if "," in disc_type:
+                left, right = disc_type.rsplit(",", 1)
+                discipline = norm(left)
+                lesson_type = norm(right)
+
+            is_remote = room_field.upper().startswith("СДО")
+
+            building = None
+            if not is_remote:
+                rm = (room_field or "").strip()
+                if rm.isdigit():
+                    n = int(rm)
+                    building = "Колледж" if n < 100 else "Высшее Образование"
+            items.append({
+                "date": cur_date.isoformat(),
+                "order": int(pair_field) if pair_field.isdigit() else None,
+                "time": None,
+                "discipline": discipline or None,
+                "lesson_type": lesson_type or None,
+                "teacher": teacher_field or None,
+                "group": group_field or None,
+                "room": None if is_remote else (room_field or None),
+                "building": building,
+                "is_remote": is_remote,
+                "remote_platform": "СДО" if is_remote else None,
+            })
+        buf = []
+
+    for ln in lines:
+        m = day_header_re.match(ln)
+        if m:
+            _flush()
+            day_idx = RU_DAY_TO_IDX[m.group(1).lower()]
+            cur_date = base + timedelta(days=day_idx)
+            continue
+        if cur_date: buf.append(ln)
+    _flush()
+
+    items.sort(key=lambda x: (x["date"], x["order"] if x["order"] is not None else 99))
+    return items
+
+
+def stream_parse(html, q, kind, week_start_iso):
+    items = list(iter_week_html(html, q, kind, week_start_iso))
+    items.sort(key=lambda x: (x["date"], x["order"] if x["order"] is not None else 99))
+    return items
+
+
+PARSERS = {"legacy": legacy_parse, "stream": stream_parse}
+
+
+# ---------- корпус ----------
+def week_start(slug: str, year: int) -> str:
+    """sep08-sep13 → 2025-09-08 (год — из --year: в адресе страницы его нет)."""
+    m = SLUG_RE.match(slug)
+    return f"{year}-{MONTHS[m.group(1)]:02d}-{m.group(2)}"
+
+
+def inflate(html: str, k: int) -> str:
+    """Каждая строка <p class="row"> повторяется k раз — страница побольше при том же формате."""
+    if k <= 1:
+        return html
+    return re.sub(r'(<p class="row">.*?</p>\n?)', lambda m: m.group(1) * k, html, flags=re.S)
+
+
+def load_corpus(args):
+    pages = []
+    for path in sorted(Path(args.pages).glob("*.html")):
+        pages.append((path.stem, week_start(path.stem, args.year), inflate(path.read_text(encoding="utf-8"), args.inflate)))
+    if not pages:
+        sys.exit(f"В {args.pages} нет страниц *.html")
+    return pages
+
+
+# ---------- замер ----------
+def run(fn, pages, repeat):
+    rows = 0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for _slug, week, html in pages:
+            rows += len(fn(html, "", "group", week))
+    sec = time.perf_counter() - t0
+    return {"ms_per_page": sec * 1000 / (repeat * len(pages)), "rows_per_sec": rows / sec if sec else 0.0}
+
+
+def peak_kb(fn, pages):
+    tracemalloc.start()
+    for _slug, week, html in pages:
+        fn(html, "", "group", week)
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return peak
+
+
+def _rss_kb(field):
+    """VmRSS/VmHWM из /proc/self/status (ru_maxrss не годится: на Linux переживает exec от родителя)."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def child_rss(args, name):
+    """Прирост пика RSS в отдельном процессе (КБ) относительно RSS после импортов и чтения корпуса."""
+    cmd = [sys.executable, __file__, "--child", name, "--pages", str(args.pages), "--year", str(args.year),
+           "--inflate", str(args.inflate), "--repeat", str(args.repeat)]
+    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])["rss_kb"]
+
+
+def write_expected(pages, args):
+    out = {}
+    for slug, week, html in pages:
+        out[slug] = {"week": week, "queries": {q: legacy_parse(html, q, "group", week) for q in QUERIES}}
+    path = Path(args.pages) / "expected.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, ensure_ascii=False, indent=1)
+        f.write("\n")
+    print(f"→ {path} ({sum(len(v['queries']['']) for v in out.values())} строк)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Разбор страницы недели RANEPA: BeautifulSoup vs lxml-поток")
+    ap.add_argument("--pages", default=str(CORPUS), help="каталог с сохранёнными страницами *.html")
+    ap.add_argument("--year", type=int, default=2025)
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--inflate", type=int, default=1, help="во сколько раз размножить строки каждого дня")
+    ap.add_argument("--write-expected", action="store_true", help="пересобрать expected.json прежним разбором")
+    ap.add_argument("--child", default="", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    pages = load_corpus(args)
+    if args.write_expected:
+        return write_expected(pages, args)
+    if args.child:
+        base = _rss_kb("VmRSS")
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # сбросить VmHWM до текущего RSS
+        run(PARSERS[args.child], pages, args.repeat)
+        print(json.dumps({"rss_kb": _rss_kb("VmHWM") - base}))
+        return
+
+    size = sum(len(html.encode()) for *_, html in pages)
+    print(f"{len(pages)} страниц, {size / 1024:.0f} КБ, повторов {args.repeat}, inflate {args.inflate}")
+    results = {}
+    for name, fn in PARSERS.items():
+        fn(pages[0][2], "", "group", pages[0][1])  # прогрев
+        r = run(fn, pages, args.repeat)
+        r["peak_kb"] = peak_kb(fn, pages)
+        r["rss_kb"] = child_rss(args, name)
+        results[name] = r
+        print(f"{name:<8}{r['ms_per_page']:9.2f} мс/стр{r['rows_per_sec']:12.0f} строк/с"
+              f"{r['peak_kb']:10.0f} КБ пик Python{r['rss_kb']:8d} КБ RSS")
+    a, b = results["legacy"], results["stream"]
+    print(f"ускорение ×{a['ms_per_page'] / b['ms_per_page']:.1f}, пик Python ×{a['peak_kb'] / max(b['peak_kb'], 1):.1f}")
+
+    mismatched = [(slug, q) for slug, week, html in pages for q in QUERIES
+                  if legacy_parse(html, q, "group", week) != stream_parse(html, q, "group", week)]
+    print("результаты совпадают" if not mismatched else f"РАСХОЖДЕНИЯ: {mismatched}")
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
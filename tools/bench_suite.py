@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+"""
+Сквозной бенчмарк горячих ручек API через тестовый клиент.
+
+Гоняет настоящие view (schedule_period, admin_generate_schedule, ranepa_import,
+export_csv, ranepa_conflicts) на текущей базе: каждый прогон — в транзакции с
+откатом, поэтому импорт ничего не оставляет, а лог импорта пишется во временный
+MEDIA_ROOT. По каждому сценарию: перцентили задержки, число SQL-запросов и пик
+памяти Python (tracemalloc, отдельным прогоном — трассировка сама тормозит).
+Результат — JSON; --compare печатает разницу с прошлым файлом.
+
+Большую базу готовит manage.py generate_dataset:
+
+    python manage.py generate_dataset --groups 300 --teachers 450 --rooms 350 --years 2 --flush
+    python tools/bench_suite.py --repeat 10 --out bench.json [--compare prev.json] [--only export_csv]
+"""
+import os, sys, argparse, json, platform, statistics, subprocess, tempfile, time, tracemalloc
+from pathlib import Path
+from datetime import datetime, timedelta
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from directory.models import Teacher, StudentGroup, Discipline, Room
+from scheduleapp.models import Lesson
+from api.services import week_cache
+
+
+# ---------- сценарии ----------
+class Scenario:
+    """name; prepare() вызывается перед каждым прогоном вне замера; request() — сам замеряемый вызов."""
+
+    def __init__(self, name, request, prepare=None, note=""):
+        self.name, self.request, self.prepare, self.note = name, request, prepare, note
+
+
+def consume(resp):
+    """Дочитывает потоковый ответ; возвращает (статус, байт)."""
+    if getattr(resp, "streaming", False):
+        size = sum(len(chunk) for chunk in resp.streaming_content)
+    else:
+        size = len(resp.content)
+    return resp.status_code, size
+
+
+def import_items(start, end, limit, shift=timedelta(0)):
+    """Пакет ranepa_import из имеющихся занятий диапазона (shift — сдвиг дат, чтобы получить новые строки)."""
+    rows = (Lesson.objects.filter(date__range=(start, end))
+            .order_by("date", "timeslot__order", "id")
+            .values_list("date", "timeslot__order", "group__code", "teacher__full_name", "discipline__title",
+                         "lesson_type__name", "room__name", "room__building__name", "is_remote", "remote_platform")
+            [:limit])
+    return [{
+        "date": (d + shift).isoformat(), "order": order, "group": group, "teacher": teacher or "",
+        "discipline": disc, "lesson_type": ltype or "", "room": room or "", "building": building or "",
+        "is_remote": remote, "remote_platform": platform_ or "",
+    } for d, order, group, teacher, disc, ltype, room, building, remote, platform_ in rows]
+
+
+def scenarios(args, staff):
+    first = Lesson.objects.order_by("date").values_list("date", flat=True).first()
+    last = Lesson.objects.order_by("-date").values_list("date", flat=True).first()
+    if first is None:
+        sys.exit("В базе нет занятий — сначала manage.py generate_dataset")
+    monday = first - timedelta(days=first.weekday())
+    week = f"start={monday}&end={monday + timedelta(days=6)}"
+    month = f"start={monday}&end={monday + timedelta(days=27)}"
+    group = (Lesson.objects.filter(date__range=(monday, monday + timedelta(days=6)))
+             .values_list("group__code", flat=True).first())
+    teacher = Lesson.objects.filter(date__gte=monday).values_list("teacher_id", flat=True).first()
+    codes = list(StudentGroup.objects.order_by("code").values_list("code", flat=True)[:args.gen_groups])
+    # генерация — на неделю после последнего занятия, чтобы было что расставлять
+    gen_monday = last - timedelta(days=last.weekday()) + timedelta(weeks=1)
+    gen = f"start={gen_monday}&end={gen_monday + timedelta(days=5)}&groups={','.join(codes)}&dry_run=1"
+
+    update_items = import_items(monday, monday + timedelta(days=6), args.import_items)
+    shift = gen_monday - monday
+    create_items = import_items(monday, monday + timedelta(days=6), args.import_items, shift=shift)
+
+    def get(url):
+        return lambda: consume(staff.get(url))
+
+    def post_json(items):
+        body = json.dumps({"items": items, "meta": {"source": "bench_suite"}})
+        return lambda: consume(staff.post("/api/integrations/ranepa/import/", body, content_type="application/json"))
+
+    return [
+        Scenario("schedule_period:cold", get(f"/api/schedule/period/?group={group}&{week}"),
+                 prepare=week_cache.invalidate_all, note=f"группа {group}, неделя, пустой кэш"),
+        Scenario("schedule_period:warm", get(f"/api/schedule/period/?group={group}&{week}"),
+                 note=f"группа {group}, неделя, из кэша"),
+        Scenario("schedule_period:teacher", get(f"/api/schedule/period/?teacher={teacher}&{week}"),
+                 prepare=week_cache.invalidate_all, note="преподаватель, неделя, пустой кэш"),
+        Scenario("admin_generate_schedule", get(f"/api/admin/generate/?{gen}"),
+                 note=f"{len(codes)} групп, 6 дней, dry_run"),
+        Scenario("ranepa_import:update", post_json(update_items), note=f"{len(update_items)} строк поверх имеющихся"),
+        Scenario("ranepa_import:create", post_json(create_items), note=f"{len(create_items)} новых строк"),
+        Scenario("export_csv", get(f"/api/export/csv/?{month}"), note="весь колледж, 4 недели"),
+        Scenario("ranepa_conflicts", get(f"/api/integrations/ranepa/conflicts/?{week}"), note="неделя"),
+    ]
+
+
+# ---------- замер ----------
+class QueryCounter:
+    """execute_wrapper: считает запросы без журнала connection.queries (он ограничен 9000 записей)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_once(sc, *, trace=False):
+    """Один прогон в транзакции с откатом: (мс, запросов, статус, байт, пик КБ|None)."""
+    counter = QueryCounter()
+    with transaction.atomic():
+        if sc.prepare:
+            sc.prepare()
+        with connection.execute_wrapper(counter):
+            if trace:
+                tracemalloc.start()
+            t0 = time.perf_counter()
+            status, size = sc.request()
+            ms = (time.perf_counter() - t0) * 1000
+            peak = None
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1] / 1024
+                tracemalloc.stop()
+        transaction.set_rollback(True)
+    return ms, counter.count, status, size, peak
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def measure(sc, repeat, warmup):
+    for _ in range(warmup):
+        run_once(sc)
+    times, queries, status, size = [], [], None, 0
+    for _ in range(repeat):
+        ms, q, status, size, _ = run_once(sc)
+        times.append(ms)
+        queries.append(q)
+    *_, peak = run_once(sc, trace=True)
+    return {
+        "note": sc.note, "status": status, "bytes": size, "runs": repeat,
+        "ms": {"p50": percentile(times, 50), "p90": percentile(times, 90), "p95": percentile(times, 95),
+               "max": max(times), "mean": statistics.fmean(times)},
+        "queries": max(queries), "peak_kb": round(peak, 1),
+    }
+
+
+def meta():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        sha = ""
+    return {
+        "at": datetime.now().isoformat(timespec="seconds"), "git": sha,
+        "python": platform.python_version(), "django": django.get_version(),
+        "db": connection.vendor,
+        "counts": {m.__name__: m.objects.count() for m in (Lesson, StudentGroup, Teacher, Discipline, Room)},
+    }
+
+
+# ---------- вывод ----------
+def print_table(results, prev=None):
+    head = f"{'сценарий':<26}{'p50, мс':>10}{'p95, мс':>10}{'max, мс':>10}{'SQL':>7}{'пик, КБ':>10}"
+    if prev:
+        head += f"{'Δp50':>9}{'ΔSQL':>7}{'Δпик':>9}"
+    print(head)
+    for name, r in results.items():
+        line = (f"{name:<26}{r['ms']['p50']:10.1f}{r['ms']['p95']:10.1f}{r['ms']['max']:10.1f}"
+                f"{r['queries']:7d}{r['peak_kb']:10.0f}")
+        old = (prev or {}).get(name)
+        if old:
+            d = (r["ms"]["p50"] - old["ms"]["p50"]) / old["ms"]["p50"] * 100 if old["ms"]["p50"] else 0.0
+            line += f"{d:+8.0f}%{r['queries'] - old['queries']:+7d}{r['peak_kb'] - old['peak_kb']:+9.0f}"
+        elif prev:
+            line += f"{'new':>9}"
+        if r["status"] != 200:
+            line += f"  HTTP {r['status']}"
+        print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Сквозной бенчмарк ручек API (задержка, SQL, память)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--warmup", type=int, default=1)
+    ap.add_argument("--only", default="", help="сценарии через запятую (по префиксу имени)")
+    ap.add_argument("--gen-groups", type=int, default=10, help="групп для admin_generate_schedule")
+    ap.add_argument("--import-items", type=int, default=300, help="строк в пакете ranepa_import")
+    ap.add_argument("--out", default="", help="куда записать JSON")
+    ap.add_argument("--compare", default="", help="прошлый JSON для сравнения")
+    args = ap.parse_args()
+
+    prev = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            prev = json.load(f)["results"]
+
+    only = [s.strip() for s in args.only.split(",") if s.strip()]
+    report = {"meta": meta(), "params": vars(args), "results": {}}
+    with tempfile.TemporaryDirectory() as media, override_settings(ALLOWED_HOSTS=["*"], MEDIA_ROOT=media):
+        with transaction.atomic():
+            admin = User.objects.create_superuser(f"bench_suite_{os.getpid()}", password=None)
+            staff = Client()
+            staff.force_login(admin)
+            for sc in scenarios(args, staff):
+                if only and not any(sc.name.startswith(p) for p in only):
+                    continue
+                print(f"… {sc.name}", file=sys.stderr)
+                report["results"][sc.name] = measure(sc, args.repeat, args.warmup)
+            transaction.set_rollback(True)
+
+    print_table(report["results"], prev)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"→ {args.out}")
+
+
+if __name__ == "__main__":
+    main()